@@ -1,27 +1,51 @@
 import json
 import os
 import boto3
+from boto3.dynamodb.types import TypeDeserializer
+from botocore.exceptions import ClientError
 from datetime import datetime, timedelta
+from rollups import (
+    RollupTable, latest_price_key, parse_rollup, price_comparison, price_spread_key,
+    price_spreads, summarize
+)
+from tracing import Tracer
 
-s3 = boto3.client('s3')
+tracer = Tracer.from_env('get_analytics')
+
+s3 = tracer.wrap(boto3.client('s3'), 's3')
 dynamodb = boto3.resource('dynamodb')
 
 BUCKET_NAME = os.environ['PRICE_DATA_BUCKET']
 TABLE_NAME = os.environ['DYNAMODB_TABLE']
+ROLLUP_TABLE_NAME = os.environ['ROLLUP_TABLE']
+
+rollup_table = RollupTable(
+    tracer.wrap(dynamodb.Table(ROLLUP_TABLE_NAME), 'rollup_table'),
+    client=tracer.wrap(dynamodb.meta.client, 'rollup_table')
+)
+deserializer = TypeDeserializer()
 
 def lambda_handler(event, context):
+    trace = tracer.start_trace('analytics')
     try:
-        params = event.get('queryStringParameters', {})
+        params = event.get('queryStringParameters') or {}
         state = params.get('state', 'maharashtra')
         start_date = params.get('start', (datetime.now() - timedelta(days=90)).strftime('%Y-%m-%d'))
         end_date = params.get('end', datetime.now().strftime('%Y-%m-%d'))
         
-        # Get analytics data
+        # Sum the daily rollup buckets in range instead of scanning the query log
+        with trace.span('analytics.rollups'):
+            summary = summarize(rollup_table.load(state, start_date, end_date))
+        with trace.span('analytics.price_comparison'):
+            comparison = get_price_comparison(state)
+        with trace.span('analytics.price_spreads'):
+            spreads = get_price_spreads(state)
         analytics = {
-            'totalQueries': get_total_queries(state, start_date, end_date),
-            'topCrops': get_top_crops(state),
-            'priceComparison': get_price_comparison(state),
-            'recommendationStats': get_recommendation_stats(state)
+            'totalQueries': summary['totalQueries'],
+            'topCrops': summary['topCrops'],
+            'priceComparison': comparison,
+            'priceSpreads': spreads,
+            'recommendationStats': summary['recommendationStats']
         }
         
         return {
@@ -32,9 +56,10 @@ def lambda_handler(event, context):
             },
             'body': json.dumps(analytics)
         }
-        
+    
     except Exception as e:
         print(f"Error: {str(e)}")
+        tracer.incr('analytics.errors')
         return {
             'statusCode': 500,
             'headers': {
@@ -43,35 +68,50 @@ def lambda_handler(event, context):
             },
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        tracer.finish_trace(trace)
 
-def get_total_queries(state, start_date, end_date):
-    """Get total queries for state in date range"""
-    # Mock implementation
-    return 1247
+def get_price_comparison(state):
+    """Highest latest mandi prices per crop from the rollup latest-price table"""
+    table = read_rollup(latest_price_key(state), 'analytics.price_comparison.missing')
+    return price_comparison(table) if table is not None else {}
 
-def get_top_crops(state):
-    """Get most queried crops"""
-    return [
-        {'crop': 'Cotton', 'queries': 456},
-        {'crop': 'Soybean', 'queries': 342},
-        {'crop': 'Wheat', 'queries': 289},
-        {'crop': 'Onion', 'queries': 160}
-    ]
+def get_price_spreads(state):
+    """Best inter-mandi spreads per crop, computed with the latest-price table at each price build"""
+    table = read_rollup(price_spread_key(state), 'analytics.price_spreads.missing')
+    return price_spreads(table) if table is not None else {}
 
-def get_price_comparison(state):
-    """Get price comparison across mandis"""
-    return {
-        'cotton': [
-            {'mandi': 'Akola', 'price': 6100},
-            {'mandi': 'Nagpur', 'price': 6000},
-            {'mandi': 'Amravati', 'price': 5900}
-        ]
-    }
+def read_rollup(key, missing_metric):
+    """A JSON rollup object from the bucket, or None if it has not been built"""
+    try:
+        response = s3.get_object(Bucket=BUCKET_NAME, Key=key)
+    except ClientError as e:
+        if e.response.get('Error', {}).get('Code') in ('NoSuchKey', '404'):
+            tracer.incr(missing_metric)
+            return None
+        raise
+    return parse_rollup(response['Body'].read())
 
-def get_recommendation_stats(state):
-    """Get recommendation statistics"""
-    return {
-        'sellNow': 45,
-        'wait': 30,
-        'sellSoon': 25
-    }
+def rollup_handler(event, context):
+    """DynamoDB stream consumer adding new query logs to the daily rollups.
+    
+    Records are applied once each by event ID, so a batch retried after a
+    partial write does not count its earlier records again.
+    """
+    trace = tracer.start_trace('rollup')
+    try:
+        records = []
+        for record in event.get('Records', []):
+            if record.get('eventName') != 'INSERT':
+                continue
+            image = record['dynamodb']['NewImage']
+            records.append((record['eventID'], {name: deserializer.deserialize(value) for name, value in image.items()}))
+        
+        with trace.span('rollup.apply'):
+            duplicates = rollup_table.apply(records)
+        tracer.incr('rollup.records', len(event.get('Records', [])))
+        tracer.incr('rollup.duplicates', duplicates)
+        print(f"Rolled up {len(records) - duplicates} records ({duplicates} already applied)")
+        return {'records': len(records) - duplicates, 'duplicates': duplicates}
+    finally:
+        tracer.finish_trace(trace)
@@ -0,0 +1,98 @@
+from datetime import date, datetime, timezone
+
+import numpy as np
+
+# Built offline by scripts/build-rollups.py next to the latest-price table,
+# so the function itself only reads the stored result and needs no NumPy.
+EARTH_RADIUS_KM = 6371.0088
+TRANSPORT_COST = 1.0    # rupees per quintal per km, as for net realization
+TOP = 10                # opportunities kept per crop
+MAX_AGE_DAYS = 7        # latest prices older than this, against the crop's newest, are left out
+BLOCK = 512             # mandis per tile side; a tile's arrays stay a few MB
+
+def top_spreads(prices, lat, lng, transport_cost=TRANSPORT_COST, top=TOP, block=BLOCK):
+    """(buy, sell, net, distance) arrays for the `top` mandi pairs with the largest positive
+    price spread net of transport, best first; buy and sell index the inputs.
+    
+    The pairs are scored a block x block tile at a time, so no N x N
+    matrix is ever built. Mandis are sorted by price first: a tile is
+    skipped when its highest sell price minus its lowest buy price cannot
+    beat the current top-th spread, which rules out every tile below the
+    diagonal and most of the rest.
+    """
+    prices = np.asarray(prices, dtype=np.float64)
+    order = np.argsort(prices, kind='stable')
+    price = prices[order]
+    lat_rad = np.radians(np.asarray(lat, dtype=np.float64)[order])
+    lng_rad = np.radians(np.asarray(lng, dtype=np.float64)[order])
+    # Unit vectors, so a tile's great-circle distances come from one matrix product
+    points = np.stack([np.cos(lat_rad) * np.cos(lng_rad), np.cos(lat_rad) * np.sin(lng_rad), np.sin(lat_rad)], axis=1)
+    
+    count = len(price)
+    best_net = np.empty(0)
+    best_buy = np.empty(0, dtype=np.int64)
+    best_sell = np.empty(0, dtype=np.int64)
+    threshold = 0.0
+    for buy_start in range(0, count, block):
+        buy = slice(buy_start, min(buy_start + block, count))
+        # Highest sell prices first, so the threshold rises early and prunes more
+        for sell_start in reversed(range(buy_start, count, block)):
+            sell = slice(sell_start, min(sell_start + block, count))
+            if price[sell.stop - 1] - price[buy.start] <= threshold:
+                continue
+            chord = np.sqrt(np.maximum(2 - 2 * (points[buy] @ points[sell].T), 0))
+            net = price[sell][None, :] - price[buy][:, None] - transport_cost * 2 * EARTH_RADIUS_KM * np.arcsin(chord / 2)
+            candidates = np.flatnonzero(net > threshold)
+            if not len(candidates):
+                continue
+            best_net = np.concatenate([best_net, net.ravel()[candidates]])
+            best_buy = np.concatenate([best_buy, buy.start + candidates // net.shape[1]])
+            best_sell = np.concatenate([best_sell, sell.start + candidates % net.shape[1]])
+            if len(best_net) > top:
+                keep = np.argpartition(-best_net, top - 1)[:top]
+                best_net, best_buy, best_sell = best_net[keep], best_buy[keep], best_sell[keep]
+            if len(best_net) == top:
+                threshold = best_net.min()
+    
+    ranked = np.lexsort((best_sell, best_buy, -best_net))
+    best_buy, best_sell, best_net = best_buy[ranked], best_sell[ranked], best_net[ranked]
+    chord = np.linalg.norm(points[best_buy] - points[best_sell], axis=1)
+    distance = 2 * EARTH_RADIUS_KM * np.arcsin(np.minimum(chord / 2, 1))
+    return order[best_buy], order[best_sell], best_net, distance
+
+def price_spread_table(state, latest_prices, metadata, transport_cost=TRANSPORT_COST, top=TOP, generated_at=None):
+    """Top inter-mandi spreads per crop of a state, the JSON stored under rollups.price_spread_key(state).
+    
+    latest_prices is the state's latest-price table and metadata its mandi
+    metadata, for coordinates. Mandis without coordinates, or whose latest
+    price is more than MAX_AGE_DAYS older than the crop's newest, are left
+    out.
+    """
+    coords = {m['code']: (m['latitude'], m['longitude']) for m in metadata.get('mandis', [])}
+    crops = {}
+    for crop, mandis in latest_prices.get('crops', {}).items():
+        newest = max((date.fromisoformat(m['date']) for m in mandis), default=None)
+        mandis = [
+            m for m in mandis
+            if m['mandi_code'] in coords and (newest - date.fromisoformat(m['date'])).days <= MAX_AGE_DAYS
+        ]
+        lat, lng = np.array([coords[m['mandi_code']] for m in mandis], dtype=np.float64).reshape(-1, 2).T
+        buy, sell, net, distance = top_spreads([m['price'] for m in mandis], lat, lng, transport_cost, top)
+        crops[crop] = [
+            {
+                'buyMandi': mandis[i]['mandi'],
+                'buyPrice': mandis[i]['price'],
+                'sellMandi': mandis[j]['mandi'],
+                'sellPrice': mandis[j]['price'],
+                'distance': round(d, 1),
+                'transportCost': int(round(transport_cost * d)),
+                'netSpread': int(round(n))
+            }
+            for i, j, n, d in zip(buy.tolist(), sell.tolist(), net.tolist(), distance.tolist())
+        ]
+    return {
+        'state': state,
+        'generated_at': generated_at or datetime.now(timezone.utc).isoformat(),
+        'transport_cost': transport_cost,
+        'crops': crops
+    }
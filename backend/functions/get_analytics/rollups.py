@@ -0,0 +1,227 @@
+import json
+import time
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+
+from boto3.dynamodb.conditions import Key
+from botocore.exceptions import ClientError
+
+# Days roll over at midnight India time, when the mandis do
+ROLLUP_TZ = timezone(timedelta(hours=5, minutes=30))
+ACTION_KEYS = {
+    'Sell Now': 'sellNow',
+    'Wait 2-4 weeks': 'wait',
+    'Sell within 1-2 weeks': 'sellSoon'
+}
+CROP_PREFIX = 'crop#'
+ACTION_PREFIX = 'action#'
+# One ledger item per applied stream record, kept past the stream's 24-hour retention
+LEDGER_PREFIX = 'applied#'
+LEDGER_TTL_SECONDS = 2 * 86400
+TRANSACT_MAX_ITEMS = 100
+
+def query_day(timestamp):
+    """Rollup day (YYYY-MM-DD) of a query-log timestamp in milliseconds or seconds"""
+    seconds = timestamp / 1000 if timestamp >= 10 ** 11 else timestamp
+    return datetime.fromtimestamp(seconds, ROLLUP_TZ).strftime('%Y-%m-%d')
+
+def bucket_key(item):
+    """(state, day) bucket a query-log record counts towards"""
+    return item['state'], query_day(int(item['timestamp']))
+
+class DailyRollups:
+    """Per-state, per-day counters of queries by crop and by recommendation action.
+    
+    Each bucket is a flat Counter with a 'queries' total plus 'crop#<crop>'
+    and 'action#<action>' counts, which is also how buckets are stored so
+    DynamoDB can ADD to them in place.
+    """
+    
+    def __init__(self):
+        self.buckets = {}
+    
+    def __len__(self):
+        return len(self.buckets)
+    
+    def add(self, item):
+        """Count one query-log record"""
+        key = bucket_key(item)
+        bucket = self.buckets.get(key)
+        if bucket is None:
+            bucket = self.buckets[key] = Counter()
+        bucket['queries'] += 1
+        bucket[CROP_PREFIX + item['crop'].lower()] += 1
+        bucket[ACTION_PREFIX + item['recommendation']] += 1
+    
+    def add_all(self, items):
+        for item in items:
+            self.add(item)
+        return self
+
+class RollupTable:
+    """Daily rollup buckets in DynamoDB, partitioned by state and sorted by day.
+    
+    Stream records are applied through `client`, the table's low-level
+    client, since ledger writes need transactions.
+    """
+    
+    def __init__(self, table, client=None):
+        self.table = table
+        self.client = client or table.meta.client
+    
+    def apply(self, records, now=None):
+        """ADD (event_id, query-log item) records to their buckets, each exactly once.
+        
+        Every transaction ADDs up to TRANSACT_MAX_ITEMS - 1 records to one
+        bucket and puts a ledger item per event ID on condition it does not
+        exist yet. A retried stream batch then drops the records already
+        applied rather than counting them twice. Returns how many were dropped.
+        """
+        expires_at = int((now or time.time()) + LEDGER_TTL_SECONDS)
+        by_bucket = {}
+        for event_id, item in records:
+            by_bucket.setdefault(bucket_key(item), []).append((event_id, item))
+        
+        duplicates = 0
+        size = TRANSACT_MAX_ITEMS - 1
+        for (state, day), bucket_records in by_bucket.items():
+            for i in range(0, len(bucket_records), size):
+                duplicates += self._apply_once(state, day, bucket_records[i:i + size], expires_at)
+        return duplicates
+    
+    def _apply_once(self, state, day, records, expires_at):
+        duplicates = 0
+        while records:
+            bucket = DailyRollups().add_all(item for _, item in records).buckets[(state, day)]
+            names = {}
+            values = {}
+            clauses = []
+            for i, (field, count) in enumerate(bucket.items()):
+                names[f"#f{i}"] = field
+                values[f":v{i}"] = count
+                clauses.append(f"#f{i} :v{i}")
+            update = {
+                'TableName': self.table.name,
+                'Key': {'state': state, 'day': day},
+                'UpdateExpression': 'ADD ' + ', '.join(clauses),
+                'ExpressionAttributeNames': names,
+                'ExpressionAttributeValues': values
+            }
+            ledger = [
+                {
+                    'TableName': self.table.name,
+                    'Item': {'state': LEDGER_PREFIX + event_id, 'day': day, 'expires_at': expires_at},
+                    'ConditionExpression': 'attribute_not_exists(#s)',
+                    'ExpressionAttributeNames': {'#s': 'state'}
+                }
+                for event_id, _ in records
+            ]
+            try:
+                self.client.transact_write_items(
+                    TransactItems=[{'Update': update}] + [{'Put': put} for put in ledger]
+                )
+                return duplicates
+            except ClientError as e:
+                if e.response.get('Error', {}).get('Code') != 'TransactionCanceledException':
+                    raise
+                # Reasons follow TransactItems; the first is the bucket update
+                reasons = e.response.get('CancellationReasons', [])[1:]
+                applied = {i for i, reason in enumerate(reasons) if reason.get('Code') == 'ConditionalCheckFailed'}
+                if not applied:
+                    raise
+                duplicates += len(applied)
+                records = [record for i, record in enumerate(records) if i not in applied]
+        return duplicates
+    
+    def replace(self, rollups):
+        """Overwrite buckets with replayed totals; safe to run more than once"""
+        with self.table.batch_writer() as batch:
+            for (state, day), bucket in rollups.buckets.items():
+                batch.put_item(Item={'state': state, 'day': day, **bucket})
+    
+    def load(self, state, start_day, end_day):
+        """Buckets for state between two YYYY-MM-DD days, inclusive"""
+        condition = Key('state').eq(state) & Key('day').between(start_day, end_day)
+        response = self.table.query(KeyConditionExpression=condition)
+        buckets = response['Items']
+        while 'LastEvaluatedKey' in response:
+            response = self.table.query(
+                KeyConditionExpression=condition,
+                ExclusiveStartKey=response['LastEvaluatedKey']
+            )
+            buckets.extend(response['Items'])
+        return buckets
+
+def summarize(buckets, top_crops=5):
+    """totalQueries, topCrops and recommendationStats from a range of buckets"""
+    totals = Counter()
+    for bucket in buckets:
+        for field, count in bucket.items():
+            if field == 'queries' or field.startswith((CROP_PREFIX, ACTION_PREFIX)):
+                totals[field] += int(count)
+    
+    crops = sorted(
+        ((field[len(CROP_PREFIX):], count) for field, count in totals.items() if field.startswith(CROP_PREFIX)),
+        key=lambda pair: (-pair[1], pair[0])
+    )
+    actions = sum(totals[ACTION_PREFIX + action] for action in ACTION_KEYS)
+    
+    return {
+        'totalQueries': totals['queries'],
+        'topCrops': [{'crop': crop.title(), 'queries': count} for crop, count in crops[:top_crops]],
+        # Percentages of queries per action, like the dashboard shows
+        'recommendationStats': {
+            key: round(totals[ACTION_PREFIX + action] * 100 / actions) if actions else 0
+            for action, key in ACTION_KEYS.items()
+        }
+    }
+
+def latest_price_key(state):
+    return f"rollups/latest-prices/{state}.json"
+
+def latest_price_table(state, windows, generated_at=None):
+    """Per-mandi latest modal price for each crop of a state.
+    
+    `windows` maps crop -> PriceWindow from the price store; the result is
+    the JSON object stored under latest_price_key(state).
+    """
+    crops = {}
+    for crop, window in windows.items():
+        rows = window.latest_rows()
+        mandis = [
+            {
+                'mandi': window.mandis[mandi]['name'],
+                'mandi_code': window.mandis[mandi]['code'],
+                'price': int(price),
+                'date': str(day)
+            }
+            for mandi, price, day in zip(
+                window.mandi[rows].tolist(),
+                window.modal_price[rows].tolist(),
+                window.day[rows].astype('datetime64[D]')
+            )
+        ]
+        crops[crop] = sorted(mandis, key=lambda m: (-m['price'], m['mandi']))
+    return {
+        'state': state,
+        'generated_at': generated_at or datetime.now(timezone.utc).isoformat(),
+        'crops': crops
+    }
+
+def price_comparison(table, limit=10):
+    """priceComparison response: highest latest prices per crop"""
+    return {
+        crop: [{'mandi': m['mandi'], 'price': m['price']} for m in mandis[:limit]]
+        for crop, mandis in table.get('crops', {}).items()
+    }
+
+def price_spread_key(state):
+    return f"rollups/price-spreads/{state}.json"
+
+def price_spreads(table, limit=10):
+    """priceSpreads response: the best mandi-to-mandi spreads net of transport per crop"""
+    return {crop: spreads[:limit] for crop, spreads in table.get('crops', {}).items()}
+
+def parse_rollup(body):
+    """A JSON rollup object: the latest-price or price-spread table"""
+    return json.loads(body.decode('utf-8'))
@@ -1,19 +1,108 @@
 import json
 import os
-import boto3
-from datetime import datetime, timedelta
+import signal
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
 from recommendation_engine import RecommendationEngine
 from price_analyzer import PriceAnalyzer
-from mandi_finder import MandiFinder
+from mandi_finder import DEFAULT_COORDS, MandiFinder, ranking_options
 from explanation_generator import ExplanationGenerator
+from explanation_cache import ExplanationCache, SqliteExplanationStore
+from object_cache import ObjectCache
+from batch import BatchRecommender, to_ndjson
+from chart_series import chart_options, encode_series
+from clients import Lazy, client, resource
+from price_store import PriceWindow
+from query_log import QueryLogWriter, make_sink
+from recommendation_snapshot import MaterializedRecommendations
+from serialization import dumps, etag, etag_matches
+from stage_graph import StageExecutor, StageGraph
+from tracing import Tracer
 
-s3 = boto3.client('s3')
-dynamodb = boto3.resource('dynamodb')
+tracer = Tracer.from_env('get_recommendation')
+
+# Clients are built on first use, shared across components and timed per call
+s3 = tracer.wrap(Lazy(client, 's3'), 's3')
+dynamodb = tracer.wrap(Lazy(resource, 'dynamodb'), 'dynamodb')
 
 BUCKET_NAME = os.environ['PRICE_DATA_BUCKET']
 TABLE_NAME = os.environ['DYNAMODB_TABLE']
+CACHE_MAX_BYTES = int(os.environ.get('OBJECT_CACHE_MAX_BYTES', 64 * 1024 * 1024))
+CACHE_TTL_SECONDS = int(os.environ.get('OBJECT_CACHE_TTL_SECONDS', 300))
+PRICE_STORE_DIR = os.environ.get('PRICE_STORE_DIR')
+GAZETTEER_PATH = os.environ.get('GAZETTEER_PATH')
+EXPLANATION_CACHE_PATH = os.environ.get('EXPLANATION_CACHE_PATH')
+EXPLANATION_BUDGET_SECONDS = float(os.environ.get('EXPLANATION_BUDGET_SECONDS', 3.0))
+REQUEST_BUDGET_SECONDS = float(os.environ.get('REQUEST_BUDGET_SECONDS', 10.0))
+STAGE_TIMEOUTS = {
+    'snapshot': float(os.environ.get('SNAPSHOT_STAGE_TIMEOUT_SECONDS', 1.0)),
+    'location': float(os.environ.get('LOCATION_STAGE_TIMEOUT_SECONDS', 1.0)),
+    'prices': float(os.environ.get('PRICE_STAGE_TIMEOUT_SECONDS', 3.0)),
+    'mandis': float(os.environ.get('MANDI_STAGE_TIMEOUT_SECONDS', 3.0)),
+    'forecast': float(os.environ.get('FORECAST_STAGE_TIMEOUT_SECONDS', 1.0)),
+    'explanation': EXPLANATION_BUDGET_SECONDS + 0.5
+}
+TRANSPORT_COST_PER_KM_QUINTAL = float(os.environ.get('TRANSPORT_COST_PER_KM_QUINTAL', 1.0))
+MAX_BATCH_SIZE = int(os.environ.get('MAX_BATCH_SIZE', 1000))
+QUERY_LOG_SINK = os.environ.get('QUERY_LOG_SINK', 'dynamodb')
+QUERY_LOG_FLUSH_SECONDS = float(os.environ.get('QUERY_LOG_FLUSH_SECONDS', 1.0))
+
+# Components live for the lifetime of the container so warm invocations
+# reuse the Bedrock client and the parsed S3 objects.
+object_cache = ObjectCache(s3, max_bytes=CACHE_MAX_BYTES, ttl_seconds=CACHE_TTL_SECONDS, tracer=tracer)
+price_analyzer = PriceAnalyzer(
+    s3, BUCKET_NAME, cache=object_cache, store_dir=PRICE_STORE_DIR,
+    executor=ThreadPoolExecutor(max_workers=8, thread_name_prefix='segments')
+)
+recommendation_engine = RecommendationEngine()
+mandi_finder = MandiFinder(
+    s3, BUCKET_NAME, cache=object_cache, store_dir=PRICE_STORE_DIR, gazetteer_path=GAZETTEER_PATH
+)
+materialized = MaterializedRecommendations(
+    s3, BUCKET_NAME, price_analyzer, cache=object_cache, store_dir=PRICE_STORE_DIR
+)
+explanation_generator = ExplanationGenerator(
+    bedrock_client=tracer.wrap(Lazy(client, 'bedrock-runtime', region_name='us-east-1'), 'bedrock'),
+    cache=ExplanationCache(
+        persistent=SqliteExplanationStore(EXPLANATION_CACHE_PATH) if EXPLANATION_CACHE_PATH else None
+    ),
+    latency_budget=EXPLANATION_BUDGET_SECONDS
+)
+stage_executor = StageExecutor(max_workers=8)
+query_log_writer = QueryLogWriter(
+    make_sink(QUERY_LOG_SINK, dynamodb, TABLE_NAME),
+    flush_interval=QUERY_LOG_FLUSH_SECONDS
+)
+batch_recommender = BatchRecommender(
+    price_analyzer, recommendation_engine, mandi_finder, explanation_generator,
+    ThreadPoolExecutor(max_workers=16, thread_name_prefix='batch'),
+    materialized=materialized
+)
+
+def shutdown(signum, frame):
+    """Drain everything on SIGTERM, which Lambda sends before recycling a container that has an extension"""
+    query_log_writer.close()
+    tracer.flush()
+    sys.exit(0)
+
+if os.environ.get('AWS_LAMBDA_FUNCTION_NAME'):
+    signal.signal(signal.SIGTERM, shutdown)
+
+def register_trace_sources():
+    """Report each component's counters with every metrics flush"""
+    tracer.add_source('object_cache', object_cache.stats)
+    tracer.add_source('prices', price_analyzer.stats)
+    tracer.add_source('mandis', mandi_finder.stats)
+    tracer.add_source('snapshot', materialized.stats)
+    tracer.add_source('explanation', explanation_generator.stats)
+    tracer.add_source('query_log', query_log_writer.stats)
+    tracer.add_source('stages', stage_executor.stats)
+
+register_trace_sources()
 
 def lambda_handler(event, context):
+    trace = tracer.start_trace()
     try:
         body = json.loads(event['body'])
         
@@ -21,29 +110,45 @@ def lambda_handler(event, context):
         crop = body['crop']
         location = body['location']
         quantity = body['quantity']
+        try:
+            chart = chart_options(body)
+            ranking = ranking_options(body, TRANSPORT_COST_PER_KM_QUINTAL)
+        except ValueError as e:
+            return error_response(400, str(e))
         
-        # Initialize components
-        price_analyzer = PriceAnalyzer(s3, BUCKET_NAME)
-        recommendation_engine = RecommendationEngine()
-        mandi_finder = MandiFinder(s3, BUCKET_NAME)
-        explanation_generator = ExplanationGenerator()
-        
-        # Get historical price data
-        price_data = price_analyzer.get_historical_prices(state, crop)
+        graph = build_stage_graph(state, crop, location, request_deadline(context), trace, ranking, quantity)
+        results = graph.run()
+        # The nightly snapshot answers everything but the mandi lookup until
+        # a newer price partition lands
+        market = results['snapshot']
+        coords, location_resolved = results['location']
+        mandis = results['mandis']
+        for stage, reason in graph.degraded:
+            tracer.incr(f"fallback.{stage}.{reason}")
         
-        # Analyze trends
-        analysis = price_analyzer.analyze_trends(price_data)
+        if market is not None:
+            analysis = market['analysis']
+            recommendation = market['recommendation']
+            explanation = explanation_generator.cached_explanation(
+                crop, state, analysis, recommendation
+            ) or market['explanation']
+            historical_prices = market['historicalPrices']
+            price_data = None
+        else:
+            analysis = results['analysis']
+            recommendation = results['recommendation']
+            explanation = results['explanation']
+            price_data = results['prices']
+            historical_prices = price_data[-90:]  # Last 90 days
+            if isinstance(historical_prices, PriceWindow):
+                historical_prices = historical_prices.to_records()
+        if chart is not None:
+            with trace.span('chart'):
+                historical_prices = chart_series(state, crop, price_data, chart)
         
-        # Generate recommendation
-        recommendation = recommendation_engine.generate_recommendation(analysis)
-        
-        # Find nearby mandis
-        mandis = mandi_finder.find_nearby_mandis(state, location, crop)
-        
-        # Generate AI explanation
-        explanation = explanation_generator.generate_explanation(
-            crop, state, analysis, recommendation
-        )
+        # Clients map userLocation unconditionally, so an unplaced location
+        # gets the default coordinates and locationResolved false, not null
+        user_coords = coords or DEFAULT_COORDS
         
         # Prepare response
         response_data = {
@@ -56,25 +161,22 @@ def lambda_handler(event, context):
             },
             'averagePrice': analysis['avg_price'],
             'trend': analysis['trend_direction'],
-            'historicalPrices': price_data[-90:],  # Last 90 days
+            'priceForecast': analysis.get('forecast'),
+            'historicalPrices': historical_prices,
             'nearbyMandis': mandis,
-            'userLocation': {'lat': 20.7002, 'lng': 77.0082}  # Mock location
+            'userLocation': {'lat': user_coords[0], 'lng': user_coords[1]},
+            'locationResolved': location_resolved
         }
         
-        # Log query to DynamoDB
-        log_query(body, response_data)
-        
-        return {
-            'statusCode': 200,
-            'headers': {
-                'Content-Type': 'application/json',
-                'Access-Control-Allow-Origin': '*'
-            },
-            'body': json.dumps(response_data)
-        }
+        # Buffered and written in batches off the response path
+        query_log_writer.log(body, response_data)
         
+        with trace.span('serialize'):
+            return json_response(dumps(response_data))
+    
     except Exception as e:
         print(f"Error: {str(e)}")
+        tracer.incr('request.errors')
         return {
             'statusCode': 500,
             'headers': {
@@ -83,21 +185,217 @@ def lambda_handler(event, context):
             },
             'body': json.dumps({'error': str(e)})
         }
+    finally:
+        tracer.finish_trace(trace)
 
-def log_query(request, response):
-    table = dynamodb.Table(TABLE_NAME)
-    timestamp = int(datetime.now().timestamp())
+def batch_handler(event, context):
+    """Recommendations for a list of {state, crop, location, quantity} items"""
+    trace = tracer.start_trace('batch')
+    try:
+        body = json.loads(event['body'])
+        items = body.get('items') if isinstance(body, dict) else None
+        if not isinstance(items, list) or not items:
+            return error_response(400, 'Request body must contain a non-empty items list')
+        if len(items) > MAX_BATCH_SIZE:
+            return error_response(400, f"Batch size {len(items)} exceeds the limit of {MAX_BATCH_SIZE}")
+        try:
+            chart = chart_options(body)
+            ranking = ranking_options(body, TRANSPORT_COST_PER_KM_QUINTAL)
+        except ValueError as e:
+            return error_response(400, str(e))
+        
+        with trace.span('batch.recommend'):
+            results, series = batch_recommender.recommend(items, ranking)
+        tracer.incr('batch.items', len(items))
+        if chart is not None:
+            series = {
+                key: encode_series(rows, days=chart['days'], points=chart['points'])
+                for key, rows in series.items()
+            }
+        for item, result in zip(items, results):
+            if 'error' not in result:
+                query_log_writer.log(item, result)
+        
+        headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+        if body.get('format') == 'ndjson' or 'application/x-ndjson' in headers.get('accept', ''):
+            return {
+                'statusCode': 200,
+                'headers': {
+                    'Content-Type': 'application/x-ndjson',
+                    'Access-Control-Allow-Origin': '*'
+                },
+                'body': to_ndjson(results, series)
+            }
+        
+        return json_response(dumps({'results': results, 'historicalPrices': series}))
     
-    table.put_item(
-        Item={
-            'userId': 'anonymous',
-            'timestamp': timestamp,
-            'state': request['state'],
-            'crop': request['crop'],
-            'location': request['location'],
-            'quantity': request['quantity'],
-            'recommendation': response['recommendation'],
-            'confidence': response['confidence'],
-            'ttl': timestamp + (90 * 24 * 60 * 60)  # 90 days TTL
-        }
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        tracer.incr('batch.errors')
+        return error_response(500, str(e))
+    finally:
+        tracer.finish_trace(trace)
+
+def series_handler(event, context):
+    """GET /prices/series: the columnar chart series for a state and crop, revalidated by ETag"""
+    trace = tracer.start_trace('series')
+    try:
+        params = event.get('queryStringParameters') or {}
+        state = params.get('state')
+        crop = params.get('crop')
+        if not state or not crop:
+            return error_response(400, 'state and crop query parameters are required')
+        try:
+            chart = chart_options({'chart': {name: int(params[name]) for name in ('days', 'points') if params.get(name)}})
+        except ValueError:
+            return error_response(400, 'days and points must be positive integers')
+        
+        with trace.span('chart'):
+            series = chart_series(state, crop, None, chart)
+        return cacheable_response(event, dumps({'state': state, 'crop': crop, 'historicalPrices': series}))
+    
+    except Exception as e:
+        print(f"Error: {str(e)}")
+        tracer.incr('series.errors')
+        return error_response(500, str(e))
+    finally:
+        tracer.finish_trace(trace)
+
+def json_response(body):
+    return {
+        'statusCode': 200,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': body
+    }
+
+def cacheable_response(event, body):
+    """200 with an ETag over the body, or an empty 304 when the client already has it.
+    
+    Only for GET routes: a conditional POST gets 412, never 304. no-cache
+    has browsers revalidate their copy with If-None-Match on every fetch.
+    """
+    tag = etag(body)
+    headers = {k.lower(): v for k, v in (event.get('headers') or {}).items()}
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Expose-Headers': 'ETag',
+        'Cache-Control': 'no-cache',
+        'ETag': tag
+    }
+    if etag_matches(headers.get('if-none-match'), tag):
+        return {'statusCode': 304, 'headers': response_headers, 'body': ''}
+    return {'statusCode': 200, 'headers': response_headers, 'body': body}
+
+def chart_series(state, crop, price_data, chart):
+    """Columnar chart series for the requested range, read from the price store when there is one"""
+    rows = price_data
+    try:
+        store = price_analyzer.get_price_store(state, crop)
+        if store is not None:
+            rows = store.last_days(chart['days'])
+    except Exception as e:
+        print(f"Error reading price store for chart: {e}")
+    if rows is None:
+        rows = price_analyzer.get_historical_prices(state, crop)
+    return encode_series(rows, days=chart['days'], points=chart['points'])
+
+def error_response(status_code, message):
+    return {
+        'statusCode': status_code,
+        'headers': {
+            'Content-Type': 'application/json',
+            'Access-Control-Allow-Origin': '*'
+        },
+        'body': json.dumps({'error': message})
+    }
+
+def build_stage_graph(state, crop, location, deadline, trace, ranking=None, quantity=1):
+    """Recommendation stages; the mandi lookup runs alongside the price pipeline.
+    
+    Each stage is a span of the request trace. The snapshot lookup starts
+    with the price fetch, which loads the store the snapshot is checked
+    against; a fresh snapshot entry skips forecast, analysis,
+    recommendation and explanation. An unresolved location has no nearby
+    mandis.
+    """
+    graph = StageGraph(stage_executor, deadline)
+    graph.add(
+        'snapshot',
+        trace.timed('snapshot', lambda: materialized.get(state, crop)),
+        timeout=STAGE_TIMEOUTS['snapshot'],
+        fallback=lambda: None
+    )
+    graph.add(
+        'location',
+        trace.timed('location', lambda: mandi_finder.locate(state, location)),
+        timeout=STAGE_TIMEOUTS['location'],
+        fallback=lambda: (None, False)
+    )
+    graph.add(
+        'mandis',
+        trace.timed(
+            'stage.mandis',
+            lambda place: mandi_finder.find_nearby_mandis(
+                state, location, crop, coords=place[0], ranking=ranking, quantity=quantity
+            ) if place[0] else []
+        ),
+        after=['location'],
+        timeout=STAGE_TIMEOUTS['mandis'],
+        fallback=lambda place: mandi_finder._get_mock_mandis()
+    )
+    graph.add(
+        'prices',
+        trace.timed('stage.prices', lambda: price_analyzer.get_historical_prices(state, crop)),
+        timeout=STAGE_TIMEOUTS['prices'],
+        fallback=lambda: price_analyzer._get_mock_data(crop)
     )
+    graph.add(
+        'forecast',
+        unless_materialized(trace.timed('stage.forecast', lambda: price_analyzer.forecast(state, crop))),
+        after=['snapshot'],
+        timeout=STAGE_TIMEOUTS['forecast'],
+        fallback=lambda market: None
+    )
+    graph.add(
+        'analysis',
+        unless_materialized(trace.timed(
+            'stage.analysis',
+            lambda price_data, forecast: {**price_analyzer.analyze_trends(price_data), 'forecast': forecast}
+        )),
+        after=['snapshot', 'prices', 'forecast']
+    )
+    graph.add(
+        'recommendation',
+        unless_materialized(trace.timed('stage.recommendation', recommendation_engine.generate_recommendation)),
+        after=['snapshot', 'analysis']
+    )
+    graph.add(
+        'explanation',
+        unless_materialized(trace.timed(
+            'stage.explanation',
+            lambda analysis, recommendation: explanation_generator.generate_explanation(
+                crop, state, analysis, recommendation
+            )
+        )),
+        after=['snapshot', 'analysis', 'recommendation'],
+        timeout=STAGE_TIMEOUTS['explanation'],
+        fallback=unless_materialized(lambda analysis, recommendation: explanation_generator._get_fallback_explanation(
+            crop, analysis, recommendation
+        ))
+    )
+    return graph
+
+def unless_materialized(fn):
+    """Stage function taking the snapshot entry first, running fn on the other inputs only without one"""
+    return lambda market, *inputs: fn(*inputs) if market is None else None
+
+def request_deadline(context):
+    """Monotonic deadline leaving a safety margin before the Lambda timeout"""
+    remaining = REQUEST_BUDGET_SECONDS
+    if context is not None and hasattr(context, 'get_remaining_time_in_millis'):
+        remaining = min(remaining, context.get_remaining_time_in_millis() / 1000 - 1.0)
+    return time.monotonic() + remaining
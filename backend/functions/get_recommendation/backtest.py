@@ -0,0 +1,211 @@
+import os
+
+import numpy as np
+
+from price_analyzer import PriceAnalyzer
+from price_partitions import crop_paths, open_local
+from recommendation_engine import RULES, RecommendationEngine
+
+# Every mandi-day of a price store is scored as if the handler had run
+# that day: the analyze_trends features over the mandi's trailing
+# WINDOW_DAYS, the first matching rule, and the price HORIZON_DAYS later.
+WINDOW_DAYS = 365          # the window get_historical_prices serves
+WARMUP_DAYS = 365          # a mandi is scored once it has this much history
+HORIZON_DAYS = (7, 14, 28)
+STALE_DAYS = 7             # the realized price is the last report within this many days of the horizon
+CHUNK_ROWS = 1 << 20       # rows featurized at once, in whole mandis; bounds the working set
+# Selling pays off when the realized change is at most its bound; waiting
+# pays off when the change is above it
+SELL_BOUNDS = {'Sell Now': 0.0, 'Sell within 1-2 weeks': 0.05}
+WAIT_BOUNDS = {'Wait 2-4 weeks': 0.0}
+
+_KEY_STRIDE = 1 << 32      # mandi * stride + day orders rows by mandi then day
+
+def trend_features(window, window_days=WINDOW_DAYS):
+    """analyze_trends fields for every row of a PriceWindow, as of that row's day.
+    
+    Each row is analyzed as analyze_trends would analyze its mandi's rows
+    from the window_days ending that day. Means come from prefix sums, min
+    and max from a sparse table and the percentile from one pass per lag,
+    so no row's window is ever gathered. Rows without a positive price are
+    left out; the rest are returned sorted by mandi then day, with 'mandi'
+    and 'day' alongside the analysis fields.
+    """
+    price = np.asarray(window.modal_price, dtype=np.float64)
+    valid = price > 0
+    mandi = np.asarray(window.mandi, dtype=np.int64)[valid]
+    day = np.asarray(window.day, dtype=np.int64)[valid]
+    order = np.lexsort((day, mandi))
+    mandi, day, price = mandi[order], day[order], price[valid][order]
+    
+    key = mandi * _KEY_STRIDE + day
+    row = np.arange(len(key))
+    lo = np.searchsorted(key, key - (window_days - 1))
+    count = row - lo + 1
+    
+    sums = np.r_[0.0, np.cumsum(price)]
+    avg_price = (sums[row + 1] - sums[lo]) / count
+    # Moments about each mandi's first price keep the prefix sums small
+    first = np.r_[True, mandi[1:] != mandi[:-1]]
+    shift = price - price[np.maximum.accumulate(np.where(first, row, 0))]
+    shifted = np.r_[0.0, np.cumsum(shift)]
+    squares = np.r_[0.0, np.cumsum(shift * shift)]
+    mean_shift = (shifted[row + 1] - shifted[lo]) / count
+    std_price = np.sqrt(np.maximum((squares[row + 1] - squares[lo]) / count - mean_shift ** 2, 0))
+    
+    # The last 28 and 84 rows, as analyze_trends takes them
+    avg_4week = np.where(count >= 28, (sums[row + 1] - sums[np.maximum(row - 27, 0)]) / 28, avg_price)
+    avg_12week = np.where(count >= 84, (sums[row + 1] - sums[np.maximum(row - 83, 0)]) / 84, avg_price)
+    trend_direction, trend_strength = PriceAnalyzer._detect_trends(avg_4week, avg_12week)
+    
+    below = np.zeros(len(key), dtype=np.int32)
+    depth = row - lo
+    for lag in range(1, int(depth.max(initial=0)) + 1):
+        below[lag:] += (price[:-lag] < price[lag:]) & (depth[lag:] >= lag)
+    
+    return {
+        'mandi': mandi,
+        'day': day,
+        'current_price': price,
+        'min_price': _window_extreme(price, lo, np.minimum),
+        'max_price': _window_extreme(price, lo, np.maximum),
+        'avg_price': avg_price,
+        'std_price': std_price,
+        'avg_4week': avg_4week,
+        'avg_12week': avg_12week,
+        'trend_direction': trend_direction,
+        'trend_strength': trend_strength,
+        'price_percentile': below / count * 100
+    }
+
+def realized_changes(features, horizons=HORIZON_DAYS):
+    """(rows, horizons) relative price change from each row's day to each horizon, NaN without a fresh report"""
+    mandi, day, price = features['mandi'], features['day'], features['current_price']
+    key = mandi * _KEY_STRIDE + day
+    changes = np.full((len(key), len(horizons)), np.nan)
+    for h, days in enumerate(horizons):
+        at = np.searchsorted(key, key + days, side='right') - 1
+        fresh = (mandi[at] == mandi) & (day[at] > day + days - STALE_DAYS) & (day[at] > day)
+        changes[fresh, h] = price[at[fresh]] / price[fresh] - 1
+    return changes
+
+def backtest_window(window, rule_sets=None, horizons=HORIZON_DAYS, warmup_days=WARMUP_DAYS):
+    """Tally each rule set's signals and outcomes over a PriceWindow.
+    
+    rule_sets maps a name to a RULES-style decision table, the current
+    RULES by default. Returns {name: tally}, where a tally holds per rule
+    'signals' and, per rule and horizon, 'scored' signals with a realized
+    price, their 'hits' and the 'change' summed over them. Forecast
+    conditions never hold: there is no point-in-time seasonal forecast.
+    """
+    engines = {name: RecommendationEngine(rules) for name, rules in (rule_sets or {'current': RULES}).items()}
+    tallies = {name: empty_tally(len(engine.rules), len(horizons)) for name, engine in engines.items()}
+    for part in _mandi_chunks(window):
+        features = trend_features(part)
+        eligible = features['day'] - _first_day(features) + 1 >= warmup_days
+        changes = realized_changes(features, horizons)[eligible]
+        features = {name: values[eligible] for name, values in features.items()}
+        for name, engine in engines.items():
+            _tally(tallies[name], engine, engine.match_rules(features), changes)
+    return tallies
+
+def backtest_crop_file(path, rule_sets=None, horizons=HORIZON_DAYS, warmup_days=WARMUP_DAYS):
+    """backtest_window over a {crop}.bin file or partitioned crop directory; module level so process pools can run it"""
+    return backtest_window(open_local(path).window(), rule_sets, horizons, warmup_days)
+
+def backtest_dir(store_dir, rule_sets=None, states=None, workers=None, horizons=HORIZON_DAYS, warmup_days=WARMUP_DAYS):
+    """{(state, crop): tallies} for every crop under store_dir, one worker process per state and crop"""
+    from concurrent.futures import ProcessPoolExecutor
+    
+    states = states or sorted(
+        name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name))
+    )
+    jobs = [
+        (state, crop, path)
+        for state in states
+        for crop, path in crop_paths(os.path.join(store_dir, state)).items()
+    ]
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (state, crop, pool.submit(backtest_crop_file, path, rule_sets, horizons, warmup_days))
+            for state, crop, path in jobs
+        ]
+        return {(state, crop): future.result() for state, crop, future in futures}
+
+def empty_tally(rules, horizons):
+    return {
+        'signals': np.zeros(rules, dtype=np.int64),
+        'scored': np.zeros((rules, horizons), dtype=np.int64),
+        'hits': np.zeros((rules, horizons), dtype=np.int64),
+        'change': np.zeros((rules, horizons))
+    }
+
+def combine(tallies):
+    """Sum tallies of the same rule set, such as every crop of a state"""
+    tallies = list(tallies)
+    return {name: sum(tally[name] for tally in tallies) for name in tallies[0]}
+
+def rule_rows(tally, rules, horizons=HORIZON_DAYS):
+    """One row per rule: its action and reason, signals, and the hit rate and mean change per horizon"""
+    rows = []
+    for r, rule in enumerate(rules):
+        scored = tally['scored'][r]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            hit_rate = tally['hits'][r] / scored
+            mean_change = tally['change'][r] / scored
+        rows.append({
+            'rule': r,
+            'action': rule['action'],
+            'reason': rule['reason'],
+            'signals': int(tally['signals'][r]),
+            'hitRate': {days: _rounded(rate) for days, rate in zip(horizons, hit_rate.tolist())},
+            'meanChangePct': {days: _rounded(change * 100) for days, change in zip(horizons, mean_change.tolist())}
+        })
+    return rows
+
+def _tally(tally, engine, rule, changes):
+    bound = np.array([SELL_BOUNDS.get(r['action'], WAIT_BOUNDS.get(r['action'], np.nan)) for r in engine.rules])
+    waits = np.array([r['action'] in WAIT_BOUNDS for r in engine.rules])
+    rules = len(engine.rules)
+    tally['signals'] += np.bincount(rule, minlength=rules)
+    for h in range(changes.shape[1]):
+        change = changes[:, h]
+        scored = np.isfinite(change)
+        hit = np.where(waits[rule], change > bound[rule], change <= bound[rule]) & scored
+        tally['scored'][:, h] += np.bincount(rule[scored], minlength=rules)
+        tally['hits'][:, h] += np.bincount(rule[hit], minlength=rules)
+        tally['change'][:, h] += np.bincount(rule[scored], change[scored], minlength=rules)
+
+def _mandi_chunks(window):
+    """Windows of whole mandis, about CHUNK_ROWS rows each"""
+    mandi = np.asarray(window.mandi)
+    if len(mandi) <= CHUNK_ROWS:
+        yield window
+        return
+    counts = np.bincount(mandi)
+    ends = np.cumsum(counts)
+    cuts = np.unique(np.searchsorted(ends, np.arange(CHUNK_ROWS, ends[-1], CHUNK_ROWS)))
+    for lo, hi in zip(np.r_[0, cuts + 1], np.r_[cuts + 1, len(counts)]):
+        yield window[(mandi >= lo) & (mandi < hi)]
+
+def _first_day(features):
+    """Each row's mandi's first day in the features"""
+    mandi, day = features['mandi'], features['day']
+    first = np.r_[True, mandi[1:] != mandi[:-1]]
+    return day[np.maximum.accumulate(np.where(first, np.arange(len(day)), 0))]
+
+def _window_extreme(values, lo, reduce):
+    """reduce over values[lo[i]:i + 1] for every row i, from a sparse table built a level at a time"""
+    hi = np.arange(len(values))
+    level = np.log2(hi - lo + 1).astype(np.int64)
+    result = np.empty(len(values))
+    table = values
+    for k in range(int(level.max(initial=0)) + 1):
+        if k:
+            table = reduce(table[:-(1 << (k - 1))], table[1 << (k - 1):])
+        at = np.flatnonzero(level == k)
+        result[at] = reduce(table[lo[at]], table[hi[at] - (1 << k) + 1])
+    return result
+
+def _rounded(value):
+    return round(value, 4) if np.isfinite(value) else None
@@ -0,0 +1,178 @@
+from mandi_finder import is_amount
+from price_store import PriceWindow
+from serialization import dumps
+
+REQUIRED_FIELDS = ('state', 'crop', 'location', 'quantity')
+TEXT_FIELDS = ('state', 'crop', 'location')
+
+class BatchRecommender:
+    """Recommendations for many farmers, sharing work between similar requests.
+    
+    Each (state, crop) pair loads and analyzes its price series once and
+    gets one explanation; each (state, location, crop) triple runs one
+    mandi lookup against the state's shared mandi and latest-price indexes. Market analyses,
+    index loads and mandi lookups all run in parallel on the executor. Pairs with a fresh materialized snapshot skip the analysis entirely.
+    """
+    
+    def __init__(self, price_analyzer, recommendation_engine, mandi_finder, explanation_generator, executor,
+                 materialized=None):
+        self.price_analyzer = price_analyzer
+        self.recommendation_engine = recommendation_engine
+        self.mandi_finder = mandi_finder
+        self.explanation_generator = explanation_generator
+        self.executor = executor
+        self.materialized = materialized
+    
+    def recommend(self, items, ranking=None):
+        """Return (results, series): one result per item plus the 90-day series per state/crop.
+        
+        With ranking options mandis are ranked by net realization, so the
+        mandi lookup is shared only between items of the same quantity.
+        """
+        valid = {}
+        errors = {}
+        for index, item in enumerate(items):
+            error = item_error(item)
+            if error:
+                errors[index] = error
+            else:
+                valid[index] = item
+        
+        markets = {(item['state'], item['crop']) for item in valid.values()}
+        lookups = {self._lookup_key(item, ranking) for item in valid.values()}
+        
+        market_futures = {key: self.executor.submit(self._analyze_market, *key) for key in markets}
+        states = {key[0] for key in lookups}
+        index_futures = {state: self.executor.submit(self._mandi_index, state) for state in states}
+        price_futures = {state: self.executor.submit(self._price_index, state) for state in states}
+        places = self._places({(state, location) for state, location, _, _ in lookups})
+        indexes = {state: (index_futures[state].result(), price_futures[state].result()) for state in states}
+        mandi_futures = {
+            (state, location, crop, quantity): self.executor.submit(
+                self._nearby_mandis, state, location, crop, quantity, places[(state, location)], indexes[state], ranking
+            )
+            for state, location, crop, quantity in lookups
+        }
+        mandi_results = {key: future.result() for key, future in mandi_futures.items()}
+        market_results = {key: future.result() for key, future in market_futures.items()}
+        
+        results = []
+        for index, item in enumerate(items):
+            item_id = item.get('id', index) if isinstance(item, dict) else index
+            if index in errors:
+                results.append({'id': item_id, 'error': errors[index]})
+                continue
+            
+            market = market_results[(item['state'], item['crop'])]
+            if 'error' in market:
+                results.append({'id': item_id, 'error': market['error']})
+                continue
+            
+            analysis = market['analysis']
+            recommendation = market['recommendation']
+            results.append({
+                'id': item_id,
+                'state': item['state'],
+                'crop': item['crop'],
+                'recommendation': recommendation['action'],
+                'confidence': recommendation['confidence'],
+                'explanation': market['explanation'],
+                'priceRange': {
+                    'min': analysis['min_price'],
+                    'max': analysis['max_price']
+                },
+                'averagePrice': analysis['avg_price'],
+                'trend': analysis['trend_direction'],
+                'priceForecast': analysis.get('forecast'),
+                'nearbyMandis': mandi_results[self._lookup_key(item, ranking)]
+            })
+        
+        series = {
+            f"{state}/{crop}": market['historicalPrices']
+            for (state, crop), market in market_results.items() if 'error' not in market
+        }
+        return results, series
+    
+    @staticmethod
+    def _lookup_key(item, ranking):
+        return (item['state'], item['location'], item['crop'], item['quantity'] if ranking is not None else 1)
+    
+    def _places(self, locations):
+        """{(state, location): coords or None}, loading the gazetteer once for the whole batch"""
+        try:
+            gazetteer = self.mandi_finder.get_gazetteer()
+        except Exception as e:
+            print(f"Error loading gazetteer: {e}")
+            return {key: None for key in locations}
+        return {(state, location): self.mandi_finder.place(gazetteer, state, location)[0] for state, location in locations}
+    
+    def _nearby_mandis(self, state, location, crop, quantity, coords, indexes, ranking):
+        if coords is None:
+            return []
+        return self.mandi_finder.find_nearby_mandis(
+            state, location, crop, mandi_index=indexes[0], price_index=indexes[1], coords=coords,
+            ranking=ranking, quantity=quantity
+        )
+    
+    def _mandi_index(self, state):
+        try:
+            return self.mandi_finder.get_mandi_index(state)
+        except Exception as e:
+            print(f"Error loading mandi index for {state}: {e}")
+            return None
+    
+    def _price_index(self, state):
+        try:
+            return self.mandi_finder.get_price_index(state)
+        except Exception as e:
+            print(f"Error loading latest-price index for {state}: {e}")
+            return None
+    
+    def _analyze_market(self, state, crop):
+        try:
+            market = self.materialized.get(state, crop) if self.materialized is not None else None
+            if market is not None:
+                explanation = self.explanation_generator.cached_explanation(
+                    crop, state, market['analysis'], market['recommendation']
+                )
+                return {**market, 'explanation': explanation or market['explanation']}
+            
+            price_data = self.price_analyzer.get_historical_prices(state, crop)
+            analysis = {
+                **self.price_analyzer.analyze_trends(price_data),
+                'forecast': self.price_analyzer.forecast(state, crop)
+            }
+            recommendation = self.recommendation_engine.generate_recommendation(analysis)
+            explanation = self.explanation_generator.generate_explanation(crop, state, analysis, recommendation)
+            
+            historical_prices = price_data[-90:]
+            if isinstance(historical_prices, PriceWindow):
+                historical_prices = historical_prices.to_records()
+            
+            return {
+                'analysis': analysis,
+                'recommendation': recommendation,
+                'explanation': explanation,
+                'historicalPrices': historical_prices
+            }
+        except Exception as e:
+            print(f"Error analyzing {state}/{crop}: {e}")
+            return {'error': str(e)}
+
+def item_error(item):
+    """Why a batch item cannot be answered, or None; a bad item gets its own error, not a failed batch"""
+    missing = [field for field in REQUIRED_FIELDS if field not in item] if isinstance(item, dict) else REQUIRED_FIELDS
+    if missing:
+        return f"Missing fields: {', '.join(missing)}"
+    not_text = [field for field in TEXT_FIELDS if not isinstance(item[field], str)]
+    if not_text:
+        return f"Fields must be strings: {', '.join(not_text)}"
+    if not is_amount(item['quantity']):
+        return 'quantity must be a non-negative number'
+    return None
+
+def to_ndjson(results, series):
+    """One JSON object per line: the price series first, then each result"""
+    lines = [dumps({'series': key, 'historicalPrices': prices}) for key, prices in series.items()]
+    lines.extend(dumps(result) for result in results)
+    return '\n'.join(lines) + '\n'
@@ -0,0 +1,78 @@
+import numpy as np
+from price_store import PriceWindow, from_day, window_from_records
+
+def daily_prices(rows):
+    """(days, mean modal price per day) across every mandi in a window or record list"""
+    window = rows if isinstance(rows, PriceWindow) else window_from_records(rows)
+    if len(window) == 0:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float64)
+    days, inverse = np.unique(np.asarray(window.day, dtype=np.int64), return_inverse=True)
+    totals = np.bincount(inverse, np.asarray(window.modal_price, dtype=np.float64), len(days))
+    return days, totals / np.bincount(inverse, minlength=len(days))
+
+def lttb(x, y, points):
+    """Indices of the points Largest-Triangle-Three-Buckets keeps.
+    
+    The first and last points are always kept; each bucket in between
+    contributes the point forming the largest triangle with the previously
+    kept point and the mean of the next bucket.
+    """
+    n = len(x)
+    if points >= n or points < 3:
+        return np.arange(n)
+    
+    x = np.asarray(x, dtype=np.float64)
+    y = np.asarray(y, dtype=np.float64)
+    # Bucket i spans bounds[i]:bounds[i + 1]; the last point is its own bucket
+    bounds = np.r_[(np.arange(points - 1) * ((n - 2) / (points - 2))).astype(np.int64) + 1, n]
+    sizes = np.diff(bounds)
+    mean_x = np.add.reduceat(x, bounds[:-1]) / sizes
+    mean_y = np.add.reduceat(y, bounds[:-1]) / sizes
+    
+    selected = np.empty(points, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = n - 1
+    a = 0
+    for i in range(points - 2):
+        lo, hi = bounds[i], bounds[i + 1]
+        area = np.abs((x[a] - mean_x[i + 1]) * (y[lo:hi] - y[a]) - (x[a] - x[lo:hi]) * (mean_y[i + 1] - y[a]))
+        a = lo + int(area.argmax())
+        selected[i + 1] = a
+    return selected
+
+def encode_series(rows, days=None, points=None):
+    """Columnar daily chart series: a start date, day offsets from it and integer prices.
+    
+    days keeps the trailing calendar days up to the newest row; points
+    downsamples with LTTB to at most that many points.
+    """
+    day, price = daily_prices(rows)
+    if days is not None and len(day):
+        keep = day > day[-1] - days
+        day, price = day[keep], price[keep]
+    if points is not None:
+        keep = lttb(day, price, points)
+        day, price = day[keep], price[keep]
+    if not len(day):
+        return {'start': None, 'offsets': [], 'prices': []}
+    return {
+        'start': str(from_day(day[0])),
+        'offsets': (day - day[0]).tolist(),
+        'prices': np.rint(price).astype(np.int64).tolist()
+    }
+
+def chart_options(body):
+    """{'days', 'points'} from a request's chart field, or None for the row format.
+    
+    Raises ValueError for values that are not positive integers.
+    """
+    chart = body.get('chart') if isinstance(body, dict) else None
+    if chart is None:
+        return None
+    if not isinstance(chart, dict) or chart.get('format', 'columnar') != 'columnar':
+        raise ValueError("chart must be an object with format 'columnar'")
+    options = {'days': chart.get('days', 90), 'points': chart.get('points')}
+    for name, value in options.items():
+        if value is not None and (not isinstance(value, int) or isinstance(value, bool) or value <= 0):
+            raise ValueError(f"chart.{name} must be a positive integer")
+    return options
@@ -0,0 +1,47 @@
+import threading
+
+_lock = threading.Lock()
+_session = None
+_clients = {}
+
+def client(service, **kwargs):
+    """Shared boto3 client; every component asking for the same service and options gets one instance"""
+    key = ('client', service, tuple(sorted(kwargs.items())))
+    return _get(key, lambda session: session.client(service, **kwargs))
+
+def resource(service, **kwargs):
+    key = ('resource', service, tuple(sorted(kwargs.items())))
+    return _get(key, lambda session: session.resource(service, **kwargs))
+
+class Lazy:
+    """Stands in for a client until its first use.
+
+    Cold starts then skip importing boto3 and building clients that a
+    request may never need, such as Bedrock when the explanation is cached.
+    """
+    
+    def __init__(self, factory, *args, **kwargs):
+        self._factory = factory
+        self._args = args
+        self._kwargs = kwargs
+        self._target = None
+    
+    def __getattr__(self, name):
+        target = self._target
+        if target is None:
+            target = self._target = self._factory(*self._args, **self._kwargs)
+        return getattr(target, name)
+
+def _get(key, create):
+    global _session
+    existing = _clients.get(key)
+    if existing is not None:
+        return existing
+    with _lock:
+        if key not in _clients:
+            if _session is None:
+                import boto3
+                # One session so the service models are loaded once
+                _session = boto3.session.Session()
+            _clients[key] = create(_session)
+        return _clients[key]
@@ -0,0 +1,224 @@
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+PRICE_BUCKET = 25
+
+def explanation_key(crop, state, analysis, recommendation, price_bucket=PRICE_BUCKET):
+    """Normalized features the explanation prompt depends on, with prices bucketed"""
+    def bucket(price):
+        return int(round(float(price) / price_bucket)) * price_bucket
+    
+    return (
+        crop.strip().lower(),
+        state.strip().lower(),
+        bucket(analysis['current_price']),
+        bucket(analysis['avg_12week']),
+        analysis['trend_direction'],
+        analysis['trend_strength'],
+        recommendation['action'],
+        bucket(analysis['forecast']['expected']) if analysis.get('forecast') else None
+    )
+
+class ExplanationCache:
+    """LRU + TTL cache of generated explanations with an optional persistent tier"""
+    
+    def __init__(self, max_entries=10000, ttl_seconds=24 * 60 * 60, persistent=None, clock=time.time):
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.persistent = persistent
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.persistent_hits = 0
+        self.misses = 0
+    
+    def get(self, key):
+        now = self.clock()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None:
+                if now - entry[1] < self.ttl_seconds:
+                    self._entries.move_to_end(key)
+                    self.hits += 1
+                    return entry[0]
+                del self._entries[key]
+        
+        if self.persistent is not None:
+            stored = self.persistent.get(key, now - self.ttl_seconds)
+            if stored is not None:
+                value, created_at = stored
+                with self._lock:
+                    self._remember(key, value, created_at)
+                    self.hits += 1
+                    self.persistent_hits += 1
+                return value
+        
+        with self._lock:
+            self.misses += 1
+        return None
+    
+    def put(self, key, value):
+        now = self.clock()
+        with self._lock:
+            self._remember(key, value, now)
+        if self.persistent is not None:
+            self.persistent.put(key, value, now)
+    
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'persistent_hits': self.persistent_hits,
+                'misses': self.misses,
+                'entries': len(self._entries),
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+    
+    def _remember(self, key, value, created_at):
+        self._entries[key] = (value, created_at)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+class SqliteExplanationStore:
+    """Persistent explanation tier in a local SQLite file (e.g. on /tmp or EFS)"""
+    
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS explanations '
+                '(key TEXT PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)'
+            )
+    
+    def get(self, key, not_before):
+        with self._lock:
+            row = self._conn.execute(
+                'SELECT value, created_at FROM explanations WHERE key = ? AND created_at >= ?',
+                (_serialize_key(key), not_before)
+            ).fetchone()
+        return row
+    
+    def put(self, key, value, created_at):
+        with self._lock, self._conn:
+            self._conn.execute(
+                'INSERT OR REPLACE INTO explanations (key, value, created_at) VALUES (?, ?, ?)',
+                (_serialize_key(key), value, created_at)
+            )
+
+class SingleFlight:
+    """Runs at most one call per key at a time; concurrent callers share its future"""
+    
+    def __init__(self, max_workers=16):
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='single-flight')
+        self._inflight = {}
+        self._lock = threading.Lock()
+        self.coalesced = 0
+    
+    def submit(self, key, fn):
+        """(future, started): the call's future and whether this caller started it"""
+        with self._lock:
+            future = self._inflight.get(key)
+            if future is not None:
+                self.coalesced += 1
+                return future, False
+            future = self._executor.submit(fn)
+            self._inflight[key] = future
+        future.add_done_callback(lambda _: self._forget(key, future))
+        return future, True
+    
+    def _forget(self, key, future):
+        with self._lock:
+            if self._inflight.get(key) is future:
+                del self._inflight[key]
+
+class _Call:
+    __slots__ = ('started',)
+    
+    def __init__(self, started):
+        self.started = started
+
+class CircuitBreaker:
+    """Opens after consecutive slow or failed calls and skips the model until cooldown ends.
+    
+    Every call records one outcome. A call still running past the budget
+    counts as slow the next time the breaker is consulted, so it opens
+    while the model is still slow, and its late result is ignored. After
+    the cooldown a single trial call is let through; the rest are skipped
+    until it closes or reopens the breaker.
+    """
+    
+    def __init__(self, latency_budget, failure_threshold=3, cooldown_seconds=30, clock=time.monotonic):
+        self.latency_budget = latency_budget
+        self.failure_threshold = failure_threshold
+        self.cooldown_seconds = cooldown_seconds
+        self.clock = clock
+        self._failures = 0
+        self._opened_at = None
+        self._trial = None
+        self._running = set()
+        self._lock = threading.Lock()
+    
+    def start(self):
+        """A ticket for one call to finish() or cancel(), or None to skip the model"""
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            if self._blocked(now):
+                return None
+            call = _Call(now)
+            if self._opened_at is not None:
+                self._trial = call
+            self._running.add(call)
+            return call
+    
+    def finish(self, call, failed=False):
+        with self._lock:
+            now = self.clock()
+            if call in self._running:
+                self._running.discard(call)
+                self._record(call, failed or now - call.started > self.latency_budget, now)
+    
+    def cancel(self, call):
+        """Forget a ticket whose call was never made"""
+        with self._lock:
+            self._running.discard(call)
+            if call is self._trial:
+                self._trial = None
+    
+    @property
+    def is_open(self):
+        with self._lock:
+            now = self.clock()
+            self._expire(now)
+            return self._blocked(now)
+    
+    def _blocked(self, now):
+        if self._opened_at is None:
+            return False
+        return self._trial is not None or now - self._opened_at < self.cooldown_seconds
+    
+    def _expire(self, now):
+        for call in [call for call in self._running if now - call.started > self.latency_budget]:
+            self._running.discard(call)
+            self._record(call, True, now)
+    
+    def _record(self, call, failed, now):
+        if call is self._trial:
+            self._trial = None
+        if failed:
+            self._failures += 1
+            if self._failures >= self.failure_threshold:
+                self._opened_at = now
+        else:
+            self._failures = 0
+            self._opened_at = None
+
+def _serialize_key(key):
+    return '|'.join(str(part) for part in key)
@@ -1,44 +1,126 @@
-import boto3
 import json
+import threading
+from concurrent.futures import TimeoutError as FutureTimeoutError
+from clients import Lazy, client
+from explanation_cache import CircuitBreaker, SingleFlight, explanation_key
 
 class ExplanationGenerator:
-    def __init__(self):
-        self.bedrock = boto3.client('bedrock-runtime', region_name='us-east-1')
+    def __init__(self, bedrock_client=None, cache=None, latency_budget=None):
+        self.bedrock = bedrock_client or Lazy(client, 'bedrock-runtime', region_name='us-east-1')
         self.model_id = 'anthropic.claude-3-haiku-20240307-v1:0'
+        self.cache = cache
+        self.latency_budget = latency_budget
+        self.breaker = CircuitBreaker(latency_budget) if latency_budget else None
+        self._single_flight = SingleFlight()
+        self._lock = threading.Lock()
+        self.model_calls = 0
+        self.fallbacks = 0
     
     def generate_explanation(self, crop, state, analysis, recommendation):
         """Generate AI explanation using AWS Bedrock"""
+        key = explanation_key(crop, state, analysis, recommendation)
+        if self.cache is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return cached
+        
+        call = None
+        if self.breaker is not None:
+            call = self.breaker.start()
+            if call is None:
+                return self._fallback(crop, analysis, recommendation)
+        
+        # Identical concurrent misses share one model call. If it overruns the
+        # budget the caller falls back, and the call still fills the cache.
+        future, started = self._single_flight.submit(
+            key, lambda: self._invoke_and_cache(call, key, crop, state, analysis, recommendation)
+        )
+        if call is not None and not started:
+            # Joined a call already running, which records its own outcome
+            self.breaker.cancel(call)
         try:
-            prompt = self._build_prompt(crop, state, analysis, recommendation)
-            
-            request_body = {
-                "anthropic_version": "bedrock-2023-05-31",
-                "max_tokens": 150,
-                "temperature": 0.3,
-                "messages": [
-                    {
-                        "role": "user",
-                        "content": prompt
-                    }
-                ]
-            }
-            
-            response = self.bedrock.invoke_model(
-                modelId=self.model_id,
-                body=json.dumps(request_body)
-            )
-            
-            response_body = json.loads(response['body'].read())
-            explanation = response_body['content'][0]['text']
-            
-            return explanation.strip()
-            
+            return future.result(timeout=self.latency_budget)
+        except FutureTimeoutError:
+            # The breaker counts the overrun without waiting for the call
+            return self._fallback(crop, analysis, recommendation)
         except Exception as e:
             print(f"Error generating explanation: {e}")
-            return self._get_fallback_explanation(crop, analysis, recommendation)
+            return self._fallback(crop, analysis, recommendation)
+    
+    def cached_explanation(self, crop, state, analysis, recommendation):
+        """Explanation from the cache only, or None; never calls the model"""
+        if self.cache is None:
+            return None
+        return self.cache.get(explanation_key(crop, state, analysis, recommendation))
+    
+    def stats(self):
+        """Model calls made and saved by the cache and request coalescing"""
+        cache_stats = self.cache.stats() if self.cache is not None else {'hits': 0, 'hit_ratio': 0.0}
+        return {
+            'model_calls': self.model_calls,
+            'saved_model_calls': cache_stats['hits'] + self._single_flight.coalesced,
+            'coalesced': self._single_flight.coalesced,
+            'fallbacks': self.fallbacks,
+            'cache_hit_ratio': cache_stats['hit_ratio'],
+            'circuit_open': self.breaker.is_open if self.breaker is not None else False
+        }
+    
+    def _invoke_and_cache(self, call, key, crop, state, analysis, recommendation):
+        try:
+            explanation = self._invoke_model(crop, state, analysis, recommendation)
+        except Exception:
+            if call is not None:
+                self.breaker.finish(call, failed=True)
+            raise
+        if call is not None:
+            self.breaker.finish(call)
+        if self.cache is not None:
+            self.cache.put(key, explanation)
+        return explanation
+    
+    def _invoke_model(self, crop, state, analysis, recommendation):
+        """Call Bedrock for one explanation"""
+        with self._lock:
+            self.model_calls += 1
+        prompt = self._build_prompt(crop, state, analysis, recommendation)
+        
+        request_body = {
+            "anthropic_version": "bedrock-2023-05-31",
+            "max_tokens": 150,
+            "temperature": 0.3,
+            "messages": [
+                {
+                    "role": "user",
+                    "content": prompt
+                }
+            ]
+        }
+        
+        response = self.bedrock.invoke_model(
+            modelId=self.model_id,
+            body=json.dumps(request_body)
+        )
+        
+        response_body = json.loads(response['body'].read())
+        explanation = response_body['content'][0]['text']
+        
+        return explanation.strip()
+    
+    def _fallback(self, crop, analysis, recommendation):
+        with self._lock:
+            self.fallbacks += 1
+        return self._get_fallback_explanation(crop, analysis, recommendation)
     
     def _build_prompt(self, crop, state, analysis, recommendation):
         """Build prompt for LLM"""
+        forecast = analysis.get('forecast')
+        if forecast:
+            outlook = (f"\n- Seasonal estimate for the next 2-4 weeks: ₹{forecast['low']} to ₹{forecast['high']} "
+                       f"per quintal, most likely ₹{forecast['expected']}")
+            caution = 'Present the seasonal estimate as a likely range, not a promise, and make no other predictions.'
+        else:
+            outlook = ''
+            caution = 'Do not make price predictions or guarantees.'
         return f"""You are an agricultural advisor helping small farmers in India understand market conditions.
 
 Context:
@@ -46,10 +128,10 @@ Context:
 - State: {state.title()}
 - Current price: ₹{int(analysis['current_price'])} per quintal
 - 12-week average price: ₹{int(analysis['avg_12week'])} per quintal
-- Price trend: {analysis['trend_direction']} ({analysis['trend_strength']})
+- Price trend: {analysis['trend_direction']} ({analysis['trend_strength']}){outlook}
 - Recommendation: {recommendation['action']}
 
-Task: Explain in 2-3 simple sentences why this recommendation makes sense based on the data. Use simple language suitable for farmers with basic literacy. Do not make price predictions or guarantees.
+Task: Explain in 2-3 simple sentences why this recommendation makes sense based on the data. Use simple language suitable for farmers with basic literacy. {caution}
 
 Explanation:"""
     
@@ -0,0 +1,438 @@
+import json
+import mmap
+import os
+import re
+import struct
+import threading
+import unicodedata
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# File layout (little endian):
+#   magic 'AGGZ' | uint16 version | uint32 header length | JSON header
+#   one array per column, each 8-byte aligned
+#
+# Places are sorted by normalized name, so exact and prefix lookups are a
+# binary search over a fixed-width name column. A second column holds each
+# place's phonetic key in key order for transliteration variants, and PIN
+# codes are a sorted uint32 column of their own.
+MAGIC = b'AGGZ'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGN = 8
+
+NAME_WIDTH = 24
+KEY_WIDTH = 16
+KINDS = ['district', 'taluka', 'city', 'town', 'village']
+NO_DISTRICT = 65535
+CACHE_SIZE = 4096
+
+# Words that qualify a place rather than name it: "Akola district", "Telhara tq"
+QUALIFIERS = {'district', 'dist', 'distt', 'zila', 'taluka', 'taluk', 'tehsil', 'tahsil', 'tq', 'mandal',
+              'block', 'village', 'gaon', 'city', 'town'}
+
+# Romanization variants of the same sound, longest first
+PHONETIC = {
+    'chh': 'c', 'ch': 'c', 'ph': 'f', 'bh': 'b', 'dh': 'd', 'th': 't', 'kh': 'k', 'gh': 'g', 'sh': 's',
+    'jh': 'j', 'ee': 'i', 'oo': 'u', 'w': 'v', 'z': 'j', 'q': 'k', 'x': 'ks', 'y': 'i', 'h': ''
+}
+_PHONETIC = re.compile('|'.join(sorted(PHONETIC, key=len, reverse=True)))
+_REPEATS = re.compile(r'(.)\1+')
+_TOKENS = re.compile(r'[^\W_]+')
+_PIN = re.compile(r'\b\d{6}\b')
+
+Place = namedtuple('Place', ['name', 'kind', 'state', 'district', 'lat', 'lng'])
+
+def normalize(text):
+    """Lowercase ASCII-folded words separated by single spaces"""
+    if not text.isascii():
+        text = unicodedata.normalize('NFKD', text)
+        text = ''.join(c for c in text if not unicodedata.combining(c))
+    return ' '.join(_TOKENS.findall(text.lower()))
+
+def phonetic_key(name):
+    """Key shared by common spellings of a normalized name: Vardha/Wardhaa, Murtijapur/Murtizapur"""
+    key = _PHONETIC.sub(lambda m: PHONETIC[m.group(0)], name.replace(' ', ''))
+    return _REPEATS.sub(r'\1', key)
+
+def state_id(name):
+    """State name as used in requests and S3 keys: 'Uttar Pradesh' -> 'uttar_pradesh'"""
+    return normalize(name).replace(' ', '_')
+
+def max_distance(length):
+    """Edit distance tolerated for a phonetic key of this length"""
+    if length <= 4:
+        return 1
+    if length <= 10:
+        return 2
+    return 3
+
+def edit_distances(query, candidates, lengths):
+    """Levenshtein distance from one key to each row of a zero-padded uint8 matrix.
+    
+    Runs the usual row-by-row recurrence over the query's characters, with
+    every candidate in one array. The left-to-right insertion dependency
+    within a row is a running minimum of (cell - column) plus the column.
+    """
+    count, width = candidates.shape
+    columns = np.arange(width + 1, dtype=np.int16)
+    row = np.broadcast_to(columns, (count, width + 1)).copy()
+    for i, char in enumerate(query, 1):
+        best = np.empty_like(row)
+        best[:, 0] = i
+        np.minimum(row[:, 1:] + 1, row[:, :-1] + (candidates != char), out=best[:, 1:])
+        row = np.minimum.accumulate(best - columns, axis=1) + columns
+    return row[np.arange(count), lengths]
+
+class Gazetteer:
+    """Offline place-name and PIN code lookup for villages, talukas and districts.
+    
+    The columns are views into the file buffer, so a memory-mapped file
+    costs no parsing at load and only touched pages are read. Resolutions
+    are remembered in a small LRU since farmers in a region ask about the
+    same few places.
+    """
+    
+    def __init__(self, buffer, cache_size=CACHE_SIZE):
+        magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a gazetteer')
+        if version != VERSION:
+            raise ValueError(f"Unsupported gazetteer version {version}")
+        
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+        self.buffer = buffer
+        self.states = header['states']
+        self.kinds = header['kinds']
+        self.districts = header['districts']
+        self._state_ids = {state: i for i, state in enumerate(self.states)}
+        self._district_names = np.array([normalize(name) for name in self.districts] + [''], dtype=object)
+        self._state_names = np.array([name.replace('_', ' ') for name in self.states], dtype=object)
+        columns = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype), count=count, offset=offset)
+            for name, (dtype, count, offset) in header['columns'].items()
+        }
+        self.names = columns['name']
+        self.display_offsets = columns['display_offset']
+        self.display = columns['display']
+        self.lat = columns['lat']
+        self.lng = columns['lng']
+        self.kind = columns['kind']
+        self.state = columns['state']
+        self.district = columns['district']
+        self.population = columns['population']
+        self.key_order = columns['key_order']
+        self.keys = columns['key']
+        self._key_chars = self.keys.view(np.uint8).reshape(len(self.keys), self.keys.dtype.itemsize)
+        self.pins = columns['pin']
+        self.pin_lat = columns['pin_lat']
+        self.pin_lng = columns['pin_lng']
+        self.pin_state = columns['pin_state']
+        self.pin_district = columns['pin_district']
+        
+        self.cache_size = cache_size
+        self._cache = OrderedDict()
+        self._lock = threading.Lock()
+        self.lookups = 0
+        self.cache_hits = 0
+        self.exact = 0
+        self.phonetic = 0
+        self.fuzzy = 0
+        self.pin_matches = 0
+        self.unresolved = 0
+    
+    @classmethod
+    def open(cls, path, **kwargs):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ), **kwargs)
+    
+    @classmethod
+    def from_bytes(cls, data, **kwargs):
+        return cls(memoryview(data), **kwargs)
+    
+    def __len__(self):
+        return len(self.names)
+    
+    def stats(self):
+        return {
+            'lookups': self.lookups,
+            'cache_hits': self.cache_hits,
+            'exact': self.exact,
+            'phonetic': self.phonetic,
+            'fuzzy': self.fuzzy,
+            'pins': self.pin_matches,
+            'unresolved': self.unresolved
+        }
+    
+    def resolve(self, query, state=None):
+        """Best Place for a name, "name, district" or PIN code, or None.
+        
+        PIN codes are looked up directly. Names are tried as spelled, then by
+        phonetic key, then within a small edit distance of the key; the
+        first step with a match wins. A requested state is searched first,
+        and ties go to the place whose district or state matches a hint
+        after the comma, then to the larger population.
+        """
+        cache_key = (query, state)
+        with self._lock:
+            self.lookups += 1
+            if cache_key in self._cache:
+                self._cache.move_to_end(cache_key)
+                self.cache_hits += 1
+                return self._cache[cache_key]
+        
+        place = self._resolve(query, state)
+        with self._lock:
+            if place is None:
+                self.unresolved += 1
+            self._cache[cache_key] = place
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return place
+    
+    def search(self, prefix, state=None, limit=10):
+        """Places whose normalized name starts with `prefix`, most populous first"""
+        prefix = _encode(normalize(prefix), self.names.dtype.itemsize)
+        if not prefix:
+            return []
+        lo, hi = np.searchsorted(self.names, [prefix, prefix + b'\xff'])
+        indices = np.arange(lo, hi)
+        if state is not None:
+            indices = indices[self.state[indices] == self._state_ids.get(state_id(state), -1)]
+        if len(indices) > limit:
+            indices = indices[np.argpartition(-self.population[indices].astype(np.int64), limit - 1)[:limit]]
+        indices = indices[np.argsort(-self.population[indices].astype(np.int64), kind='stable')]
+        return [self.place(i) for i in indices.tolist()]
+    
+    def place(self, index):
+        district = int(self.district[index])
+        return Place(
+            bytes(self.display[self.display_offsets[index]:self.display_offsets[index + 1]]).decode('utf-8'),
+            self.kinds[self.kind[index]],
+            self.states[self.state[index]],
+            self.districts[district] if district != NO_DISTRICT else None,
+            round(float(self.lat[index]), 5),
+            round(float(self.lng[index]), 5)
+        )
+    
+    def _resolve(self, query, state):
+        match = _PIN.search(query)
+        if match:
+            place = self._resolve_pin(int(match.group(0)))
+            if place is not None:
+                return place
+            query = query[:match.start()] + query[match.end():]
+        
+        parts = [_strip_qualifiers(normalize(part)) for part in query.split(',')]
+        parts = [part for part in parts if part]
+        if not parts:
+            return None
+        name, hints = parts[0], parts[1:]
+        
+        # A requested state is searched with every step before exact and
+        # phonetic matches elsewhere are considered
+        state_index = self._state_ids.get(state_id(state)) if state else None
+        if state_index is not None:
+            steps = [(state_index, ('exact', 'phonetic', 'fuzzy')), (None, ('exact', 'phonetic'))]
+        else:
+            steps = [(None, ('exact', 'phonetic', 'fuzzy'))]
+        for scope, methods in steps:
+            for method in methods:
+                indices = getattr(self, f"_{method}")(name, scope)
+                if len(indices):
+                    setattr(self, method, getattr(self, method) + 1)
+                    return self.place(self._best(indices, hints))
+        return None
+    
+    def _resolve_pin(self, pin):
+        i = int(np.searchsorted(self.pins, pin))
+        if i == len(self.pins) or self.pins[i] != pin:
+            return None
+        self.pin_matches += 1
+        district = int(self.pin_district[i])
+        return Place(
+            str(pin), 'pin', self.states[self.pin_state[i]],
+            self.districts[district] if district != NO_DISTRICT else None,
+            round(float(self.pin_lat[i]), 5), round(float(self.pin_lng[i]), 5)
+        )
+    
+    def _exact(self, name, scope):
+        encoded = _encode(name, self.names.dtype.itemsize)
+        if not encoded:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = np.searchsorted(self.names, encoded, side='left'), np.searchsorted(self.names, encoded, side='right')
+        return self._in_scope(np.arange(lo, hi), scope)
+    
+    def _phonetic(self, name, scope):
+        encoded = _encode(phonetic_key(name), self.keys.dtype.itemsize)
+        if not encoded:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = np.searchsorted(self.keys, encoded, side='left'), np.searchsorted(self.keys, encoded, side='right')
+        return self._in_scope(self.key_order[lo:hi].astype(np.int64), scope)
+    
+    def _fuzzy(self, name, scope):
+        """Places whose phonetic key is within max_distance of the name's, closest first.
+        
+        Candidates share the key's first two characters, which keeps the
+        search to a small slice of the key column; a typo in the first two
+        letters is not recovered.
+        """
+        encoded = _encode(phonetic_key(name), self.keys.dtype.itemsize)
+        if len(encoded) < 2:
+            return np.empty(0, dtype=np.int64)
+        lo, hi = np.searchsorted(self.keys, [encoded[:2], encoded[:2] + b'\xff'])
+        rows = np.arange(lo, hi)
+        if scope is not None:
+            rows = rows[self.state[self.key_order[rows]] == scope]
+        limit = max_distance(len(encoded))
+        lengths = (self._key_chars[rows] != 0).sum(axis=1)
+        close = np.abs(lengths - len(encoded)) <= limit
+        rows, lengths = rows[close], lengths[close]
+        if not len(rows):
+            return np.empty(0, dtype=np.int64)
+        
+        distances = edit_distances(encoded, self._key_chars[rows], lengths)
+        closest = distances.min()
+        if closest > limit:
+            return np.empty(0, dtype=np.int64)
+        return self.key_order[rows[distances == closest]].astype(np.int64)
+    
+    def _in_scope(self, indices, scope):
+        if scope is None or not len(indices):
+            return indices
+        return indices[self.state[indices] == scope]
+    
+    def _best(self, indices, hints):
+        """Index of the preferred place among equally good matches"""
+        if len(indices) == 1:
+            return int(indices[0])
+        if hints:
+            districts = self._district_names[np.minimum(self.district[indices], len(self.districts))]
+            states = self._state_names[self.state[indices]]
+            hinted = np.isin(districts, hints) | np.isin(states, hints)
+            if hinted.any():
+                indices = indices[hinted]
+        order = np.lexsort((self.kind[indices], -self.population[indices].astype(np.int64)))
+        return int(indices[order[0]])
+
+def build_gazetteer(places, pins=()):
+    """Encode a Gazetteer from place and PIN code records.
+    
+    places: (name, kind, state, district, lat, lng, population) tuples;
+    districts are names and states are display names or ids.
+    pins: (pincode, lat, lng, state, district) tuples.
+    """
+    places = list(places)
+    pins = sorted(pins, key=lambda pin: int(pin[0]))
+    state_ids = {name: state_id(name) for name in {place[2] for place in places} | {pin[3] for pin in pins}}
+    states = sorted(set(state_ids.values()))
+    kinds = KINDS + sorted({place[1] for place in places} - set(KINDS))
+    districts = sorted({place[3] for place in places if place[3]} | {pin[4] for pin in pins if pin[4]})
+    state_index = {name: states.index(state) for name, state in state_ids.items()}
+    kind_index = {kind: i for i, kind in enumerate(kinds)}
+    district_index = {district: i for i, district in enumerate(districts)}
+    
+    normalized = [normalize(place[0]) for place in places]
+    names = np.array([_encode(name, NAME_WIDTH) for name in normalized], dtype=f"S{NAME_WIDTH}")
+    population = np.array([int(place[6] or 0) for place in places], dtype=np.int64)
+    # Most populous first within a name, so ties read in a sensible order
+    order = np.lexsort((-population, names))
+    places = [places[i] for i in order.tolist()]
+    names = names[order]
+    keys = np.array([_encode(phonetic_key(normalized[i]), KEY_WIDTH) for i in order.tolist()], dtype=f"S{KEY_WIDTH}")
+    key_order = np.argsort(keys, kind='stable').astype('<u4')
+    
+    display = [place[0].encode('utf-8') for place in places]
+    display_offset = np.zeros(len(places) + 1, dtype='<u4')
+    np.cumsum([len(name) for name in display], out=display_offset[1:])
+    
+    columns = {
+        'name': names,
+        'display_offset': display_offset,
+        'display': np.frombuffer(b''.join(display), dtype=np.uint8),
+        'lat': np.array([place[4] for place in places], dtype='<f4'),
+        'lng': np.array([place[5] for place in places], dtype='<f4'),
+        'kind': np.array([kind_index[place[1]] for place in places], dtype=np.uint8),
+        'state': np.array([state_index[place[2]] for place in places], dtype=np.uint8),
+        'district': np.array([district_index.get(place[3], NO_DISTRICT) for place in places], dtype='<u2'),
+        'population': population[order].astype('<u4'),
+        'key_order': key_order,
+        'key': keys[key_order],
+        'pin': np.array([int(pin[0]) for pin in pins], dtype='<u4'),
+        'pin_lat': np.array([pin[1] for pin in pins], dtype='<f4'),
+        'pin_lng': np.array([pin[2] for pin in pins], dtype='<f4'),
+        'pin_state': np.array([state_index[pin[3]] for pin in pins], dtype=np.uint8),
+        'pin_district': np.array([district_index.get(pin[4], NO_DISTRICT) for pin in pins], dtype='<u2')
+    }
+    
+    header = {
+        'states': states,
+        'kinds': kinds,
+        'districts': districts,
+        'columns': {name: [column.dtype.str, len(column), 0] for name, column in columns.items()}
+    }
+    # Offsets depend on the header length, so grow the header until it fits
+    while True:
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        offset = _align(PREAMBLE.size + len(header_bytes))
+        offsets = {}
+        for name, column in columns.items():
+            offsets[name] = offset
+            offset = _align(offset + column.nbytes)
+        if all(header['columns'][name][2] == offsets[name] for name in columns):
+            break
+        for name in columns:
+            header['columns'][name][2] = offsets[name]
+    
+    out = bytearray(offset)
+    out[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, VERSION, len(header_bytes))
+    out[PREAMBLE.size:PREAMBLE.size + len(header_bytes)] = header_bytes
+    for name, column in columns.items():
+        data = column.tobytes()
+        out[offsets[name]:offsets[name] + len(data)] = data
+    return bytes(out)
+
+def load_gazetteer(s3_client, bucket, key, path=None, download_dir='/tmp'):
+    """Gazetteer from a local file, or from S3 via a copy in download_dir; None if neither exists.
+    
+    The S3 object is copied to disk and memory-mapped, so it is never held
+    in the heap. A copy left by an earlier container is reused after a
+    conditional GET on its ETag.
+    """
+    if path:
+        return Gazetteer.open(path) if os.path.exists(path) else None
+    
+    from object_cache import is_missing, is_not_modified
+    local = os.path.join(download_dir, key.replace('/', '_'))
+    request = {'Bucket': bucket, 'Key': key}
+    if os.path.exists(local) and os.path.exists(f"{local}.etag"):
+        with open(f"{local}.etag") as f:
+            request['IfNoneMatch'] = f.read()
+    try:
+        response = s3_client.get_object(**request)
+    except Exception as e:
+        if is_not_modified(e):
+            return Gazetteer.open(local)
+        if is_missing(e):
+            return None
+        raise
+    
+    partial = f"{local}.{os.getpid()}.part"
+    with open(partial, 'wb') as f:
+        for chunk in iter(lambda: response['Body'].read(1024 * 1024), b''):
+            f.write(chunk)
+    os.replace(partial, local)
+    with open(f"{local}.etag", 'w') as f:
+        f.write(response.get('ETag', ''))
+    return Gazetteer.open(local)
+
+def _strip_qualifiers(name):
+    words = [word for word in name.split() if word not in QUALIFIERS]
+    return ' '.join(words) if words else name
+
+def _encode(text, width):
+    return text.encode('ascii', 'ignore')[:width]
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
@@ -0,0 +1,214 @@
+import json
+import mmap
+import struct
+import time
+from datetime import datetime, timezone
+
+import numpy as np
+
+from price_analyzer import PriceAnalyzer
+from price_partitions import crop_paths, open_local
+from price_store import from_day, to_day
+
+# File layout (little endian):
+#   magic 'AGPL' | uint16 version | uint32 header length | JSON header
+#   one (crops x mandis) array per column, each 8-byte aligned
+MAGIC = b'AGPL'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGN = 8
+
+COLUMNS = [
+    ('day', np.int32),
+    ('price', np.float32),
+    ('deviation', np.float32),
+    ('demand', np.uint8)
+]
+
+DEMAND_TIERS = ['Low', 'Medium', 'High']
+NO_DEMAND = 255
+# Prices older than this (in days) are reported as missing rather than as the latest
+MAX_AGE_DAYS = 14
+
+class LatestPrice:
+    __slots__ = ('day', 'price', 'deviation', 'demand')
+    
+    def __init__(self, day, price, deviation, demand):
+        self.day = day
+        self.price = price
+        self.deviation = deviation
+        self.demand = demand
+    
+    def comparison(self):
+        """Latest price against the mandi's trailing 4-week average, as shown in the app"""
+        diff = int(round(self.deviation))
+        if diff > 0:
+            return f"↑ {diff}% above average"
+        if diff < 0:
+            return f"↓ {abs(diff)}% below average"
+        return '→ at average'
+
+class LatestPriceIndex:
+    """Latest price, trailing-average deviation and demand tier per (crop, mandi) for one state.
+    
+    Columns are dense crops x mandis arrays, so a lookup is two small dict
+    lookups for the row and column plus four array reads. The arrays are
+    views into the file buffer and can be memory-mapped. Prices more than
+    max_age_days older than today count as missing, so an index that stops
+    being rebuilt does not keep serving its last prices.
+    """
+    
+    def __init__(self, buffer):
+        magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a latest-price index')
+        if version != VERSION:
+            raise ValueError(f"Unsupported latest-price index version {version}")
+        
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+        self.buffer = buffer
+        self.state = header['state']
+        self.built_at = header['built_at']
+        self.max_age_days = header.get('max_age_days', MAX_AGE_DAYS)
+        self.crops = {crop: i for i, crop in enumerate(header['crops'])}
+        self.mandis = {code: i for i, code in enumerate(header['mandi_codes'])}
+        codes = np.array(header['mandi_codes'], dtype=str)
+        self._code_order = np.argsort(codes, kind='stable')
+        self._sorted_codes = codes[self._code_order]
+        shape = (len(self.crops), len(self.mandis))
+        columns = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype).newbyteorder('<'),
+                                count=shape[0] * shape[1], offset=header['column_offsets'][name]).reshape(shape)
+            for name, dtype in COLUMNS
+        }
+        self.day = columns['day']
+        self.price = columns['price']
+        self.deviation = columns['deviation']
+        self.demand = columns['demand']
+    
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(memoryview(data))
+    
+    def prices(self, crop, mandi_codes, today=None):
+        """Latest price for each of an array of mandi codes, NaN where there is none or it is stale"""
+        row = self.crops.get(crop.lower())
+        prices = np.full(len(mandi_codes), np.nan)
+        if row is None or not len(self._sorted_codes):
+            return prices
+        at = np.minimum(np.searchsorted(self._sorted_codes, mandi_codes), len(self._sorted_codes) - 1)
+        found = self._sorted_codes[at] == mandi_codes
+        cols = self._code_order[at[found]]
+        fresh = (self.demand[row, cols] != NO_DEMAND) & (self.day[row, cols] >= self._oldest_day(today))
+        prices[found] = np.where(fresh, self.price[row, cols], np.nan)
+        return prices
+    
+    def lookup(self, crop, mandi_code, today=None):
+        """LatestPrice for a crop at a mandi, or None if the mandi has no recent prices for it"""
+        row = self.crops.get(crop.lower())
+        col = self.mandis.get(mandi_code)
+        if row is None or col is None:
+            return None
+        demand = int(self.demand[row, col])
+        day = int(self.day[row, col])
+        if demand == NO_DEMAND or day < self._oldest_day(today):
+            return None
+        return LatestPrice(
+            from_day(day),
+            int(self.price[row, col]),
+            float(self.deviation[row, col]),
+            DEMAND_TIERS[demand]
+        )
+    
+    def _oldest_day(self, today):
+        # Whole UTC days from the clock are cheaper than building a datetime per lookup
+        day = to_day(today) if today is not None else int(time.time() // 86400)
+        return day - self.max_age_days
+
+def build_index(state, stores, built_at=None, max_age_days=MAX_AGE_DAYS):
+    """Encode a LatestPriceIndex from {crop: PriceStore} for one state.
+    
+    Deviation is the latest modal price against the mandi's 4-week average;
+    demand tiers split the crop's mandis into thirds by trailing 12-week
+    arrival volume. max_age_days is stored in the header as the cutoff for
+    lookups.
+    """
+    crops = sorted(crop.lower() for crop in stores)
+    analyzer = PriceAnalyzer(None, None)
+    analyses = {}
+    codes = set()
+    for crop, store in stores.items():
+        window = store.last_days(84, today=from_day(store.last_day)) if store.rows else store.window()
+        if len(window) == 0:
+            continue
+        mandis = analyzer.analyze_trends_by_mandi(window)['mandis']
+        analyses[crop.lower()] = mandis
+        codes.update(mandis['mandi_code'])
+    mandi_codes = sorted(code for code in codes if code)
+    column = {code: i for i, code in enumerate(mandi_codes)}
+    
+    shape = (len(crops), len(mandi_codes))
+    columns = {
+        'day': np.zeros(shape, dtype=np.int32),
+        'price': np.full(shape, np.nan, dtype=np.float32),
+        'deviation': np.zeros(shape, dtype=np.float32),
+        'demand': np.full(shape, NO_DEMAND, dtype=np.uint8)
+    }
+    for row, crop in enumerate(crops):
+        mandis = analyses.get(crop)
+        if mandis is None:
+            continue
+        cols = np.array([column.get(code, -1) for code in mandis['mandi_code']], dtype=np.int64)
+        keep = cols >= 0
+        cols = cols[keep]
+        current = np.asarray(mandis['current_price'], dtype=np.float64)[keep]
+        average = np.asarray(mandis['avg_4week'], dtype=np.float64)[keep]
+        volume = np.asarray(mandis['total_volume'], dtype=np.float64)[keep]
+        columns['day'][row, cols] = np.asarray(mandis['latest_day'])[keep]
+        columns['price'][row, cols] = current
+        safe_average = np.where(average > 0, average, 1)
+        columns['deviation'][row, cols] = np.where(average > 0, (current - average) / safe_average * 100, 0)
+        # Rank-based thirds so ties and small mandi counts still spread across tiers
+        ranks = np.argsort(np.argsort(volume, kind='stable'), kind='stable')
+        columns['demand'][row, cols] = np.minimum(ranks * len(DEMAND_TIERS) // max(len(cols), 1), len(DEMAND_TIERS) - 1)
+    
+    header = {
+        'state': state,
+        'built_at': built_at or datetime.now(timezone.utc).isoformat(),
+        'max_age_days': max_age_days,
+        'crops': crops,
+        'mandi_codes': mandi_codes,
+        'column_offsets': {name: 0 for name, _ in COLUMNS}
+    }
+    # Offsets depend on the header length, so grow the header until it fits
+    while True:
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        offset = _align(PREAMBLE.size + len(header_bytes))
+        offsets = {}
+        for name, _ in COLUMNS:
+            offsets[name] = offset
+            offset = _align(offset + columns[name].nbytes)
+        if offsets == header['column_offsets']:
+            break
+        header['column_offsets'] = offsets
+    
+    out = bytearray(offset)
+    out[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, VERSION, len(header_bytes))
+    out[PREAMBLE.size:PREAMBLE.size + len(header_bytes)] = header_bytes
+    for name, dtype in COLUMNS:
+        data = np.ascontiguousarray(columns[name], dtype=np.dtype(dtype).newbyteorder('<')).tobytes()
+        out[offsets[name]:offsets[name] + len(data)] = data
+    return bytes(out)
+
+def build_index_from_dir(state_dir, state):
+    """Index bytes from every {crop}.bin price store or partitioned crop in a state directory"""
+    stores = {crop: open_local(path) for crop, path in crop_paths(state_dir).items()}
+    return build_index(state, stores)
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
@@ -1,75 +1,229 @@
-import json
-from geopy.distance import geodesic
+import os
+import threading
+from datetime import datetime, timedelta
+import numpy as np
+from gazetteer import load_gazetteer
+from latest_price_index import LatestPriceIndex
+from mandi_index import MandiIndex
+from object_cache import ObjectCache, is_missing
+
+GAZETTEER_KEY = 'gazetteer/india.bin'
+# Used for every location until a gazetteer has been deployed
+DEFAULT_COORDS = (20.7002, 77.0082)  # Akola, Maharashtra
+RADIUS_KM = 100
+# Net-realization ranking doubles the radius up to this until it has k priced mandis
+MAX_RADIUS_KM = 400
+RANK_MODES = ('distance', 'netRealization')
+
+def ranking_options(body, transport_cost):
+    """{'transport_cost'} for a net-realization ranking, or None to rank by distance.
+    
+    transport_cost is the default in rupees per quintal per km; a request may
+    override it with transportCost. Raises ValueError for invalid values,
+    including a quantity that is not a number.
+    """
+    mode = body.get('rankBy', 'distance')
+    if mode not in RANK_MODES:
+        raise ValueError(f"rankBy must be one of {', '.join(RANK_MODES)}")
+    if mode == 'distance':
+        return None
+    transport_cost = body.get('transportCost', transport_cost)
+    checks = [('transportCost', transport_cost)] + ([('quantity', body['quantity'])] if 'quantity' in body else [])
+    for field, value in checks:
+        if not is_amount(value):
+            raise ValueError(f"{field} must be a non-negative number")
+    return {'transport_cost': transport_cost}
+
+def is_amount(value):
+    return isinstance(value, (int, float)) and not isinstance(value, bool) and value >= 0
 
 class MandiFinder:
-    def __init__(self, s3_client, bucket_name):
+    def __init__(self, s3_client, bucket_name, cache=None, store_dir=None, gazetteer=None, gazetteer_path=None):
         self.s3 = s3_client
         self.bucket = bucket_name
+        self.cache = cache or ObjectCache(s3_client)
+        self.store_dir = store_dir
+        self.gazetteer_path = gazetteer_path
+        self._gazetteer = gazetteer
+        self._gazetteer_checked_at = None
+        self._gazetteer_lock = threading.Lock()
+        self._mapped_indexes = {}
+        self.mock_fallbacks = 0
+        self.unresolved_locations = 0
+    
+    def stats(self):
+        stats = {'mock_fallbacks': self.mock_fallbacks, 'unresolved_locations': self.unresolved_locations}
+        if self._gazetteer is not None:
+            stats.update({f"gazetteer.{name}": value for name, value in self._gazetteer.stats().items()})
+        return stats
     
-    def find_nearby_mandis(self, state, location, crop):
-        """Find nearby mandis within 100km"""
+    def find_nearby_mandis(self, state, location, crop, mandi_index=None, price_index=None, coords=None,
+                           ranking=None, quantity=1, k=10, today=None):
+        """Find nearby mandis within 100km; none if the location cannot be placed.
+        
+        With ranking options the mandis are ordered by net realization
+        instead of distance.
+        """
         try:
-            key = f"mandi-metadata/{state}_mandis.json"
-            response = self.s3.get_object(Bucket=self.bucket, Key=key)
-            mandi_data = json.loads(response['Body'].read().decode('utf-8'))
-            
-            user_coords = self._get_location_coords(location)
+            mandi_index = mandi_index or self.get_mandi_index(state)
+            price_index = price_index or self.get_price_index(state)
+            user_coords = coords or self.resolve_location(state, location)
+            if user_coords is None:
+                return []
+            if ranking is not None:
+                return self.rank_by_net_realization(
+                    crop, user_coords, mandi_index, price_index, quantity, ranking['transport_cost'], k, today
+                )
             nearby_mandis = []
             
-            for mandi in mandi_data['mandis']:
-                if crop.lower() not in [c.lower() for c in mandi.get('crops_traded', [])]:
-                    continue
-                
-                mandi_coords = (mandi['latitude'], mandi['longitude'])
-                distance = geodesic(user_coords, mandi_coords).km
-                
-                if distance <= 100:
-                    nearby_mandis.append({
-                        'name': mandi['name'],
-                        'distance': round(distance, 1),
-                        'price': self._get_mandi_price(mandi['code']),
-                        'priceComparison': self._get_price_comparison(),
-                        'demand': self._get_demand_indicator(),
-                        'coordinates': {
-                            'lat': mandi['latitude'],
-                            'lng': mandi['longitude']
-                        }
-                    })
-            
-            # Sort by distance
-            nearby_mandis.sort(key=lambda x: x['distance'])
-            return nearby_mandis[:10]
+            for distance, mandi in mandi_index.nearest(crop, user_coords, radius_km=RADIUS_KM, k=k):
+                latest = price_index.lookup(crop, mandi['code'], today) if price_index is not None else None
+                nearby_mandis.append(self._mandi_entry(mandi, distance, latest))
             
+            return nearby_mandis
+        
         except Exception as e:
             print(f"Error finding mandis: {e}")
             return self._get_mock_mandis()
     
-    def _get_location_coords(self, location):
-        """Get coordinates for location (mock implementation)"""
-        # In production, use geocoding service
-        return (20.7002, 77.0082)  # Akola, Maharashtra
+    def rank_by_net_realization(self, crop, coords, mandi_index, price_index, quantity, transport_cost, k=10, today=None):
+        """Top k mandis by expected net realization for selling `quantity` quintals.
+        
+        Net realization is (latest price - transport_cost x distance) x quantity.
+        Every candidate is scored at once and the best k are picked with a
+        partial selection; mandis without a recent price follow by distance.
+        Each entry carries the next day the mandi trades.
+        """
+        today = today or datetime.now()
+        radius = RADIUS_KM
+        while True:
+            indices, distances = mandi_index.within(crop, coords, radius)
+            if price_index is not None:
+                # Whole rupees, as the entries show them
+                prices = np.trunc(price_index.prices(crop, mandi_index.codes[indices], today))
+            else:
+                prices = np.full(len(indices), np.nan)
+            priced = np.count_nonzero(~np.isnan(prices))
+            if priced >= k or radius >= MAX_RADIUS_KM:
+                break
+            radius = min(radius * 2, MAX_RADIUS_KM)
+        if not len(indices):
+            return []
+        
+        cost = transport_cost * distances * quantity
+        net = prices * quantity - cost
+        # Unpriced mandis score below any net realization, nearest first
+        score = np.where(np.isnan(net), -1e12 - distances, net)
+        top = np.argpartition(-score, k - 1)[:k] if len(score) > k else np.arange(len(score))
+        top = top[np.lexsort((distances[top], -score[top]))]
+        
+        waits = mandi_index.days_to_trading(indices[top], today.weekday())
+        ranked = []
+        for i, wait in zip(top.tolist(), waits.tolist()):
+            mandi = mandi_index.mandis[indices[i]]
+            latest = price_index.lookup(crop, mandi['code'], today) if price_index is not None else None
+            entry = self._mandi_entry(mandi, float(distances[i]), latest)
+            entry['transportCost'] = int(round(cost[i]))
+            entry['netRealization'] = int(round(net[i])) if latest else None
+            entry['nextTradingDay'] = (today + timedelta(days=wait)).strftime('%Y-%m-%d')
+            ranked.append(entry)
+        return ranked
     
-    def _get_mandi_price(self, mandi_code):
-        """Get latest price for mandi (mock implementation)"""
-        import random
-        return random.randint(5800, 6300)
+    def get_mandi_index(self, state):
+        """Spatial index for a state, rebuilt only when its metadata object changes"""
+        key = f"mandi-metadata/{state}_mandis.json"
+        return self.cache.get(self.bucket, key, MandiIndex.from_json)
     
-    def _get_price_comparison(self):
-        """Compare price with average (mock implementation)"""
-        import random
-        diff = random.randint(-10, 15)
-        if diff > 0:
-            return f"↑ {diff}% above average"
-        else:
-            return f"↓ {abs(diff)}% below average"
+    def get_price_index(self, state):
+        """Latest-price index for a state, or None if it has not been built.
+        
+        A local file is re-mapped when its mtime changes and the S3 object is
+        revalidated by the cache, so a new ingest is picked up without a restart.
+        """
+        if self.store_dir:
+            path = os.path.join(self.store_dir, state, 'latest-prices.idx')
+            if not os.path.exists(path):
+                return None
+            mtime = os.stat(path).st_mtime_ns
+            mapped = self._mapped_indexes.get(path)
+            if mapped is None or mapped[0] != mtime:
+                mapped = (mtime, LatestPriceIndex.open(path))
+                self._mapped_indexes[path] = mapped
+            return mapped[1]
+        
+        key = f"price-store/{state}/latest-prices.idx"
+        try:
+            return self.cache.get(self.bucket, key, LatestPriceIndex.from_bytes)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
     
-    def _get_demand_indicator(self):
-        """Get demand indicator (mock implementation)"""
-        import random
-        return random.choice(['High', 'Medium', 'Low'])
+    def resolve_location(self, state, location):
+        """(lat, lng) to search mandis around, or None if the location cannot be placed"""
+        return self.locate(state, location)[0]
+    
+    def locate(self, state, location):
+        """(coords, resolved) for a village, taluka, district or PIN code.
+        
+        coords is None if the location is not in the gazetteer. Until a
+        gazetteer is deployed every location gets DEFAULT_COORDS, with
+        resolved False since the coordinates are not the location's.
+        """
+        try:
+            gazetteer = self.get_gazetteer()
+        except Exception as e:
+            print(f"Error loading gazetteer: {e}")
+            self.unresolved_locations += 1
+            return None, False
+        return self.place(gazetteer, state, location)
+    
+    def place(self, gazetteer, state, location):
+        """locate() with a gazetteer already loaded, or None if none has been deployed"""
+        if gazetteer is None:
+            return DEFAULT_COORDS, False
+        place = gazetteer.resolve(str(location), state)
+        if place is None:
+            self.unresolved_locations += 1
+            return None, False
+        return (place.lat, place.lng), True
+    
+    def get_gazetteer(self):
+        """The gazetteer, loaded on first use, or None if none has been deployed.
+        
+        It is mapped from gazetteer_path, or copied once from S3 to /tmp and
+        mapped from there. A failed load is retried on the next request; a
+        missing gazetteer is looked for again once the object cache's TTL
+        has passed, so one deployed later is picked up by warm containers.
+        """
+        if self._gazetteer is None and self._gazetteer_due():
+            with self._gazetteer_lock:
+                if self._gazetteer is None and self._gazetteer_due():
+                    self._gazetteer = load_gazetteer(self.s3, self.bucket, GAZETTEER_KEY, path=self.gazetteer_path)
+                    self._gazetteer_checked_at = self.cache.clock()
+        return self._gazetteer
+    
+    def _gazetteer_due(self):
+        checked_at = self._gazetteer_checked_at
+        return checked_at is None or self.cache.clock() - checked_at >= self.cache.ttl_seconds
+    
+    @staticmethod
+    def _mandi_entry(mandi, distance, latest):
+        return {
+            'name': mandi['name'],
+            'distance': round(distance, 1),
+            'price': latest.price if latest else None,
+            'priceComparison': latest.comparison() if latest else 'No recent price',
+            'demand': latest.demand if latest else 'Unknown',
+            'coordinates': {
+                'lat': mandi['latitude'],
+                'lng': mandi['longitude']
+            }
+        }
     
     def _get_mock_mandis(self):
         """Generate mock mandi data for testing"""
+        self.mock_fallbacks += 1
         return [
             {
                 'name': 'Akola APMC',
@@ -0,0 +1,119 @@
+import heapq
+import json
+import math
+
+import numpy as np
+
+EARTH_RADIUS_KM = 6371.0088
+# Haversine on a sphere differs from the WGS-84 geodesic by well under 0.6%
+HAVERSINE_MARGIN = 1.006
+CELL_DEGREES = 0.5
+WEEKDAYS = ['monday', 'tuesday', 'wednesday', 'thursday', 'friday', 'saturday', 'sunday']
+EVERY_DAY = 0x7F
+
+class MandiIndex:
+    """Prebuilt lookup over one state's mandi metadata.
+    
+    Holds a crop -> mandi inverted index and a fixed-size lat/lng grid so a
+    query only touches mandis in nearby cells that trade the crop. Those are
+    prefiltered with vectorized haversine, the survivors get an exact
+    geodesic distance and a heap keeps the closest k.
+    """
+    
+    def __init__(self, mandi_data):
+        self.mandis = mandi_data.get('mandis', [])
+        self.lat = np.array([m['latitude'] for m in self.mandis], dtype=np.float64)
+        self.lng = np.array([m['longitude'] for m in self.mandis], dtype=np.float64)
+        self._lat_rad = np.radians(self.lat)
+        self._lng_rad = np.radians(self.lng)
+        self.codes = np.array([m.get('code', '') for m in self.mandis], dtype=str)
+        # One bit per weekday, Monday first; a mandi without a schedule trades daily
+        self.trading_days = np.array([
+            sum(1 << WEEKDAYS.index(day.lower()) for day in m.get('operating_days', []) if day.lower() in WEEKDAYS)
+            or EVERY_DAY
+            for m in self.mandis
+        ], dtype=np.uint8)
+        
+        count = len(self.mandis)
+        self.crops = {}
+        for i, mandi in enumerate(self.mandis):
+            for crop in mandi.get('crops_traded', []):
+                self.crops.setdefault(crop.lower(), np.zeros(count, dtype=bool))[i] = True
+        
+        self.cells = {}
+        rows = np.floor(self.lat / CELL_DEGREES).astype(np.int64)
+        cols = np.floor(self.lng / CELL_DEGREES).astype(np.int64)
+        for i, cell in enumerate(zip(rows.tolist(), cols.tolist())):
+            self.cells.setdefault(cell, []).append(i)
+        self.cells = {cell: np.array(members, dtype=np.int64) for cell, members in self.cells.items()}
+    
+    @classmethod
+    def from_json(cls, body):
+        """Parse a mandi-metadata object; the index is rebuilt only when the object changes"""
+        return cls(json.loads(body.decode('utf-8')))
+    
+    def __len__(self):
+        return len(self.mandis)
+    
+    def candidates(self, crop, coords, radius_km):
+        """Indices of mandis trading `crop` in grid cells that overlap the radius"""
+        trades = self.crops.get(crop.lower())
+        if trades is None:
+            return np.empty(0, dtype=np.int64)
+        
+        lat, lng = coords
+        lat_span = radius_km / 110.574
+        lng_span = radius_km / max(111.320 * math.cos(math.radians(min(abs(lat) + lat_span, 89.0))), 1e-6)
+        row_range = range(math.floor((lat - lat_span) / CELL_DEGREES), math.floor((lat + lat_span) / CELL_DEGREES) + 1)
+        col_range = range(math.floor((lng - lng_span) / CELL_DEGREES), math.floor((lng + lng_span) / CELL_DEGREES) + 1)
+        
+        if len(row_range) * len(col_range) >= len(self.cells):
+            members = [indices for indices in self.cells.values()]
+        else:
+            members = [self.cells[cell] for cell in ((r, c) for r in row_range for c in col_range) if cell in self.cells]
+        if not members:
+            return np.empty(0, dtype=np.int64)
+        
+        indices = np.concatenate(members)
+        return indices[trades[indices]]
+    
+    def haversine_km(self, coords, indices):
+        lat = math.radians(coords[0])
+        lng = math.radians(coords[1])
+        dlat = self._lat_rad[indices] - lat
+        dlng = self._lng_rad[indices] - lng
+        a = np.sin(dlat / 2) ** 2 + math.cos(lat) * np.cos(self._lat_rad[indices]) * np.sin(dlng / 2) ** 2
+        return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+    
+    def within(self, crop, coords, radius_km):
+        """Indices and haversine distances of mandis trading `crop` within radius_km"""
+        indices = self.candidates(crop, coords, radius_km)
+        distances = self.haversine_km(coords, indices)
+        keep = distances <= radius_km
+        return indices[keep], distances[keep]
+    
+    def days_to_trading(self, indices, weekday):
+        """Days from `weekday` (Monday is 0) until each mandi next trades, 0 if it trades that day"""
+        shifts = (weekday + np.arange(7)) % 7
+        trades = (self.trading_days[indices, None] >> shifts) & 1
+        return np.argmax(trades, axis=1)
+    
+    def nearest(self, crop, coords, radius_km=100, k=10):
+        """Closest k mandis trading `crop` within radius_km as (distance_km, mandi) pairs"""
+        indices = self.candidates(crop, coords, radius_km)
+        if len(indices) == 0:
+            return []
+        
+        # geopy is only needed once a query has candidates
+        from geopy.distance import geodesic
+        
+        approx = self.haversine_km(coords, indices)
+        indices = indices[approx <= radius_km * HAVERSINE_MARGIN]
+        
+        exact = []
+        for i in indices.tolist():
+            distance = geodesic(coords, (self.lat[i], self.lng[i])).km
+            if distance <= radius_km:
+                exact.append((distance, i))
+        
+        return [(distance, self.mandis[i]) for distance, i in heapq.nsmallest(k, exact)]
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+class _Entry:
+    __slots__ = ('value', 'etag', 'size', 'checked_at', 'error')
+    
+    def __init__(self, value, etag, size, checked_at, error=None):
+        self.value = value
+        self.etag = etag
+        self.size = size
+        self.checked_at = checked_at
+        self.error = error
+
+class ObjectCache:
+    """Bounded in-process cache of parsed S3 objects.
+    
+    Entries are evicted least-recently-used once the raw object bytes exceed
+    max_bytes. Within ttl_seconds an entry is served without touching S3;
+    after that it is revalidated with a conditional GET on its ETag, so an
+    unchanged object costs one round trip and no transfer or parse.
+    Missing objects are remembered for the TTL as well, so optional keys
+    do not cost a request every time. Concurrent misses for the same key
+    share one fetch and parse.
+    """
+    
+    def __init__(self, s3_client, max_bytes=64 * 1024 * 1024, ttl_seconds=300, clock=time.monotonic, tracer=None):
+        self.s3 = s3_client
+        self.tracer = tracer
+        self.max_bytes = max_bytes
+        self.ttl_seconds = ttl_seconds
+        self.clock = clock
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._loading = {}
+        self.hits = 0
+        self.misses = 0
+        self.revalidations = 0
+        self.evictions = 0
+        self.coalesced = 0
+    
+    def get(self, bucket, key, parse):
+        """Return parse(body) for an S3 object, reusing the cached value while unchanged"""
+        cache_key = (bucket, key, _parser_name(parse))
+        now = self.clock()
+        
+        with self._lock:
+            entry = self._entries.get(cache_key)
+            if entry is not None and now - entry.checked_at < self.ttl_seconds:
+                self._entries.move_to_end(cache_key)
+                self.hits += 1
+                if entry.error is not None:
+                    raise entry.error
+                return entry.value
+            loading = self._loading.get(cache_key)
+            leader = loading is None
+            if leader:
+                loading = self._loading[cache_key] = Future()
+            else:
+                self.coalesced += 1
+        
+        if not leader:
+            return loading.result()
+        try:
+            value = self._load(cache_key, bucket, key, parse, entry, now)
+        except Exception as e:
+            loading.set_exception(e)
+            raise
+        else:
+            loading.set_result(value)
+            return value
+        finally:
+            with self._lock:
+                del self._loading[cache_key]
+    
+    def _load(self, cache_key, bucket, key, parse, entry, now):
+        request = {'Bucket': bucket, 'Key': key}
+        if entry is not None and entry.etag and entry.error is None:
+            request['IfNoneMatch'] = entry.etag
+        
+        try:
+            response = self.s3.get_object(**request)
+        except Exception as e:
+            if is_missing(e):
+                self._store(cache_key, _Entry(None, None, 0, now, error=e))
+                raise
+            if entry is None or entry.error is not None or not is_not_modified(e):
+                raise
+            with self._lock:
+                entry.checked_at = now
+                if cache_key in self._entries:
+                    self._entries.move_to_end(cache_key)
+                self.hits += 1
+                self.revalidations += 1
+            return entry.value
+        
+        body = response['Body'].read()
+        if self.tracer is not None:
+            with self.tracer.span('s3.parse'):
+                value = parse(body)
+        else:
+            value = parse(body)
+        self._store(cache_key, _Entry(value, response.get('ETag'), len(body), now))
+        return value
+    
+    def invalidate(self, bucket, key):
+        """Drop every cached parse of an object"""
+        with self._lock:
+            for cache_key in [k for k in self._entries if k[0] == bucket and k[1] == key]:
+                self._bytes -= self._entries.pop(cache_key).size
+    
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self):
+        """Hit/miss counters and current occupancy"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'revalidations': self.revalidations,
+                'evictions': self.evictions,
+                'coalesced': self.coalesced,
+                'entries': len(self._entries),
+                'bytes': self._bytes,
+                'hit_ratio': self.hits / lookups if lookups else 0.0
+            }
+    
+    def _store(self, cache_key, entry):
+        with self._lock:
+            self.misses += 1
+            previous = self._entries.pop(cache_key, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            
+            if entry.size > self.max_bytes:
+                return
+            
+            self._entries[cache_key] = entry
+            self._bytes += entry.size
+            while self._bytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._bytes -= evicted.size
+                self.evictions += 1
+
+def _parser_name(parse):
+    return f"{getattr(parse, '__module__', '')}.{getattr(parse, '__qualname__', repr(parse))}"
+
+def is_missing(error):
+    """True for the NoSuchKey error botocore raises for an absent object"""
+    response = getattr(error, 'response', None) or {}
+    return str(response.get('Error', {}).get('Code', '')) in ('NoSuchKey', '404')
+
+def is_not_modified(error):
+    """True for the 304 botocore raises when IfNoneMatch matches"""
+    response = getattr(error, 'response', None) or {}
+    code = str(response.get('Error', {}).get('Code', ''))
+    status = response.get('ResponseMetadata', {}).get('HTTPStatusCode')
+    return code in ('304', 'NotModified') or status == 304
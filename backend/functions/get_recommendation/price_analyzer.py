@@ -1,42 +1,162 @@
 import json
-import pandas as pd
+import os
+import numpy as np
 from datetime import datetime, timedelta
-from io import StringIO
+from object_cache import ObjectCache, is_missing
+from price_partitions import MANIFEST, PartitionedPriceStore, open_partitions
+from price_store import PriceStore, PriceWindow, concat_windows, parse_price_csv, to_day, window_from_records
+from seasonal_model import MODELS_NAME, SeasonalModels
 
 class PriceAnalyzer:
-    def __init__(self, s3_client, bucket_name):
+    def __init__(self, s3_client, bucket_name, cache=None, store_dir=None, executor=None):
         self.s3 = s3_client
         self.bucket = bucket_name
+        self.cache = cache or ObjectCache(s3_client)
+        self.store_dir = store_dir
+        # Loads the segments of a partitioned store in parallel
+        self.executor = executor
+        self._mapped_stores = {}
+        self.mock_fallbacks = 0
+        self.missing_forecasts = 0
+    
+    def stats(self):
+        return {'mock_fallbacks': self.mock_fallbacks, 'missing_forecasts': self.missing_forecasts}
     
     def get_historical_prices(self, state, crop):
         """Fetch historical price data from S3"""
         try:
-            year = datetime.now().year
-            key = f"historical-prices/{state}/{crop}_{year}.csv"
-            
-            response = self.s3.get_object(Bucket=self.bucket, Key=key)
-            csv_data = response['Body'].read().decode('utf-8')
+            store = self.get_price_store(state, crop)
+            if store is not None:
+                # Last 12 months as array views into the store
+                return store.last_days(365)
             
-            df = pd.read_csv(StringIO(csv_data))
-            df['date'] = pd.to_datetime(df['date'])
+            cutoff = datetime.now() - timedelta(days=365)
+            # Early in the year most of the window is in last year's file
+            windows = [
+                self._yearly_prices(state, crop, year, required=year == datetime.now().year)
+                for year in range(cutoff.year, datetime.now().year + 1)
+            ]
+            # CSVs are newest first; put the rows in store order so both
+            # backends agree on the current price and the trailing averages
+            window = concat_windows([window for window in windows if window is not None], dedupe=True)
             
-            # Return last 12 months
-            cutoff_date = datetime.now() - timedelta(days=365)
-            df = df[df['date'] >= cutoff_date]
-            
-            return df.to_dict('records')
+            # Return last 12 months: dates on or after the cutoff instant
+            first_day = to_day(cutoff) + (cutoff.time() != datetime.min.time())
+            return window[window.day >= first_day]
         except Exception as e:
             print(f"Error fetching price data: {e}")
             return self._get_mock_data(crop)
     
-    def analyze_trends(self, price_data):
-        """Analyze price trends and calculate statistics"""
-        df = pd.DataFrame(price_data)
+    def _yearly_prices(self, state, crop, year, required=True):
+        try:
+            return self.cache.get(self.bucket, f"historical-prices/{state}/{crop}_{year}.csv", self._parse_price_csv)
+        except Exception as e:
+            if required or not is_missing(e):
+                raise
+            return None
+    
+    def get_price_store(self, state, crop):
+        """Columnar price store for a state and crop, or None if it has not been built.
         
-        if 'modal_price' not in df.columns:
-            df['modal_price'] = df['price']
+        Time partitions are preferred to a single store file once ingestion has written a manifest.
+        """
+        partitions = self.get_partitioned_store(state, crop)
+        if partitions is not None:
+            return partitions
+        
+        if self.store_dir:
+            path = os.path.join(self.store_dir, state, f"{crop}.bin")
+            if not os.path.exists(path):
+                return None
+            mtime = os.stat(path).st_mtime_ns
+            mapped = self._mapped_stores.get(path)
+            if mapped is None or mapped[0] != mtime:
+                mapped = (mtime, PriceStore.open(path))
+                self._mapped_stores[path] = mapped
+            return mapped[1]
+        
+        key = f"price-store/{state}/{crop}.bin"
+        try:
+            return self.cache.get(self.bucket, key, PriceStore.from_bytes)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+    
+    def get_partitioned_store(self, state, crop):
+        """Time-partitioned price store for a state and crop, or None without a manifest"""
+        if self.store_dir:
+            directory = os.path.join(self.store_dir, state, crop)
+            path = os.path.join(directory, MANIFEST)
+            if not os.path.exists(path):
+                return None
+            mtime = os.stat(path).st_mtime_ns
+            mapped = self._mapped_stores.get(path)
+            if mapped is None or mapped[0] != mtime:
+                mapped = (mtime, open_partitions(directory, self.executor))
+                self._mapped_stores[path] = mapped
+            return mapped[1]
+        
+        try:
+            return self.cache.get(self.bucket, f"price-store/{state}/{crop}/{MANIFEST}", self._parse_manifest)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+    
+    def _parse_manifest(self, body):
+        manifest = json.loads(body.decode('utf-8'))
+        prefix = f"price-store/{manifest['state']}/{manifest['crop']}"
+        return PartitionedPriceStore(
+            manifest,
+            lambda segment: self.cache.get(self.bucket, f"{prefix}/{segment['name']}", PriceStore.from_bytes),
+            self.executor
+        )
+    
+    def forecast(self, state, crop, today=None):
+        """Seasonal price band 2-4 weeks out for a state and crop, or None without a usable model"""
+        try:
+            models = self.get_seasonal_models(state)
+            band = models.forecast(crop, today=today) if models is not None else None
+        except Exception as e:
+            print(f"Error forecasting {state}/{crop}: {e}")
+            band = None
+        if band is None:
+            self.missing_forecasts += 1
+        return band
+    
+    def get_seasonal_models(self, state):
+        """Fitted seasonal models for a state, or None if they have not been built"""
+        if self.store_dir:
+            path = os.path.join(self.store_dir, state, MODELS_NAME)
+            if not os.path.exists(path):
+                return None
+            mtime = os.stat(path).st_mtime_ns
+            mapped = self._mapped_stores.get(path)
+            if mapped is None or mapped[0] != mtime:
+                mapped = (mtime, SeasonalModels.open(path))
+                self._mapped_stores[path] = mapped
+            return mapped[1]
         
-        prices = df['modal_price'].values
+        try:
+            return self.cache.get(self.bucket, f"price-store/{state}/{MODELS_NAME}", SeasonalModels.from_bytes)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+    
+    @staticmethod
+    def _parse_price_csv(body):
+        """Parse a price CSV object; the result is shared across requests"""
+        return parse_price_csv(body.decode('utf-8'))
+    
+    def analyze_trends(self, price_data):
+        """Analyze price trends and calculate statistics"""
+        if isinstance(price_data, PriceWindow):
+            prices = price_data.modal_price.astype(np.float64)
+        else:
+            field = 'modal_price' if price_data and 'modal_price' in price_data[0] else 'price'
+            prices = np.array([record[field] for record in price_data])
         
         # Calculate statistics
         current_price = prices[-1] if len(prices) > 0 else 0
@@ -50,7 +170,7 @@ class PriceAnalyzer:
             avg_4week = float(prices[-28:].mean())
         else:
             avg_4week = avg_price
-            
+        
         if len(prices) >= 84:
             avg_12week = float(prices[-84:].mean())
         else:
@@ -75,7 +195,111 @@ class PriceAnalyzer:
             'price_percentile': float(price_percentile)
         }
     
-    def _detect_trend(self, avg_4week, avg_12week):
+    def analyze_trends_by_mandi(self, price_data):
+        """Analyze every mandi in one vectorized pass plus a volume-weighted state aggregate
+        
+        Windows are calendar based: the 4-week and 12-week averages cover the
+        28 and 84 days up to each mandi's latest arrival, and fall back to the
+        overall mean when a mandi has less history than the window.
+        """
+        window = price_data if isinstance(price_data, PriceWindow) else window_from_records(price_data)
+        if len(window) == 0:
+            raise ValueError('No price rows to analyze')
+        
+        # Sort once by mandi then day so every group is a contiguous run
+        order = np.lexsort((window.day, window.mandi))
+        mandi = np.asarray(window.mandi)[order]
+        day = np.asarray(window.day, dtype=np.int64)[order]
+        prices = np.asarray(window.modal_price, dtype=np.float64)[order]
+        volume = np.asarray(window.volume, dtype=np.float64)[order]
+        
+        starts = np.flatnonzero(np.r_[True, mandi[1:] != mandi[:-1]])
+        ends = np.r_[starts[1:], len(mandi)]
+        counts = ends - starts
+        group = np.repeat(np.arange(len(starts)), counts)
+        groups = len(starts)
+        
+        current_price = prices[ends - 1]
+        last_day = day[ends - 1]
+        span = last_day - day[starts] + 1
+        min_price = np.minimum.reduceat(prices, starts)
+        max_price = np.maximum.reduceat(prices, starts)
+        avg_price = np.add.reduceat(prices, starts) / counts
+        std_price = np.sqrt(np.add.reduceat((prices - avg_price[group]) ** 2, starts) / counts)
+        
+        age = last_day[group] - day
+        in_4week = age < 28
+        in_12week = age < 84
+        avg_4week = np.where(
+            span >= 28,
+            np.bincount(group, prices * in_4week, groups) / np.maximum(np.bincount(group, in_4week, groups), 1),
+            avg_price
+        )
+        avg_12week = np.where(
+            span >= 84,
+            np.bincount(group, prices * in_12week, groups) / np.maximum(np.bincount(group, in_12week, groups), 1),
+            avg_price
+        )
+        trend_direction, trend_strength = self._detect_trends(avg_4week, avg_12week)
+        price_percentile = np.bincount(group, prices < current_price[group], groups) / counts * 100
+        
+        codes = window.mandi_codes
+        mandis = {
+            'mandi_code': [codes[i] if i < len(codes) else '' for i in mandi[starts]],
+            'rows': counts,
+            'latest_day': last_day,
+            'latest_volume': volume[ends - 1],
+            'total_volume': np.add.reduceat(volume, starts),
+            'current_price': current_price,
+            'min_price': min_price,
+            'max_price': max_price,
+            'avg_price': avg_price,
+            'std_price': std_price,
+            'avg_4week': avg_4week,
+            'avg_12week': avg_12week,
+            'trend_direction': trend_direction,
+            'trend_strength': trend_strength,
+            'price_percentile': price_percentile
+        }
+        
+        return {
+            'mandis': mandis,
+            'state': self._aggregate_state(day, prices, volume, mandis)
+        }
+    
+    def _aggregate_state(self, day, prices, volume, mandis):
+        """Volume-weighted state analysis in the analyze_trends format"""
+        weights = volume if volume.sum() > 0 else np.ones_like(volume)
+        latest_weights = mandis['latest_volume'] if mandis['latest_volume'].sum() > 0 else np.ones_like(mandis['latest_volume'])
+        
+        current_price = np.average(mandis['current_price'], weights=latest_weights)
+        avg_price = np.average(prices, weights=weights)
+        std_price = np.sqrt(np.average((prices - avg_price) ** 2, weights=weights))
+        
+        age = day.max() - day
+        span = day.max() - day.min() + 1
+        in_4week = weights * (age < 28)
+        in_12week = weights * (age < 84)
+        avg_4week = np.average(prices, weights=in_4week) if span >= 28 else avg_price
+        avg_12week = np.average(prices, weights=in_12week) if span >= 84 else avg_price
+        trend_direction, trend_strength = self._detect_trend(avg_4week, avg_12week)
+        price_percentile = weights[prices < current_price].sum() / weights.sum() * 100
+        
+        return {
+            'current_price': float(current_price),
+            'min_price': int(prices.min()),
+            'max_price': int(prices.max()),
+            'avg_price': int(avg_price),
+            'std_price': float(std_price),
+            'avg_4week': float(avg_4week),
+            'avg_12week': float(avg_12week),
+            'trend_direction': trend_direction,
+            'trend_strength': trend_strength,
+            'price_percentile': float(price_percentile)
+        }
+    
+    @staticmethod
+    def _detect_trend(avg_4week, avg_12week):
         """Detect price trend direction and strength"""
         change_pct = ((avg_4week - avg_12week) / avg_12week) * 100
         
@@ -95,9 +319,19 @@ class PriceAnalyzer:
         
         return direction, strength
     
+    @staticmethod
+    def _detect_trends(avg_4week, avg_12week):
+        """Vectorized _detect_trend over arrays of averages"""
+        change_pct = (avg_4week - avg_12week) / avg_12week * 100
+        direction = np.select([change_pct > 5, change_pct < -5], ['Rising', 'Falling'], 'Stable')
+        strength = np.select([np.abs(change_pct) > 10, np.abs(change_pct) > 5], ['Strong', 'Moderate'], 'Weak')
+        return direction, strength
+    
     def _get_mock_data(self, crop):
         """Generate mock price data for testing"""
-        dates = pd.date_range(end=datetime.now(), periods=365, freq='D')
+        self.mock_fallbacks += 1
+        end = datetime.now()
+        dates = [end - timedelta(days=364 - i) for i in range(365)]
         base_price = 6000
         
         data = []
@@ -0,0 +1,266 @@
+import json
+import os
+from datetime import datetime
+
+import numpy as np
+
+from price_quality import CONTEXT_DAYS, clean_window
+from price_store import MAGIC, PriceStore, concat_windows, empty_window, encode_store, from_day, to_day
+
+# A crop's prices as time partitions under price-store/{state}/{crop}/:
+#   manifest.json               segment list, the only object rewritten in place
+#   delta/{last date}.{seq}.bin one per ingest, holding just the new rows
+#   month/{YYYY-MM}.{seq}.bin   deltas folded in by compaction
+#   year/{YYYY}.{seq}.bin       months of completed years
+# Segments are price stores and never change once written; a higher seq
+# wins where two segments hold the same (day, mandi) row.
+MANIFEST = 'manifest.json'
+
+class PartitionedPriceStore:
+    """Read-only view over a crop's time partitions with the PriceStore reading API.
+    
+    A window loads only the segments that overlap it, in parallel on the
+    executor when there is more than one, and merges them in day order.
+    """
+    
+    def __init__(self, manifest, load_segment, executor=None):
+        self.state = manifest['state']
+        self.crop = manifest['crop']
+        self.segments = sorted(manifest['segments'], key=lambda segment: segment['seq'])
+        self.rows = sum(segment['rows'] for segment in self.segments)
+        self.first_day = min((segment['first_day'] for segment in self.segments), default=0)
+        self.last_day = max((segment['last_day'] for segment in self.segments), default=-1)
+        self.load_segment = load_segment
+        self.executor = executor
+    
+    def overlapping(self, start_day=None, end_day=None):
+        """Segments holding any day from start_day to end_day, oldest write first"""
+        return [
+            segment for segment in self.segments
+            if (start_day is None or segment['last_day'] >= start_day)
+            and (end_day is None or segment['first_day'] <= end_day)
+        ]
+    
+    def window(self, start_day=None, end_day=None):
+        """Rows with start_day <= day <= end_day, sorted by day then mandi"""
+        segments = self.overlapping(start_day, end_day)
+        if not segments:
+            return empty_window()
+        if self.executor is not None and len(segments) > 1:
+            stores = list(self.executor.map(self.load_segment, segments))
+        else:
+            stores = [self.load_segment(segment) for segment in segments]
+        return concat_windows([store.window(start_day, end_day) for store in stores], dedupe=True)
+    
+    def last_days(self, days=365, today=None):
+        """Rows from the trailing `days` days, counting today"""
+        return self.window(to_day(today or datetime.now()) - days + 1)
+
+def open_partitions(directory, executor=None):
+    """Partitioned store for a local {state}/{crop} directory, mapping each segment on first use"""
+    with open(os.path.join(directory, MANIFEST), 'rb') as f:
+        manifest = json.loads(f.read().decode('utf-8'))
+    # Segments never change, so each is mapped once per manifest
+    segments = {}
+    
+    def open_segment(segment):
+        if segment['name'] not in segments:
+            segments[segment['name']] = PriceStore.open(os.path.join(directory, *segment['name'].split('/')))
+        return segments[segment['name']]
+    
+    return PartitionedPriceStore(manifest, open_segment, executor)
+
+def crop_paths(state_dir):
+    """{crop: path} for a local state directory, taking a crop's partitions over its {crop}.bin.
+    
+    Other .bin files, such as the seasonal models, are told apart by their magic.
+    """
+    paths = {}
+    for name in sorted(os.listdir(state_dir)):
+        path = os.path.join(state_dir, name)
+        if name.endswith('.bin'):
+            with open(path, 'rb') as f:
+                if f.read(len(MAGIC)) != MAGIC:
+                    continue
+            paths.setdefault(name[:-len('.bin')], path)
+        elif os.path.isfile(os.path.join(path, MANIFEST)):
+            paths[name] = path
+    return paths
+
+def open_local(path, executor=None):
+    """The store at a path from crop_paths"""
+    return open_partitions(path, executor) if os.path.isdir(path) else PriceStore.open(path)
+
+class DirectoryStorage:
+    """Partition objects as files under a local price-store directory"""
+    
+    def __init__(self, root):
+        self.root = root
+    
+    def path(self, key):
+        return os.path.join(self.root, *key.split('/'))
+    
+    def read(self, key):
+        try:
+            with open(self.path(key), 'rb') as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+    
+    def write(self, key, data):
+        path = self.path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Write then rename so a reader never sees a partial object
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+    
+    def delete(self, key):
+        try:
+            os.remove(self.path(key))
+        except FileNotFoundError:
+            pass
+
+class S3Storage:
+    """Partition objects under a key prefix in S3"""
+    
+    def __init__(self, s3_client, bucket, prefix='price-store'):
+        self.s3 = s3_client
+        self.bucket = bucket
+        self.prefix = prefix
+    
+    def read(self, key):
+        from object_cache import is_missing
+        try:
+            return self.s3.get_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")['Body'].read()
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+    
+    def write(self, key, data):
+        self.s3.put_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}", Body=data)
+    
+    def delete(self, key):
+        self.s3.delete_object(Bucket=self.bucket, Key=f"{self.prefix}/{key}")
+
+def read_manifest(storage, state, crop):
+    """The crop's manifest, or an empty one if nothing has been ingested"""
+    data = storage.read(f"{state}/{crop}/{MANIFEST}")
+    if data is None:
+        return {'state': state, 'crop': crop, 'seq': 0, 'segments': [], 'retired': []}
+    return json.loads(data.decode('utf-8'))
+
+def ingest(storage, state, crop, window, clean=True):
+    """Append new rows as a delta segment; costs the new rows plus a manifest rewrite.
+    
+    Rows for days that are already stored replace them on read. The
+    manifest is read and rewritten, so run one writer per crop at a time.
+    With clean the rows go through price_quality.clean_window against the
+    crop's CONTEXT_DAYS before them, and the delta stores their flags.
+    """
+    if not len(window):
+        return None
+    manifest = read_manifest(storage, state, crop)
+    if clean:
+        first_day = int(np.min(window.day))
+        stored = PartitionedPriceStore(
+            manifest, lambda segment: PriceStore.from_bytes(storage.read(f"{state}/{crop}/{segment['name']}"))
+        )
+        window, _ = clean_window(window, stored.window(first_day - CONTEXT_DAYS, first_day - 1))
+        if not len(window):
+            return None
+    manifest['seq'] += 1
+    data = encode_store(window, state, crop)
+    store = PriceStore.from_bytes(data)
+    segment = _segment(f"delta/{from_day(store.last_day).isoformat()}.{manifest['seq']}.bin", 'delta', store,
+                       manifest['seq'])
+    storage.write(f"{state}/{crop}/{segment['name']}", data)
+    manifest['segments'].append(segment)
+    _write_manifest(storage, manifest)
+    return segment
+
+def compact(storage, state, crop, today=None):
+    """Fold deltas into month segments and the months of completed years into year segments.
+    
+    A run rewrites each month that received deltas and any year that has
+    month segments and has ended, so a 365-day window spans at most one
+    year segment, twelve months and the deltas ingested since. Replaced
+    segments leave the manifest at once and are deleted by the next run,
+    after readers holding the old manifest have moved on.
+    """
+    manifest = read_manifest(storage, state, crop)
+    current_year = from_day(to_day(today or datetime.now())).year
+    segments = manifest['segments']
+    stores = {}
+    
+    def load(segment):
+        if segment['name'] not in stores:
+            stores[segment['name']] = PriceStore.from_bytes(storage.read(f"{state}/{crop}/{segment['name']}"))
+        return stores[segment['name']]
+    
+    def merge(sources, level, period, first_day, last_day):
+        sources = sorted(sources, key=lambda segment: segment['seq'])
+        window = concat_windows([load(segment).window(first_day, last_day) for segment in sources], dedupe=True)
+        manifest['seq'] += 1
+        data = encode_store(window, state, crop)
+        segment = _segment(f"{level}/{period}.{manifest['seq']}.bin", level, PriceStore.from_bytes(data), manifest['seq'])
+        storage.write(f"{state}/{crop}/{segment['name']}", data)
+        return segment
+    
+    retired = []
+    deltas = [segment for segment in segments if segment['level'] == 'delta']
+    months = sorted({month for delta in deltas for month in _months(load(delta).window().day)})
+    for month in months:
+        first_day, last_day = _month_range(month)
+        sources = [
+            segment for segment in segments
+            if segment['level'] in ('month', 'delta') and segment['first_day'] <= last_day
+            and segment['last_day'] >= first_day and (segment['level'] == 'delta' or segment['period'] == month)
+        ]
+        segments.append(merge(sources, 'month', month, first_day, last_day))
+        retired.extend(segment for segment in sources if segment['level'] == 'month')
+    retired.extend(deltas)
+    segments = [segment for segment in segments if segment not in retired]
+    
+    years = sorted({segment['period'][:4] for segment in segments if segment['level'] == 'month'
+                    and int(segment['period'][:4]) < current_year})
+    for year in years:
+        sources = [segment for segment in segments if segment['level'] in ('year', 'month')
+                   and segment['period'][:4] == year]
+        segments.append(merge(sources, 'year', year, to_day(f"{year}-01-01"), to_day(f"{year}-12-31")))
+        retired.extend(sources)
+        segments = [segment for segment in segments if segment not in sources]
+    
+    previous = manifest['retired']
+    manifest['segments'] = segments
+    manifest['retired'] = [segment['name'] for segment in retired]
+    _write_manifest(storage, manifest)
+    for name in previous:
+        storage.delete(f"{state}/{crop}/{name}")
+    return {'months': months, 'years': years, 'retired': len(retired), 'deleted': len(previous)}
+
+def _segment(name, level, store, seq):
+    segment = {
+        'name': name,
+        'level': level,
+        'seq': seq,
+        'rows': store.rows,
+        'first_day': store.first_day,
+        'last_day': store.last_day
+    }
+    if level != 'delta':
+        segment['period'] = name.split('/')[1].split('.')[0]
+    return segment
+
+def _write_manifest(storage, manifest):
+    storage.write(f"{manifest['state']}/{manifest['crop']}/{MANIFEST}",
+                  json.dumps(manifest, separators=(',', ':')).encode('utf-8'))
+
+def _months(days):
+    """'YYYY-MM' of every month with a row"""
+    return np.unique(np.asarray(days).astype('datetime64[D]').astype('datetime64[M]')).astype(str).tolist()
+
+def _month_range(month):
+    start = np.datetime64(month, 'M')
+    return int(start.astype('datetime64[D]').astype(np.int64)), int((start + 1).astype('datetime64[D]').astype(np.int64)) - 1
@@ -0,0 +1,170 @@
+import numpy as np
+
+from price_store import PriceWindow, concat_windows
+
+# Quality flags, one bit each in the 'quality' column of cleaned price stores
+RANGE = 1       # min and max did not bracket the modal price and were repaired
+OUTLIER = 2     # modal price far from the mandi's rolling median, replaced by the median
+DUPLICATE = 4   # the mandi reported the day more than once; the last report is kept
+GAP = 8         # the mandi's first report after more than GAP_DAYS without one
+FLAGS = {'range': RANGE, 'outlier': OUTLIER, 'duplicate': DUPLICATE, 'gap': GAP}
+
+# A modal price is an outlier when its log is more than THRESHOLD scaled
+# MADs, and more than MIN_DEVIATION, from the median of the mandi's
+# previous WINDOW reports. Both are in log price, so an extra zero and a
+# price quoted per kg stand out alike.
+WINDOW = 21
+MIN_HISTORY = 7            # fewer previous reports cannot judge a price
+THRESHOLD = 6
+MIN_DEVIATION = np.log(1.5)
+MAD_SCALE = 1.4826         # MAD to standard deviation for normal noise
+BOUND_RATIO = 2            # a min or max this far from the modal price is reset to it
+GAP_DAYS = 30
+CONTEXT_DAYS = 120         # stored history read to seed an ingest's rolling windows
+CHUNK_ROWS = 1 << 18       # rows scored at once; bounds the working set to ~50 MB
+
+def clean_window(window, history=None):
+    """Cleaned copy of a PriceWindow with quality flags, and its quality_report.
+    
+    history holds earlier cleaned rows, such as the tail of the store the
+    window is appended to. It seeds each mandi's rolling window and gap
+    check and is not returned. A row with no positive modal price is
+    dropped when the mandi has too little history to fill it from.
+    """
+    if not len(window):
+        return PriceWindow(*window.columns(), window.mandis, np.zeros(0, dtype=np.uint8)), {}
+    rows = len(window)
+    context_day, context_mandi, context_price = _context(history, window.mandi_codes)
+    day = np.concatenate([context_day, np.asarray(window.day, dtype=np.int64)])
+    mandi = np.concatenate([context_mandi, np.asarray(window.mandi, dtype=np.int64)])
+    price = np.concatenate([context_price, np.asarray(window.modal_price, dtype=np.float64)])
+    source = np.concatenate([np.full(len(context_day), -1), np.arange(rows)])
+    
+    # Each mandi's reports in day order, context first, then input order
+    order = np.lexsort((np.arange(len(day)), day, mandi))
+    day, mandi, price, source = day[order], mandi[order], price[order], source[order]
+    superseded = np.r_[(mandi[1:] == mandi[:-1]) & (day[1:] == day[:-1]) & (source[:-1] >= 0), False]
+    duplicate = np.r_[False, superseded[:-1]]
+    keep = ~superseded
+    day, mandi, price, source, duplicate = day[keep], mandi[keep], price[keep], source[keep], duplicate[keep]
+    
+    with np.errstate(divide='ignore', invalid='ignore'):
+        log_price = np.where(price > 0, np.log(price), np.nan)
+    first = np.r_[True, mandi[1:] != mandi[:-1]]
+    position = np.arange(len(day)) - np.maximum.accumulate(np.where(first, np.arange(len(day)), 0))
+    gap = ~first & (np.diff(day, prepend=day[0]) > GAP_DAYS)
+    
+    new = np.flatnonzero(source >= 0)
+    median = np.empty(len(new))
+    spread = np.empty(len(new))
+    history_count = np.empty(len(new), dtype=np.int64)
+    for start in range(0, len(new), CHUNK_ROWS):
+        part = slice(start, start + CHUNK_ROWS)
+        median[part], spread[part], history_count[part] = _rolling(log_price, position, new[part])
+    
+    source = source[new]
+    deviation = log_price[new] - median
+    judged = history_count >= MIN_HISTORY
+    # A missing or non-positive price is never within the limit
+    outlier = judged & ~(np.abs(deviation) <= np.maximum(THRESHOLD * MAD_SCALE * spread, MIN_DEVIATION))
+    kept = judged | np.isfinite(log_price[new])
+    
+    modal = np.asarray(window.modal_price, dtype=np.float64)[source]
+    low = np.asarray(window.min_price, dtype=np.float64)[source]
+    high = np.asarray(window.max_price, dtype=np.float64)[source]
+    filled = np.round(np.exp(median[outlier]))
+    # A row quoted in the wrong unit has its bounds off by the same factor
+    scale = np.ones(len(source))
+    rescale = (modal[outlier] > 0) & (low[outlier] <= modal[outlier]) & (modal[outlier] <= high[outlier])
+    scale[np.flatnonzero(outlier)[rescale]] = filled[rescale] / modal[outlier][rescale]
+    modal[outlier] = filled
+    low, high = np.round(low * scale), np.round(high * scale)
+    
+    swapped = low > high
+    low, high = np.minimum(low, high), np.maximum(low, high)
+    bad_low = ~((low <= modal) & (low * BOUND_RATIO >= modal))
+    bad_high = ~((high >= modal) & (high <= modal * BOUND_RATIO))
+    low = np.where(bad_low, modal, low)
+    high = np.where(bad_high, modal, high)
+    
+    quality = (
+        np.where(swapped | bad_low | bad_high, RANGE, 0) | np.where(outlier, OUTLIER, 0)
+        | np.where(duplicate[new], DUPLICATE, 0) | np.where(gap[new], GAP, 0)
+    ).astype(np.uint8)
+    if window.quality is not None:
+        quality |= np.asarray(window.quality)[source]
+    
+    dropped = np.bincount(np.asarray(window.mandi)[source[~kept]], minlength=len(window.mandis))
+    source = source[kept]
+    cleaned = PriceWindow(
+        np.asarray(window.day)[source], np.asarray(window.mandi)[source], low[kept].astype(np.float32),
+        high[kept].astype(np.float32), modal[kept].astype(np.float32), np.asarray(window.volume)[source],
+        window.mandis, quality[kept]
+    )
+    cleaned = cleaned[np.lexsort((cleaned.mandi, cleaned.day))]
+    return cleaned, quality_report(cleaned, dropped)
+
+def clean_windows(windows, history=None):
+    """clean_window over consecutive windows in day order, such as a store read a month at a time.
+    
+    Each window is cleaned against the last WINDOW cleaned rows of every
+    mandi before it, so memory stays bounded by the largest window however
+    many rows pass through. Yields (cleaned window, report) pairs.
+    """
+    for window in windows:
+        cleaned, report = clean_window(window, history)
+        history = tail(concat_windows([history, cleaned]) if history is not None else cleaned)
+        yield cleaned, report
+
+def quality_report(window, dropped=None):
+    """{mandi code: {flag name: rows}} for each mandi with a flagged row, plus 'dropped' rows if given"""
+    counts = {}
+    if window.quality is not None:
+        quality = np.asarray(window.quality)
+        mandi = np.asarray(window.mandi)
+        for name, bit in FLAGS.items():
+            counts[name] = np.bincount(mandi[(quality & bit) != 0], minlength=len(window.mandis))
+    if dropped is not None:
+        counts['dropped'] = dropped
+    report = {}
+    for name, per_mandi in counts.items():
+        for m in np.flatnonzero(per_mandi).tolist():
+            report.setdefault(window.mandis[m]['code'], {})[name] = int(per_mandi[m])
+    return report
+
+def tail(window, rows=WINDOW):
+    """The last `rows` rows of every mandi in a window"""
+    order = np.lexsort((np.asarray(window.day), np.asarray(window.mandi)))
+    mandi = np.asarray(window.mandi)[order]
+    last = np.r_[mandi[1:] != mandi[:-1], True]
+    # Rows from each mandi's last one, counting back
+    from_end = np.minimum.accumulate(np.where(last, np.arange(len(mandi)), len(mandi))[::-1])[::-1] - np.arange(len(mandi))
+    return window[np.sort(order[from_end < rows])]
+
+def _context(history, codes):
+    """(day, mandi, modal price) of history rows, with mandis indexed into codes and others left out"""
+    if history is None or not len(history):
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64), np.empty(0)
+    positions = {code: i for i, code in enumerate(codes)}
+    mapping = np.array([positions.get(code, -1) for code in history.mandi_codes], dtype=np.int64)
+    mandi = mapping[np.asarray(history.mandi)]
+    known = mandi >= 0
+    return (np.asarray(history.day, dtype=np.int64)[known], mandi[known],
+            np.asarray(history.modal_price, dtype=np.float64)[known])
+
+def _rolling(log_price, position, rows):
+    """Median and MAD of the previous WINDOW log prices of each row's mandi, and how many there were"""
+    lags = np.arange(1, WINDOW + 1)
+    values = log_price[np.maximum(rows[:, None] - lags, 0)].astype(np.float32)
+    values[lags > position[rows, None]] = np.nan
+    median, count = _median(values)
+    spread, _ = _median(np.abs(values - median[:, None]))
+    return median, spread, count
+
+def _median(values):
+    """Row medians ignoring NaN, and the count of values per row"""
+    values = np.sort(values, axis=1)  # NaN sorts last
+    count = np.count_nonzero(~np.isnan(values), axis=1)
+    lo = np.take_along_axis(values, (np.maximum(count, 1) - 1)[:, None] // 2, axis=1)[:, 0]
+    hi = np.take_along_axis(values, np.minimum(count // 2, values.shape[1] - 1)[:, None], axis=1)[:, 0]
+    return (lo.astype(np.float64) + hi) / 2, count
@@ -0,0 +1,313 @@
+import csv
+import json
+import mmap
+import struct
+from datetime import date, datetime, timedelta
+from io import StringIO
+
+import numpy as np
+
+# File layout (little endian):
+#   magic 'AGPS' | uint16 version | uint32 header length | JSON header
+#   int64 day index: row offset of every day from first_day to last_day + 1
+#   one contiguous array per column, each 8-byte aligned
+# Stores written from cleaned prices add a uint8 'quality' column of
+# price_quality flags after the others; readers that predate it skip it.
+MAGIC = b'AGPS'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGN = 8
+
+COLUMNS = [
+    ('day', np.int32),
+    ('mandi', np.uint16),
+    ('min_price', np.float32),
+    ('max_price', np.float32),
+    ('modal_price', np.float32),
+    ('volume', np.float32)
+]
+QUALITY = ('quality', np.uint8)
+
+EPOCH = date(1970, 1, 1)
+
+def to_day(value):
+    """Days since 1970-01-01 for a date, datetime or 'YYYY-MM-DD' string"""
+    if isinstance(value, str):
+        value = date.fromisoformat(value[:10])
+    if isinstance(value, datetime):
+        value = value.date()
+    return (value - EPOCH).days
+
+def from_day(day):
+    return EPOCH + timedelta(days=int(day))
+
+class PriceWindow:
+    """Columnar slice of price rows sorted by day then mandi.
+    
+    The arrays are read-only views into the store buffer when the window
+    comes from a PriceStore, so slicing a window never copies prices.
+    quality holds the price_quality flags of cleaned rows, or None for
+    rows that have not been through cleaning.
+    """
+    
+    def __init__(self, day, mandi, min_price, max_price, modal_price, volume, mandis, quality=None):
+        self.day = day
+        self.mandi = mandi
+        self.min_price = min_price
+        self.max_price = max_price
+        self.modal_price = modal_price
+        self.volume = volume
+        self.mandis = mandis
+        self.quality = quality
+    
+    def __len__(self):
+        return len(self.day)
+    
+    def __getitem__(self, index):
+        """Rows by slice (zero-copy) or by boolean mask / index array (copied)"""
+        if not isinstance(index, (slice, np.ndarray)):
+            raise TypeError('PriceWindow only supports slices and arrays')
+        return PriceWindow(*(column[index] for column in self.columns()), self.mandis,
+                           None if self.quality is None else self.quality[index])
+    
+    def columns(self):
+        return (self.day, self.mandi, self.min_price, self.max_price, self.modal_price, self.volume)
+    
+    @property
+    def mandi_codes(self):
+        return [m['code'] for m in self.mandis]
+    
+    def latest_rows(self):
+        """Index of each mandi's most recent row, ordered by mandi"""
+        if not len(self.day):
+            return np.empty(0, dtype=np.int64)
+        # Rows are sorted by day, so a mandi's last occurrence is its latest
+        _, first_from_end = np.unique(self.mandi[::-1], return_index=True)
+        return len(self.mandi) - 1 - first_from_end
+    
+    def to_records(self):
+        """Rows as dicts in the CSV layout, for JSON responses"""
+        dates = self.day.astype('datetime64[D]').astype(str)
+        records = []
+        for i in range(len(self.day)):
+            mandi = self.mandis[self.mandi[i]]
+            records.append({
+                'date': dates[i],
+                'mandi_name': mandi['name'],
+                'mandi_code': mandi['code'],
+                'variety': mandi.get('variety', ''),
+                'min_price': int(self.min_price[i]),
+                'max_price': int(self.max_price[i]),
+                'modal_price': int(self.modal_price[i]),
+                'volume_quintals': int(self.volume[i])
+            })
+        return records
+
+class PriceStore:
+    """Read-only view over an encoded price store for one state and crop"""
+    
+    def __init__(self, buffer):
+        magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a price store')
+        if version != VERSION:
+            raise ValueError(f"Unsupported price store version {version}")
+        
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+        self.buffer = buffer
+        self.state = header['state']
+        self.crop = header['crop']
+        self.rows = header['rows']
+        self.first_day = header['first_day']
+        self.last_day = header['last_day']
+        self.mandis = header['mandis']
+        
+        day_count = self.last_day - self.first_day + 2 if self.rows else 1
+        self.day_index = np.frombuffer(buffer, dtype='<i8', count=day_count, offset=header['day_index_offset'])
+        self._columns = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype).newbyteorder('<'),
+                                count=self.rows, offset=header['column_offsets'][name])
+            for name, dtype in COLUMNS
+        }
+        offsets = header['column_offsets']
+        self._quality = (
+            np.frombuffer(buffer, dtype=np.uint8, count=self.rows, offset=offsets[QUALITY[0]])
+            if QUALITY[0] in offsets else None
+        )
+    
+    @classmethod
+    def open(cls, path):
+        """Memory-map a store file; pages are read only for the rows a window touches"""
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(memoryview(data))
+    
+    def window(self, start_day=None, end_day=None):
+        """Rows with start_day <= day <= end_day, as zero-copy views"""
+        start, stop = self._row_range(start_day, end_day)
+        return PriceWindow(*(self._columns[name][start:stop] for name, _ in COLUMNS), self.mandis,
+                           None if self._quality is None else self._quality[start:stop])
+    
+    def last_days(self, days=365, today=None):
+        """Rows from the trailing `days` days, counting today"""
+        return self.window(to_day(today or datetime.now()) - days + 1)
+    
+    def _row_range(self, start_day, end_day):
+        if not self.rows:
+            return 0, 0
+        lo = self.first_day if start_day is None else max(start_day, self.first_day)
+        hi = self.last_day if end_day is None else min(end_day, self.last_day)
+        if lo > hi:
+            return 0, 0
+        return int(self.day_index[lo - self.first_day]), int(self.day_index[hi - self.first_day + 1])
+
+def encode_store(window, state, crop):
+    """Encode a PriceWindow into the store layout, with its quality flags if it has them"""
+    order = np.lexsort((window.mandi, window.day))
+    layout = COLUMNS + [QUALITY] if window.quality is not None else COLUMNS
+    columns = {
+        name: np.ascontiguousarray(np.asarray(column)[order], dtype=np.dtype(dtype).newbyteorder('<'))
+        for (name, dtype), column in zip(layout, window.columns() + (window.quality,))
+    }
+    days = columns['day']
+    rows = len(days)
+    first_day = int(days[0]) if rows else 0
+    last_day = int(days[-1]) if rows else -1
+    day_index = np.searchsorted(days, np.arange(first_day, last_day + 2), side='left').astype('<i8')
+    
+    header = {
+        'state': state,
+        'crop': crop,
+        'rows': rows,
+        'first_day': first_day,
+        'last_day': last_day,
+        'mandis': window.mandis
+    }
+    # Offsets depend on the header length, so grow the header until it fits
+    header['day_index_offset'] = 0
+    header['column_offsets'] = {name: 0 for name, _ in layout}
+    while True:
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        if header['day_index_offset'] >= PREAMBLE.size + len(header_bytes):
+            break
+        offset = _align(PREAMBLE.size + len(header_bytes) + 32)
+        header['day_index_offset'] = offset
+        offset = _align(offset + day_index.nbytes)
+        for name, _ in layout:
+            header['column_offsets'][name] = offset
+            offset = _align(offset + columns[name].nbytes)
+    
+    out = bytearray(offset)
+    out[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, VERSION, len(header_bytes))
+    out[PREAMBLE.size:PREAMBLE.size + len(header_bytes)] = header_bytes
+    _put(out, header['day_index_offset'], day_index)
+    for name, _ in layout:
+        _put(out, header['column_offsets'][name], columns[name])
+    return bytes(out)
+
+def parse_price_csv(text):
+    """Parse the data/sample-price-data.csv layout into a PriceWindow"""
+    reader = csv.reader(StringIO(text))
+    header = next(reader)
+    rows = [row for row in reader if row]
+    if not rows:
+        return empty_window()
+    
+    columns = dict(zip(header, zip(*rows)))
+    codes, mandi = np.unique(np.array(columns['mandi_code']), return_inverse=True)
+    first_row = {code: i for i, code in reversed(list(enumerate(columns['mandi_code'])))}
+    mandis = [
+        {
+            'code': str(code),
+            'name': columns['mandi_name'][first_row[code]],
+            'variety': columns.get('variety', [''] * len(rows))[first_row[code]]
+        }
+        for code in codes
+    ]
+    
+    def numeric(name):
+        return np.array(columns[name], dtype=np.float64).astype(np.float32)
+    
+    day = np.array([d[:10] for d in columns['date']], dtype='datetime64[D]').astype(np.int32)
+    return PriceWindow(day, mandi.astype(np.uint16), numeric('min_price'), numeric('max_price'),
+                       numeric('modal_price'), numeric('volume_quintals'), mandis)
+
+def window_from_records(records):
+    """Build a PriceWindow from row dicts such as the CSV records or mock data"""
+    codes = [str(r.get('mandi_code', '')) for r in records]
+    mandi_codes, mandi = np.unique(np.array(codes, dtype=object), return_inverse=True) if records else ([], [])
+    first = {}
+    for r, code in zip(records, codes):
+        first.setdefault(code, r)
+    mandis = [
+        {'code': code, 'name': first[code].get('mandi_name', ''), 'variety': first[code].get('variety', '')}
+        for code in mandi_codes
+    ]
+    
+    def numeric(*names):
+        return np.array([next((r[n] for n in names if n in r), 0) for r in records], dtype=np.float32)
+    
+    day = np.array([to_day(r['date']) for r in records], dtype=np.int32)
+    return PriceWindow(day, np.asarray(mandi, dtype=np.uint16), numeric('min_price', 'price'),
+                       numeric('max_price', 'price'), numeric('modal_price', 'price'),
+                       numeric('volume_quintals'), mandis)
+
+def empty_window():
+    empty = np.empty(0, dtype=np.float32)
+    return PriceWindow(np.empty(0, dtype=np.int32), np.empty(0, dtype=np.uint16), empty, empty, empty, empty, [])
+
+def concat_windows(windows, dedupe=False):
+    """One window holding the rows of several, with mandi indices remapped to a shared list.
+    
+    With dedupe the rows are put in day then mandi order, as a store holds
+    them, and where rows share a (day, mandi) the later one is kept. Quality
+    flags are kept when any window has them, as 0 for rows that had none.
+    """
+    windows = [window for window in windows if len(window)]
+    if not windows:
+        return empty_window()
+    if len(windows) == 1 and not dedupe:
+        return windows[0]
+    
+    mandis = []
+    positions = {}
+    remapped = []
+    for window in windows:
+        mapping = np.empty(len(window.mandis), dtype=np.uint16)
+        for i, mandi in enumerate(window.mandis):
+            if mandi['code'] not in positions:
+                positions[mandi['code']] = len(mandis)
+                mandis.append(mandi)
+            mapping[i] = positions[mandi['code']]
+        remapped.append(mapping[window.mandi])
+    
+    columns = [np.concatenate(parts) for parts in zip(*(window.columns() for window in windows))]
+    columns[1] = np.concatenate(remapped)
+    if any(window.quality is not None for window in windows):
+        columns.append(np.concatenate([
+            window.quality if window.quality is not None else np.zeros(len(window), dtype=np.uint8)
+            for window in windows
+        ]))
+    if dedupe:
+        key = columns[0].astype(np.int64) * 65536 + columns[1]
+        if not np.all(key[1:] > key[:-1]):
+            order = np.argsort(key, kind='stable')
+            key = key[order]
+            # Stable order keeps later windows last among equal keys
+            last = np.append(key[1:] != key[:-1], True)
+            columns = [column[order[last]] for column in columns]
+    return PriceWindow(*columns[:6], mandis, *columns[6:])
+
+def convert_csv(text, state, crop):
+    """Convert a price CSV into encoded store bytes"""
+    return encode_store(parse_price_csv(text), state, crop)
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
+
+def _put(out, offset, array):
+    data = array.tobytes()
+    out[offset:offset + len(data)] = data
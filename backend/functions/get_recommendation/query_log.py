@@ -0,0 +1,247 @@
+import json
+import random
+import sqlite3
+import threading
+import time
+from collections import deque
+
+BATCH_SIZE = 25  # DynamoDB batch_write_item limit
+FLUSH_GROUPS = 8
+TTL_SECONDS = 90 * 24 * 60 * 60
+
+def query_log_item(request, response, timestamp_ms):
+    """Query-log record; timestamp is in milliseconds so bursts keep distinct sort keys"""
+    return {
+        'userId': 'anonymous',
+        'timestamp': timestamp_ms,
+        'state': request['state'],
+        'crop': request['crop'],
+        'location': request['location'],
+        'quantity': request['quantity'],
+        'recommendation': response['recommendation'],
+        'confidence': response['confidence'],
+        'ttl': timestamp_ms // 1000 + TTL_SECONDS  # 90 days TTL
+    }
+
+class QueryLogWriter:
+    """Buffers query logs in memory and writes them from a background thread.
+    
+    log() only appends to the buffer. The writer thread flushes a full
+    batch as soon as one is buffered, whatever is left once the oldest
+    record has waited `flush_interval` seconds, and everything on close().
+    Lambda freezes the thread between invocations; it picks up where it
+    left off once the container thaws, never on a request's response path.
+    When the sink falls behind, the oldest
+    records beyond `max_buffer` are dropped rather than blocking requests.
+    """
+    
+    def __init__(self, sink, batch_size=BATCH_SIZE, flush_interval=1.0, max_buffer=10000, clock=time.time):
+        self.sink = sink
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_buffer = max_buffer
+        self.clock = clock
+        self._buffer = deque()
+        self._oldest = None
+        self._last_timestamp = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self.logged = 0
+        self.written = 0
+        self.failed = 0
+        self.dropped = 0
+        self._thread = threading.Thread(target=self._run, name='query-log', daemon=True)
+        self._thread.start()
+    
+    def log(self, request, response):
+        with self._condition:
+            # Strictly increasing per writer so no two records share a key
+            timestamp = max(int(self.clock() * 1000), self._last_timestamp + 1)
+            self._last_timestamp = timestamp
+            if len(self._buffer) >= self.max_buffer:
+                self._buffer.popleft()
+                self.dropped += 1
+            if not self._buffer:
+                self._oldest = time.monotonic()
+            self._buffer.append(query_log_item(request, response, timestamp))
+            self.logged += 1
+            if len(self._buffer) >= self.batch_size:
+                self._condition.notify()
+    
+    def flush(self):
+        """Write everything buffered so far from the calling thread"""
+        while True:
+            batch = self._take(force=True)
+            if not batch:
+                return
+            self._write(batch)
+    
+    def close(self, timeout=5.0):
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join(timeout)
+        self.flush()
+    
+    def stats(self):
+        with self._condition:
+            return {
+                'logged': self.logged,
+                'written': self.written,
+                'failed': self.failed,
+                'dropped': self.dropped,
+                'buffered': len(self._buffer),
+                'write_calls': getattr(self.sink, 'write_calls', None)
+            }
+    
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._closed and not self._due():
+                    self._condition.wait(self._wait_time())
+                if self._closed:
+                    return
+            batch = self._take(force=False)
+            if batch:
+                self._write(batch)
+    
+    def _due(self):
+        if len(self._buffer) >= self.batch_size:
+            return True
+        return bool(self._buffer) and time.monotonic() - self._oldest >= self.flush_interval
+    
+    def _wait_time(self):
+        if not self._buffer:
+            return None
+        return max(self.flush_interval - (time.monotonic() - self._oldest), 0.0)
+    
+    def _take(self, force):
+        with self._condition:
+            if not self._buffer or not (force or self._due()):
+                return []
+            count = min(self.batch_size * FLUSH_GROUPS, len(self._buffer))
+            batch = [self._buffer.popleft() for _ in range(count)]
+            self._oldest = time.monotonic() if self._buffer else None
+            return batch
+    
+    def _write(self, batch):
+        try:
+            failed = self.sink.write(batch)
+        except Exception as e:
+            print(f"Error writing query logs: {e}")
+            failed = len(batch)
+        with self._condition:
+            self.written += len(batch) - failed
+            self.failed += failed
+
+class DynamoDBSink:
+    """batch_write_item in groups of 25 with retries for unprocessed items.
+    
+    Unprocessed items go to the back of the queue and ride along with the
+    next group instead of costing a call of their own. The sink backs off
+    (with jitter) only when a call makes little progress, which is how
+    DynamoDB signals throttling.
+    """
+    
+    def __init__(self, dynamodb, table_name, max_attempts=5, base_delay=0.05, max_delay=2.0):
+        self.dynamodb = dynamodb
+        self.table_name = table_name
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.write_calls = 0
+    
+    def write(self, items):
+        """Returns the number of items that could not be written; groups already written are not counted"""
+        pending = deque({'PutRequest': {'Item': item}} for item in items)
+        attempts = {}
+        failed = 0
+        delay = 0.0
+        while pending:
+            requests = [pending.popleft() for _ in range(min(BATCH_SIZE, len(pending)))]
+            if delay:
+                time.sleep(random.uniform(0, delay))
+            try:
+                self.write_calls += 1
+                response = self.dynamodb.batch_write_item(RequestItems={self.table_name: requests})
+                unprocessed = response.get('UnprocessedItems', {}).get(self.table_name, [])
+            except Exception as e:
+                if not _is_throttled(e):
+                    print(f"Error writing query logs: {e}")
+                    failed += len(requests) + len(pending)
+                    break
+                print(f"Query log write throttled: {e}")
+                unprocessed = requests
+            
+            for request in unprocessed:
+                key = _item_key(request['PutRequest']['Item'])
+                attempts[key] = attempts.get(key, 1) + 1
+                if attempts[key] > self.max_attempts:
+                    failed += 1
+                else:
+                    pending.append(request)
+            
+            if len(unprocessed) * 2 > len(requests):
+                delay = min(self.max_delay, max(delay * 2, self.base_delay))
+            else:
+                delay = 0.0
+        
+        if failed:
+            print(f"Dropping {failed} query logs after {self.max_attempts} attempts")
+        return failed
+
+class SqliteSink:
+    """Query logs in a local SQLite file for offline environments"""
+    
+    def __init__(self, path):
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._lock = threading.Lock()
+        self.write_calls = 0
+        with self._lock, self._conn:
+            self._conn.execute(
+                'CREATE TABLE IF NOT EXISTS query_logs '
+                '(userId TEXT NOT NULL, timestamp INTEGER NOT NULL, item TEXT NOT NULL, '
+                'PRIMARY KEY (userId, timestamp))'
+            )
+    
+    def write(self, items):
+        with self._lock, self._conn:
+            self.write_calls += 1
+            self._conn.executemany(
+                'INSERT OR REPLACE INTO query_logs (userId, timestamp, item) VALUES (?, ?, ?)',
+                [(item['userId'], item['timestamp'], json.dumps(item, default=str)) for item in items]
+            )
+        return 0
+
+class FileSink:
+    """Query logs appended to a JSON-lines file"""
+    
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+        self.write_calls = 0
+    
+    def write(self, items):
+        lines = ''.join(json.dumps(item, default=str) + '\n' for item in items)
+        with self._lock, open(self.path, 'a', encoding='utf-8') as f:
+            self.write_calls += 1
+            f.write(lines)
+        return 0
+
+def make_sink(spec, dynamodb, table_name):
+    """Sink from a QUERY_LOG_SINK value: 'dynamodb', 'sqlite:<path>' or 'file:<path>'"""
+    kind, _, path = (spec or 'dynamodb').partition(':')
+    if kind == 'dynamodb':
+        return DynamoDBSink(dynamodb, table_name)
+    if kind == 'sqlite':
+        return SqliteSink(path)
+    if kind == 'file':
+        return FileSink(path)
+    raise ValueError(f"Unknown query log sink: {spec}")
+
+def _item_key(item):
+    return (item['userId'], item['timestamp'])
+
+def _is_throttled(error):
+    code = (getattr(error, 'response', None) or {}).get('Error', {}).get('Code')
+    return code in ('ProvisionedThroughputExceededException', 'ThrottlingException', 'RequestLimitExceeded')
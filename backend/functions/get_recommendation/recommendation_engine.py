@@ -1,55 +1,142 @@
+import numpy as np
+
+ACTIONS = ['Sell Now', 'Wait 2-4 weeks', 'Sell within 1-2 weeks']
+CONFIDENCES = ['High', 'Medium', 'Low']
+
+# Decision table, first match wins. A rule matches when every condition it
+# lists holds:
+#   trend_direction / trend_strength  equal to the analysis value
+#   above     current_price > avg_12week * above
+#   below     current_price < avg_12week * below
+#   percentile_above  price_percentile > percentile_above
+#   ratio_between     lo < current_price / avg_12week < hi
+#   forecast_above / forecast_below  the seasonal forecast's changePct is
+#                     above / below the value; never holds without a forecast
+# The last rule has no conditions and is the default.
+RULES = [
+    {
+        'trend_direction': 'Falling', 'above': 1.05,
+        'action': 'Sell Now', 'confidence': 'High',
+        'reason': 'Prices are declining but still above average'
+    },
+    {
+        'trend_direction': 'Rising', 'below': 0.95,
+        'action': 'Wait 2-4 weeks', 'confidence': 'Medium',
+        'reason': 'Prices are rising and currently below average'
+    },
+    {
+        'percentile_above': 85,
+        'action': 'Sell Now', 'confidence': 'High',
+        'reason': 'Current price is near yearly high'
+    },
+    {
+        'trend_direction': 'Rising', 'trend_strength': 'Strong',
+        'action': 'Wait 2-4 weeks', 'confidence': 'Medium',
+        'reason': 'Strong upward trend suggests better prices ahead'
+    },
+    {
+        'forecast_above': 5,
+        'action': 'Wait 2-4 weeks', 'confidence': 'Medium',
+        'reason': 'Seasonal pattern points to higher prices in 2-4 weeks'
+    },
+    {
+        'forecast_below': -5,
+        'action': 'Sell Now', 'confidence': 'Medium',
+        'reason': 'Seasonal pattern points to lower prices in the coming weeks'
+    },
+    {
+        'trend_direction': 'Stable', 'ratio_between': (0.95, 1.05),
+        'action': 'Sell within 1-2 weeks', 'confidence': 'Medium',
+        'reason': 'Market is stable, no strong signal to wait'
+    },
+    {
+        'action': 'Sell within 1-2 weeks', 'confidence': 'Low',
+        'reason': 'Market conditions are unclear, moderate timing suggested'
+    }
+]
+
 class RecommendationEngine:
+    def __init__(self, rules=RULES):
+        self.rules = rules
+        self.rule_actions = np.array([ACTIONS.index(rule['action']) for rule in rules], dtype=np.int8)
+        self.rule_confidences = np.array([CONFIDENCES.index(rule['confidence']) for rule in rules], dtype=np.int8)
+    
     def generate_recommendation(self, analysis):
         """Generate recommendation based on rule-based logic"""
-        current_price = analysis['current_price']
+        current = analysis['current_price']
         avg_12week = analysis['avg_12week']
-        trend_direction = analysis['trend_direction']
-        trend_strength = analysis['trend_strength']
-        price_percentile = analysis['price_percentile']
-        
-        # Rule 1: Falling trend + high current price
-        if trend_direction == "Falling" and current_price > avg_12week * 1.05:
-            return {
-                'action': 'Sell Now',
-                'confidence': 'High',
-                'reason': 'Prices are declining but still above average'
-            }
-        
-        # Rule 2: Rising trend + low current price
-        if trend_direction == "Rising" and current_price < avg_12week * 0.95:
-            return {
-                'action': 'Wait 2-4 weeks',
-                'confidence': 'Medium',
-                'reason': 'Prices are rising and currently below average'
-            }
+        ratio = current / avg_12week if avg_12week else float('nan')
+        forecast = analysis.get('forecast')
+        change = forecast['changePct'] if forecast else float('nan')
+        rule = self.rules[-1]
+        for candidate in self.rules[:-1]:
+            if _rule_holds(candidate, current, avg_12week, analysis['trend_direction'],
+                           analysis['trend_strength'], analysis['price_percentile'], ratio, change):
+                rule = candidate
+                break
+        return {
+            'action': rule['action'],
+            'confidence': rule['confidence'],
+            'reason': rule['reason']
+        }
+    
+    def generate_recommendations(self, analyses):
+        """Score a struct-of-arrays batch of analyses at once.
         
-        # Rule 3: Price at yearly high
-        if price_percentile > 85:
-            return {
-                'action': 'Sell Now',
-                'confidence': 'High',
-                'reason': 'Current price is near yearly high'
-            }
+        analyses maps each analyze_trends field to an array, as returned by
+        analyze_trends_by_mandi, plus an optional forecast_change_pct array
+        (NaN where there is no forecast). Returns the matching rule per
+        analysis plus action and confidence codes indexing ACTIONS and
+        CONFIDENCES. The rule index doubles as the reason code, via
+        self.rules.
+        """
+        rule = self.match_rules(analyses)
+        return {
+            'rule': rule,
+            'action': self.rule_actions[rule],
+            'confidence': self.rule_confidences[rule]
+        }
+    
+    def match_rules(self, analyses):
+        """Index of the first matching rule for every analysis"""
+        current = np.asarray(analyses['current_price'], dtype=np.float64)
+        avg_12week = np.asarray(analyses['avg_12week'], dtype=np.float64)
+        direction = np.asarray(analyses['trend_direction'])
+        strength = np.asarray(analyses['trend_strength'])
+        percentile = np.asarray(analyses['price_percentile'], dtype=np.float64)
+        change = np.asarray(analyses.get('forecast_change_pct', np.nan), dtype=np.float64)
         
-        # Rule 4: Strong rising trend
-        if trend_direction == "Rising" and trend_strength == "Strong":
-            return {
-                'action': 'Wait 2-4 weeks',
-                'confidence': 'Medium',
-                'reason': 'Strong upward trend suggests better prices ahead'
-            }
+        with np.errstate(divide='ignore', invalid='ignore'):
+            ratio = current / avg_12week
         
-        # Rule 5: Stable market
-        if trend_direction == "Stable" and 0.95 < (current_price / avg_12week) < 1.05:
-            return {
-                'action': 'Sell within 1-2 weeks',
-                'confidence': 'Medium',
-                'reason': 'Market is stable, no strong signal to wait'
-            }
+        conditions = [
+            np.broadcast_to(
+                _rule_holds(rule, current, avg_12week, direction, strength, percentile, ratio, change), current.shape
+            )
+            for rule in self.rules[:-1]
+        ]
         
-        # Default rule
-        return {
-            'action': 'Sell within 1-2 weeks',
-            'confidence': 'Low',
-            'reason': 'Market conditions are unclear, moderate timing suggested'
-        }
+        # np.select takes the first true condition, matching the rule order
+        return np.select(conditions, np.arange(len(conditions)), len(self.rules) - 1)
+
+def _rule_holds(rule, current, avg_12week, direction, strength, percentile, ratio, change):
+    """Whether a rule's conditions hold, for scalars or element-wise for arrays"""
+    holds = True
+    if 'trend_direction' in rule:
+        holds = holds & (direction == rule['trend_direction'])
+    if 'trend_strength' in rule:
+        holds = holds & (strength == rule['trend_strength'])
+    if 'above' in rule:
+        holds = holds & (current > avg_12week * rule['above'])
+    if 'below' in rule:
+        holds = holds & (current < avg_12week * rule['below'])
+    if 'percentile_above' in rule:
+        holds = holds & (percentile > rule['percentile_above'])
+    if 'ratio_between' in rule:
+        lo, hi = rule['ratio_between']
+        holds = holds & (lo < ratio) & (ratio < hi)
+    if 'forecast_above' in rule:
+        holds = holds & (change > rule['forecast_above'])
+    if 'forecast_below' in rule:
+        holds = holds & (change < rule['forecast_below'])
+    return holds
@@ -0,0 +1,168 @@
+import json
+import os
+from datetime import datetime, timezone
+from object_cache import ObjectCache, is_missing
+from price_partitions import crop_paths, open_local
+
+SNAPSHOT_NAME = 'recommendations.json'
+
+class RecommendationSnapshot:
+    """Precomputed analysis, recommendation, fallback explanation and 90-day
+    series for every crop of one state, keyed by crop.
+    
+    Each entry records the last price day it was computed from, so a reader
+    can tell when a newer price partition has landed.
+    """
+    
+    def __init__(self, data):
+        self.state = data['state']
+        self.built_at = data['built_at']
+        self.markets = data['markets']
+    
+    @classmethod
+    def from_json(cls, body):
+        if isinstance(body, (bytes, bytearray)):
+            body = body.decode('utf-8')
+        return cls(json.loads(body))
+    
+    @classmethod
+    def open(cls, path):
+        with open(path, encoding='utf-8') as f:
+            return cls.from_json(f.read())
+    
+    def lookup(self, crop):
+        """Entry for a crop, or None if the snapshot does not cover it"""
+        return self.markets.get(crop.lower())
+
+class MaterializedRecommendations:
+    """Serves snapshot entries that are at least as new as the price store.
+    
+    Snapshots load from store_dir/{state}/recommendations.json when a local
+    store directory is configured, else from price-store/{state}/ in S3
+    through the object cache, mirroring the latest-price index.
+    """
+    
+    def __init__(self, s3_client, bucket_name, price_analyzer, cache=None, store_dir=None):
+        self.s3 = s3_client
+        self.bucket = bucket_name
+        self.price_analyzer = price_analyzer
+        self.cache = cache or ObjectCache(s3_client)
+        self.store_dir = store_dir
+        self._loaded = {}
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+    
+    def get(self, state, crop):
+        """Fresh snapshot entry for a state and crop, or None to recompute"""
+        try:
+            snapshot = self.get_snapshot(state)
+            market = snapshot.lookup(crop) if snapshot is not None else None
+            if market is None:
+                self.misses += 1
+                return None
+            
+            store = self.price_analyzer.get_price_store(state, crop)
+            if store is None or market['last_day'] < store.last_day:
+                self.stale += 1
+                return None
+            
+            self.hits += 1
+            return market
+        except Exception as e:
+            print(f"Error reading recommendation snapshot for {state}/{crop}: {e}")
+            self.misses += 1
+            return None
+    
+    def get_snapshot(self, state):
+        """Snapshot for a state, or None if it has not been built"""
+        if self.store_dir:
+            path = os.path.join(self.store_dir, state, SNAPSHOT_NAME)
+            if not os.path.exists(path):
+                return None
+            mtime = os.stat(path).st_mtime_ns
+            loaded = self._loaded.get(path)
+            if loaded is None or loaded[0] != mtime:
+                loaded = (mtime, RecommendationSnapshot.open(path))
+                self._loaded[path] = loaded
+            return loaded[1]
+        
+        key = f"price-store/{state}/{SNAPSHOT_NAME}"
+        try:
+            return self.cache.get(self.bucket, key, RecommendationSnapshot.from_json)
+        except Exception as e:
+            if is_missing(e):
+                return None
+            raise
+    
+    def stats(self):
+        served = self.hits + self.misses + self.stale
+        return {
+            'hits': self.hits,
+            'misses': self.misses,
+            'stale': self.stale,
+            'hit_ratio': self.hits / served if served else 0.0
+        }
+
+def build_market(state, crop, store, price_analyzer, recommendation_engine, explanation_generator, today=None):
+    """Snapshot entry for one price store, computed as the handler would"""
+    price_data = store.last_days(365, today=today)
+    analysis = {**price_analyzer.analyze_trends(price_data), 'forecast': price_analyzer.forecast(state, crop, today)}
+    recommendation = recommendation_engine.generate_recommendation(analysis)
+    return {
+        'last_day': store.last_day,
+        'analysis': analysis,
+        'recommendation': recommendation,
+        'explanation': explanation_generator._get_fallback_explanation(crop, analysis, recommendation),
+        'historicalPrices': price_data[-90:].to_records()  # Last 90 days, as the handler serves them
+    }
+
+def build_market_from_file(path, state, crop, today=None):
+    """build_market for a {crop}.bin file or partitioned crop directory; module level so process pools can run it"""
+    from explanation_generator import ExplanationGenerator
+    from price_analyzer import PriceAnalyzer
+    from recommendation_engine import RecommendationEngine
+    
+    store = open_local(path)
+    if not store.rows:
+        return None
+    # Seasonal models sit beside the stores, in the store directory's state folder
+    store_dir = os.path.dirname(os.path.dirname(os.path.abspath(path)))
+    return build_market(state, crop, store, PriceAnalyzer(None, None, store_dir=store_dir), RecommendationEngine(),
+                        ExplanationGenerator(), today=today)
+
+def encode_snapshot(state, markets, built_at=None):
+    """Snapshot bytes from {crop: entry}"""
+    return json.dumps({
+        'state': state,
+        'built_at': built_at or datetime.now(timezone.utc).isoformat(),
+        'markets': {crop.lower(): market for crop, market in sorted(markets.items())}
+    }, separators=(',', ':')).encode('utf-8')
+
+def build_snapshots(store_dir, states=None, workers=None, today=None):
+    """{state: snapshot bytes} for every {state}/{crop}.bin or partitioned crop under store_dir.
+    
+    Each (state, crop) is analyzed in its own worker process, so the build
+    scales with the cores available.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    states = states or sorted(
+        name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name))
+    )
+    jobs = [
+        (state, crop, path)
+        for state in states
+        for crop, path in crop_paths(os.path.join(store_dir, state)).items()
+    ]
+    markets = {state: {} for state in states}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [
+            (state, crop, pool.submit(build_market_from_file, path, state, crop, today))
+            for state, crop, path in jobs
+        ]
+        for state, crop, future in futures:
+            market = future.result()
+            if market is not None:
+                markets[state][crop] = market
+    return {state: encode_snapshot(state, crop_markets) for state, crop_markets in markets.items()}
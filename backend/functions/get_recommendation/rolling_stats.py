@@ -0,0 +1,192 @@
+import json
+from bisect import bisect_left, insort
+from collections import deque
+from price_analyzer import PriceAnalyzer
+
+class RollingPriceStats:
+    """Incrementally maintained analyze_trends statistics for one mandi series.
+    
+    Holds the trailing `window_days` of daily modal prices. Appending a day
+    updates running sums for the 4- and 12-week windows, Welford mean and
+    variance, monotonic min/max queues and a sorted copy of the window for
+    the percentile rank, then evicts days that fell out of the window.
+    The window is calendar days counted back from the latest arrival; the
+    4- and 12-week averages are its last 28 and 84 rows, as analyze_trends
+    takes them, so the two agree on series with missing days too.
+    """
+    
+    def __init__(self, window_days=365):
+        self.window_days = window_days
+        self._window = deque()
+        self._week4 = deque()
+        self._week12 = deque()
+        self._sum = 0.0
+        self._sum4 = 0.0
+        self._sum12 = 0.0
+        self._count = 0
+        self._mean = 0.0
+        self._m2 = 0.0
+        self._mins = deque()
+        self._maxs = deque()
+        self._sorted = []
+        self._appends_since_rebuild = 0
+        self.latest_day = None
+        self.current_price = None
+    
+    def __len__(self):
+        return self._count
+    
+    def append(self, day, price):
+        """Add one arrival; days must not go backwards"""
+        if self.latest_day is not None and day < self.latest_day:
+            raise ValueError(f"Day {day} is older than the latest day {self.latest_day}")
+        price = float(price)
+        entry = (day, price)
+        
+        self._window.append(entry)
+        self._week4.append(entry)
+        self._week12.append(entry)
+        self._sum += price
+        self._sum4 += price
+        self._sum12 += price
+        self._add_moment(price)
+        while self._mins and self._mins[-1][1] > price:
+            self._mins.pop()
+        self._mins.append(entry)
+        while self._maxs and self._maxs[-1][1] < price:
+            self._maxs.pop()
+        self._maxs.append(entry)
+        # insort moves O(n) entries, but for a year of prices that memmove beats a tree
+        insort(self._sorted, price)
+        
+        self.latest_day = day
+        self.current_price = price
+        self._evict()
+        
+        # Welford removals accumulate rounding error; rebuild once per window
+        self._appends_since_rebuild += 1
+        if self._appends_since_rebuild >= self.window_days:
+            self._rebuild_moments()
+    
+    def analysis(self):
+        """Statistics in the analyze_trends format"""
+        if not self._count:
+            raise ValueError('No prices in the window')
+        # Plain sums keep the means bit-identical to NumPy for whole-rupee prices
+        avg_price = self._sum / self._count
+        avg_4week = self._sum4 / len(self._week4) if self._count >= 28 else avg_price
+        avg_12week = self._sum12 / len(self._week12) if self._count >= 84 else avg_price
+        trend_direction, trend_strength = PriceAnalyzer._detect_trend(avg_4week, avg_12week)
+        below = bisect_left(self._sorted, self.current_price)
+        
+        return {
+            'current_price': float(self.current_price),
+            'min_price': int(self._mins[0][1]),
+            'max_price': int(self._maxs[0][1]),
+            'avg_price': int(avg_price),
+            'std_price': float(max(self._m2, 0.0) / self._count) ** 0.5,
+            'avg_4week': float(avg_4week),
+            'avg_12week': float(avg_12week),
+            'trend_direction': trend_direction,
+            'trend_strength': trend_strength,
+            'price_percentile': float(below / self._count * 100)
+        }
+    
+    def to_dict(self):
+        return {
+            'window_days': self.window_days,
+            'days': [day for day, _ in self._window],
+            'prices': [price for _, price in self._window]
+        }
+    
+    @classmethod
+    def from_dict(cls, data):
+        stats = cls(data['window_days'])
+        for day, price in zip(data['days'], data['prices']):
+            stats.append(day, price)
+        return stats
+    
+    def _evict(self):
+        cutoff = self.latest_day - self.window_days
+        while self._window and self._window[0][0] <= cutoff:
+            _, price = self._window.popleft()
+            self._sum -= price
+            self._remove_moment(price)
+            del self._sorted[bisect_left(self._sorted, price)]
+        while self._mins and self._mins[0][0] <= cutoff:
+            self._mins.popleft()
+        while self._maxs and self._maxs[0][0] <= cutoff:
+            self._maxs.popleft()
+        while len(self._week4) > 28:
+            self._sum4 -= self._week4.popleft()[1]
+        while len(self._week12) > 84:
+            self._sum12 -= self._week12.popleft()[1]
+    
+    def _add_moment(self, price):
+        self._count += 1
+        delta = price - self._mean
+        self._mean += delta / self._count
+        self._m2 += delta * (price - self._mean)
+    
+    def _remove_moment(self, price):
+        if self._count == 1:
+            self._count, self._mean, self._m2 = 0, 0.0, 0.0
+            return
+        delta = price - self._mean
+        self._mean = (self._count * self._mean - price) / (self._count - 1)
+        self._count -= 1
+        self._m2 -= delta * (price - self._mean)
+    
+    def _rebuild_moments(self):
+        prices = [price for _, price in self._window]
+        self._count = len(prices)
+        self._sum = sum(prices)
+        self._mean = self._sum / self._count
+        self._m2 = sum((p - self._mean) ** 2 for p in prices)
+        self._sum4 = sum(price for _, price in self._week4)
+        self._sum12 = sum(price for _, price in self._week12)
+        self._appends_since_rebuild = 0
+
+class RollingStatsStore:
+    """RollingPriceStats for every (state, crop, mandi) series"""
+    
+    def __init__(self, window_days=365):
+        self.window_days = window_days
+        self.series = {}
+    
+    def get(self, state, crop, mandi_code):
+        return self.series.get((state, crop, mandi_code))
+    
+    def append(self, state, crop, mandi_code, day, price):
+        key = (state, crop, mandi_code)
+        stats = self.series.get(key)
+        if stats is None:
+            stats = self.series[key] = RollingPriceStats(self.window_days)
+        stats.append(day, price)
+        return stats
+    
+    def append_window(self, state, crop, window):
+        """Append every row of a PriceWindow (rows sorted by day)"""
+        codes = window.mandi_codes
+        for day, mandi, price in zip(window.day.tolist(), window.mandi.tolist(), window.modal_price.tolist()):
+            self.append(state, crop, codes[mandi], day, price)
+    
+    def save(self, path):
+        data = {
+            'window_days': self.window_days,
+            'series': [
+                {'state': state, 'crop': crop, 'mandi_code': code, 'stats': stats.to_dict()}
+                for (state, crop, code), stats in self.series.items()
+            ]
+        }
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, separators=(',', ':'))
+    
+    @classmethod
+    def load(cls, path):
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        store = cls(data['window_days'])
+        for item in data['series']:
+            store.series[(item['state'], item['crop'], item['mandi_code'])] = RollingPriceStats.from_dict(item['stats'])
+        return store
@@ -0,0 +1,322 @@
+import json
+import mmap
+import os
+import struct
+from datetime import datetime, timezone
+
+import numpy as np
+
+from price_partitions import crop_paths, open_local
+from price_store import from_day, to_day
+
+# File layout (little endian):
+#   magic 'AGSM' | uint16 version | uint32 header length | JSON header
+#   one array per column over every series, each 8-byte aligned
+# A crop's series are a contiguous run of rows: the state-wide series
+# first, then one per mandi.
+MODELS_NAME = 'seasonal-models.bin'
+MAGIC = b'AGSM'
+VERSION = 1
+PREAMBLE = struct.Struct('<4sHI')
+ALIGN = 8
+
+# log price = trend line + yearly, half-yearly and four-monthly sine and
+# cosine terms + a level that wanders day by day + daily noise. Forecasts
+# keep the current level and add the seasonal and trend change.
+HARMONICS = 3
+TERMS = 2 + 2 * HARMONICS
+YEAR_DAYS = 365.25
+COLUMNS = [
+    ('coef', np.float32, TERMS),
+    ('level', np.float32, 1),
+    ('noise', np.float32, 1),
+    ('drift', np.float32, 1),
+    ('last_day', np.int32, 1),
+    ('observations', np.uint32, 1)
+]
+
+STATE_SERIES = '*'
+HISTORY_DAYS = 3 * 365     # history fitted, counting back from a store's last day
+MIN_OBSERVATIONS = 120
+MIN_SPAN_DAYS = 365        # a shorter series cannot tell season from trend
+LEVEL_DAYS = 7             # residuals averaged into the current level
+RIDGE = 1e-3               # per observation, on the seasonal terms only
+HORIZON_DAYS = (14, 28)
+MAX_AGE_DAYS = 45          # a model this far behind today does not forecast
+BAND_Z = 1.2816            # 80% band
+
+class SeasonalModels:
+    """Fitted seasonal price models for every (crop, series) of one state.
+    
+    Coefficients are arrays over all series, so forecasting any number of
+    series is a handful of vector operations. The arrays are views into
+    the file buffer and can be memory-mapped.
+    """
+    
+    def __init__(self, buffer):
+        magic, version, header_len = PREAMBLE.unpack_from(buffer, 0)
+        if magic != MAGIC:
+            raise ValueError('Not a seasonal model file')
+        if version != VERSION:
+            raise ValueError(f"Unsupported seasonal model version {version}")
+        
+        header = json.loads(bytes(buffer[PREAMBLE.size:PREAMBLE.size + header_len]).decode('utf-8'))
+        if header['harmonics'] != HARMONICS:
+            raise ValueError(f"Models were fitted with {header['harmonics']} harmonics, not {HARMONICS}")
+        self.buffer = buffer
+        self.state = header['state']
+        self.built_at = header['built_at']
+        self.rows = {
+            crop: {code: entry['start'] + i for i, code in enumerate(entry['codes'])}
+            for crop, entry in header['crops'].items()
+        }
+        count = header['series']
+        columns = {
+            name: np.frombuffer(buffer, dtype=np.dtype(dtype).newbyteorder('<'), count=count * width,
+                                offset=header['column_offsets'][name]).reshape((count, width) if width > 1 else count)
+            for name, dtype, width in COLUMNS
+        }
+        self.coef = columns['coef']
+        self.level = columns['level']
+        self.noise = columns['noise']
+        self.drift = columns['drift']
+        self.last_day = columns['last_day']
+        self.observations = columns['observations']
+    
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    
+    @classmethod
+    def from_bytes(cls, data):
+        return cls(memoryview(data))
+    
+    def __len__(self):
+        return len(self.last_day)
+    
+    def forecast(self, crop, mandi_code=None, today=None):
+        """Expected price band 2-4 weeks out for the state-wide series or one mandi, or None without a usable model"""
+        row = self.rows.get(crop.lower(), {}).get(mandi_code or STATE_SERIES)
+        if row is None:
+            return None
+        day = to_day(today or datetime.now())
+        bands = self.bands(np.array([row]), day)
+        if not bands['usable'][0]:
+            return None
+        return {
+            'from': from_day(day + HORIZON_DAYS[0]).isoformat(),
+            'to': from_day(day + HORIZON_DAYS[1]).isoformat(),
+            'low': int(bands['low'][0]),
+            'expected': int(bands['expected'][0]),
+            'high': int(bands['high'][0]),
+            'changePct': round(float(bands['change_pct'][0]), 1)
+        }
+    
+    def bands(self, rows, day):
+        """Band arrays over the horizon after `day` for an array of series rows.
+        
+        expected is the mean forecast price, low and high the widest 80%
+        band across the horizon days, and change_pct is expected against
+        the model's own price at its last day.
+        """
+        target = day + np.arange(HORIZON_DAYS[0], HORIZON_DAYS[1] + 1)
+        last_day = self.last_day[rows].astype(np.int64)
+        coef = self.coef[rows].astype(np.float64)
+        level = self.level[rows].astype(np.float64)
+        ahead = target[None, :] - last_day[:, None]
+        
+        mean = np.einsum('rhp,rp->rh', design(target[None, :], last_day[:, None]), coef) + level[:, None]
+        spread = BAND_Z * np.sqrt(
+            self.noise[rows].astype(np.float64)[:, None] ** 2 + self.drift[rows].astype(np.float64)[:, None] ** 2 * ahead
+        )
+        now = np.einsum('rp,rp->r', design(last_day, last_day), coef) + level
+        expected = np.exp(mean).mean(axis=1)
+        return {
+            'usable': np.isfinite(coef[:, 0]) & (day - last_day <= MAX_AGE_DAYS),
+            'low': np.exp(mean - spread).min(axis=1),
+            'expected': expected,
+            'high': np.exp(mean + spread).max(axis=1),
+            'change_pct': (expected / np.exp(now) - 1) * 100
+        }
+
+def design(day, last_day):
+    """Regression terms for days, with the trend in years since each series' last day; broadcasts"""
+    day = np.asarray(day, dtype=np.float64)
+    t = (day - last_day) / YEAR_DAYS
+    angle = np.broadcast_to(day, t.shape)[..., None] * (2 * np.pi / YEAR_DAYS * np.arange(1, HARMONICS + 1))
+    return np.concatenate([np.ones(t.shape + (1,)), t[..., None], np.sin(angle), np.cos(angle)], axis=-1)
+
+def fit_series(series, day, log_price, count):
+    """Fit every series at once from (series, day, log price) rows; {column: array over the series}.
+    
+    The normal equations of all series are accumulated with one bincount
+    per pair of terms and solved as a stack. Series that are too short
+    get NaN coefficients and never forecast.
+    """
+    if not len(series):
+        return {
+            name: np.full((count, width) if width > 1 else count, np.nan if name == 'coef' else 0)
+            for name, _, width in COLUMNS
+        }
+    series = np.asarray(series, dtype=np.int64)
+    day = np.asarray(day, dtype=np.int64)
+    # One radix sort on a combined key, rather than lexsort, puts rows in series then day order
+    first_day = day.min()
+    order = np.argsort(series * (day.max() - first_day + 1) + (day - first_day), kind='stable')
+    series = series[order]
+    day = day[order]
+    y = np.asarray(log_price, dtype=np.float64)[order]
+    observations = np.bincount(series, minlength=count)
+    starts = np.searchsorted(series, np.arange(count))
+    ends = starts + observations
+    present = observations > 0
+    last_day = np.where(present, day[np.maximum(ends - 1, 0)], 0)
+    span = np.where(present, last_day - day[np.minimum(starts, len(day) - 1)] + 1, 0)
+    fitted = (observations >= MIN_OBSERVATIONS) & (span >= MIN_SPAN_DAYS)
+    
+    # Seasonal terms depend on the day alone, so they are computed once per calendar day
+    x = design(np.arange(first_day, day.max() + 1), first_day)[day - first_day]
+    x[:, 1] = (day - last_day[series]) / YEAR_DAYS
+    xtx = np.empty((count, TERMS, TERMS))
+    for i in range(TERMS):
+        for j in range(i, TERMS):
+            xtx[:, i, j] = xtx[:, j, i] = np.bincount(series, x[:, i] * x[:, j], count)
+    xty = np.stack([np.bincount(series, x[:, i] * y, count) for i in range(TERMS)], axis=1)
+    seasonal = np.arange(2, TERMS)
+    xtx[:, seasonal, seasonal] += RIDGE * observations[:, None]
+    # Unfitted series get a solvable identity system and are blanked after
+    xtx[~fitted] = np.eye(TERMS)
+    xty[~fitted] = 0
+    coef = np.linalg.solve(xtx, xty[..., None])[..., 0]
+    
+    residual = y - np.einsum('np,np->n', x, coef[series])
+    recent = last_day[series] - day < LEVEL_DAYS
+    level = np.bincount(series, residual * recent, count) / np.maximum(np.bincount(series, recent, count), 1)
+    
+    # Weekly mean residuals separate the wandering level from daily noise:
+    # the level's daily drift comes from week-on-week changes, the noise
+    # from each day's distance to its week's mean
+    week = day // 7
+    first = np.flatnonzero(np.r_[True, (series[1:] != series[:-1]) | (week[1:] != week[:-1])])
+    days_in_week = np.diff(np.r_[first, len(day)])
+    weekly = np.add.reduceat(residual, first) / days_in_week
+    noise = np.sqrt(
+        np.bincount(series, (residual - np.repeat(weekly, days_in_week)) ** 2, count)
+        / np.maximum(observations - np.bincount(series[first], minlength=count), 1)
+    )
+    week_series, week = series[first], week[first]
+    follows = (week_series[1:] == week_series[:-1]) & (week[1:] == week[:-1] + 1)
+    changes = np.bincount(week_series[:-1][follows], np.diff(weekly)[follows] ** 2, count)
+    drift = np.sqrt(changes / np.maximum(np.bincount(week_series[:-1][follows], minlength=count), 1) / 7)
+    
+    coef[~fitted] = np.nan
+    return {
+        'coef': coef,
+        'level': level,
+        'noise': noise,
+        'drift': drift,
+        'last_day': last_day,
+        'observations': observations
+    }
+
+def fit_window(window):
+    """(series codes, fitted columns) for the state-wide series and each mandi in a PriceWindow.
+    
+    The state-wide series is the daily mean log price over reporting mandis.
+    """
+    price = np.asarray(window.modal_price, dtype=np.float64)
+    valid = price > 0
+    day = np.asarray(window.day, dtype=np.int64)[valid]
+    mandi = np.asarray(window.mandi, dtype=np.int64)[valid]
+    log_price = np.log(price[valid])
+    days, inverse = np.unique(day, return_inverse=True)
+    state_price = np.bincount(inverse, log_price) / np.bincount(inverse)
+    codes = [STATE_SERIES] + window.mandi_codes
+    columns = fit_series(
+        np.concatenate([np.zeros(len(days), dtype=np.int64), mandi + 1]),
+        np.concatenate([days, day]),
+        np.concatenate([state_price, log_price]),
+        len(codes)
+    )
+    return codes, columns
+
+def fit_store(store):
+    """fit_window over the last HISTORY_DAYS of a price store"""
+    return fit_window(store.window(store.last_day - HISTORY_DAYS + 1) if store.rows else store.window())
+
+def fit_crop_file(path):
+    """fit_store for a {crop}.bin file or partitioned crop directory; module level so process pools can run it"""
+    return fit_store(open_local(path))
+
+def build_models(state, fitted, built_at=None):
+    """Encode SeasonalModels from {crop: (codes, columns)} for one state"""
+    crops = {}
+    parts = {name: [] for name, _, _ in COLUMNS}
+    start = 0
+    for crop, (codes, columns) in sorted(fitted.items()):
+        crops[crop.lower()] = {'start': start, 'codes': list(codes)}
+        start += len(codes)
+        for name, dtype, width in COLUMNS:
+            parts[name].append(np.asarray(columns[name]).reshape(len(codes), width) if width > 1 else columns[name])
+    columns = {
+        name: np.ascontiguousarray(
+            np.concatenate(parts[name]) if parts[name] else np.empty((0, width) if width > 1 else 0),
+            dtype=np.dtype(dtype).newbyteorder('<')
+        )
+        for name, dtype, width in COLUMNS
+    }
+    
+    header = {
+        'state': state,
+        'built_at': built_at or datetime.now(timezone.utc).isoformat(),
+        'harmonics': HARMONICS,
+        'series': start,
+        'crops': crops,
+        'column_offsets': {name: 0 for name, _, _ in COLUMNS}
+    }
+    # Offsets depend on the header length, so grow the header until it fits
+    while True:
+        header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+        offset = _align(PREAMBLE.size + len(header_bytes))
+        offsets = {}
+        for name, _, _ in COLUMNS:
+            offsets[name] = offset
+            offset = _align(offset + columns[name].nbytes)
+        if offsets == header['column_offsets']:
+            break
+        header['column_offsets'] = offsets
+    
+    out = bytearray(offset)
+    out[:PREAMBLE.size] = PREAMBLE.pack(MAGIC, VERSION, len(header_bytes))
+    out[PREAMBLE.size:PREAMBLE.size + len(header_bytes)] = header_bytes
+    for name, _, _ in COLUMNS:
+        data = columns[name].tobytes()
+        out[offsets[name]:offsets[name] + len(data)] = data
+    return bytes(out)
+
+def build_models_from_dir(store_dir, states=None, workers=None):
+    """{state: model file bytes} for every {state}/{crop}.bin or partitioned crop under store_dir.
+    
+    Each (state, crop) is fitted in its own worker process, so the build
+    scales with the cores available.
+    """
+    from concurrent.futures import ProcessPoolExecutor
+    
+    states = states or sorted(
+        name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name))
+    )
+    jobs = [
+        (state, crop, path)
+        for state in states
+        for crop, path in crop_paths(os.path.join(store_dir, state)).items()
+    ]
+    fitted = {state: {} for state in states}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = [(state, crop, pool.submit(fit_crop_file, path)) for state, crop, path in jobs]
+        for state, crop, future in futures:
+            fitted[state][crop] = future.result()
+    return {state: build_models(state, crops) for state, crops in fitted.items()}
+
+def _align(offset):
+    return (offset + ALIGN - 1) // ALIGN * ALIGN
@@ -0,0 +1,34 @@
+import hashlib
+import json
+
+import numpy as np
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional
+    orjson = None
+
+def _default(value):
+    """NumPy scalars and arrays, which both encoders otherwise reject"""
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, np.ndarray):
+        return value.tolist()
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+def dumps(value):
+    """Compact JSON text, through orjson when it is installed"""
+    if orjson is not None:
+        return orjson.dumps(value, default=_default, option=orjson.OPT_SERIALIZE_NUMPY).decode('utf-8')
+    return json.dumps(value, default=_default, separators=(',', ':'), ensure_ascii=False)
+
+def etag(body):
+    """Strong ETag for a response body"""
+    return '"%s"' % hashlib.blake2b(body.encode('utf-8'), digest_size=16).hexdigest()
+
+def etag_matches(if_none_match, tag):
+    """True if an If-None-Match header value names the tag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(',')]
+    return '*' in candidates or tag in candidates or f"W/{tag}" in candidates
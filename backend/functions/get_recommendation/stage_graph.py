@@ -0,0 +1,132 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+class _Stage:
+    __slots__ = ('name', 'fn', 'after', 'timeout', 'fallback')
+    
+    def __init__(self, name, fn, after, timeout, fallback):
+        self.name = name
+        self.fn = fn
+        self.after = after
+        self.timeout = timeout
+        self.fallback = fallback
+
+class StageExecutor:
+    """Thread pool for request stages that is swapped out once too many workers are stuck.
+    
+    A stage that times out keeps running on its worker, so a hung dependency
+    would otherwise fill the pool and queue every later request behind it.
+    Once max_abandoned timed-out stages are still running, new stages go to
+    a fresh pool and the old one is shut down without waiting; its threads
+    exit as their calls return.
+    """
+    
+    def __init__(self, max_workers=8, max_abandoned=4, thread_name_prefix='stage'):
+        self.max_workers = max_workers
+        self.max_abandoned = max_abandoned
+        self.thread_name_prefix = thread_name_prefix
+        self._pool = self._new_pool()
+        self._stuck = set()
+        self._lock = threading.Lock()
+        self.abandoned = 0
+        self.recycled = 0
+    
+    def submit(self, fn, *args, **kwargs):
+        with self._lock:
+            return self._pool.submit(fn, *args, **kwargs)
+    
+    def abandon(self, future):
+        """Give up on a timed-out stage: cancel it if queued, else count its worker as stuck"""
+        if future.cancel() or future.done():
+            return
+        with self._lock:
+            self.abandoned += 1
+            self._stuck.add(future)
+            if len(self._stuck) >= self.max_abandoned:
+                self._pool.shutdown(wait=False)
+                self._pool = self._new_pool()
+                self._stuck = set()
+                self.recycled += 1
+        future.add_done_callback(self._settled)
+    
+    def stats(self):
+        return {'abandoned': self.abandoned, 'recycled': self.recycled}
+    
+    def _settled(self, future):
+        with self._lock:
+            self._stuck.discard(future)
+    
+    def _new_pool(self):
+        return ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.thread_name_prefix)
+
+class StageGraph:
+    """Runs request stages on a StageExecutor as soon as their inputs are ready.
+    
+    Each stage receives the results of the stages listed in `after` as
+    positional arguments. A stage that fails or is still running when its
+    timeout or the request deadline passes resolves to fallback(*inputs)
+    instead, so dependent stages and the response degrade rather than fail.
+    """
+    
+    def __init__(self, executor, deadline=None, clock=time.monotonic):
+        self.executor = executor
+        self.deadline = deadline
+        self.clock = clock
+        self._stages = {}
+        self._futures = {}
+        self._results = {}
+        self._locks = {}
+        self.degraded = []
+    
+    def add(self, name, fn, after=(), timeout=None, fallback=None):
+        for dependency in after:
+            if dependency not in self._stages:
+                raise ValueError(f"Stage {name} depends on unknown stage {dependency}")
+        self._stages[name] = _Stage(name, fn, tuple(after), timeout, fallback)
+        self._locks[name] = threading.Lock()
+        return self
+    
+    def run(self):
+        """Start every stage and return {name: result} once all have resolved"""
+        for name, stage in self._stages.items():
+            self._futures[name] = self.executor.submit(self._execute, stage)
+        return {name: self.result(name) for name in self._stages}
+    
+    def result(self, name):
+        """Result of a stage, waiting at most until its timeout or the deadline"""
+        with self._locks[name]:
+            if name in self._results:
+                return self._results[name]
+            
+            stage = self._stages[name]
+            try:
+                value = self._futures[name].result(timeout=self._wait_time(stage))
+            except FutureTimeoutError:
+                self.executor.abandon(self._futures[name])
+                value = self._degrade(stage, 'timeout')
+            except Exception as e:
+                print(f"Error in stage {name}: {e}")
+                value = self._degrade(stage, 'error')
+            
+            self._results[name] = value
+            return value
+    
+    def _execute(self, stage):
+        return stage.fn(*(self.result(dependency) for dependency in stage.after))
+    
+    def _wait_time(self, stage):
+        waits = [t for t in (stage.timeout, self._remaining()) if t is not None]
+        return max(min(waits), 0) if waits else None
+    
+    def _remaining(self):
+        if self.deadline is None:
+            return None
+        return self.deadline - self.clock()
+    
+    def _degrade(self, stage, reason):
+        self.degraded.append((stage.name, reason))
+        if stage.fallback is None:
+            raise RuntimeError(f"Stage {stage.name} failed ({reason}) and has no fallback")
+        return stage.fallback(*(self.result(dependency) for dependency in stage.after))
@@ -0,0 +1,409 @@
+import json
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+SUB_BUCKETS = 16  # per power of two, so a bucket is within ~6% of any value in it
+EMF_MAX_VALUES = 100
+EMF_MAX_METRICS = 100  # per metric directive
+
+class Histogram:
+    """Log-linear (HDR-style) histogram of non-negative integer samples.
+    
+    Recording is one dict update; quantiles are exact to the bucket, which
+    spans 1/SUB_BUCKETS of its power of two.
+    """
+    
+    __slots__ = ('counts', 'count', 'total', 'min', 'max')
+    
+    def __init__(self):
+        self.counts = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+    
+    def record(self, value):
+        value = int(value)
+        index = bucket_index(value)
+        self.counts[index] = self.counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+    
+    def quantile(self, q):
+        """Upper bound of the bucket holding the q-th quantile"""
+        if not self.count:
+            return None
+        rank = q * self.count
+        seen = 0
+        for index in sorted(self.counts):
+            seen += self.counts[index]
+            if seen >= rank:
+                return min(bucket_upper(index), self.max)
+        return self.max
+    
+    def merge(self, other):
+        """Add another histogram's samples, e.g. one from a different process"""
+        for index, count in other.counts.items():
+            self.counts[index] = self.counts.get(index, 0) + count
+        self.count += other.count
+        self.total += other.total
+        if other.min is not None and (self.min is None or other.min < self.min):
+            self.min = other.min
+        if other.max is not None and (self.max is None or other.max > self.max):
+            self.max = other.max
+        return self
+    
+    def buckets(self):
+        """(representative value, count) per non-empty bucket, ascending"""
+        return [((bucket_lower(i) + bucket_upper(i)) / 2, self.counts[i]) for i in sorted(self.counts)]
+
+def bucket_index(value):
+    if value < SUB_BUCKETS:
+        return value
+    exponent = value.bit_length() - 1
+    shift = exponent - (SUB_BUCKETS.bit_length() - 1)
+    return (shift + 1) * SUB_BUCKETS + ((value >> shift) - SUB_BUCKETS)
+
+def bucket_lower(index):
+    if index < SUB_BUCKETS:
+        return index
+    shift = index // SUB_BUCKETS - 1
+    return (SUB_BUCKETS + index % SUB_BUCKETS) << shift
+
+def bucket_upper(index):
+    return bucket_lower(index + 1) - 1 if index >= SUB_BUCKETS else index
+
+class _NoSpan:
+    __slots__ = ()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        return False
+
+NO_SPAN = _NoSpan()
+
+class _Span:
+    __slots__ = ('tracer', 'name', 'trace', 'started')
+    
+    def __init__(self, tracer, name, trace):
+        self.tracer = tracer
+        self.name = name
+        self.trace = trace
+    
+    def __enter__(self):
+        self.started = time.perf_counter_ns()
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        elapsed_us = (time.perf_counter_ns() - self.started) // 1000
+        self.tracer.record(self.name, elapsed_us)
+        if exc_type is not None:
+            self.tracer.incr(f"{self.name}.errors")
+        if self.trace is not None:
+            self.trace.spans.append((self.name, self.started, elapsed_us))
+        return False
+
+class Trace:
+    """Spans of one request, kept so a slow request can be logged in full"""
+    
+    def __init__(self, tracer, name):
+        self.tracer = tracer
+        self.name = name
+        self.spans = []
+        self.started = time.perf_counter_ns()
+        self.profile = None
+    
+    def span(self, name):
+        if not self.tracer.enabled:
+            return NO_SPAN
+        return _Span(self.tracer, name, self)
+    
+    def timed(self, name, fn):
+        """fn wrapped so each call is a span of this trace"""
+        def run(*args, **kwargs):
+            with self.span(name):
+                return fn(*args, **kwargs)
+        return run
+    
+    def elapsed_ms(self):
+        return (time.perf_counter_ns() - self.started) / 1e6
+
+class Tracer:
+    """Span timers, counters and latency histograms, emitted as CloudWatch EMF log lines.
+    
+    Spans and counters only touch in-process state under a lock; one JSON
+    line per flush interval carries every histogram and counter, so the
+    cost per request stays in the microseconds. Requests slower than
+    slow_ms are logged with their spans, and with a stack-sampling profile
+    when profile_slow is on.
+    """
+    
+    def __init__(self, service, namespace='AgriSense', flush_interval=60.0, slow_ms=None,
+                 profile_slow=False, enabled=True, emit=print, clock=time.monotonic):
+        self.service = service
+        self.namespace = namespace
+        self.flush_interval = flush_interval
+        self.slow_ms = slow_ms
+        self.profile_slow = profile_slow
+        self.enabled = enabled
+        self.emit = emit
+        self.clock = clock
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = Counter()
+        self._sources = {}
+        self._last_source_values = {}
+        self._last_flush = clock()
+    
+    @classmethod
+    def from_env(cls, service):
+        """Tracer configured by TRACING, METRICS_FLUSH_SECONDS, SLOW_REQUEST_MS and PROFILE_SLOW_REQUESTS.
+        
+        Metrics are flushed at the end of every trace by default: Lambda
+        freezes the container once the handler returns and may recycle it
+        without warning, so anything held for a later flush can be lost.
+        """
+        slow_ms = os.environ.get('SLOW_REQUEST_MS')
+        return cls(
+            os.environ.get('AWS_LAMBDA_FUNCTION_NAME', service),
+            flush_interval=float(os.environ.get('METRICS_FLUSH_SECONDS', 0)),
+            slow_ms=float(slow_ms) if slow_ms else None,
+            profile_slow=os.environ.get('PROFILE_SLOW_REQUESTS', '').lower() in ('1', 'true', 'yes'),
+            enabled=os.environ.get('TRACING', 'on').lower() not in ('0', 'off', 'false')
+        )
+    
+    def span(self, name):
+        """Context manager timing a block into the `name` histogram"""
+        if not self.enabled:
+            return NO_SPAN
+        return _Span(self, name, None)
+    
+    def record(self, name, value_us):
+        if not self.enabled:
+            return
+        with self._lock:
+            histogram = self._histograms.get(name)
+            if histogram is None:
+                histogram = self._histograms[name] = Histogram()
+            histogram.record(value_us)
+    
+    def incr(self, name, count=1):
+        if not self.enabled:
+            return
+        with self._lock:
+            self._counters[name] += count
+    
+    def add_source(self, prefix, stats):
+        """Report a component's stats() at each flush; integer counts as deltas, ratios as-is"""
+        self._sources[prefix] = stats
+    
+    def wrap(self, client, name):
+        """Proxy timing every method call of an AWS client as `name.method`"""
+        return TracedClient(client, name, self) if self.enabled else client
+    
+    def start_trace(self, name='request'):
+        trace = Trace(self, name)
+        if self.enabled and self.profile_slow and self.slow_ms is not None:
+            trace.profile = SamplingProfiler()
+            trace.profile.start()
+        return trace
+    
+    def finish_trace(self, trace):
+        """Record the request span, log it if slow, and flush when the interval has passed"""
+        if not self.enabled:
+            return
+        elapsed_ms = trace.elapsed_ms()
+        self.record(trace.name, int(elapsed_ms * 1000))
+        profile = trace.profile.stop() if trace.profile is not None else None
+        if self.slow_ms is not None and elapsed_ms >= self.slow_ms:
+            self.incr(f"{trace.name}.slow")
+            line = {
+                'message': 'slow request',
+                'service': self.service,
+                'elapsed_ms': round(elapsed_ms, 2),
+                'spans': [
+                    {'name': name, 'offset_ms': round((started - trace.started) / 1e6, 2), 'ms': us / 1000}
+                    for name, started, us in trace.spans
+                ]
+            }
+            if profile:
+                line['profile'] = [{'stack': stack, 'samples': n} for stack, n in profile.most_common(20)]
+            self.emit(json.dumps(line))
+        self.maybe_flush()
+    
+    def maybe_flush(self):
+        if self.clock() - self._last_flush >= self.flush_interval:
+            self.flush()
+    
+    def take(self):
+        """(histograms, counters) recorded since the last flush, resetting both"""
+        with self._lock:
+            histograms, self._histograms = self._histograms, {}
+            counters, self._counters = self._counters, Counter()
+            self._last_flush = self.clock()
+        return histograms, counters
+    
+    def flush(self):
+        """Emit one EMF line with every histogram and counter since the last flush.
+        
+        Metric definitions are split across directives of at most
+        EMF_MAX_METRICS, since CloudWatch drops a directive with more.
+        """
+        histograms, counters = self.take()
+        gauges = self._source_values(counters)
+        # Gauges alone mean no request ran since the last flush
+        if not histograms and not counters:
+            return
+        
+        metrics = []
+        line = {'Service': self.service}
+        for name, histogram in sorted(histograms.items()):
+            buckets = _emf_buckets(histogram)
+            metrics.append({'Name': name, 'Unit': 'Milliseconds'})
+            line[name] = {
+                'Values': [round(value / 1000, 3) for value, _ in buckets],
+                'Counts': [count for _, count in buckets],
+                'Min': histogram.min / 1000,
+                'Max': histogram.max / 1000,
+                'Sum': histogram.total / 1000,
+                'Count': histogram.count
+            }
+        for name, count in sorted(counters.items()):
+            metrics.append({'Name': name, 'Unit': 'Count'})
+            line[name] = count
+        for name, value in sorted(gauges.items()):
+            metrics.append({'Name': name, 'Unit': 'None'})
+            line[name] = value
+        line['_aws'] = {
+            'Timestamp': int(time.time() * 1000),
+            'CloudWatchMetrics': [
+                {'Namespace': self.namespace, 'Dimensions': [['Service']], 'Metrics': metrics[i:i + EMF_MAX_METRICS]}
+                for i in range(0, len(metrics), EMF_MAX_METRICS)
+            ]
+        }
+        self.emit(json.dumps(line, separators=(',', ':')))
+    
+    def snapshot(self):
+        """{name: {count, p50, p95, p99, max}} in milliseconds, plus counters, without resetting"""
+        with self._lock:
+            result = {
+                name: {
+                    'count': h.count,
+                    'p50': h.quantile(0.5) / 1000,
+                    'p95': h.quantile(0.95) / 1000,
+                    'p99': h.quantile(0.99) / 1000,
+                    'max': h.max / 1000
+                }
+                for name, h in self._histograms.items()
+            }
+            result.update(self._counters)
+            return result
+    
+    def _source_values(self, counters):
+        """Integer stats become counter deltas; other numbers are reported as gauges"""
+        gauges = {}
+        for prefix, stats in self._sources.items():
+            try:
+                values = stats()
+            except Exception as e:
+                print(f"Error reading {prefix} stats: {e}")
+                continue
+            for key, value in values.items():
+                name = f"{prefix}.{key}"
+                if isinstance(value, bool) or not isinstance(value, (int, float)):
+                    continue
+                if isinstance(value, int):
+                    delta = value - self._last_source_values.get(name, 0)
+                    self._last_source_values[name] = value
+                    if delta:
+                        counters[name] += delta
+                else:
+                    gauges[name] = value
+        return gauges
+
+def _emf_buckets(histogram):
+    """Histogram buckets, pairwise merged until EMF's 100-value limit is met"""
+    buckets = histogram.buckets()
+    while len(buckets) > EMF_MAX_VALUES:
+        merged = []
+        for i in range(0, len(buckets), 2):
+            pair = buckets[i:i + 2]
+            count = sum(c for _, c in pair)
+            merged.append((sum(v * c for v, c in pair) / count, count))
+        buckets = merged
+    return buckets
+
+class TracedClient:
+    """Times each call made through an AWS client or resource"""
+    
+    def __init__(self, client, name, tracer):
+        self._client = client
+        self._name = name
+        self._tracer = tracer
+    
+    def __getattr__(self, attr):
+        target = getattr(self._client, attr)
+        if not callable(target):
+            return target
+        span_name = f"{self._name}.{attr}"
+        tracer = self._tracer
+        
+        def call(*args, **kwargs):
+            started = time.perf_counter_ns()
+            try:
+                return target(*args, **kwargs)
+            except Exception as e:
+                # Not-modified and not-found answers are expected; count each code apart
+                code = (getattr(e, 'response', None) or {}).get('Error', {}).get('Code', 'errors')
+                tracer.incr(f"{span_name}.{code}")
+                raise
+            finally:
+                tracer.record(span_name, (time.perf_counter_ns() - started) // 1000)
+        return call
+
+class SamplingProfiler:
+    """Samples every thread's stack at a fixed interval while a request runs.
+    
+    Opt-in: sys._current_frames() walks each thread, which costs more than
+    spans do, so it is only started when slow requests are to be profiled.
+    """
+    
+    def __init__(self, interval=0.005, max_depth=12):
+        self.interval = interval
+        self.max_depth = max_depth
+        self.samples = Counter()
+        self._stop = threading.Event()
+        self._thread = None
+    
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampling-profiler', daemon=True)
+        self._thread.start()
+    
+    def stop(self):
+        """Collapsed stacks ('outer;inner') with their sample counts"""
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+        return self.samples
+    
+    def _run(self):
+        own = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            for ident, frame in sys._current_frames().items():
+                if ident == own:
+                    continue
+                stack = []
+                while frame is not None and len(stack) < self.max_depth:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}")
+                    frame = frame.f_back
+                self.samples[';'.join(reversed(stack))] += 1
@@ -3,7 +3,7 @@
 interface Mandi {
   name: string
   distance: number
-  price: number
+  price: number | null
   priceComparison: string
   demand: string
   coordinates: { lat: number; lng: number }
@@ -17,7 +17,8 @@ export default function MandiList({ mandis }: MandiListProps) {
   const getDemandColor = (demand: string) => {
     if (demand === 'High') return 'bg-success'
     if (demand === 'Medium') return 'bg-warning'
-    return 'bg-danger'
+    if (demand === 'Low') return 'bg-danger'
+    return 'bg-gray-400'
   }
 
   const openDirections = (mandi: Mandi) => {
@@ -39,10 +40,12 @@ export default function MandiList({ mandis }: MandiListProps) {
               </h4>
               <div className="flex flex-wrap gap-4 text-sm text-gray-600">
                 <span>📍 {mandi.distance} km away</span>
-                <span className="font-semibold text-primary">
-                  ₹{mandi.price}/quintal
-                </span>
-                <span className={mandi.priceComparison.includes('above') ? 'text-success' : 'text-danger'}>
+                {mandi.price !== null && (
+                  <span className="font-semibold text-primary">
+                    ₹{mandi.price}/quintal
+                  </span>
+                )}
+                <span className={mandi.price === null ? 'text-gray-500' : mandi.priceComparison.includes('above') ? 'text-success' : 'text-danger'}>
                   {mandi.priceComparison}
                 </span>
               </div>
@@ -3,7 +3,7 @@
 interface Mandi {
   name: string
   distance: number
-  price: number
+  price: number | null
   priceComparison: string
   demand: string
   coordinates: { lat: number; lng: number }
@@ -0,0 +1,66 @@
+#!/usr/bin/env python3
+"""
+Backtest the recommendation rules over every mandi-day of a local price-store directory:
+how often each rule's advice would have paid off 7, 14 and 28 days later, per state, crop
+and rule. Alternative decision tables (JSON lists in the RULES format) are scored side by
+side with the current one, one worker process per state and crop.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from backtest import HORIZON_DAYS, WARMUP_DAYS, backtest_dir, combine, rule_rows
+from recommendation_engine import RULES
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('store_dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--state', action='append', help='only these states (default: every state directory)')
+    parser.add_argument('--rules', action='append', default=[], metavar='NAME=PATH',
+                        help='an alternative decision table to score beside the current rules')
+    parser.add_argument('--warmup-days', type=int, default=WARMUP_DAYS, help='history a mandi needs before it is scored')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--output', help='write the per state, crop and rule results to this JSON file')
+    args = parser.parse_args()
+
+    rule_sets = {'current': RULES}
+    for spec in args.rules:
+        name, _, path = spec.partition('=')
+        with open(path, encoding='utf-8') as f:
+            rule_sets[name] = json.load(f)
+
+    start = time.perf_counter()
+    tallies = backtest_dir(args.store_dir, rule_sets, states=args.state, workers=args.workers,
+                           warmup_days=args.warmup_days)
+    print(f"Backtested {len(tallies)} crops in {time.perf_counter() - start:.1f} s")
+
+    report = {}
+    for name, rules in rule_sets.items():
+        overall = rule_rows(combine(tally[name] for tally in tallies.values()), rules)
+        report[name] = {
+            'all': overall,
+            'states': {
+                state: rule_rows(combine(t[name] for (s, _), t in tallies.items() if s == state), rules)
+                for state in sorted({state for state, _ in tallies})
+            },
+            'crops': {
+                f"{state}/{crop}": rule_rows(tally[name], rules) for (state, crop), tally in sorted(tallies.items())
+            }
+        }
+        print(f"\n{name}: signals, then hit rate and mean change at {', '.join(f'{d}' for d in HORIZON_DAYS)} days")
+        for row in overall:
+            print(f"  {row['rule']}. {row['action']:<22} {row['signals']:>10}  " + '  '.join(
+                '-' if row['hitRate'][d] is None else f"{row['hitRate'][d]:.1%} {row['meanChangePct'][d]:+.1f}%"
+                for d in HORIZON_DAYS
+            ) + f"  ({row['reason']})")
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Compare answering /analytics from daily rollups with aggregating the full query log
+"""
+
+import argparse
+import bisect
+import math
+import time
+from collections import Counter
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import standins
+
+standins.use_analytics_modules()
+
+from rollups import ACTION_KEYS, DailyRollups, RollupTable, query_day, summarize
+
+STATES = ['maharashtra', 'karnataka', 'gujarat', 'madhya_pradesh', 'rajasthan']
+CROPS = ['cotton', 'soybean', 'wheat', 'onion', 'tur', 'gram', 'maize']
+ACTIONS = list(ACTION_KEYS)
+ITEM_BYTES = 200  # approximate size of one query-log item
+SCAN_PAGE_BYTES = 1024 * 1024
+
+def synthetic_logs(rows, days, seed):
+    """Column arrays for `rows` query-log records spread over the last `days` days"""
+    rng = np.random.default_rng(seed)
+    end = int(time.time() * 1000)
+    return {
+        'timestamp': np.sort(rng.integers(end - days * 86_400_000, end, rows)),
+        'state': rng.integers(0, len(STATES), rows),
+        'crop': rng.choice(len(CROPS), rows, p=np.linspace(2, 1, len(CROPS)) / np.linspace(2, 1, len(CROPS)).sum()),
+        'action': rng.integers(0, len(ACTIONS), rows)
+    }
+
+def items(logs):
+    for timestamp, state, crop, action in zip(*(logs[k].tolist() for k in ('timestamp', 'state', 'crop', 'action'))):
+        yield {'timestamp': timestamp, 'state': STATES[state], 'crop': CROPS[crop], 'recommendation': ACTIONS[action]}
+
+def day_number(day):
+    return int(day.replace('-', ''))
+
+def full_scan(logs, days, state, start_day, end_day):
+    """Baseline: filter and count every record, vectorized (a lower bound on a table Scan)"""
+    mask = (logs['state'] == STATES.index(state)) & (days >= day_number(start_day)) & (days <= day_number(end_day))
+    crops = np.bincount(logs['crop'][mask], minlength=len(CROPS))
+    actions = np.bincount(logs['action'][mask], minlength=len(ACTIONS))
+    bucket = Counter({'queries': int(mask.sum())})
+    bucket.update({f"crop#{CROPS[i]}": int(n) for i, n in enumerate(crops) if n})
+    bucket.update({f"action#{ACTIONS[i]}": int(n) for i, n in enumerate(actions) if n})
+    return summarize([bucket])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--rows', type=int, default=2_000_000)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    logs = synthetic_logs(args.rows, args.days, args.seed)
+
+    start = time.perf_counter()
+    rollups = DailyRollups().add_all(items(logs))
+    replay_s = time.perf_counter() - start
+
+    # The rollup table: per state, buckets sorted by day like the DynamoDB sort key
+    table = {}
+    for (state, day), bucket in sorted(rollups.buckets.items()):
+        days_list, buckets = table.setdefault(state, ([], []))
+        days_list.append(day)
+        buckets.append(bucket)
+
+    def query(state, start_day, end_day):
+        days_list, buckets = table.get(state, ([], []))
+        return buckets[bisect.bisect_left(days_list, start_day):bisect.bisect_right(days_list, end_day)]
+
+    # Rollup days are IST calendar days; the baseline uses the same day boundaries
+    minutes, minute_index = np.unique(logs['timestamp'] // 60_000, return_inverse=True)
+    record_days = np.array([day_number(query_day(m * 60_000)) for m in minutes.tolist()])[minute_index]
+
+    today = datetime.now()
+    start_day = (today - timedelta(days=90)).strftime('%Y-%m-%d')
+    end_day = today.strftime('%Y-%m-%d')
+
+    expected = full_scan(logs, record_days, 'maharashtra', start_day, end_day)
+    actual = summarize(query('maharashtra', start_day, end_day))
+    assert actual == expected, (actual, expected)
+
+    # A retried stream batch, overlapping the first, adds each record once
+    stream = [(f"event-{i}", item) for i, item in enumerate(items({k: v[:3000] for k, v in logs.items()}))]
+    rollup_table = RollupTable(standins.StubDynamoDB(0).Table('rollups'))
+    assert rollup_table.apply(stream[:2000]) == 0
+    assert rollup_table.apply(stream[1000:]) == 1000
+    applied = {
+        (item['state'], item['day']): {k: v for k, v in item.items() if k not in ('state', 'day')}
+        for item in rollup_table.client.items['rollups'] if not item['state'].startswith('applied#')
+    }
+    assert applied == DailyRollups().add_all(item for _, item in stream).buckets
+
+    scan_ms = standins.timed(lambda: full_scan(logs, record_days, 'maharashtra', start_day, end_day), args.repeat)
+    rollup_ms = standins.timed(lambda: summarize(query('maharashtra', start_day, end_day)), args.repeat)
+    buckets = len(query('maharashtra', start_day, end_day))
+    scan_pages = math.ceil(args.rows * ITEM_BYTES / SCAN_PAGE_BYTES)
+
+    print(f"{args.rows:,} query-log rows over {args.days} days, {len(STATES)} states; 90-day range for one state")
+    print(f"replay into rollups: {replay_s:.1f} s ({args.rows / replay_s:,.0f} rows/s), {len(rollups)} buckets")
+    print(f"{'method':<22}{'p50 ms':>10}{'p99 ms':>10}{'DynamoDB pages':>16}")
+    print(f"{'full scan (numpy)':<22}{standins.percentile(scan_ms, 50):>10.2f}"
+          f"{standins.percentile(scan_ms, 99):>10.2f}{scan_pages:>16,}")
+    print(f"{'rollups':<22}{standins.percentile(rollup_ms, 50):>10.3f}"
+          f"{standins.percentile(rollup_ms, 99):>10.3f}{1:>16,}")
+    print(f"rollup answer sums {buckets} daily buckets and matches the full scan")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,159 @@
+#!/usr/bin/env python3
+"""
+Backtest the decision table over every mandi-day of the synthetic national dataset, for
+the current rules and a tighter threshold set side by side; measure throughput against
+replaying analyze_trends day by day, and check the vectorized features, rule matches and
+realized outcomes against the per-request path on sampled days
+"""
+
+import argparse
+import copy
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+import backtest
+from backtest import (HORIZON_DAYS, STALE_DAYS, WINDOW_DAYS, backtest_dir, backtest_window, combine, realized_changes,
+                      rule_rows, trend_features)
+from price_analyzer import PriceAnalyzer
+from price_partitions import crop_paths, open_local
+from recommendation_engine import RULES, RecommendationEngine
+
+FIELDS = ['current_price', 'min_price', 'max_price', 'avg_price', 'std_price', 'avg_4week', 'avg_12week',
+          'price_percentile']
+
+def tighter_rules():
+    """The current rules with every price threshold moved a step further out"""
+    rules = copy.deepcopy(RULES)
+    for rule in rules:
+        if 'above' in rule:
+            rule['above'] = 1.08
+        if 'below' in rule:
+            rule['below'] = 0.92
+        if 'percentile_above' in rule:
+            rule['percentile_above'] = 92
+    return rules
+
+def replay(window, features, rows, analyzer, engine):
+    """analyze_trends and generate_recommendation on each sampled row's trailing window, the per-request way"""
+    mandi = np.asarray(window.mandi)
+    analyses, actions = [], []
+    for i in rows.tolist():
+        m, day = features['mandi'][i], features['day'][i]
+        start, stop = np.searchsorted(window.day, [day - WINDOW_DAYS + 1, day + 1])
+        part = window[slice(int(start), int(stop))]
+        analysis = analyzer.analyze_trends(part[mandi[start:stop] == m])
+        analyses.append(analysis)
+        actions.append(engine.generate_recommendation({**analysis, 'forecast': None})['action'])
+    return analyses, actions
+
+def check_features(window, rows, analyzer, engine):
+    """Features, rules and outcomes for sampled rows match the per-request path"""
+    features = trend_features(window)
+    analyses, actions = replay(window, features, rows, analyzer, engine)
+    for field in FIELDS:
+        expected = np.array([a[field] for a in analyses], dtype=np.float64)
+        actual = features[field][rows]
+        if field in ('min_price', 'max_price', 'avg_price'):
+            # analyze_trends truncates these to whole rupees
+            actual = np.trunc(actual + 1e-9)
+        assert np.allclose(actual, expected, rtol=1e-9, atol=1e-6), field
+    for field in ('trend_direction', 'trend_strength'):
+        assert [a[field] for a in analyses] == features[field][rows].tolist(), field
+    rule = engine.match_rules({name: values[rows] for name, values in features.items()})
+    assert [engine.rules[r]['action'] for r in rule.tolist()] == actions
+
+    changes = realized_changes(features)
+    for i, r in enumerate(rows.tolist()):
+        m, day, price = features['mandi'][r], features['day'][r], features['current_price'][r]
+        series = features['mandi'] == m
+        for h, days in enumerate(HORIZON_DAYS):
+            later = series & (features['day'] <= day + days) & (features['day'] > max(day, day + days - STALE_DAYS))
+            expected = features['current_price'][np.flatnonzero(later)[-1]] / price - 1 if later.any() else np.nan
+            assert np.allclose(changes[r, h], expected, equal_nan=True), (r, days)
+
+def check_chunks(window, rule_sets):
+    """Featurizing a few mandis at a time tallies what featurizing the whole store does"""
+    whole = backtest_window(window, rule_sets)
+    chunk_rows, backtest.CHUNK_ROWS = backtest.CHUNK_ROWS, len(window) // 7
+    try:
+        chunked = backtest_window(window, rule_sets)
+    finally:
+        backtest.CHUNK_ROWS = chunk_rows
+    for name in rule_sets:
+        for field in ('signals', 'scored', 'hits'):
+            assert np.array_equal(whole[name][field], chunked[name][field]), (name, field)
+        assert np.allclose(whole[name]['change'], chunked[name]['change'])
+
+def print_table(name, rows):
+    print(f"\n{name}")
+    print(f"{'rule':<5}{'action':<23}{'signals':>10}" + ''.join(f"{f'hit {d}d':>9}{f'chg {d}d':>9}" for d in HORIZON_DAYS))
+    for row in rows:
+        print(f"{row['rule']:<5}{row['action']:<23}{row['signals']:>10}" + ''.join(
+            f"{_pct(row['hitRate'][d]):>9}{_pct(row['meanChangePct'][d], 100):>9}" for d in HORIZON_DAYS
+        ))
+
+def _pct(value, scale=1):
+    return '-' if value is None else f"{value / scale:.1%}"
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', help='price-store directory (default: generate the national dataset)')
+    parser.add_argument('--mandis', type=int, default=300, help='mandis per state when generating')
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    parser.add_argument('--samples', type=int, default=300, help='mandi-days replayed the per-request way')
+    args = parser.parse_args()
+
+    rule_sets = {'current': RULES, 'tighter': tighter_rules()}
+    with tempfile.TemporaryDirectory() as directory:
+        store_dir = args.data or standins.generate_price_stores(directory, args.mandis, args.years)
+        start = time.perf_counter()
+        tallies = backtest_dir(store_dir, rule_sets, workers=args.workers)
+        elapsed = time.perf_counter() - start
+
+        paths = [crop_paths(os.path.join(store_dir, state))[crop] for state, crop in tallies]
+        rows = sum(len(open_local(path).window()) for path in paths)
+        print(f"backtested {rows:,} mandi-days from {len(tallies)} stores in {elapsed:.1f} s "
+              f"({rows / elapsed / 1e6:.2f}M rows/s, {args.workers or os.cpu_count()} workers)")
+
+        analyzer = PriceAnalyzer(None, None)
+        engine = RecommendationEngine()
+        window = open_local(paths[0]).window()
+        features = trend_features(window)
+        sample = np.sort(np.random.default_rng(3).choice(len(features['day']), args.samples, replace=False))
+        start = time.perf_counter()
+        replay(window, features, sample, analyzer, engine)
+        per_row = (time.perf_counter() - start) / args.samples
+        print(f"replaying analyze_trends day by day: {per_row * 1000:.2f} ms per mandi-day, "
+              f"{per_row * rows / 60:.0f} min for the same rows on one core")
+        check_features(window, sample, analyzer, engine)
+        check_chunks(window, rule_sets)
+        print(f"features, rules and outcomes match the per-request path on {args.samples} sampled mandi-days")
+
+        for name, rules in rule_sets.items():
+            print_table(f"rule set '{name}', all states and crops", rule_rows(combine(t[name] for t in tallies.values()), rules))
+
+        print(f"\n14-day hit rate of all signals{'':<6}" + ''.join(f"{name:>10}" for name in rule_sets))
+        for label, keys in [
+            *((state, [k for k in tallies if k[0] == state]) for state in sorted({s for s, _ in tallies})),
+            *((crop, [k for k in tallies if k[1] == crop]) for crop in sorted({c for _, c in tallies}))
+        ]:
+            rates = []
+            for name in rule_sets:
+                tally = combine(tallies[k][name] for k in keys)
+                h = HORIZON_DAYS.index(14)
+                rates.append(tally['hits'][:, h].sum() / max(tally['scored'][:, h].sum(), 1))
+            print(f"{label:<36}" + ''.join(f"{rate:>10.1%}" for rate in rates))
+
+        current = combine(t['current'] for t in tallies.values())
+        assert current['signals'].sum() > 0.5 * rows, current['signals'].sum()
+
+if __name__ == '__main__':
+    main()
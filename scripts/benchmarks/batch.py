@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+Benchmark the batch recommendation endpoint against the same items sent one at a time
+"""
+
+import argparse
+import json
+import random
+import time
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, seed_bucket, timed
+
+STATES = ['maharashtra', 'karnataka', 'gujarat']
+CROPS = ['cotton', 'soybean', 'wheat', 'onion', 'tur']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--items', type=int, default=1000)
+    parser.add_argument('--s3-ms', type=float, default=30)
+    parser.add_argument('--bedrock-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    s3 = LocalS3(latency_ms=args.s3_ms)
+    for state in STATES:
+        for crop in CROPS:
+            seed_bucket(s3, state=state, crop=crop)
+    bedrock = StubBedrock(args.bedrock_ms)
+    app = load_recommendation_app(s3, bedrock, StubDynamoDB())
+
+    rng = random.Random(0)
+    items = [
+        {'id': i, 'state': rng.choice(STATES), 'crop': rng.choice(CROPS),
+         'location': f"Village {rng.randrange(100)}", 'quantity': rng.randint(5, 80)}
+        for i in range(args.items)
+    ]
+
+    def single(item):
+        response = app.lambda_handler({'body': json.dumps(item)}, None)
+        assert response['statusCode'] == 200
+
+    one = timed(lambda: single(items[0]), 5)
+    single_ms = sorted(one)[len(one) // 2]
+
+    calls_before = bedrock.calls
+    start = time.perf_counter()
+    response = app.batch_handler({'body': json.dumps({'items': items})}, None)
+    batch_ms = (time.perf_counter() - start) * 1000
+    assert response['statusCode'] == 200
+    results = json.loads(response['body'])['results']
+    assert len(results) == len(items) and not any('error' in r for r in results)
+
+    batch_calls = bedrock.calls - calls_before
+    # Mandi lookups run on the executor, so the batch stays within a few requests' time
+    assert batch_ms < 10 * single_ms, f"batch took {batch_ms:.0f} ms, {batch_ms / single_ms:.0f}x one request"
+
+    # Malformed items get their own error slot; the rest of the batch is still answered
+    bad = [{**items[0], 'location': {'lat': 20.7}}, {**items[1], 'crop': ['cotton']},
+           {**items[2], 'quantity': '50'}, {k: v for k, v in items[3].items() if k != 'state'}, 'not an item']
+    response = app.batch_handler({'body': json.dumps({'items': bad + items[:3], 'rankBy': 'netRealization'})}, None)
+    assert response['statusCode'] == 200, response['body']
+    mixed = json.loads(response['body'])['results']
+    assert [r['error'] for r in mixed[:len(bad)]] == [
+        'Fields must be strings: location', 'Fields must be strings: crop', 'quantity must be a non-negative number',
+        'Missing fields: state', 'Missing fields: state, crop, location, quantity'
+    ], mixed[:len(bad)]
+    assert not any('error' in r for r in mixed[len(bad):])
+
+    start = time.perf_counter()
+    streamed = app.batch_handler({'body': json.dumps({'items': items, 'format': 'ndjson'})}, None)
+    ndjson_ms = (time.perf_counter() - start) * 1000
+
+    print(f"single request p50:          {single_ms:8.1f} ms")
+    print(f"{len(items)} sequential (est):     {single_ms * len(items) / 1000:8.1f} s")
+    print(f"batch of {len(items)} (JSON):        {batch_ms:8.1f} ms ({batch_ms / single_ms:.1f}x one request)")
+    print(f"batch of {len(items)} (NDJSON):      {ndjson_ms:8.1f} ms, {len(streamed['body']) / 1e6:.1f} MB")
+    print(f"Bedrock calls for the batch: {batch_calls}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,68 @@
+#!/usr/bin/env python3
+"""
+Compare historicalPrices as row dicts with the columnar chart series, by response
+bytes (raw and gzip) and serialization time, for 90-day and multi-year ranges
+"""
+
+import argparse
+import gzip
+import json
+
+import standins
+from standins import (LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, make_price_csv,
+                      percentile, seed_bucket, timed)
+
+standins.use_recommendation_modules()
+
+from chart_series import encode_series
+from price_store import PriceStore, convert_csv
+from serialization import dumps, orjson
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, default=20)
+    parser.add_argument('--days', type=int, nargs='+', default=[90, 365 * 5])
+    parser.add_argument('--points', type=int, default=200)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    store = PriceStore.from_bytes(convert_csv(
+        make_price_csv(days=max(args.days), mandis=args.mandis), 'maharashtra', 'cotton'
+    ))
+    print(f"{args.mandis} mandis; fast encoder: {'orjson' if orjson is not None else 'stdlib json'}")
+    print(f"{'days':>6}  {'payload':<22}{'bytes':>10}{'gzip':>9}{'encode ms':>11}")
+    for days in args.days:
+        window = store.last_days(days)
+        payloads = {
+            'rows, json.dumps': lambda: json.dumps(window.to_records()),
+            'columnar': lambda: dumps(encode_series(window, days=days)),
+            f"columnar, {args.points} pts": lambda: dumps(encode_series(window, days=days, points=args.points))
+        }
+        for name, encode in payloads.items():
+            body = encode()
+            elapsed = percentile(timed(encode, args.repeat), 50)
+            print(f"{days:>6}  {name:<22}{len(body):>10}{len(gzip.compress(body.encode('utf-8'))):>9}{elapsed:>11.2f}")
+
+    s3 = LocalS3(latency_ms=0)
+    seed_bucket(s3, mandis=args.mandis)
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB())
+    body = json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50,
+                       'chart': {'days': 90, 'points': 30}})
+    first = app.lambda_handler({'body': body}, None)
+    assert first['statusCode'] == 200 and 'ETag' not in first['headers'], first['headers']
+    # A POST is never answered with 304; the series route revalidates
+    resent = app.lambda_handler({'body': body, 'headers': {'If-None-Match': '*'}}, None)
+    assert resent['statusCode'] == 200, resent['statusCode']
+    query = {'state': 'maharashtra', 'crop': 'cotton', 'days': '90', 'points': '30'}
+    series = app.series_handler({'queryStringParameters': query}, None)
+    assert series['statusCode'] == 200, series['body']
+    assert json.loads(series['body'])['historicalPrices'] == json.loads(first['body'])['historicalPrices']
+    again = app.series_handler({'queryStringParameters': query, 'headers': {'If-None-Match': series['headers']['ETag']}}, None)
+    assert again['statusCode'] == 304 and again['body'] == '', again
+    bad = app.series_handler({'queryStringParameters': {**query, 'days': 'year'}}, None)
+    assert bad['statusCode'] == 400, bad
+    print(f"\nhandler: {len(first['body'])} byte response; GET /prices/series {len(series['body'])} bytes, "
+          f"repeat with If-None-Match -> {again['statusCode']}")
+
+if __name__ == '__main__':
+    main()
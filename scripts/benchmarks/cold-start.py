@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Measure get_recommendation cold-start init: module import time, heavy modules loaded and their size on disk
+
+Each run imports app.py in a fresh interpreter under `python -X importtime`,
+which is what Lambda does during INIT. Exits non-zero when a forbidden module
+is imported or the median import time exceeds --max-ms, so it can gate CI.
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RECOMMENDATION_DIR = os.path.join(ROOT, 'backend', 'functions', 'get_recommendation')
+# Lambda puts layer code on the path under /opt/python
+LAYER_DIRS = [os.path.join(ROOT, 'backend', 'layers', 'tracing', 'python')]
+
+# Runs in the child after the import; reports the non-stdlib packages that were loaded
+REPORT = """
+import json, os, sys
+loaded = {}
+for name, module in list(sys.modules.items()):
+    top = name.partition('.')[0]
+    path = getattr(module, '__file__', None)
+    if name == top and path and top not in sys.stdlib_module_names and not path.startswith(%r):
+        loaded[top] = os.path.dirname(path) if path.endswith('__init__.py') else path
+print(json.dumps(loaded))
+""" % os.path.join(ROOT, 'backend')
+
+def import_once(module, env):
+    """(wall ms, {top-level module: cumulative import us}, loaded third-party packages)"""
+    start = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f"import {module}\n{REPORT}"],
+        cwd=RECOMMENDATION_DIR, env=env, capture_output=True, text=True
+    )
+    wall = (time.perf_counter() - start) * 1000
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return wall, parse_importtime(result.stderr), json.loads(result.stdout.strip().splitlines()[-1])
+
+def parse_importtime(stderr):
+    """Cumulative microseconds per top-level import from -X importtime output"""
+    totals = {}
+    for line in stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        # Nested imports are indented under the module that triggered them
+        if not name[1:].startswith(' '):
+            totals[name.strip()] = totals.get(name.strip(), 0) + int(cumulative)
+    return totals
+
+def size_mb(path):
+    if os.path.isfile(path):
+        return os.path.getsize(path) / 1e6
+    total = 0
+    for directory, _, files in os.walk(path):
+        total += sum(os.path.getsize(os.path.join(directory, f)) for f in files)
+    return total / 1e6
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--repeat', type=int, default=10)
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--forbid', nargs='*', default=['pandas', 'geopy', 'boto3', 'botocore'])
+    parser.add_argument('--max-ms', type=float, default=None)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        env = dict(os.environ)
+        env.update({
+            'PRICE_DATA_BUCKET': 'bench-bucket',
+            'DYNAMODB_TABLE': 'bench-table',
+            'AWS_DEFAULT_REGION': 'ap-south-1',
+            'QUERY_LOG_SINK': f"file:{os.path.join(tmp, 'queries.jsonl')}",
+            'PYTHONPATH': os.pathsep.join(LAYER_DIRS + [os.environ.get('PYTHONPATH', '')])
+        })
+        # The interpreter's own startup is not part of the function's init
+        baseline = statistics.median(
+            import_once('sys', env)[0] for _ in range(args.repeat)
+        )
+        runs = [import_once(args.module, env) for _ in range(args.repeat)]
+
+    imports_ms = [totals.get(args.module, 0) / 1000 for _, totals, _ in runs]
+    wall_ms = [wall - baseline for wall, _, _ in runs]
+    totals = runs[-1][1]
+    loaded = runs[-1][2]
+
+    print(f"import {args.module}: {args.repeat} fresh interpreters")
+    print(f"{'':<22}{'median ms':>11}{'max ms':>9}")
+    print(f"{'import time':<22}{statistics.median(imports_ms):>11.1f}{max(imports_ms):>9.1f}")
+    print(f"{'init over baseline':<22}{statistics.median(wall_ms):>11.1f}{max(wall_ms):>9.1f}")
+
+    print(f"\n{'slowest top-level imports':<34}{'cumulative ms':>14}")
+    for name, us in sorted(totals.items(), key=lambda item: -item[1])[:args.top]:
+        print(f"{name:<34}{us / 1000:>14.1f}")
+
+    print(f"\n{'third-party packages loaded':<34}{'size MB':>14}")
+    for name, path in sorted(loaded.items()):
+        print(f"{name:<34}{size_mb(path):>14.1f}")
+
+    failures = [f"{name} is imported during init" for name in args.forbid if name in loaded]
+    if args.max_ms is not None and statistics.median(imports_ms) > args.max_ms:
+        failures.append(f"median import time {statistics.median(imports_ms):.1f} ms exceeds {args.max_ms:.1f} ms")
+    for failure in failures:
+        print(f"FAIL: {failure}", file=sys.stderr)
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
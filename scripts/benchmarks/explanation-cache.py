@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+"""
+Benchmark the explanation cache, request coalescing and latency-budget fallback with a stub model
+"""
+
+import argparse
+import random
+from concurrent.futures import ThreadPoolExecutor
+
+import standins
+from standins import StubBedrock, percentile, timed
+
+standins.use_recommendation_modules()
+
+from explanation_cache import CircuitBreaker, ExplanationCache
+from explanation_generator import ExplanationGenerator
+
+CROPS = ['cotton', 'soybean', 'wheat', 'onion', 'tur', 'gram', 'maize', 'rice']
+STATES = ['maharashtra', 'karnataka', 'madhya pradesh']
+
+def request_mix(count, seed=0):
+    """Farmer queries: a few crops per state with prices jittering within a day"""
+    rng = random.Random(seed)
+    requests = []
+    for _ in range(count):
+        crop = rng.choice(CROPS)
+        base = 2000 + 500 * CROPS.index(crop)
+        analysis = {
+            'current_price': base + rng.uniform(-10, 10),
+            'avg_12week': base * 1.02,
+            'trend_direction': 'Stable',
+            'trend_strength': 'Weak'
+        }
+        requests.append((crop, rng.choice(STATES), analysis, {'action': 'Sell within 1-2 weeks'}))
+    return requests
+
+def run(generator, requests, concurrency):
+    latencies = []
+
+    def one(item):
+        latencies.extend(timed(lambda: generator.generate_explanation(*item), 1))
+
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(one, requests))
+    return latencies
+
+def check_breaker():
+    """One outcome per call, however late it finishes, and a single trial call once half-open"""
+    now = [0.0]
+    breaker = CircuitBreaker(0.2, failure_threshold=3, cooldown_seconds=30, clock=lambda: now[0])
+    for _ in range(2):
+        call = breaker.start()
+        now[0] += 0.5
+        assert not breaker.is_open
+        # The overrun already counted; finishing late neither adds a failure nor resets them
+        breaker.finish(call, failed=True)
+        breaker.finish(call)
+    assert not breaker.is_open, 'a late call counted twice'
+    breaker.start()
+    now[0] += 0.5
+    assert breaker.is_open and breaker.start() is None
+
+    now[0] += 30
+    trial = breaker.start()
+    assert trial is not None
+    assert breaker.start() is None and breaker.is_open, 'more than one trial call while half-open'
+    breaker.cancel(trial)
+    trial = breaker.start()
+    breaker.finish(trial, failed=True)
+    assert breaker.start() is None, 'a failed trial call should reopen the breaker'
+    now[0] += 30
+    breaker.finish(breaker.start())
+    assert not breaker.is_open and breaker.start() is not None and breaker.start() is not None
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--requests', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--model-ms', type=float, default=300)
+    args = parser.parse_args()
+
+    requests = request_mix(args.requests)
+    scenarios = {
+        'no cache': ExplanationGenerator(StubBedrock(args.model_ms)),
+        'cache + coalescing': ExplanationGenerator(StubBedrock(args.model_ms), cache=ExplanationCache()),
+        'slow model, 0.2s budget': ExplanationGenerator(StubBedrock(args.model_ms * 10), cache=ExplanationCache(),
+                                                        latency_budget=0.2)
+    }
+
+    print(f"{'scenario':<26}{'p50 ms':>9}{'p99 ms':>9}{'model calls':>13}{'saved':>7}{'fallbacks':>11}{'hit ratio':>11}")
+    for name, generator in scenarios.items():
+        latencies = run(generator, requests, args.concurrency)
+        stats = generator.stats()
+        print(f"{name:<26}{percentile(latencies, 50):>9.1f}{percentile(latencies, 99):>9.1f}"
+              f"{generator.bedrock.calls:>13}{stats['saved_model_calls']:>7}{stats['fallbacks']:>11}"
+              f"{stats['cache_hit_ratio']:>11.2f}")
+        assert stats['model_calls'] == generator.bedrock.calls, (stats['model_calls'], generator.bedrock.calls)
+    check_breaker()
+
+if __name__ == '__main__':
+    main()
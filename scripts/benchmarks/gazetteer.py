@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+"""
+Build a village-scale gazetteer and measure its size, open time, resident memory and
+lookup latency for exact names, PIN codes, prefixes, spelling variants and typos;
+check that the recommendation handler places the user with it
+"""
+
+import argparse
+import csv
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, percentile, seed_bucket
+
+standins.use_recommendation_modules()
+
+from gazetteer import Gazetteer, build_gazetteer, load_gazetteer, normalize, phonetic_key
+from mandi_finder import DEFAULT_COORDS, MandiFinder
+from object_cache import ObjectCache
+
+SYLLABLES = ['a', 'ba', 'bha', 'da', 'dha', 'ga', 'ka', 'kha', 'la', 'ma', 'na', 'pa', 'ra', 'sa', 'sha', 'ta',
+             'tha', 'va', 'ja', 'ko', 'mu', 'ni', 'pu', 'ri', 'chi', 'de', 'go', 'ha', 'ke', 'lo', 'ro', 'ti', 'u', 'vi']
+SUFFIXES = ['', '', '', 'pur', 'gaon', 'wadi', 'khed', 'nagar', 'ner', 'ala', 'oli', 'wada', 'pet', 'halli']
+# Spellings that should reach the same phonetic key
+VARIANTS = [('w', 'v'), ('v', 'w'), ('i', 'ee'), ('u', 'oo'), ('sh', 's'), ('bh', 'b'), ('dh', 'd'), ('a', 'aa')]
+
+def rss_mb():
+    with open('/proc/self/status') as f:
+        for line in f:
+            if line.startswith('VmRSS:'):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+def synthesize(count, states, districts_per_state, talukas_per_district, seed):
+    """Places and PIN codes with repeated and near-repeated names, as in real village lists"""
+    rng = np.random.default_rng(seed)
+    state_names = [f"State {chr(65 + i // 26)}{chr(65 + i % 26)}" for i in range(states)]
+
+    def names(n):
+        lengths = rng.integers(2, 5, n)
+        parts = rng.integers(0, len(SYLLABLES), (n, 4))
+        suffixes = rng.integers(0, len(SUFFIXES), n)
+        return [
+            (''.join(SYLLABLES[p] for p in row[:length]) + SUFFIXES[suffix]).capitalize()
+            for row, length, suffix in zip(parts.tolist(), lengths.tolist(), suffixes.tolist())
+        ]
+
+    places = []
+    pins = []
+    district_count = states * districts_per_state
+    district_names = names(district_count)
+    centres = np.column_stack([rng.uniform(8, 32, district_count), rng.uniform(69, 95, district_count)])
+    for d, (name, (lat, lng)) in enumerate(zip(district_names, centres.tolist())):
+        state = state_names[d // districts_per_state]
+        places.append((name, 'district', state, name, lat, lng, int(rng.integers(50_000, 3_000_000))))
+        pins.append((100000 + d * 100, lat, lng, state, name))
+        for taluka in names(talukas_per_district):
+            places.append((taluka, 'taluka', state, name, lat + rng.normal(0, 0.3), lng + rng.normal(0, 0.3),
+                           int(rng.integers(10_000, 200_000))))
+
+    villages = count - len(places)
+    district = rng.integers(0, district_count, villages)
+    lat = centres[district, 0] + rng.normal(0, 0.4, villages)
+    lng = centres[district, 1] + rng.normal(0, 0.4, villages)
+    population = rng.lognormal(7, 1, villages).astype(np.int64)
+    for name, d, la, ln, pop in zip(names(villages), district.tolist(), lat.tolist(), lng.tolist(), population.tolist()):
+        places.append((name, 'village', state_names[d // districts_per_state], district_names[d], la, ln, pop))
+    return places, pins
+
+def latencies(fn, queries):
+    samples = []
+    for query in queries:
+        start = time.perf_counter_ns()
+        fn(query)
+        samples.append((time.perf_counter_ns() - start) / 1e6)
+    return samples
+
+def variant(name, rng):
+    lower = name.lower()
+    options = [(a, b) for a, b in VARIANTS if a in lower[1:]]
+    if not options:
+        return None
+    a, b = options[rng.integers(len(options))]
+    at = lower.index(a, 1)
+    return name[:at] + b + name[at + len(a):]
+
+def typo(name, rng):
+    """One substituted letter after the first three"""
+    if len(name) < 6:
+        return None
+    at = int(rng.integers(3, len(name)))
+    letters = [c for c in 'bdgklmnprst' if c != name[at].lower()]
+    return name[:at] + letters[rng.integers(len(letters))] + name[at + 1:]
+
+def check_handler(places_csv):
+    """Location resolution through the recommendation handler, with the gazetteer loaded from S3"""
+    s3 = LocalS3(latency_ms=0)
+    seed_bucket(s3)
+    with open(places_csv, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    places = [(r['name'], r['kind'], r['state'], r['district'], float(r['latitude']), float(r['longitude']),
+               int(r['population'])) for r in rows]
+    s3.put_object('bench-bucket', 'gazetteer/india.bin', build_gazetteer(places))
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB(0))
+    with tempfile.TemporaryDirectory() as directory:
+        gazetteer = load_gazetteer(app.s3, 'bench-bucket', 'gazetteer/india.bin', download_dir=directory)
+        # A second container finds the copy in /tmp and only revalidates it
+        requests = s3.requests
+        assert len(load_gazetteer(app.s3, 'bench-bucket', 'gazetteer/india.bin', download_dir=directory)) == len(gazetteer)
+        assert s3.requests == requests + 1 and s3.bytes_sent == len(s3.objects[('bench-bucket', 'gazetteer/india.bin')][0])
+        app.mandi_finder = MandiFinder(app.s3, 'bench-bucket', cache=app.object_cache, gazetteer=gazetteer)
+        cases = {'Akola': (20.7002, 77.0082), 'Amraoti': (20.9374, 77.7796), 'Murtijapur, Akola': (20.731, 77.365),
+                 'Nowhere Village': None}
+        for location, expected in cases.items():
+            event = {'body': json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': location, 'quantity': 50})}
+            response = app.lambda_handler(event, None)
+            assert response['statusCode'] == 200, response['body']
+            body = json.loads(response['body'])
+            if expected is None:
+                assert not body['locationResolved'] and body['nearbyMandis'] == [], body
+                assert (body['userLocation']['lat'], body['userLocation']['lng']) == DEFAULT_COORDS
+            else:
+                found = (body['userLocation']['lat'], body['userLocation']['lng'])
+                assert body['locationResolved'] and np.allclose(found, expected, atol=1e-3), (location, found)
+            print(f"  {location!r:<22} -> {body['userLocation']}, {len(body['nearbyMandis'])} mandis")
+        print(f"  {app.mandi_finder.stats()}")
+
+        # Without a gazetteer mandis are searched around the default, which is not the location
+        app.mandi_finder = MandiFinder(app.s3, 'bench-bucket', cache=app.object_cache,
+                                       gazetteer_path=os.path.join(directory, 'missing.bin'))
+        event = {'body': json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50})}
+        body = json.loads(app.lambda_handler(event, None)['body'])
+        assert not body['locationResolved'] and body['nearbyMandis'], body
+        assert (body['userLocation']['lat'], body['userLocation']['lng']) == DEFAULT_COORDS
+    check_late_upload(build_gazetteer(places))
+
+def check_late_upload(data):
+    """A warm container without a gazetteer picks one up once the object cache's TTL has passed"""
+    now = [0.0]
+    cache = ObjectCache(LocalS3(latency_ms=0), clock=lambda: now[0])
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'india.bin')
+        finder = MandiFinder(cache.s3, 'bench-bucket', cache=cache, gazetteer_path=path)
+        assert finder.get_gazetteer() is None
+        with open(path, 'wb') as f:
+            f.write(data)
+        assert finder.get_gazetteer() is None, 'missing gazetteer not remembered for the TTL'
+        now[0] += cache.ttl_seconds
+        assert finder.get_gazetteer() is not None, 'gazetteer deployed later never picked up'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--places', type=int, default=650_000)
+    parser.add_argument('--states', type=int, default=30)
+    parser.add_argument('--districts', type=int, default=25, help='districts per state')
+    parser.add_argument('--talukas', type=int, default=8, help='talukas per district')
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    places, pins = synthesize(args.places, args.states, args.districts, args.talukas, args.seed)
+    generated = time.perf_counter() - start
+    start = time.perf_counter()
+    data = build_gazetteer(places, pins)
+    built = time.perf_counter() - start
+    print(f"{len(places)} places, {len(pins)} PIN codes: generated in {generated:.1f} s, "
+          f"built in {built:.1f} s, {len(data) / 1e6:.1f} MB")
+
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'gazetteer.bin')
+        with open(path, 'wb') as f:
+            f.write(data)
+        del data
+        before = rss_mb()
+        start = time.perf_counter()
+        gazetteer = Gazetteer.open(path, cache_size=0)
+        opened = (time.perf_counter() - start) * 1000
+        print(f"open: {opened:.2f} ms, resident +{rss_mb() - before:.1f} MB")
+
+        rng = np.random.default_rng(args.seed + 1)
+        sample = [places[i] for i in rng.integers(0, len(places), args.queries).tolist()]
+        state_of = lambda place: place[2]
+        variants = [(v, p) for v, p in ((variant(p[0], rng), p) for p in sample) if v]
+        typos = [(t, p) for t, p in ((typo(p[0], rng), p) for p in sample) if t]
+        prefixes = [p[0][:3] for p in sample]
+        pin_queries = [str(pins[i][0]) for i in rng.integers(0, len(pins), args.queries).tolist()]
+
+        # An exact match must come back as a place with that name, in that state
+        for place in sample[:200]:
+            found = gazetteer.resolve(place[0], state_of(place))
+            assert found is not None and normalize(found.name) == normalize(place[0]), (place, found)
+        for pin in pin_queries[:200]:
+            assert gazetteer.resolve(pin).kind == 'pin'
+
+        def recovered(cases):
+            # A place spelled the same way up to its phonetic key is as good an answer
+            hits = 0
+            for query, place in cases:
+                found = gazetteer.resolve(query, state_of(place))
+                hits += found is not None and phonetic_key(normalize(found.name)) == phonetic_key(normalize(place[0]))
+            return hits / max(len(cases), 1)
+
+        variant_rate = recovered(variants)
+        typo_rate = recovered(typos)
+        assert variant_rate > 0.95, variant_rate
+        assert typo_rate > 0.8, typo_rate
+
+        print(f"\n{'lookup':<26}{'p50 ms':>9}{'p99 ms':>9}")
+        cases = {
+            'exact name': latencies(lambda p: gazetteer.resolve(p[0], state_of(p)), sample),
+            'exact name, no state': latencies(lambda p: gazetteer.resolve(p[0]), sample),
+            'PIN code': latencies(gazetteer.resolve, pin_queries),
+            'prefix search (3 chars)': latencies(lambda q: gazetteer.search(q, limit=10), prefixes),
+            'spelling variant': latencies(lambda c: gazetteer.resolve(c[0], state_of(c[1])), variants),
+            'typo (fuzzy)': latencies(lambda c: gazetteer.resolve(c[0], state_of(c[1])), typos)
+        }
+        gazetteer.cache_size = 4096
+        for place in sample:
+            gazetteer.resolve(place[0], state_of(place))
+        cases['repeat (LRU hit)'] = latencies(lambda p: gazetteer.resolve(p[0], state_of(p)), sample)
+        for name, samples in cases.items():
+            print(f"{name:<26}{percentile(samples, 50):>9.3f}{percentile(samples, 99):>9.3f}")
+        print(f"\nvariants recovered {variant_rate:.1%}, typos recovered {typo_rate:.1%}; "
+              f"resident after lookups +{rss_mb() - before:.1f} MB")
+
+    print('\nhandler:')
+    check_handler(os.path.join(standins.ROOT, 'data', 'sample-gazetteer.csv'))
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+#!/usr/bin/env python3
+"""
+Benchmark the single-pass per-mandi analysis against a per-mandi analyze_trends loop
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+from price_analyzer import PriceAnalyzer
+from price_store import PriceWindow
+
+def synthetic_window(mandis, days, seed=0):
+    """Daily rows for every mandi, sorted by day then mandi like the price store"""
+    rng = np.random.default_rng(seed)
+    day = np.repeat(np.arange(20000, 20000 + days, dtype=np.int32), mandis)
+    mandi = np.tile(np.arange(mandis, dtype=np.uint16), days)
+    offset = rng.normal(0, 300, mandis)[mandi]
+    modal = np.round(6000 + offset + 2 * (day - 20000) + rng.normal(0, 100, len(day))).astype(np.float32)
+    volume = rng.integers(100, 2000, len(day)).astype(np.float32)
+    codes = [{'code': f"MH{m:05d}", 'name': f"Mandi {m}", 'variety': ''} for m in range(mandis)]
+    return PriceWindow(day, mandi, modal - 200, modal + 200, modal, volume, codes)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, nargs='+', default=[100, 1000, 5000])
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--loop-sample', type=int, default=50, help='mandis timed in the per-mandi loop')
+    args = parser.parse_args()
+
+    analyzer = PriceAnalyzer(None, None)
+    print(f"{'mandis':>7}{'rows':>11}{'grouped ms':>12}{'loop ms (est)':>15}")
+    for mandis in args.mandis:
+        window = synthetic_window(mandis, args.days)
+
+        start = time.perf_counter()
+        result = analyzer.analyze_trends_by_mandi(window)
+        grouped = (time.perf_counter() - start) * 1000
+
+        # Per-mandi loop over the current single-series analysis, extrapolated from a sample
+        sample = min(args.loop_sample, mandis)
+        start = time.perf_counter()
+        for m in range(sample):
+            rows = window.mandi == m
+            single = PriceWindow(*(column[rows] for column in window.columns()), window.mandis)
+            analysis = analyzer.analyze_trends(single)
+            assert abs(analysis['avg_12week'] - result['mandis']['avg_12week'][m]) < 1e-6
+        loop = (time.perf_counter() - start) * 1000 * mandis / sample
+
+        print(f"{mandis:>7}{len(window):>11}{grouped:>12.1f}{loop:>15.1f}")
+
+if __name__ == '__main__':
+    main()
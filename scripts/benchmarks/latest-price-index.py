@@ -0,0 +1,96 @@
+#!/usr/bin/env python3
+"""
+Benchmark latest-price index lookups across a full state mandi list
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+from latest_price_index import LatestPriceIndex, build_index
+from price_analyzer import PriceAnalyzer
+from price_store import PriceStore, PriceWindow, encode_store, to_day
+
+def synthetic_store(crop, mandis, days, rng):
+    """Price store with one row per mandi per day"""
+    last_day = to_day(time.strftime('%Y-%m-%d'))
+    day = np.repeat(np.arange(last_day - days + 1, last_day + 1, dtype=np.int32), mandis)
+    mandi = np.tile(np.arange(mandis, dtype=np.uint16), days)
+    base = rng.uniform(2000, 7000, mandis)[mandi]
+    modal = np.round(base * (1 + rng.normal(0, 0.03, len(day))))
+    window = PriceWindow(
+        day, mandi, modal * 0.95, modal * 1.05, modal, rng.uniform(50, 1500, len(day)),
+        [{'code': f"M{m:05d}", 'name': f"Mandi {m}", 'variety': ''} for m in range(mandis)]
+    )
+    return PriceStore.from_bytes(encode_store(window, 'bench', crop))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, default=7000)
+    parser.add_argument('--crops', type=int, default=20)
+    parser.add_argument('--days', type=int, default=84)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    crops = [f"crop{c:02d}" for c in range(args.crops)]
+    stores = {crop: synthetic_store(crop, args.mandis, args.days, rng) for crop in crops}
+    codes = [f"M{m:05d}" for m in range(args.mandis)]
+
+    start = time.perf_counter()
+    data = build_index('bench', stores)
+    build_s = time.perf_counter() - start
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'latest-prices.idx')
+        with open(path, 'wb') as f:
+            f.write(data)
+
+        start = time.perf_counter()
+        index = LatestPriceIndex.open(path)
+        open_ms = (time.perf_counter() - start) * 1000
+
+        # Equivalent dicts of dicts, the layout the index replaces
+        tracemalloc.start()
+        nested = {}
+        for crop in crops:
+            per_crop = nested[crop] = {}
+            for code in codes:
+                latest = index.lookup(crop, code)
+                per_crop[code] = {'price': latest.price, 'deviation': latest.deviation, 'demand': latest.demand}
+        nested_bytes = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+
+        crop = crops[0]
+        analysis = PriceAnalyzer(None, None).analyze_trends_by_mandi(stores[crop].window())['mandis']
+        expected = dict(zip(analysis['mandi_code'], analysis['current_price'].tolist()))
+        assert all(index.lookup(crop, code).price == int(expected[code]) for code in codes)
+        # Past max_age_days the latest prices count as missing
+        stale = datetime.now() + timedelta(days=index.max_age_days + 1)
+        assert index.lookup(crop, codes[0], stale) is None
+        assert np.isnan(index.prices(crop, np.array(codes), stale)).all()
+        assert not np.isnan(index.prices(crop, np.array(codes))).any()
+
+        full = standins.timed(lambda: [index.lookup(crop, code) for code in codes], 20)
+        nearby = standins.timed(lambda: [index.lookup(crop, code) for code in codes[:10]], 200)
+        recompute = standins.timed(lambda: PriceAnalyzer(None, None).analyze_trends_by_mandi(stores[crop].window()), 5)
+
+        print(f"{args.crops} crops x {args.mandis} mandis, {args.days} days of history per crop")
+        print(f"build: {build_s:.2f} s; index {len(data) / 1e6:.2f} MB on disk, "
+              f"dicts of dicts {nested_bytes / 1e6:.1f} MB; mmap open {open_ms:.2f} ms")
+        print(f"lookup, all {args.mandis} mandis: {standins.percentile(full, 50):8.2f} ms "
+              f"({standins.percentile(full, 50) * 1000 / args.mandis:.2f} us each)")
+        print(f"lookup, 10 nearby mandis:  {standins.percentile(nearby, 50) * 1000:8.1f} us")
+        print(f"recompute from price store: {standins.percentile(recompute, 50):8.2f} ms per request")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,343 @@
+#!/usr/bin/env python3
+"""
+Replay a request mix against the recommendation, batch and analytics handlers with
+local stand-ins for S3, DynamoDB and Bedrock, and report throughput and latency
+
+S3 is served from a directory laid out like the bucket (scripts/generate-sample-data.py
+writes one), or from an in-memory bucket seeded with one state and crop. Each worker
+process is one warm container running its share of the requests back to back; in
+cold mode every request gets a fresh process, so its latency includes the import.
+Stage latencies come from the handlers' own tracers. Results are saved as JSON
+and can be compared with a saved baseline, e.g. one from the previous commit.
+"""
+
+import argparse
+import json
+import multiprocessing
+import os
+import random
+import statistics
+import subprocess
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import standins
+from standins import (DirectoryS3, LocalS3, StubBedrock, StubDynamoDB, install_recommendation_clients,
+                      load_analytics_app, percentile, seed_bucket)
+
+# Workers send back tracing.Histogram objects
+standins.use_recommendation_modules()
+
+BUCKET = 'bench-bucket'
+HANDLERS = ['recommendation', 'batch', 'analytics']
+QUANTILES = (50, 95, 99)
+
+def bucket_contents(data_dir):
+    """{state: [crops]} with a price store or CSV in the bucket directory"""
+    contents = {}
+    for prefix, suffix in (('price-store', '.bin'), ('historical-prices', '.csv')):
+        root = os.path.join(data_dir, prefix)
+        for state in sorted(os.listdir(root)) if os.path.isdir(root) else []:
+            for name in sorted(os.listdir(os.path.join(root, state))):
+                if name.endswith(suffix):
+                    crop = name[:-len(suffix)].split('_')[0] if suffix == '.csv' else name[:-len(suffix)]
+                    if crop not in contents.setdefault(state, []):
+                        contents[state].append(crop)
+    return contents
+
+def synthetic_mix(count, weights, contents, batch_size, seed):
+    """Requests drawn from the weighted handler mix over the bucket's states and crops"""
+    rng = random.Random(seed)
+    markets = [(state, crop) for state, crops in sorted(contents.items()) for crop in crops]
+    handlers = [name for name in HANDLERS if weights.get(name)]
+
+    def item():
+        state, crop = rng.choice(markets)
+        body = {'state': state, 'crop': crop, 'location': 'Akola', 'quantity': rng.randint(5, 200)}
+        if rng.random() < 0.2:
+            body['chart'] = {'days': rng.choice([90, 365]), 'points': 100}
+        return body
+
+    requests = []
+    for handler in rng.choices(handlers, [weights[name] for name in handlers], k=count):
+        if handler == 'recommendation':
+            event = {'body': json.dumps(item())}
+        elif handler == 'batch':
+            event = {'body': json.dumps({'items': [item() for _ in range(batch_size)]})}
+        else:
+            event = {'queryStringParameters': {'state': rng.choice(markets)[0]}}
+        requests.append({'handler': handler, 'event': event})
+    return requests
+
+def read_mix(path):
+    """Recorded requests, one {"handler": ..., "event": {...}} object per line"""
+    with open(path, encoding='utf-8') as f:
+        requests = [json.loads(line) for line in f if line.strip()]
+    for request in requests:
+        if request.get('handler') not in HANDLERS:
+            raise SystemExit(f"{path}: unknown handler {request.get('handler')!r}")
+    return requests
+
+def build_stand_ins(config):
+    """S3, DynamoDB and Bedrock stand-ins holding the bucket, query-log rollups and latest prices"""
+    # get_recommendation first on the path, so `import app` finds its app.py
+    standins.use_analytics_modules()
+    standins.use_recommendation_modules()
+    from price_store import PriceStore
+    from rollups import DailyRollups, RollupTable, latest_price_key, latest_price_table
+
+    if config['data']:
+        s3 = DirectoryS3(config['data'], latency_ms=config['s3_ms'])
+    else:
+        s3 = LocalS3(latency_ms=config['s3_ms'])
+        seed_bucket(s3, BUCKET)
+    dynamodb = StubDynamoDB(latency_ms=config['dynamodb_ms'])
+
+    # Analytics reads a latest-price table and rollups that offline jobs build
+    latency, s3.latency = s3.latency, 0
+    for state, crops in config['contents'].items():
+        windows = {}
+        for crop in crops:
+            try:
+                body = s3.get_object(Bucket=BUCKET, Key=f"price-store/{state}/{crop}.bin")['Body'].read()
+            except Exception:
+                continue
+            windows[crop] = PriceStore.from_bytes(body).window()
+        s3.put_object(BUCKET, latest_price_key(state), json.dumps(latest_price_table(state, windows)))
+    s3.latency = latency
+
+    logs = os.path.join(config['data'] or '', 'query-logs.jsonl')
+    if config['data'] and os.path.exists(logs):
+        with open(logs, encoding='utf-8') as f:
+            rollups = DailyRollups().add_all(json.loads(line) for line in f if line.strip())
+    else:
+        now = int(time.time() * 1000)
+        rng = random.Random(0)
+        rollups = DailyRollups().add_all(
+            {'timestamp': now - rng.randrange(90 * 86_400_000), 'state': state, 'crop': rng.choice(crops),
+             'recommendation': rng.choice(['Sell Now', 'Wait 2-4 weeks', 'Sell within 1-2 weeks'])}
+            for state, crops in config['contents'].items() for _ in range(5000)
+        )
+    dynamodb.latency = 0
+    RollupTable(dynamodb.Table(os.environ['ROLLUP_TABLE'])).replace(rollups)
+    dynamodb.latency = config['dynamodb_ms'] / 1000
+    return s3, dynamodb, StubBedrock(config['bedrock_ms'])
+
+def run_worker(config, requests, warmup):
+    """Import the handlers in this process as a container would, then run the requests in order"""
+    if config['query_log'].startswith('sqlite:'):
+        # One database per process, like one per container
+        os.environ['QUERY_LOG_SINK'] = f"{config['query_log']}.{os.getpid()}"
+    s3, dynamodb, bedrock = build_stand_ins(config)
+    install_recommendation_clients(s3, bedrock, dynamodb)
+
+    started = time.perf_counter()
+    import app
+    analytics = load_analytics_app(s3, dynamodb, BUCKET)
+    init_ms = (time.perf_counter() - started) * 1000
+
+    tracers = [app.tracer, analytics.tracer]
+    for tracer in tracers:
+        tracer.emit = lambda line: None
+    handlers = {
+        'recommendation': app.lambda_handler,
+        'batch': app.batch_handler,
+        'analytics': analytics.lambda_handler
+    }
+    for request in warmup:
+        handlers[request['handler']](request['event'], None)
+    for tracer in tracers:
+        tracer.take()
+
+    results = []
+    window = [time.time(), None]
+    for request in requests:
+        start = time.perf_counter()
+        response = handlers[request['handler']](request['event'], None)
+        results.append((request['handler'], (time.perf_counter() - start) * 1000, response['statusCode']))
+    window[1] = time.time()
+    app.query_log_writer.close()
+
+    histograms = {}
+    for tracer in tracers:
+        for name, histogram in tracer.take()[0].items():
+            if name in histograms:
+                histograms[name].merge(histogram)
+            else:
+                histograms[name] = histogram
+    return {'init_ms': init_ms, 'results': results, 'histograms': histograms, 'window': window}
+
+def run(config, requests, mode, concurrency, warmup):
+    """Worker outputs, and the wall-clock seconds from the first measured request to the last"""
+    context = multiprocessing.get_context('spawn')
+    if mode == 'cold':
+        pool = ProcessPoolExecutor(concurrency, mp_context=context, max_tasks_per_child=1)
+        jobs = [([request], []) for request in requests]
+    else:
+        pool = ProcessPoolExecutor(concurrency, mp_context=context)
+        jobs = [(requests[i::concurrency], requests[i::concurrency][:warmup]) for i in range(concurrency)]
+    with pool:
+        futures = [pool.submit(run_worker, config, share, warm) for share, warm in jobs]
+        outputs = [future.result() for future in futures]
+    if mode == 'cold':
+        # A cold request's latency is its container's init plus the request itself
+        for output in outputs:
+            output['results'] = [(h, ms + output['init_ms'], status) for h, ms, status in output['results']]
+    elapsed = max(o['window'][1] for o in outputs) - min(o['window'][0] for o in outputs)
+    return outputs, elapsed
+
+def summarize(outputs, elapsed, args, config):
+    latencies = {}
+    errors = {}
+    for output in outputs:
+        for handler, ms, status in output['results']:
+            latencies.setdefault(handler, []).append(ms)
+            errors[handler] = errors.get(handler, 0) + (status >= 500)
+    histograms = {}
+    for output in outputs:
+        for name, histogram in output['histograms'].items():
+            if name in histograms:
+                histograms[name].merge(histogram)
+            else:
+                histograms[name] = histogram
+    total = sum(len(samples) for samples in latencies.values())
+    init = [o['init_ms'] for o in outputs]
+    return {
+        'commit': git_commit(),
+        'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+        'config': {
+            'mode': args.mode, 'concurrency': args.concurrency, 'requests': total, 'warmup': args.warmup,
+            'data': args.data, 'mix': args.mix or args.weights, 's3_ms': args.s3_ms,
+            'dynamodb_ms': args.dynamodb_ms, 'bedrock_ms': args.bedrock_ms, 'query_log': config['query_log']
+        },
+        'throughput_rps': total / elapsed if elapsed > 0 else None,
+        'init_ms': {'median': statistics.median(init), 'max': max(init), 'workers': len(init)},
+        'handlers': {
+            handler: {
+                'count': len(samples),
+                'errors': errors[handler],
+                'mean': statistics.fmean(samples),
+                **{f"p{q}": percentile(samples, q) for q in QUANTILES}
+            }
+            for handler, samples in sorted(latencies.items())
+        },
+        'stages': {
+            name: {
+                'count': histogram.count,
+                **{f"p{q}": histogram.quantile(q / 100) / 1000 for q in QUANTILES}
+            }
+            for name, histogram in sorted(histograms.items())
+        }
+    }
+
+def git_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=standins.ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def print_report(report):
+    config = report['config']
+    print(f"{config['mode']} mode, concurrency {config['concurrency']}: {config['requests']} requests, "
+          f"{report['throughput_rps']:.1f} req/s (commit {report['commit']})")
+    print(f"init per container: median {report['init_ms']['median']:.0f} ms, max {report['init_ms']['max']:.0f} ms")
+    print(f"\n{'handler':<30}{'n':>7}{'errors':>8}" + ''.join(f"{'p%d ms' % q:>10}" for q in QUANTILES))
+    for name, row in report['handlers'].items():
+        print(f"{name:<30}{row['count']:>7}{row['errors']:>8}" + ''.join(f"{row['p%d' % q]:>10.2f}" for q in QUANTILES))
+    print(f"\n{'stage':<30}{'n':>7}{'':>8}" + ''.join(f"{'p%d ms' % q:>10}" for q in QUANTILES))
+    for name, row in report['stages'].items():
+        print(f"{name:<30}{row['count']:>7}{'':>8}" + ''.join(f"{row['p%d' % q]:>10.2f}" for q in QUANTILES))
+
+def compare(report, baseline, threshold):
+    """Print p50/p99 changes against a baseline; returns the regressions beyond threshold percent"""
+    regressions = []
+    print(f"\nagainst {baseline.get('commit')} ({baseline.get('timestamp')})")
+    for section in ('handlers', 'stages'):
+        print(f"{section[:-1]:<30}{'p50 ms':>10}{'change':>9}{'p99 ms':>10}{'change':>9}")
+        for name, row in report[section].items():
+            before = baseline.get(section, {}).get(name)
+            if not before:
+                continue
+            line = f"{name:<30}"
+            for q in ('p50', 'p99'):
+                change = (row[q] - before[q]) / before[q] * 100 if before[q] else 0.0
+                line += f"{row[q]:>10.2f}{change:>+8.0f}%"
+                if section == 'handlers' and change > threshold:
+                    regressions.append(f"{name} {q} {before[q]:.2f} -> {row[q]:.2f} ms")
+            print(line)
+    if baseline.get('throughput_rps') and report['throughput_rps']:
+        change = (report['throughput_rps'] - baseline['throughput_rps']) / baseline['throughput_rps'] * 100
+        print(f"{'throughput req/s':<30}{report['throughput_rps']:>10.1f}{change:>+8.0f}%")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--data', help='bucket directory (default: an in-memory bucket with one state and crop)')
+    parser.add_argument('--mix', help='recorded requests, JSON lines of {"handler", "event"}')
+    parser.add_argument('--weights', default='recommendation=80,batch=5,analytics=15',
+                        help='synthetic mix, handler=weight pairs')
+    parser.add_argument('--save-mix', help='write the requests replayed to this file')
+    parser.add_argument('--requests', type=int, default=400)
+    parser.add_argument('--batch-size', type=int, default=20)
+    parser.add_argument('--concurrency', type=int, default=4)
+    parser.add_argument('--mode', choices=['warm', 'cold'], default='warm')
+    parser.add_argument('--warmup', type=int, default=5, help='requests per warm container before measuring')
+    parser.add_argument('--s3-ms', type=float, default=20)
+    parser.add_argument('--dynamodb-ms', type=float, default=10)
+    parser.add_argument('--bedrock-ms', type=float, default=300)
+    parser.add_argument('--query-log', default='dynamodb', help="'dynamodb' (in-memory stand-in) or sqlite:<path>")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', help='save results as JSON')
+    parser.add_argument('--compare', help='baseline results JSON to compare with')
+    parser.add_argument('--max-regression', type=float, default=None,
+                        help='exit 1 if a handler p50 or p99 is this many percent slower than the baseline')
+    args = parser.parse_args()
+
+    contents = bucket_contents(args.data) if args.data else {'maharashtra': ['cotton']}
+    if not contents:
+        raise SystemExit(f"{args.data}: no price stores or CSVs found")
+    if args.mix:
+        requests = read_mix(args.mix)
+    else:
+        weights = {name: float(weight) for name, weight in (pair.split('=') for pair in args.weights.split(','))}
+        requests = synthetic_mix(args.requests, weights, contents, args.batch_size, args.seed)
+    if args.save_mix:
+        with open(args.save_mix, 'w', encoding='utf-8') as f:
+            f.writelines(json.dumps(request) + '\n' for request in requests)
+
+    with tempfile.TemporaryDirectory() as tmp:
+        # Spawned workers read these before importing the handlers
+        os.environ.update({
+            'AWS_DEFAULT_REGION': 'ap-south-1',
+            'PRICE_DATA_BUCKET': BUCKET,
+            'DYNAMODB_TABLE': 'bench-table',
+            'ROLLUP_TABLE': 'bench-rollups',
+            'QUERY_LOG_SINK': args.query_log,
+            'METRICS_FLUSH_SECONDS': '86400'
+        })
+        config = {
+            'data': args.data, 'contents': contents, 's3_ms': args.s3_ms, 'dynamodb_ms': args.dynamodb_ms,
+            'bedrock_ms': args.bedrock_ms, 'query_log': args.query_log
+        }
+        if args.query_log == 'sqlite':
+            config['query_log'] = f"sqlite:{os.path.join(tmp, 'query-logs.db')}"
+        outputs, elapsed = run(config, requests, args.mode, args.concurrency, args.warmup)
+
+    report = summarize(outputs, elapsed, args, config)
+    print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, indent=2)
+        print(f"\nsaved {args.output}")
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            regressions = compare(report, json.load(f), args.max_regression or float('inf'))
+        for regression in regressions:
+            print(f"REGRESSION: {regression}")
+        if regressions and args.max_regression is not None:
+            raise SystemExit(1)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,81 @@
+#!/usr/bin/env python3
+"""
+Benchmark MandiIndex lookups against the per-request geodesic scan, up to all-India mandi counts
+"""
+
+import argparse
+import time
+
+import numpy as np
+from geopy.distance import geodesic
+
+import standins
+
+standins.use_recommendation_modules()
+
+from mandi_index import MandiIndex
+
+CROPS = ['Cotton', 'Soybean', 'Wheat', 'Rice', 'Onion', 'Tur', 'Gram', 'Maize', 'Groundnut', 'Bajra',
+         'Jowar', 'Potato', 'Tomato', 'Mustard', 'Chilli', 'Turmeric', 'Banana', 'Sugarcane', 'Ragi', 'Moong']
+
+def national_metadata(count, seed=0):
+    """Mandis scattered over India's bounding box with random crop baskets"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(8.0, 34.0, count)
+    lng = rng.uniform(69.0, 96.0, count)
+    mandis = []
+    for i in range(count):
+        crops = rng.choice(CROPS, size=rng.integers(2, 8), replace=False).tolist()
+        mandis.append({
+            'code': f"IN{i:05d}",
+            'name': f"Mandi {i}",
+            'latitude': float(lat[i]),
+            'longitude': float(lng[i]),
+            'crops_traded': crops
+        })
+    return {'state': 'India', 'mandis': mandis}
+
+def scan(mandi_data, crop, coords, radius_km=100, k=10):
+    """The original per-request loop from MandiFinder.find_nearby_mandis"""
+    nearby = []
+    for mandi in mandi_data['mandis']:
+        if crop.lower() not in [c.lower() for c in mandi.get('crops_traded', [])]:
+            continue
+        distance = geodesic(coords, (mandi['latitude'], mandi['longitude'])).km
+        if distance <= radius_km:
+            nearby.append((distance, mandi['code']))
+    nearby.sort()
+    return nearby[:k]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, nargs='+', default=[300, 1000, 7000])
+    parser.add_argument('--queries', type=int, default=50)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(1)
+    print(f"{'mandis':>7}{'build ms':>10}{'scan ms':>10}{'index ms':>10}{'speedup':>9}")
+    for count in args.mandis:
+        data = national_metadata(count)
+        queries = [(CROPS[q % len(CROPS)], (float(rng.uniform(10, 32)), float(rng.uniform(72, 90))))
+                   for q in range(args.queries)]
+
+        start = time.perf_counter()
+        index = MandiIndex(data)
+        build = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        expected = [scan(data, crop, coords) for crop, coords in queries]
+        scanned = (time.perf_counter() - start) * 1000 / len(queries)
+
+        start = time.perf_counter()
+        found = [index.nearest(crop, coords) for crop, coords in queries]
+        indexed = (time.perf_counter() - start) * 1000 / len(queries)
+
+        for want, got in zip(expected, found):
+            assert [code for _, code in want] == [m['code'] for _, m in got]
+
+        print(f"{count:>7}{build:>10.1f}{scanned:>10.2f}{indexed:>10.3f}{scanned / indexed:>8.0f}x")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,150 @@
+#!/usr/bin/env python3
+"""
+Benchmark ranking mandis by net realization against ranking by distance, up to all-India
+mandi counts, and check the ranking and next trading days against a per-mandi loop
+"""
+
+import argparse
+import json
+import math
+import time
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, seed_bucket
+
+standins.use_recommendation_modules()
+
+from latest_price_index import LatestPriceIndex, build_index
+from mandi_finder import MAX_RADIUS_KM, RADIUS_KM, MandiFinder
+from mandi_index import EARTH_RADIUS_KM, WEEKDAYS, MandiIndex
+from price_store import PriceStore, PriceWindow, encode_store, to_day
+
+def national_market(count, priced_share, days, seed=0):
+    """Cotton mandis over India's bounding box with schedules, and a latest-price index covering some of them"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(8.0, 34.0, count)
+    lng = rng.uniform(69.0, 96.0, count)
+    mandis = []
+    for i in range(count):
+        open_days = rng.random(7) < 0.6
+        mandis.append({
+            'code': f"M{i:05d}",
+            'name': f"Mandi {i}",
+            'latitude': float(lat[i]),
+            'longitude': float(lng[i]),
+            'crops_traded': ['Cotton'],
+            'operating_days': [day.capitalize() for day, trades in zip(WEEKDAYS, open_days) if trades]
+        })
+
+    priced = np.flatnonzero(rng.random(count) < priced_share).astype(np.uint16)
+    last_day = to_day(time.strftime('%Y-%m-%d'))
+    day = np.repeat(np.arange(last_day - days + 1, last_day + 1, dtype=np.int32), len(priced))
+    mandi = np.tile(np.arange(len(priced), dtype=np.uint16), days)
+    modal = np.round(rng.uniform(5500, 7500, len(priced))[mandi] * (1 + rng.normal(0, 0.02, len(day))))
+    window = PriceWindow(
+        day, mandi, modal * 0.95, modal * 1.05, modal, rng.uniform(50, 1500, len(day)),
+        [{'code': f"M{m:05d}", 'name': f"Mandi {m}", 'variety': ''} for m in priced.tolist()]
+    )
+    store = PriceStore.from_bytes(encode_store(window, 'india', 'cotton'))
+    return MandiIndex({'state': 'India', 'mandis': mandis}), LatestPriceIndex.from_bytes(build_index('india', {'cotton': store}))
+
+def haversine_km(a, b):
+    lat1, lng1, lat2, lng2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lng2 - lng1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+def reference(index, prices, coords, quantity, cost, k, today):
+    """Score every mandi in a loop, widening the radius the same way, and sort fully"""
+    radius = RADIUS_KM
+    while True:
+        scored = []
+        for mandi in index.mandis:
+            distance = haversine_km(coords, (mandi['latitude'], mandi['longitude']))
+            if distance > radius:
+                continue
+            latest = prices.lookup('cotton', mandi['code'])
+            net = (latest.price - cost * distance) * quantity if latest else None
+            scored.append((net is None, -(net or 0), distance, mandi))
+        if sum(1 for s in scored if not s[0]) >= k or radius >= MAX_RADIUS_KM:
+            break
+        radius = min(radius * 2, MAX_RADIUS_KM)
+    scored.sort(key=lambda s: s[:3])
+
+    ranked = []
+    for _, _, _, mandi in scored[:k]:
+        days = [WEEKDAYS.index(day.lower()) for day in mandi['operating_days']] or list(range(7))
+        wait = min((day - today.weekday()) % 7 for day in days)
+        ranked.append((mandi['code'], (today + timedelta(days=wait)).strftime('%Y-%m-%d')))
+    return ranked
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, nargs='+', default=[1000, 3000, 7000])
+    parser.add_argument('--priced-share', type=float, default=0.7)
+    parser.add_argument('--days', type=int, default=28)
+    parser.add_argument('--queries', type=int, default=200)
+    parser.add_argument('--quantity', type=float, default=50)
+    parser.add_argument('--transport-cost', type=float, default=1.0)
+    args = parser.parse_args()
+
+    finder = MandiFinder(None, None)
+    today = datetime(2026, 10, 18)
+    ranking = {'transport_cost': args.transport_cost}
+    rng = np.random.default_rng(1)
+    print(f"{'mandis':>7}{'distance ms':>13}{'net p50 ms':>12}{'net p99 ms':>12}{'widened':>9}")
+    for count in args.mandis:
+        index, prices = national_market(count, args.priced_share, args.days)
+        queries = [(float(rng.uniform(10, 32)), float(rng.uniform(72, 90))) for _ in range(args.queries)]
+        codes = {mandi['name']: mandi['code'] for mandi in index.mandis}
+
+        # Mandis with a price come first, by net realization, matching the loop
+        for coords in queries[:20]:
+            ranked = finder.find_nearby_mandis('india', None, 'cotton', index, prices, coords=coords, ranking=ranking,
+                                               quantity=args.quantity, today=today)
+            expected = reference(index, prices, coords, args.quantity, args.transport_cost, 10, today)
+            assert [(codes[m['name']], m['nextTradingDay']) for m in ranked] == expected, coords
+            for mandi in ranked:
+                if mandi['price'] is not None:
+                    net = (mandi['price'] - args.transport_cost * mandi['distance']) * args.quantity
+                    assert abs(mandi['netRealization'] - net) <= 0.05 * args.transport_cost * args.quantity + 1
+
+        start = time.perf_counter()
+        for coords in queries:
+            finder.find_nearby_mandis('india', None, 'cotton', index, prices, coords=coords)
+        by_distance = (time.perf_counter() - start) * 1000 / len(queries)
+
+        samples = []
+        widened = 0
+        for coords in queries:
+            start = time.perf_counter()
+            ranked = finder.find_nearby_mandis('india', None, 'cotton', index, prices, coords=coords, ranking=ranking,
+                                               quantity=args.quantity, today=today)
+            samples.append((time.perf_counter() - start) * 1000)
+            widened += any(m['distance'] > RADIUS_KM for m in ranked)
+        print(f"{count:>7}{by_distance:>13.3f}{standins.percentile(samples, 50):>12.3f}"
+              f"{standins.percentile(samples, 99):>12.3f}{widened / len(queries):>8.0%}")
+
+    s3 = LocalS3(latency_ms=0)
+    seed_bucket(s3)
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB(0))
+    item = {'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50, 'rankBy': 'netRealization'}
+    response = app.lambda_handler({'body': json.dumps(item)}, None)
+    mandis = json.loads(response['body'])['nearbyMandis']
+    assert response['statusCode'] == 200 and mandis and all('nextTradingDay' in m for m in mandis), response['body']
+    nets = [m['netRealization'] for m in mandis if m['netRealization'] is not None]
+    assert nets == sorted(nets, reverse=True), nets
+    batch = app.batch_handler({'body': json.dumps({
+        'items': [{**item, 'quantity': 10}, {**item, 'quantity': 'lots'}], 'rankBy': 'netRealization'
+    })}, None)
+    results = json.loads(batch['body'])['results']
+    assert abs(results[0]['nearbyMandis'][0]['netRealization'] * 5 - mandis[0]['netRealization']) <= 5, results[0]
+    assert 'error' in results[1], results[1]
+    invalid = app.lambda_handler({'body': json.dumps({**item, 'rankBy': 'price'})}, None)
+    assert invalid['statusCode'] == 400, invalid
+    print(f"\nhandler: {len(mandis)} mandis, best nets {nets[:3]}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Benchmark cold vs warm price and mandi lookups through the S3 object cache
+"""
+
+import argparse
+import json
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import standins
+from standins import LocalS3, make_mandi_metadata, make_price_csv, percentile, timed
+
+standins.use_recommendation_modules()
+
+from mandi_finder import MandiFinder
+from object_cache import ObjectCache
+from price_analyzer import PriceAnalyzer
+
+BUCKET = 'bench-bucket'
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, default=20)
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    s3 = LocalS3(latency_ms=args.latency_ms)
+    year = datetime.now().year
+    s3.put_object(BUCKET, f"historical-prices/maharashtra/cotton_{year}.csv",
+                  make_price_csv(days=365, mandis=args.mandis))
+    s3.put_object(BUCKET, 'mandi-metadata/maharashtra_mandis.json',
+                  json.dumps(make_mandi_metadata(args.mandis)))
+
+    def request(analyzer, finder):
+        analyzer.get_historical_prices('maharashtra', 'cotton')
+        finder.find_nearby_mandis('maharashtra', 'Akola', 'cotton')
+
+    def cold():
+        cache = ObjectCache(s3)
+        request(PriceAnalyzer(s3, BUCKET, cache=cache), MandiFinder(s3, BUCKET, cache=cache))
+
+    cache = ObjectCache(s3, ttl_seconds=300)
+    analyzer = PriceAnalyzer(s3, BUCKET, cache=cache)
+    finder = MandiFinder(s3, BUCKET, cache=cache)
+    request(analyzer, finder)
+
+    revalidating = ObjectCache(s3, ttl_seconds=0)
+    reval_analyzer = PriceAnalyzer(s3, BUCKET, cache=revalidating)
+    reval_finder = MandiFinder(s3, BUCKET, cache=revalidating)
+    request(reval_analyzer, reval_finder)
+
+    # Concurrent misses for one key share a single fetch and parse
+    single_flight = ObjectCache(s3)
+    barrier = threading.Barrier(8)
+    requests_before = s3.requests
+
+    def concurrent_get(_):
+        barrier.wait()
+        return single_flight.get(BUCKET, 'mandi-metadata/maharashtra_mandis.json', json.loads)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        values = list(pool.map(concurrent_get, range(8)))
+    assert s3.requests - requests_before == 1 and all(value is values[0] for value in values)
+    assert single_flight.stats()['coalesced'] == 7, single_flight.stats()
+
+    results = {
+        'cold': timed(cold, args.repeat),
+        'warm (within TTL)': timed(lambda: request(analyzer, finder), args.repeat),
+        'warm (ETag revalidated)': timed(lambda: request(reval_analyzer, reval_finder), args.repeat)
+    }
+
+    print(f"{'path':<26}{'p50 ms':>10}{'p99 ms':>10}")
+    for name, samples in results.items():
+        print(f"{name:<26}{percentile(samples, 50):>10.2f}{percentile(samples, 99):>10.2f}")
+    print(f"warm cache stats: {cache.stats()}")
+    print(f"revalidating cache stats: {revalidating.stats()}")
+
+if __name__ == '__main__':
+    main()
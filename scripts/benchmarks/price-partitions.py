@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Replay years of daily price ingestion into time partitions with daily compaction, and
+measure ingest and compaction cost, the segments a 365-day read touches and read latency
+against a single price store; check every read against the single store, and that the
+CSV fallback spans the year boundary
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+import numpy as np
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, make_price_csv, percentile, seed_bucket
+
+standins.use_recommendation_modules()
+
+from price_analyzer import PriceAnalyzer
+from price_partitions import DirectoryStorage, PartitionedPriceStore, S3Storage, compact, ingest, open_partitions
+from price_store import PriceStore, PriceWindow, encode_store, from_day, to_day
+
+def market(years, mandis, seed):
+    """Daily rows for each mandi over `years` years up to today, with some mandis missing on some days"""
+    rng = np.random.default_rng(seed)
+    last_day = to_day(datetime.now())
+    days = np.arange(last_day - years * 365 + 1, last_day + 1, dtype=np.int32)
+    day = np.repeat(days, mandis)
+    mandi = np.tile(np.arange(mandis, dtype=np.uint16), len(days))
+    keep = rng.random(len(day)) < 0.8
+    day, mandi = day[keep], mandi[keep]
+    modal = np.round(rng.uniform(5000, 8000, mandis)[mandi] + rng.normal(0, 100, len(day))).astype(np.float32)
+    volume = rng.uniform(50, 1500, len(day)).astype(np.float32)
+    codes = [{'code': f"MH{m:04d}", 'name': f"Mandi {m}", 'variety': ''} for m in range(mandis)]
+    return PriceWindow(day, mandi, modal - 200, modal + 200, modal, volume, codes)
+
+def same_rows(a, b):
+    codes_a = np.array(a.mandi_codes)[a.mandi] if len(a) else np.empty(0)
+    codes_b = np.array(b.mandi_codes)[b.mandi] if len(b) else np.empty(0)
+    return (np.array_equal(a.day, b.day) and np.array_equal(codes_a, codes_b)
+            and all(np.array_equal(x, y) for x, y in zip(a.columns()[2:], b.columns()[2:])))
+
+def replay(storage, full, correct_every):
+    """Ingest each day's rows and compact after it; every `correct_every` days re-ingest an older day with revised prices.
+
+    Revisions are applied to `full` too, so it ends up holding the rows a reader should see.
+    """
+    starts = np.searchsorted(full.day, np.arange(int(full.day[0]), int(full.day[-1]) + 2))
+    ingests, written, compactions, touched = [], [], [], []
+    for offset, day in enumerate(range(int(full.day[0]), int(full.day[-1]) + 1)):
+        batches = [slice(starts[offset], starts[offset + 1])]
+        if correct_every and offset >= 10 and offset % correct_every == 0:
+            # A revision for ten days back, as arrives from late mandi reports
+            revised = slice(starts[offset - 10], starts[offset - 9])
+            for column in (full.min_price, full.max_price, full.modal_price):
+                column[revised] += 25
+            batches.append(revised)
+        for rows in batches:
+            window = PriceWindow(*(column[rows] for column in full.columns()), full.mandis)
+            start = time.perf_counter()
+            segment = ingest(storage, 'maharashtra', 'cotton', window)
+            ingests.append((time.perf_counter() - start) * 1000)
+            written.append(segment['rows'])
+        start = time.perf_counter()
+        compact(storage, 'maharashtra', 'cotton', today=from_day(day))
+        compactions.append((time.perf_counter() - start) * 1000)
+        store = open_partitions(os.path.join(storage.root, 'maharashtra', 'cotton'))
+        touched.append(len(store.overlapping(day - 364)))
+    return ingests, written, compactions, touched
+
+def check_csv_fallback():
+    """The last 365 days come from this year's and last year's CSV files"""
+    s3 = LocalS3(latency_ms=0)
+    lines = make_price_csv(days=400, mandis=3).splitlines()
+    year = datetime.now().year
+    for y in (year - 1, year):
+        rows = [line for line in lines[1:] if line.startswith(str(y))]
+        s3.put_object('bench-bucket', f"historical-prices/maharashtra/cotton_{y}.csv", '\n'.join([lines[0], *rows]) + '\n')
+    window = PriceAnalyzer(s3, 'bench-bucket').get_historical_prices('maharashtra', 'cotton')
+    cutoff = datetime.now() - timedelta(days=365)
+    assert int(window.day.min()) == to_day(cutoff) + 1 and int(window.day.max()) == to_day(datetime.now()), \
+        (from_day(int(window.day.min())), from_day(int(window.day.max())))
+    assert len(np.unique(window.day)) == 365, len(np.unique(window.day))
+    return len(window)
+
+def check_handler(storage_root):
+    """The recommendation handler reads the partitions from S3 in place of the single store"""
+    s3 = LocalS3(latency_ms=0)
+    seed_bucket(s3)
+    source = DirectoryStorage(storage_root)
+    target = S3Storage(s3, 'bench-bucket')
+    manifest = source.read(f"maharashtra/cotton/manifest.json")
+    for segment in json.loads(manifest)['segments']:
+        target.write(f"maharashtra/cotton/{segment['name']}", source.read(f"maharashtra/cotton/{segment['name']}"))
+    target.write('maharashtra/cotton/manifest.json', manifest)
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB(0))
+    store = app.price_analyzer.get_price_store('maharashtra', 'cotton')
+    assert isinstance(store, PartitionedPriceStore), store
+    response = app.lambda_handler({'body': json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50})}, None)
+    assert response['statusCode'] == 200, response['body']
+    return json.loads(response['body'])['recommendation']
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--years', type=int, default=3)
+    parser.add_argument('--mandis', type=int, default=300)
+    parser.add_argument('--correct-every', type=int, default=7, help='days between late revisions (0 for none)')
+    parser.add_argument('--repeat', type=int, default=20)
+    parser.add_argument('--s3-latency-ms', type=float, default=20)
+    parser.add_argument('--seed', type=int, default=3)
+    args = parser.parse_args()
+
+    full = market(args.years, args.mandis, args.seed)
+    with tempfile.TemporaryDirectory() as directory:
+        storage = DirectoryStorage(directory)
+        start = time.perf_counter()
+        ingests, written, compactions, touched = replay(storage, full, args.correct_every)
+        print(f"replayed {len(compactions)} days, {len(full)} rows, in {time.perf_counter() - start:.1f} s")
+        print(f"ingest: p50 {percentile(ingests, 50):.2f} ms, p99 {percentile(ingests, 99):.2f} ms, "
+              f"{np.mean(written):.0f} rows per delta")
+        print(f"compaction: p50 {percentile(compactions, 50):.2f} ms, max {max(compactions):.2f} ms")
+        print(f"segments per 365-day read: last {touched[-1]}, max {max(touched)} "
+              f"(after the first year: {max(touched[365:] or touched)})")
+        # At most a year segment and thirteen months, with no deltas left after compaction
+        assert max(touched) <= 15, max(touched)
+
+        single = PriceStore.from_bytes(encode_store(full, 'maharashtra', 'cotton'))
+        partitioned = open_partitions(os.path.join(directory, 'maharashtra', 'cotton'))
+        assert partitioned.first_day == single.first_day and partitioned.last_day == single.last_day
+        last = single.last_day
+        ranges = [(None, None), (last - 364, None), (last - 400, last - 30), (last - 40, last - 40), (last + 1, None)]
+        for start_day, end_day in ranges:
+            assert same_rows(partitioned.window(start_day, end_day), single.window(start_day, end_day)), (start_day, end_day)
+
+        # Reads through PriceAnalyzer: a local directory, and S3 with the segments fetched serially or in parallel
+        store_dir = os.path.join(directory, 'single')
+        os.makedirs(os.path.join(store_dir, 'maharashtra'))
+        with open(os.path.join(store_dir, 'maharashtra', 'cotton.bin'), 'wb') as f:
+            f.write(encode_store(full, 'maharashtra', 'cotton'))
+        local = PriceAnalyzer(None, None, store_dir=directory)
+        baseline = PriceAnalyzer(None, None, store_dir=store_dir)
+        assert same_rows(local.get_historical_prices('maharashtra', 'cotton'),
+                         baseline.get_historical_prices('maharashtra', 'cotton'))
+
+        s3 = LocalS3(latency_ms=args.s3_latency_ms)
+        target = S3Storage(s3, 'bench-bucket')
+        for name in ['manifest.json'] + [segment['name'] for segment in partitioned.segments]:
+            target.write(f"maharashtra/cotton/{name}", storage.read(f"maharashtra/cotton/{name}"))
+        s3.put_object('bench-bucket', 'price-store/maharashtra/cotton.bin', encode_store(full, 'maharashtra', 'cotton'))
+        executor = ThreadPoolExecutor(max_workers=8)
+
+        def cold(analyzer, key=None):
+            def read():
+                analyzer.cache.clear()
+                if key:
+                    return analyzer.cache.get('bench-bucket', key, PriceStore.from_bytes).last_days(365)
+                return analyzer.get_historical_prices('maharashtra', 'cotton')
+            return read
+
+        cases = {
+            'local single store': lambda: baseline.get_historical_prices('maharashtra', 'cotton'),
+            'local partitions': lambda: local.get_historical_prices('maharashtra', 'cotton'),
+            'S3 single store, cold': cold(PriceAnalyzer(s3, 'bench-bucket'), 'price-store/maharashtra/cotton.bin'),
+            'S3 partitions, serial, cold': cold(PriceAnalyzer(s3, 'bench-bucket')),
+            'S3 partitions, parallel, cold': cold(PriceAnalyzer(s3, 'bench-bucket', executor=executor))
+        }
+        print(f"\n{'365-day read':<32}{'p50 ms':>9}{'p99 ms':>9}")
+        for name, read in cases.items():
+            samples = standins.timed(read, args.repeat)
+            print(f"{name:<32}{percentile(samples, 50):>9.2f}{percentile(samples, 99):>9.2f}")
+        warm = PriceAnalyzer(s3, 'bench-bucket', executor=executor)
+        assert same_rows(warm.get_historical_prices('maharashtra', 'cotton'), single.last_days(365))
+        executor.shutdown()
+
+        print(f"\nCSV fallback across the year boundary: {check_csv_fallback()} rows")
+        print(f"handler on partitions: {check_handler(directory)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Inject typing errors (an extra zero, prices quoted per kg, swapped min/max, zero prices,
+repeated reports) into the synthetic national price stores and clean them a month at a
+time; measure cleaning throughput and the working set, how many injected errors are caught
+and how many clean rows are flagged, and how far the errors move the request-time analysis
+before and after cleaning. Checks that chunked cleaning flags the rows cleaning a store at once does,
+and that ingestion stores the flags
+"""
+
+import argparse
+import os
+import tempfile
+import time
+import tracemalloc
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+from price_analyzer import PriceAnalyzer
+from price_partitions import DirectoryStorage, ingest, open_partitions
+from price_quality import DUPLICATE, OUTLIER, RANGE, clean_window, clean_windows
+from price_store import PriceStore, PriceWindow, concat_windows
+from recommendation_engine import RecommendationEngine
+
+ERRORS = {
+    # name: share of rows
+    'extra zero': 0.001,
+    'per kg': 0.0005,
+    'zero price': 0.0002,
+    'swapped range': 0.001,
+    'repeated': 0.001
+}
+
+def corrupt(window, rng):
+    """A copy of the window with ERRORS injected, and {error: row indices} into the truth window"""
+    columns = [np.array(column) for column in window.columns()]
+    day, mandi, low, high, modal, volume = columns
+    rows = len(day)
+    picked = rng.permutation(rows)
+    injected = {}
+    start = 0
+    for name, share in ERRORS.items():
+        count = int(rows * share)
+        injected[name] = np.sort(picked[start:start + count])
+        start += count
+    modal[injected['extra zero']] *= 10
+    for column in (low, high, modal):
+        column[injected['per kg']] = np.round(column[injected['per kg']] / 100)
+    modal[injected['zero price']] = 0
+    low[injected['swapped range']], high[injected['swapped range']] = (
+        high[injected['swapped range']], low[injected['swapped range']].copy()
+    )
+    # A second, slightly different report of the same day, arriving later
+    repeats = injected['repeated']
+    extra = [column[repeats] for column in columns]
+    extra[4] = extra[4] + 10
+    columns = [np.concatenate([column, more]) for column, more in zip(columns, extra)]
+    order = np.lexsort((np.arange(len(columns[0])), columns[1], columns[0]))
+    return PriceWindow(*(column[order] for column in columns), window.mandis), injected
+
+def months(window):
+    """Calendar-month slices of a window sorted by day"""
+    bounds = np.arange(window.day[0].astype('datetime64[D]').astype('datetime64[M]'),
+                       window.day[-1].astype('datetime64[D]').astype('datetime64[M]') + 2)
+    starts = np.searchsorted(window.day, bounds.astype('datetime64[D]').astype(np.int64))
+    return [window[slice(a, b)] for a, b in zip(starts[:-1], starts[1:]) if b > a]
+
+def score(truth, cleaned, injected):
+    """Caught and false-flag counts, aligning cleaned rows with the truth by (day, mandi)"""
+    key = truth.day.astype(np.int64) * 65536 + truth.mandi
+    cleaned_key = cleaned.day.astype(np.int64) * 65536 + cleaned.mandi
+    at = np.searchsorted(cleaned_key, key)
+    present = (at < len(cleaned_key)) & (cleaned_key[np.minimum(at, len(cleaned_key) - 1)] == key)
+    quality = np.zeros(len(truth), dtype=np.uint8)
+    quality[present] = cleaned.quality[at[present]]
+    modal = np.full(len(truth), np.nan)
+    modal[present] = cleaned.modal_price[at[present]]
+
+    price_errors = np.concatenate([injected['extra zero'], injected['per kg'], injected['zero price']])
+    clean_rows = np.ones(len(truth), dtype=bool)
+    clean_rows[np.concatenate(list(injected.values()))] = False
+    fixed = present[price_errors] & (np.abs(modal[price_errors] / truth.modal_price[price_errors] - 1) < 0.1)
+    return {
+        'price errors': len(price_errors),
+        'caught': int(np.count_nonzero(quality[price_errors] & OUTLIER)),
+        'fixed within 10%': int(np.count_nonzero(fixed)),
+        'dropped': int(np.count_nonzero(~present[price_errors])),
+        'ranges caught': int(np.count_nonzero(quality[injected['swapped range']] & RANGE)),
+        'ranges': len(injected['swapped range']),
+        'repeats caught': int(np.count_nonzero(quality[injected['repeated']] & DUPLICATE)),
+        'repeats': len(injected['repeated']),
+        'clean rows': int(np.count_nonzero(clean_rows)),
+        'clean flagged outlier': int(np.count_nonzero(quality[clean_rows] & OUTLIER))
+    }
+
+def agree(a, b):
+    """Same rows and flags; filled prices may differ a little, since a month cleaned after
+    the one before sees that month's filled prices where cleaning at once sees raw ones"""
+    return (np.array_equal(a.day, b.day) and np.array_equal(a.mandi, b.mandi) and np.array_equal(a.quality, b.quality)
+            and np.allclose(a.modal_price, b.modal_price, rtol=0.01))
+
+def check_ingest(truth, rng):
+    """Daily ingestion of a corrupted month into partitions stores cleaned prices with their flags"""
+    with tempfile.TemporaryDirectory() as directory:
+        storage = DirectoryStorage(directory)
+        history = truth[slice(0, int(np.searchsorted(truth.day, truth.day[-1] - 30)))]
+        ingest(storage, 'bench', 'crop', history, clean=False)
+        recent, injected = corrupt(truth[slice(len(history), len(truth))], rng)
+        starts = np.searchsorted(recent.day, np.unique(recent.day))
+        for a, b in zip(starts, np.r_[starts[1:], len(recent)]):
+            ingest(storage, 'bench', 'crop', recent[slice(a, b)])
+        stored = open_partitions(os.path.join(directory, 'bench', 'crop')).window(int(recent.day[0]))
+        assert stored.quality is not None
+        errors = np.concatenate([injected['extra zero'], injected['per kg']])
+        truth_recent = truth[slice(len(history), len(truth))]
+        ratio = stored.modal_price.max() / truth_recent.modal_price.max()
+        assert ratio < 1.5, ratio
+        return int(np.count_nonzero(stored.quality & OUTLIER)), len(errors)
+
+def analysis_drift(truth, corrupted, cleaned, analyzer, engine, last_day):
+    """Relative max_price and std_price error against the truth, and whether the advice changes"""
+    base = analyzer.analyze_trends(truth[slice(int(np.searchsorted(truth.day, last_day - 364)), len(truth))])
+    result = {}
+    for name, window in (('raw', corrupted), ('cleaned', cleaned)):
+        analysis = analyzer.analyze_trends(window[slice(int(np.searchsorted(window.day, last_day - 364)), len(window))])
+        result[name] = (
+            abs(analysis['max_price'] / base['max_price'] - 1),
+            abs(analysis['std_price'] / base['std_price'] - 1),
+            engine.generate_recommendation(analysis)['action'] != engine.generate_recommendation(base)['action']
+        )
+    return result
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', help='price-store directory (default: generate the national dataset)')
+    parser.add_argument('--mandis', type=int, default=300, help='mandis per state when generating')
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--seed', type=int, default=11)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    analyzer = PriceAnalyzer(None, None)
+    engine = RecommendationEngine()
+    with tempfile.TemporaryDirectory() as directory:
+        store_dir = args.data or standins.generate_price_stores(directory, args.mandis, args.years)
+        paths = sorted(
+            os.path.join(store_dir, state, name)
+            for state in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, state))
+            for name in os.listdir(os.path.join(store_dir, state)) if name.endswith('.bin') and '-' not in name
+        )
+
+        rows, elapsed, peak, totals, drift = 0, 0.0, 0, {}, []
+        for index, path in enumerate(paths):
+            truth = PriceStore.open(path).window()
+            corrupted, injected = corrupt(truth, rng)
+            parts = months(corrupted)
+            start = time.perf_counter()
+            cleaned = [part for part, _ in clean_windows(parts)]
+            elapsed += time.perf_counter() - start
+            rows += len(corrupted)
+
+            # The working set: one month's cleaning plus the carried tail, not the output
+            tracemalloc.start()
+            for _ in clean_windows(parts):
+                pass
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+            cleaned = concat_windows(cleaned)
+            for name, count in score(truth, cleaned, injected).items():
+                totals[name] = totals.get(name, 0) + count
+            drift.append(analysis_drift(truth, corrupted, cleaned, analyzer, engine, int(truth.day[-1])))
+            if index == 0:
+                at_once, _ = clean_window(corrupted)
+                assert agree(at_once, cleaned), 'chunked cleaning differs from cleaning at once'
+
+        print(f"cleaned {rows} rows from {len(paths)} stores in {elapsed:.1f} s: {rows / elapsed / 1e6:.2f}M rows/s, "
+              f"peak working set {peak / 2**20:.0f} MB")
+        print(f"price errors: {totals['caught']} of {totals['price errors']} flagged, "
+              f"{totals['fixed within 10%']} restored to within 10% of the true price, {totals['dropped']} dropped")
+        print(f"swapped ranges flagged: {totals['ranges caught']} of {totals['ranges']}; "
+              f"repeats flagged: {totals['repeats caught']} of {totals['repeats']}")
+        false_rate = totals['clean flagged outlier'] / totals['clean rows']
+        print(f"clean rows flagged as outliers: {totals['clean flagged outlier']} ({false_rate * 1e6:.0f} per million)")
+
+        print(f"\n{'365-day analysis':<20}{'max err':>10}{'std err':>10}{'advice changed':>16}")
+        for name in ('raw', 'cleaned'):
+            values = np.array([d[name] for d in drift], dtype=np.float64)
+            print(f"{name:<20}{np.median(values[:, 0]):>10.1%}{np.median(values[:, 1]):>10.1%}"
+                  f"{int(values[:, 2].sum()):>10} of {len(drift)}")
+
+        assert totals['caught'] >= 0.98 * totals['price errors'], totals
+        # A swap is invisible where min and max were equal
+        assert totals['ranges caught'] >= 0.999 * totals['ranges'] and totals['repeats caught'] == totals['repeats'], totals
+        assert false_rate < 1e-3, false_rate
+        assert peak < 256 * 2**20, peak
+
+        truth = PriceStore.open(paths[0]).window()
+        caught, injected = check_ingest(truth, rng)
+        print(f"\ndaily ingestion: {caught} rows flagged as outliers for {injected} injected price errors")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,108 @@
+#!/usr/bin/env python3
+"""
+Time the tiled inter-mandi spread search at 1k, 5k and 10k mandis and measure its peak
+memory against the dense N x N matrix it avoids; check its top pairs against scoring
+every pair, and that /analytics serves the stored spreads
+"""
+
+import argparse
+import json
+import time
+import tracemalloc
+
+import numpy as np
+
+import standins
+from standins import LocalS3, StubDynamoDB
+
+standins.use_analytics_modules()
+
+from price_spreads import BLOCK, EARTH_RADIUS_KM, price_spread_table, top_spreads
+from rollups import latest_price_key, price_spread_key
+
+def market(mandis, seed):
+    """Latest prices and coordinates for mandis spread over a state-sized area"""
+    rng = np.random.default_rng(seed)
+    lat = rng.uniform(16, 22, mandis)
+    lng = rng.uniform(73, 80, mandis)
+    # Prices drift across the state, with a local offset per mandi
+    prices = np.round(6000 + 40 * (lat - 19) - 30 * (lng - 76.5) + rng.normal(0, 200, mandis))
+    return prices, lat, lng
+
+def every_pair(prices, lat, lng, transport_cost, top, rows=256):
+    """The same top pairs, scoring every pair with the haversine formula, a band of rows at a time"""
+    lat, lng = np.radians(lat), np.radians(lng)
+    best = np.empty(0)
+    best_pair = np.empty((0, 2), dtype=np.int64)
+    for start in range(0, len(prices), rows):
+        buy = slice(start, start + rows)
+        h = (np.sin((lat[None, :] - lat[buy, None]) / 2) ** 2
+             + np.cos(lat[buy, None]) * np.cos(lat[None, :]) * np.sin((lng[None, :] - lng[buy, None]) / 2) ** 2)
+        net = prices[None, :] - prices[buy, None] - transport_cost * 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(h))
+        flat = np.argpartition(-net.ravel(), top - 1)[:top]
+        best = np.concatenate([best, net.ravel()[flat]])
+        best_pair = np.concatenate([best_pair, np.stack([start + flat // len(prices), flat % len(prices)], axis=1)])
+    keep = np.argsort(-best, kind='stable')[:top]
+    return best_pair[keep, 0], best_pair[keep, 1], best[keep]
+
+def measure(fn):
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = fn()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return result, elapsed * 1000, peak
+
+def check_handler():
+    """/analytics returns the stored spreads beside the price comparison"""
+    prices, lat, lng = market(50, 3)
+    codes = [f"MH{m:04d}" for m in range(len(prices))]
+    latest = {'state': 'maharashtra', 'crops': {'cotton': [
+        {'mandi': f"Mandi {m}", 'mandi_code': code, 'price': int(price), 'date': '2026-10-18'}
+        for m, (code, price) in enumerate(zip(codes, prices))
+    ]}}
+    metadata = {'mandis': [{'code': code, 'latitude': a, 'longitude': b} for code, a, b in zip(codes, lat, lng)]}
+    s3 = LocalS3(latency_ms=0)
+    s3.put_object('bench-bucket', latest_price_key('maharashtra'), json.dumps(latest).encode('utf-8'))
+    s3.put_object('bench-bucket', price_spread_key('maharashtra'),
+                  json.dumps(price_spread_table('maharashtra', latest, metadata)).encode('utf-8'))
+    app = standins.load_analytics_app(s3, StubDynamoDB(0))
+    response = app.lambda_handler({'queryStringParameters': {'state': 'maharashtra'}}, None)
+    assert response['statusCode'] == 200, response['body']
+    spreads = json.loads(response['body'])['priceSpreads']['cotton']
+    best = spreads[0]
+    assert best['sellPrice'] - best['buyPrice'] - best['transportCost'] in range(best['netSpread'] - 1, best['netSpread'] + 2), best
+    missing = app.lambda_handler({'queryStringParameters': {'state': 'gujarat'}}, None)
+    assert json.loads(missing['body'])['priceSpreads'] == {}
+    return best
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, nargs='+', default=[1000, 5000, 10000])
+    parser.add_argument('--top', type=int, default=10)
+    parser.add_argument('--transport-cost', type=float, default=1.0)
+    parser.add_argument('--block', type=int, default=BLOCK)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    print(f"{'mandis':>7}{'tiled ms':>10}{'peak MB':>9}{'every pair ms':>15}{'dense MB':>10}")
+    for mandis in args.mandis:
+        prices, lat, lng = market(mandis, args.seed)
+        (buy, sell, net, distance), tiled_ms, peak = measure(
+            lambda: top_spreads(prices, lat, lng, args.transport_cost, args.top, args.block)
+        )
+        (ref_buy, ref_sell, ref_net), full_ms, _ = measure(
+            lambda: every_pair(prices, lat, lng, args.transport_cost, args.top)
+        )
+        assert np.allclose(net, ref_net, atol=1e-6), (net, ref_net)
+        assert np.array_equal(buy, ref_buy) and np.array_equal(sell, ref_sell)
+        assert np.allclose(prices[sell] - prices[buy] - args.transport_cost * distance, net, atol=1e-6)
+        dense = mandis * mandis * 8
+        print(f"{mandis:>7}{tiled_ms:>10.1f}{peak / 2**20:>9.1f}{full_ms:>15.1f}{dense / 2**20:>10.0f}")
+        # A tile's few block x block temporaries are the floor; past that, memory stays flat
+        assert peak < max(dense / 4, 16 * args.block ** 2 * 8), peak
+    print(f"\n/analytics best cotton spread: {check_handler()}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,109 @@
+#!/usr/bin/env python3
+"""
+Benchmark CSV parsing against the columnar price store at 1, 5 and 20 years of history,
+and check both backends give the same analysis
+"""
+
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+import tracemalloc
+
+import standins
+from standins import LocalS3, make_price_csv
+
+standins.use_recommendation_modules()
+
+def run_mode(mode, csv_path, store_path, queue):
+    from datetime import datetime, timedelta
+    from price_analyzer import PriceAnalyzer
+    from price_store import PriceStore, concat_windows, to_day
+
+    analyzer = PriceAnalyzer(None, None)
+    with open(csv_path, encoding='utf-8') as f:
+        csv_text = f.read()
+    with open(store_path, 'rb') as f:
+        store_bytes = f.read()
+
+    baseline = resident_mb()
+    tracemalloc.start()
+    start = time.perf_counter()
+    if mode == 'csv':
+        window = concat_windows([PriceAnalyzer._parse_price_csv(csv_text.encode('utf-8'))], dedupe=True)
+        window = window[window.day >= to_day(datetime.now() - timedelta(days=365)) + 1]
+        analysis = analyzer.analyze_trends(window)
+    elif mode == 'store':
+        analysis = analyzer.analyze_trends(PriceStore.from_bytes(store_bytes).last_days(365))
+    else:
+        analysis = analyzer.analyze_trends(PriceStore.open(store_path).last_days(365))
+    elapsed = (time.perf_counter() - start) * 1000
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    queue.put((elapsed, peak / 1e6, resident_mb() - baseline, analysis['avg_12week']))
+
+def resident_mb():
+    with open('/proc/self/statm') as f:
+        return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 1e6
+
+def measure(mode, csv_path, store_path):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    process = context.Process(target=run_mode, args=(mode, csv_path, store_path, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+def check_backends(csv_text):
+    """get_historical_prices from the CSV and from the store it converts to analyze alike"""
+    from datetime import datetime
+    from price_analyzer import PriceAnalyzer
+    from price_store import convert_csv
+
+    csv_s3, store_s3 = LocalS3(latency_ms=0), LocalS3(latency_ms=0)
+    csv_s3.put_object('bench-bucket', f"historical-prices/maharashtra/cotton_{datetime.now().year}.csv", csv_text)
+    store_s3.put_object('bench-bucket', 'price-store/maharashtra/cotton.bin', convert_csv(csv_text, 'maharashtra', 'cotton'))
+    analyses = []
+    for s3 in (csv_s3, store_s3):
+        analyzer = PriceAnalyzer(s3, 'bench-bucket')
+        analyses.append(analyzer.analyze_trends(analyzer.get_historical_prices('maharashtra', 'cotton')))
+        assert analyzer.stats()['mock_fallbacks'] == 0
+    assert analyses[0] == analyses[1], analyses
+    return analyses[0]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--mandis', type=int, default=20)
+    parser.add_argument('--years', type=int, nargs='+', default=[1, 5, 20])
+    args = parser.parse_args()
+
+    from price_store import convert_csv
+
+    print(f"{'years':>5}{'rows':>10}{'csv MB':>9}{'store MB':>10}  {'mode':<6}{'ms':>9}{'peak MB':>9}{'RSS +MB':>9}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for years in args.years:
+            csv_text = make_price_csv(days=365 * years, mandis=args.mandis)
+            csv_path = os.path.join(tmp, f"{years}.csv")
+            store_path = os.path.join(tmp, f"{years}.bin")
+            with open(csv_path, 'w', encoding='utf-8') as f:
+                f.write(csv_text)
+            with open(store_path, 'wb') as f:
+                f.write(convert_csv(csv_text, 'maharashtra', 'cotton'))
+
+            rows = 365 * years * args.mandis
+            sizes = (os.path.getsize(csv_path) / 1e6, os.path.getsize(store_path) / 1e6)
+            results = {mode: measure(mode, csv_path, store_path) for mode in ('csv', 'store', 'mmap')}
+            assert results['csv'][3] == results['store'][3] == results['mmap'][3], 'backends disagree'
+            for mode, (elapsed, peak, rss, _) in results.items():
+                print(f"{years:>5}{rows:>10}{sizes[0]:>9.2f}{sizes[1]:>10.2f}  {mode:<6}"
+                      f"{elapsed:>9.2f}{peak:>9.2f}{rss:>9.2f}")
+
+    analysis = check_backends(make_price_csv(days=400, mandis=args.mandis))
+    print(f"CSV and store backends agree: current {analysis['current_price']:.0f}, "
+          f"percentile {analysis['price_percentile']:.1f}")
+
+if __name__ == '__main__':
+    main()
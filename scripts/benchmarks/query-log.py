@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Compare one put_item per query with the buffered query-log writer under a burst of requests
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import standins
+from standins import StubDynamoDB, percentile
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--queries', type=int, default=2000)
+    parser.add_argument('--concurrency', type=int, default=32)
+    parser.add_argument('--dynamodb-ms', type=float, default=15)
+    parser.add_argument('--unprocessed', type=float, default=0.05,
+                        help='fraction of each batch the stand-in leaves unprocessed')
+    args = parser.parse_args()
+
+    standins.use_recommendation_modules()
+    from query_log import BATCH_SIZE, DynamoDBSink, QueryLogWriter, SqliteSink, query_log_item
+
+    request = {'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50}
+    response = {'recommendation': 'SELL_SOON', 'confidence': 'MEDIUM'}
+
+    def burst(log):
+        latencies = []
+        def one(i):
+            start = time.perf_counter()
+            log(i)
+            latencies.append((time.perf_counter() - start) * 1000)
+        start = time.perf_counter()
+        with ThreadPoolExecutor(args.concurrency) as pool:
+            list(pool.map(one, range(args.queries)))
+        return latencies, time.perf_counter() - start
+
+    direct_db = StubDynamoDB(latency_ms=args.dynamodb_ms)
+    table = direct_db.Table('logs')
+    direct, direct_s = burst(lambda i: table.put_item(Item=query_log_item(request, response, i)))
+
+    buffered_db = StubDynamoDB(latency_ms=args.dynamodb_ms, unprocessed=args.unprocessed)
+    writer = QueryLogWriter(DynamoDBSink(buffered_db, 'logs'), flush_interval=0.2)
+    buffered, _ = burst(lambda i: writer.log(request, response))
+    start = time.perf_counter()
+    writer.close()
+    drain_s = time.perf_counter() - start
+    stats = writer.stats()
+    stored = len(buffered_db.items.get('logs', []))
+    assert stored == stats['written'] == args.queries - stats['failed'], (stored, stats)
+    assert len({item['timestamp'] for item in buffered_db.items['logs']}) == stored, 'duplicate sort keys'
+
+    # A non-throttle error partway through counts only the groups it left unwritten
+    failing = StubDynamoDB(latency_ms=0)
+    write = failing.batch_write_item
+    def fail_third(RequestItems):
+        if failing.write_calls == 2:
+            raise RuntimeError('AccessDeniedException')
+        return write(RequestItems)
+    failing.batch_write_item = fail_third
+    failed = DynamoDBSink(failing, 'logs').write([query_log_item(request, response, i) for i in range(4 * BATCH_SIZE)])
+    assert failed == 2 * BATCH_SIZE and len(failing.items['logs']) == 2 * BATCH_SIZE, failed
+
+    with tempfile.TemporaryDirectory() as tmp:
+        offline = QueryLogWriter(SqliteSink(os.path.join(tmp, 'logs.db')))
+        for _ in range(args.queries):
+            offline.log(request, response)
+        start = time.perf_counter()
+        offline.close()
+        sqlite_s = time.perf_counter() - start
+
+    print(f"{args.queries} queries, {args.concurrency} concurrent, "
+          f"{args.dynamodb_ms:.0f} ms per write, {args.unprocessed:.0%} unprocessed per batch")
+    print(f"{'writer':<14}{'p50 ms':>9}{'p99 ms':>9}{'write calls':>13}")
+    print(f"{'put_item':<14}{percentile(direct, 50):>9.3f}{percentile(direct, 99):>9.3f}{direct_db.write_calls:>13}")
+    print(f"{'buffered':<14}{percentile(buffered, 50):>9.3f}{percentile(buffered, 99):>9.3f}{buffered_db.write_calls:>13}")
+    print(f"per-query put_item burst took {direct_s:.2f} s; buffered writer drained {drain_s:.2f} s after the burst")
+    print(f"queries per write call: {args.queries / buffered_db.write_calls:.1f} "
+          f"(written {stats['written']}, failed {stats['failed']}, dropped {stats['dropped']})")
+    print(f"SQLite sink flushed {args.queries} records in {sqlite_s * 1000:.1f} ms")
+
+if __name__ == '__main__':
+    main()
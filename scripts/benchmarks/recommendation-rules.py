@@ -0,0 +1,95 @@
+#!/usr/bin/env python3
+"""
+Benchmark the vectorized decision table against per-analysis rule evaluation,
+and check it agrees with the original if-chain
+"""
+
+import argparse
+import time
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+from recommendation_engine import ACTIONS, CONFIDENCES, RecommendationEngine
+
+def reference_recommendation(analysis):
+    """The hand-written rules the decision table replaced"""
+    current_price = analysis['current_price']
+    avg_12week = analysis['avg_12week']
+    trend_direction = analysis['trend_direction']
+    trend_strength = analysis['trend_strength']
+    price_percentile = analysis['price_percentile']
+
+    if trend_direction == "Falling" and current_price > avg_12week * 1.05:
+        return 'Sell Now', 'High', 'Prices are declining but still above average'
+    if trend_direction == "Rising" and current_price < avg_12week * 0.95:
+        return 'Wait 2-4 weeks', 'Medium', 'Prices are rising and currently below average'
+    if price_percentile > 85:
+        return 'Sell Now', 'High', 'Current price is near yearly high'
+    if trend_direction == "Rising" and trend_strength == "Strong":
+        return 'Wait 2-4 weeks', 'Medium', 'Strong upward trend suggests better prices ahead'
+    if trend_direction == "Stable" and 0.95 < (current_price / avg_12week) < 1.05:
+        return 'Sell within 1-2 weeks', 'Medium', 'Market is stable, no strong signal to wait'
+    return 'Sell within 1-2 weeks', 'Low', 'Market conditions are unclear, moderate timing suggested'
+
+def synthetic_analyses(count, seed=0):
+    """Struct-of-arrays analyses, with a share of prices exactly on the rule thresholds"""
+    rng = np.random.default_rng(seed)
+    avg_12week = rng.uniform(1000, 9000, count).round()
+    ratio = rng.uniform(0.85, 1.15, count)
+    edges = rng.random(count) < 0.1
+    ratio[edges] = rng.choice([0.95, 1.05], edges.sum())
+    percentile = rng.uniform(0, 100, count)
+    percentile[rng.random(count) < 0.05] = 85.0
+    return {
+        'current_price': avg_12week * ratio,
+        'avg_12week': avg_12week,
+        'trend_direction': rng.choice(['Rising', 'Falling', 'Stable'], count),
+        'trend_strength': rng.choice(['Strong', 'Moderate', 'Weak'], count),
+        'price_percentile': percentile
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--analyses', type=int, default=1_000_000)
+    parser.add_argument('--check', type=int, default=100_000, help='analyses compared with the if-chain')
+    args = parser.parse_args()
+
+    engine = RecommendationEngine()
+    analyses = synthetic_analyses(args.analyses)
+    fields = list(analyses)
+
+    start = time.perf_counter()
+    scored = engine.generate_recommendations(analyses)
+    vectorized = time.perf_counter() - start
+
+    check = min(args.check, args.analyses)
+    rows = [{field: analyses[field][i].item() for field in fields} for i in range(check)]
+    start = time.perf_counter()
+    expected = [reference_recommendation(row) for row in rows]
+    loop = (time.perf_counter() - start) * args.analyses / check
+
+    start = time.perf_counter()
+    singles = [engine.generate_recommendation(row) for row in rows[:10_000]]
+    wrapper = (time.perf_counter() - start) * args.analyses / len(singles)
+
+    for i, (action, confidence, reason) in enumerate(expected):
+        assert ACTIONS[scored['action'][i]] == action, (i, rows[i])
+        assert CONFIDENCES[scored['confidence'][i]] == confidence, (i, rows[i])
+        assert engine.rules[scored['rule'][i]]['reason'] == reason, (i, rows[i])
+    for single, (action, confidence, reason) in zip(singles, expected):
+        assert (single['action'], single['confidence'], single['reason']) == (action, confidence, reason)
+
+    counts = np.bincount(scored['rule'], minlength=len(engine.rules))
+    print(f"{args.analyses} analyses; {check} checked against the if-chain, all equal")
+    print(f"{'path':<26}{'seconds':>10}{'per analysis us':>17}")
+    for name, seconds in (('decision table', vectorized), ('if-chain loop (est)', loop),
+                          ('single-item wrapper (est)', wrapper)):
+        print(f"{name:<26}{seconds:>10.3f}{seconds / args.analyses * 1e6:>17.3f}")
+    print('matches per rule: ' + ', '.join(str(c) for c in counts))
+
+if __name__ == '__main__':
+    main()
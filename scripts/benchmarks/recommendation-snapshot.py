@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Benchmark the nightly recommendation snapshot: build time across worker counts,
+and request latency served from the snapshot against recomputing per request
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import standins
+from standins import (LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, make_price_csv,
+                      percentile, seed_bucket, timed)
+
+standins.use_recommendation_modules()
+
+from price_store import convert_csv
+from recommendation_snapshot import SNAPSHOT_NAME, build_snapshots
+
+def write_stores(store_dir, states, crops, mandis, days):
+    csv_text = make_price_csv(days=days, mandis=mandis)
+    for state in states:
+        os.makedirs(os.path.join(store_dir, state), exist_ok=True)
+        data = convert_csv(csv_text, state, 'cotton')
+        for crop in crops:
+            with open(os.path.join(store_dir, state, f"{crop}.bin"), 'wb') as f:
+                f.write(data)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--states', type=int, default=8)
+    parser.add_argument('--crops', type=int, default=25)
+    parser.add_argument('--mandis', type=int, default=50)
+    parser.add_argument('--days', type=int, default=365)
+    parser.add_argument('--workers', type=int, nargs='+', default=[1, os.cpu_count() or 1])
+    parser.add_argument('--s3-ms', type=float, default=20)
+    parser.add_argument('--bedrock-ms', type=float, default=300)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    states = [f"state{s:02d}" for s in range(args.states)]
+    crops = [f"crop{c:02d}" for c in range(args.crops)]
+    with tempfile.TemporaryDirectory() as tmp:
+        write_stores(tmp, states, crops, args.mandis, args.days)
+        print(f"{args.states} states x {args.crops} crops, {args.mandis} mandis x {args.days} days each")
+        print(f"{'workers':>7}{'build s':>10}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            snapshots = build_snapshots(tmp, workers=workers)
+            print(f"{workers:>7}{time.perf_counter() - start:>10.2f}")
+        sizes = [len(data) for data in snapshots.values()]
+        print(f"snapshot size per state: {sum(sizes) / len(sizes) / 1e3:.1f} kB")
+
+    s3 = LocalS3(latency_ms=args.s3_ms)
+    seed_bucket(s3)
+    app = load_recommendation_app(s3, StubBedrock(args.bedrock_ms), StubDynamoDB())
+    event = {'body': json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50})}
+
+    def request():
+        response = app.lambda_handler(event, None)
+        assert response['statusCode'] == 200
+        return json.loads(response['body'])
+
+    recompute = timed(request, args.repeat)
+    expected = request()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        os.makedirs(os.path.join(tmp, 'maharashtra'))
+        with open(os.path.join(tmp, 'maharashtra', 'cotton.bin'), 'wb') as f:
+            f.write(s3.objects[('bench-bucket', 'price-store/maharashtra/cotton.bin')][0])
+        s3.put_object('bench-bucket', f"price-store/maharashtra/{SNAPSHOT_NAME}",
+                      build_snapshots(tmp, workers=1)['maharashtra'])
+
+    requests_before = s3.requests
+    served = timed(request, args.repeat)
+    served_requests = (s3.requests - requests_before) / args.repeat
+    actual = request()
+    for field in ('recommendation', 'confidence', 'priceRange', 'averagePrice', 'trend', 'historicalPrices'):
+        assert actual[field] == expected[field], f"snapshot and recompute disagree on {field}"
+
+    print(f"\n{'request path':<14}{'p50 ms':>9}{'p99 ms':>9}")
+    print(f"{'recompute':<14}{percentile(recompute, 50):>9.1f}{percentile(recompute, 99):>9.1f}")
+    print(f"{'snapshot':<14}{percentile(served, 50):>9.1f}{percentile(served, 99):>9.1f}")
+    print(f"snapshot stats: {app.materialized.stats()}")
+    # The snapshot and prices stages both load the price store; the cache fetches it once
+    print(f"S3 GETs per snapshot request: {served_requests:.1f}; "
+          f"coalesced cache loads: {app.object_cache.stats()['coalesced']}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,99 @@
+#!/usr/bin/env python3
+"""
+Benchmark incremental daily appends against recomputing analyze_trends for many series
+"""
+
+import argparse
+import math
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import standins
+
+standins.use_recommendation_modules()
+
+from price_analyzer import PriceAnalyzer
+from price_store import PriceWindow
+from rolling_stats import RollingPriceStats, RollingStatsStore
+
+def series_prices(rng, days):
+    return np.round(6000 + rng.normal(0, 300) + np.cumsum(rng.normal(0, 20, days))).astype(np.float64)
+
+def check_equal(incremental, recomputed):
+    for key, value in recomputed.items():
+        if key == 'std_price':
+            assert math.isclose(incremental[key], value, rel_tol=1e-9), (key, incremental[key], value)
+        else:
+            assert incremental[key] == value, (key, incremental[key], value)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--series', type=int, default=10000)
+    parser.add_argument('--history', type=int, default=400, help='days loaded before timing')
+    parser.add_argument('--updates', type=int, default=3, help='daily appends timed per series')
+    parser.add_argument('--check', type=int, default=200, help='series compared with analyze_trends')
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    analyzer = PriceAnalyzer(None, None)
+    days = args.history + args.updates
+    prices = [series_prices(rng, days) for _ in range(args.series)]
+    store = RollingStatsStore()
+
+    start = time.perf_counter()
+    for s, series in enumerate(prices):
+        for day in range(args.history):
+            store.append('maharashtra', 'cotton', f"MH{s:05d}", day, series[day])
+    print(f"warm-up: {args.series} series x {args.history} days in {time.perf_counter() - start:.1f}s")
+
+    start = time.perf_counter()
+    for day in range(args.history, days):
+        for s, series in enumerate(prices):
+            store.append('maharashtra', 'cotton', f"MH{s:05d}", day, series[day])
+            store.get('maharashtra', 'cotton', f"MH{s:05d}").analysis()
+    incremental = (time.perf_counter() - start) / (args.series * args.updates) * 1e6
+
+    start = time.perf_counter()
+    day_axis = np.arange(days, dtype=np.int32)
+    for s in range(args.check):
+        window = slice(days - 365, days)
+        single = PriceWindow(day_axis[window], np.zeros(365, dtype=np.uint16), prices[s][window],
+                             prices[s][window], prices[s][window], np.ones(365), [{'code': ''}])
+        recomputed = analyzer.analyze_trends(single)
+        check_equal(store.get('maharashtra', 'cotton', f"MH{s:05d}").analysis(), recomputed)
+    recompute = (time.perf_counter() - start) / args.check * 1e6
+
+    # A mandi trading on about half the days: the 4- and 12-week averages are still the last 28 and 84 rows
+    for s in range(20):
+        traded = np.flatnonzero(rng.random(days) < 0.5).astype(np.int32)
+        stats = RollingPriceStats()
+        for day in traded.tolist():
+            stats.append(day, prices[s][day])
+        rows = traded[traded > traded[-1] - 365]
+        single = PriceWindow(rows, np.zeros(len(rows), dtype=np.uint16), prices[s][rows],
+                             prices[s][rows], prices[s][rows], np.ones(len(rows)), [{'code': ''}])
+        check_equal(stats.analysis(), analyzer.analyze_trends(single))
+
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, 'rolling.json')
+        start = time.perf_counter()
+        store.save(path)
+        saved = time.perf_counter() - start
+        start = time.perf_counter()
+        reloaded = RollingStatsStore.load(path)
+        loaded = time.perf_counter() - start
+        check_equal(reloaded.get('maharashtra', 'cotton', 'MH00000').analysis(),
+                    store.get('maharashtra', 'cotton', 'MH00000').analysis())
+        size = os.path.getsize(path) / 1e6
+
+    print(f"append + analysis: {incremental:.1f} us/series/day")
+    print(f"analyze_trends recompute: {recompute:.1f} us/series/day ({args.check} series matched)")
+    print(f"daily update of {args.series} series: {incremental * args.series / 1e3:.0f} ms incremental "
+          f"vs {recompute * args.series / 1e3:.0f} ms recompute")
+    print(f"state file: {size:.1f} MB, save {saved:.2f}s, load {loaded:.2f}s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,166 @@
+#!/usr/bin/env python3
+"""
+Fit seasonal price models for every (state, crop, mandi) series of the synthetic national
+dataset and measure fit throughput per core and request-time forecast latency; backtest
+the 2-4 week forecasts against carrying the last week's price forward, and check the
+handler and the decision table use them
+"""
+
+import argparse
+import json
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, percentile, seed_bucket
+
+standins.use_recommendation_modules()
+
+from price_analyzer import PriceAnalyzer
+from price_store import PriceStore
+from recommendation_engine import RecommendationEngine
+from seasonal_model import (HISTORY_DAYS, HORIZON_DAYS, MODELS_NAME, SeasonalModels, build_models,
+                            build_models_from_dir, fit_store, fit_window)
+
+def backtest(store, cutoffs):
+    """Mean absolute error of the expected price and share of horizon prices inside the band, per mandi
+    and cutoff, for the models and for the mean of each mandi's last seven days"""
+    window = store.window()
+    model_errors, naive_errors, inside = [], [], []
+    for cutoff in cutoffs:
+        codes, columns = fit_window(window[(window.day <= cutoff) & (window.day > cutoff - HISTORY_DAYS)])
+        models = SeasonalModels.from_bytes(build_models('bench', {'crop': (codes, columns)}))
+        bands = models.bands(np.arange(1, len(codes)), cutoff)
+        series = len(codes) - 1
+
+        ahead = window[(window.day >= cutoff + HORIZON_DAYS[0]) & (window.day <= cutoff + HORIZON_DAYS[1])]
+        recent = window[(window.day > cutoff - 7) & (window.day <= cutoff)]
+        count = np.bincount(ahead.mandi, minlength=series)
+        actual = np.bincount(ahead.mandi, ahead.modal_price, series) / np.maximum(count, 1)
+        naive = (np.bincount(recent.mandi, recent.modal_price, series)
+                 / np.maximum(np.bincount(recent.mandi, minlength=series), 1))
+        scored = bands['usable'] & (count > 0) & (naive > 0)
+        model_errors.append(np.abs(bands['expected'][scored] / actual[scored] - 1))
+        naive_errors.append(np.abs(naive[scored] / actual[scored] - 1))
+        rows = scored[ahead.mandi]
+        mandi = ahead.mandi[rows]
+        inside.append((ahead.modal_price[rows] >= bands['low'][mandi]) & (ahead.modal_price[rows] <= bands['high'][mandi]))
+    return np.concatenate(model_errors).mean(), np.concatenate(naive_errors).mean(), np.concatenate(inside).mean()
+
+def check_rules():
+    """Forecast rules agree between the scalar and vectorized paths, and never fire without a forecast"""
+    engine = RecommendationEngine()
+    rng = np.random.default_rng(5)
+    count = 20_000
+    analyses = {
+        'current_price': rng.uniform(5000, 7000, count),
+        'avg_12week': np.full(count, 6000.0),
+        'trend_direction': rng.choice(['Rising', 'Falling', 'Stable'], count),
+        'trend_strength': rng.choice(['Strong', 'Moderate', 'Weak'], count),
+        'price_percentile': rng.uniform(0, 100, count),
+        'forecast_change_pct': np.where(rng.random(count) < 0.2, np.nan, rng.uniform(-12, 12, count))
+    }
+    rules = engine.match_rules(analyses)
+    without = engine.match_rules({k: v for k, v in analyses.items() if k != 'forecast_change_pct'})
+    for i in range(count):
+        analysis = {k: v[i] for k, v in analyses.items() if k != 'forecast_change_pct'}
+        change = analyses['forecast_change_pct'][i]
+        analysis['forecast'] = None if np.isnan(change) else {'changePct': change}
+        assert engine.rules[rules[i]]['reason'] == engine.generate_recommendation(analysis)['reason'], i
+        assert 'forecast_above' not in engine.rules[without[i]] and 'forecast_below' not in engine.rules[without[i]]
+    return np.mean([('forecast_above' in engine.rules[r]) or ('forecast_below' in engine.rules[r]) for r in rules])
+
+def check_handler():
+    """The handler returns the band and the prompt carries it"""
+    s3 = LocalS3(latency_ms=0)
+    seed_bucket(s3)
+    store = PriceStore.from_bytes(s3.objects[('bench-bucket', 'price-store/maharashtra/cotton.bin')][0])
+    s3.put_object('bench-bucket', f"price-store/maharashtra/{MODELS_NAME}",
+                  build_models('maharashtra', {'cotton': fit_store(store)}))
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB(0))
+    item = {'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50}
+    response = app.lambda_handler({'body': json.dumps(item)}, None)
+    body = json.loads(response['body'])
+    assert response['statusCode'] == 200 and body['priceForecast'] is not None, response['body']
+    band = body['priceForecast']
+    assert band['low'] <= band['expected'] <= band['high'], band
+    analysis = {**app.price_analyzer.analyze_trends(app.price_analyzer.get_historical_prices('maharashtra', 'cotton')),
+                'forecast': band}
+    assert 'Seasonal estimate' in app.explanation_generator._build_prompt('cotton', 'maharashtra', analysis,
+                                                                          {'action': body['recommendation']})
+    batch = app.batch_handler({'body': json.dumps({'items': [item]})}, None)
+    assert json.loads(batch['body'])['results'][0]['priceForecast'] == band
+    return band
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--data', help='price-store directory (default: generate the national dataset)')
+    parser.add_argument('--mandis', type=int, default=300, help='mandis per state when generating')
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--workers', type=int, nargs='+', default=sorted({1, os.cpu_count() or 1}))
+    parser.add_argument('--backtest-stores', type=int, default=16)
+    parser.add_argument('--queries', type=int, default=2000)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as directory:
+        store_dir = args.data or standins.generate_price_stores(directory, args.mandis, args.years + 1)
+        states = sorted(name for name in os.listdir(store_dir) if os.path.isdir(os.path.join(store_dir, name)))
+
+        print(f"{'workers':>8}{'series':>9}{'fit s':>8}{'series/s':>10}{'per core':>10}")
+        for workers in args.workers:
+            start = time.perf_counter()
+            models = build_models_from_dir(store_dir, workers=workers)
+            elapsed = time.perf_counter() - start
+            series = sum(len(SeasonalModels.from_bytes(data)) for data in models.values())
+            print(f"{workers:>8}{series:>9}{elapsed:>8.2f}{series / elapsed:>10.0f}{series / elapsed / workers:>10.0f}")
+        sizes = [len(data) for data in models.values()]
+        print(f"model files: {sum(sizes) / 1024:.0f} KB for {len(models)} states")
+
+        model_dir = os.path.join(directory, 'models')
+        for state, data in models.items():
+            os.makedirs(os.path.join(model_dir, state))
+            with open(os.path.join(model_dir, state, MODELS_NAME), 'wb') as f:
+                f.write(data)
+        analyzer = PriceAnalyzer(None, None, store_dir=model_dir)
+        loaded = SeasonalModels.open(os.path.join(model_dir, states[0], MODELS_NAME))
+        crops = sorted(loaded.rows)
+        rng = np.random.default_rng(1)
+        pairs = [(states[i], crops[j]) for i, j in zip(rng.integers(0, len(states), args.queries).tolist(),
+                                                        rng.integers(0, len(crops), args.queries).tolist())]
+        assert all(analyzer.forecast(state, crop) is not None for state, crop in pairs[:100])
+        samples = []
+        for state, crop in pairs:
+            start = time.perf_counter()
+            analyzer.forecast(state, crop)
+            samples.append((time.perf_counter() - start) * 1000)
+        rows = np.arange(len(loaded))
+        start = time.perf_counter()
+        for _ in range(20):
+            loaded.bands(rows, int(loaded.last_day.max()))
+        every = (time.perf_counter() - start) / 20 * 1000
+        print(f"forecast, one state/crop: p50 {percentile(samples, 50):.3f} ms, p99 {percentile(samples, 99):.3f} ms; "
+              f"all {len(loaded)} series of a state at once: {every:.2f} ms")
+
+        print(f"\n{'backtest':<26}{'model MAE':>10}{'naive MAE':>10}{'in 80% band':>12}")
+        stores = [(state, crop) for state in states for crop in crops][::max(1, len(states) * len(crops) // args.backtest_stores)]
+        by_crop = {}
+        for state, crop in stores:
+            store = PriceStore.open(os.path.join(store_dir, state, f"{crop}.bin"))
+            cutoffs = range(store.last_day - 365, store.last_day - HORIZON_DAYS[1], 30)
+            by_crop.setdefault(crop, []).append(backtest(store, cutoffs))
+        for crop, results in sorted(by_crop.items()):
+            model, naive, inside = np.mean(results, axis=0)
+            print(f"{crop:<26}{model:>10.2%}{naive:>10.2%}{inside:>12.1%}")
+        model, naive, inside = np.mean([r for results in by_crop.values() for r in results], axis=0)
+        print(f"{'all':<26}{model:>10.2%}{naive:>10.2%}{inside:>12.1%}")
+        assert model < naive, (model, naive)
+        assert 0.7 < inside < 0.95, inside
+
+    print(f"\nforecast rules fire for {check_rules():.1%} of analyses with a forecast")
+    print(f"handler: priceForecast {check_handler()}")
+
+if __name__ == '__main__':
+    main()
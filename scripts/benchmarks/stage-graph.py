@@ -0,0 +1,73 @@
+#!/usr/bin/env python3
+"""
+Compare the sequential recommendation flow with the concurrent stage graph against local stand-ins
+"""
+
+import argparse
+import json
+import threading
+import time
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, percentile, seed_bucket, timed
+
+def check_stuck_stages():
+    """Timed-out stages that never return must not hold the pool's workers for later requests"""
+    from stage_graph import StageExecutor, StageGraph
+
+    executor = StageExecutor(max_workers=2, max_abandoned=2)
+    hung = threading.Event()
+    for _ in range(2):
+        graph = StageGraph(executor).add('hung', hung.wait, timeout=0.05, fallback=lambda: 'fallback')
+        assert graph.run() == {'hung': 'fallback'}
+    start = time.perf_counter()
+    graph = StageGraph(executor).add('fast', lambda: 'done', timeout=1.0)
+    assert graph.run() == {'fast': 'done'}
+    assert time.perf_counter() - start < 0.5
+    assert executor.stats() == {'abandoned': 2, 'recycled': 1}, executor.stats()
+    hung.set()
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--s3-ms', type=float, default=60)
+    parser.add_argument('--bedrock-ms', type=float, default=300)
+    parser.add_argument('--dynamodb-ms', type=float, default=30)
+    parser.add_argument('--repeat', type=int, default=30)
+    args = parser.parse_args()
+
+    s3 = LocalS3(latency_ms=args.s3_ms)
+    dynamodb = StubDynamoDB(latency_ms=args.dynamodb_ms)
+    seed_bucket(s3)
+    app = load_recommendation_app(s3, StubBedrock(args.bedrock_ms), dynamodb)
+    from query_log import query_log_item
+
+    body = {'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50}
+    event = {'body': json.dumps(body)}
+
+    def sequential():
+        price_data = app.price_analyzer.get_historical_prices('maharashtra', 'cotton')
+        analysis = app.price_analyzer.analyze_trends(price_data)
+        recommendation = app.recommendation_engine.generate_recommendation(analysis)
+        app.mandi_finder.find_nearby_mandis('maharashtra', 'Akola', 'cotton')
+        app.explanation_generator.generate_explanation('cotton', 'maharashtra', analysis, recommendation)
+        response = {'recommendation': recommendation['action'], 'confidence': recommendation['confidence']}
+        dynamodb.Table(app.TABLE_NAME).put_item(Item=query_log_item(body, response, int(time.time() * 1000)))
+
+    def concurrent():
+        response = app.lambda_handler(event, None)
+        assert response['statusCode'] == 200, response['body']
+
+    sequential()
+    concurrent()
+    check_stuck_stages()
+    results = {'sequential': timed(sequential, args.repeat), 'stage graph': timed(concurrent, args.repeat)}
+
+    stages = {'S3 price fetch': args.s3_ms, 'S3 mandi fetch': args.s3_ms, 'Bedrock': args.bedrock_ms,
+              'DynamoDB put': args.dynamodb_ms}
+    print('stand-in latencies (ms): ' + ', '.join(f"{k} {v:.0f}" for k, v in stages.items()))
+    print(f"{'flow':<14}{'p50 ms':>9}{'p99 ms':>9}")
+    for name, samples in results.items():
+        print(f"{name:<14}{percentile(samples, 50):>9.1f}{percentile(samples, 99):>9.1f}")
+
+if __name__ == '__main__':
+    main()
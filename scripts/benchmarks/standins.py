@@ -0,0 +1,370 @@
+"""
+Local stand-ins for the AWS services used by the backend, for benchmarks
+"""
+
+import hashlib
+import io
+import json
+import os
+import random
+import subprocess
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+from botocore.exceptions import ClientError
+
+ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+RECOMMENDATION_DIR = os.path.join(ROOT, 'backend', 'functions', 'get_recommendation')
+ANALYTICS_DIR = os.path.join(ROOT, 'backend', 'functions', 'get_analytics')
+LAYER_DIRS = [os.path.join(ROOT, 'backend', 'layers', 'tracing', 'python')]
+
+def use_recommendation_modules():
+    """Make the get_recommendation modules and the shared layers importable, ahead of get_analytics"""
+    _prepend(LAYER_DIRS + [RECOMMENDATION_DIR])
+
+def use_analytics_modules():
+    """Make the get_analytics modules and the shared layers importable, ahead of get_recommendation"""
+    _prepend(LAYER_DIRS + [ANALYTICS_DIR])
+
+def _prepend(paths):
+    # Both functions have an app.py; the one asked for last wins `import app`
+    for path in paths:
+        if path in sys.path:
+            sys.path.remove(path)
+        sys.path.insert(0, path)
+
+class LocalS3:
+    """In-memory S3 with per-request latency, bandwidth and ETag support"""
+
+    def __init__(self, latency_ms=20, bandwidth_mb_s=50):
+        self.objects = {}
+        self.latency = latency_ms / 1000
+        self.bandwidth = bandwidth_mb_s * 1024 * 1024
+        self.requests = 0
+        self.bytes_sent = 0
+
+    def put_object(self, Bucket, Key, Body):
+        if isinstance(Body, str):
+            Body = Body.encode('utf-8')
+        etag = '"%s"' % hashlib.md5(Body).hexdigest()
+        self.objects[(Bucket, Key)] = (Body, etag)
+        return {'ETag': etag}
+
+    def delete_object(self, Bucket, Key):
+        self.objects.pop((Bucket, Key), None)
+        return {}
+
+    def get_object(self, Bucket, Key, IfNoneMatch=None, Range=None):
+        self.requests += 1
+        time.sleep(self.latency)
+        if (Bucket, Key) not in self.objects:
+            raise ClientError({'Error': {'Code': 'NoSuchKey', 'Message': Key}}, 'GetObject')
+
+        body, etag = self.objects[(Bucket, Key)]
+        if IfNoneMatch is not None and IfNoneMatch == etag:
+            raise ClientError(
+                {'Error': {'Code': '304', 'Message': 'Not Modified'},
+                 'ResponseMetadata': {'HTTPStatusCode': 304}},
+                'GetObject'
+            )
+
+        if Range is not None:
+            start, end = Range.split('=')[1].split('-')
+            body = body[int(start):int(end) + 1]
+
+        time.sleep(len(body) / self.bandwidth)
+        self.bytes_sent += len(body)
+        return {'Body': io.BytesIO(body), 'ETag': etag, 'ContentLength': len(body)}
+
+class DirectoryS3(LocalS3):
+    """LocalS3 reading objects from a directory laid out like the bucket.
+
+    A file is read once, on its first request; put_object writes stay in
+    memory, so the directory is never modified.
+    """
+
+    def __init__(self, root, latency_ms=20, bandwidth_mb_s=50):
+        super().__init__(latency_ms, bandwidth_mb_s)
+        self.root = root
+
+    def get_object(self, Bucket, Key, **kwargs):
+        if (Bucket, Key) not in self.objects:
+            path = os.path.join(self.root, *Key.split('/'))
+            if os.path.isfile(path):
+                with open(path, 'rb') as f:
+                    self.put_object(Bucket, Key, f.read())
+        return super().get_object(Bucket, Key, **kwargs)
+
+def make_price_csv(days=365, mandis=3, end=None, base_price=6000):
+    """Daily multi-mandi price CSV in the data/sample-price-data.csv layout, newest first"""
+    end = end or datetime.now()
+    lines = ['date,mandi_name,mandi_code,crop,variety,min_price,max_price,modal_price,volume_quintals']
+    for d in range(days):
+        date = (end - timedelta(days=d)).strftime('%Y-%m-%d')
+        for m in range(mandis):
+            modal = base_price + 50 * m - d + (d * 37 + m * 11) % 150
+            lines.append(
+                f"{date},Mandi {m},MH{m:03d},Cotton,Medium Staple,"
+                f"{modal - 200},{modal + 200},{modal},{900 + (d * 13 + m * 7) % 600}"
+            )
+    return '\n'.join(lines) + '\n'
+
+def make_mandi_metadata(count=3, state='Maharashtra', crops=('Cotton', 'Soybean', 'Wheat')):
+    """Mandi metadata in the data/sample-mandi-metadata.json layout"""
+    mandis = []
+    for m in range(count):
+        mandis.append({
+            'code': f"MH{m:03d}",
+            'name': f"Mandi {m}",
+            'district': f"District {m % 36}",
+            'latitude': 16.0 + (m * 0.6180339) % 6.0,
+            'longitude': 73.0 + (m * 0.4142135) % 7.0,
+            'crops_traded': [c for i, c in enumerate(crops) if (m + i) % 2 == 0] or [crops[0]],
+            'facilities': ['weighbridge'],
+            'contact': '+91-000-xxx-xxxx',
+            'operating_days': ['Monday', 'Wednesday', 'Friday']
+        })
+    return {'state': state, 'mandis': mandis}
+
+def generate_price_stores(directory, mandis=300, years=3):
+    """Price stores for every state and crop under directory/price-store, as scripts/generate-sample-data.py writes them"""
+    subprocess.run([
+        sys.executable, os.path.join(ROOT, 'scripts', 'generate-sample-data.py'), '--output', directory,
+        '--formats', 'store', '--queries', '0', '--mandis', str(mandis), '--years', str(years)
+    ], check=True, stdout=subprocess.DEVNULL)
+    return os.path.join(directory, 'price-store')
+
+def timed(fn, repeat):
+    """Per-call latencies in milliseconds"""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append((time.perf_counter() - start) * 1000)
+    return samples
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    return ordered[min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))]
+
+class StubBedrock:
+    """Bedrock runtime stand-in returning a canned explanation after a fixed latency"""
+
+    def __init__(self, latency_ms=800, fail=False):
+        self.latency = latency_ms / 1000
+        self.fail = fail
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def invoke_model(self, modelId, body):
+        with self._lock:
+            self.calls += 1
+        time.sleep(self.latency)
+        if self.fail:
+            raise ClientError({'Error': {'Code': 'ThrottlingException', 'Message': 'slow down'}}, 'InvokeModel')
+        text = 'Prices are steady compared to the recent average, so selling soon is reasonable.'
+        return {'body': io.BytesIO(json.dumps({'content': [{'text': text}]}).encode('utf-8'))}
+
+class StubTable:
+    def __init__(self, owner, name):
+        self.owner = owner
+        self.name = name
+        self.meta = owner.meta
+
+    def put_item(self, Item):
+        time.sleep(self.owner.latency)
+        with self.owner.lock:
+            self.owner.items.setdefault(self.name, []).append(Item)
+            self.owner.write_calls += 1
+        return {}
+
+    def query(self, KeyConditionExpression, ExclusiveStartKey=None):
+        """Every matching item in one page"""
+        time.sleep(self.owner.latency)
+        with self.owner.lock:
+            items = [item for item in self.owner.items.get(self.name, []) if _matches(item, KeyConditionExpression)]
+        return {'Items': items, 'Count': len(items)}
+
+    @contextmanager
+    def batch_writer(self):
+        yield self
+
+def _matches(item, condition):
+    """Evaluate a boto3 key condition (=, BETWEEN, begins_with and AND) against an item"""
+    expression = condition.get_expression()
+    operator, values = expression['operator'], expression['values']
+    if operator == 'AND':
+        return all(_matches(item, value) for value in values)
+    value = item.get(values[0].name)
+    if value is None:
+        return False
+    if operator == '=':
+        return value == values[1]
+    if operator == 'BETWEEN':
+        return values[1] <= value <= values[2]
+    if operator == 'begins_with':
+        return str(value).startswith(values[1])
+    raise ValueError(f"Unsupported key condition {operator}")
+
+class StubDynamoDB:
+    """DynamoDB resource stand-in that keeps items in memory.
+
+    batch_write_item leaves a fraction of each batch unprocessed, like a
+    throttled table, so callers exercise their retry path.
+    """
+
+    def __init__(self, latency_ms=15, unprocessed=0.0, seed=0):
+        self.latency = latency_ms / 1000
+        self.unprocessed = unprocessed
+        self.items = {}
+        self.write_calls = 0
+        self.meta = SimpleNamespace(client=self)
+        self.lock = threading.Lock()
+        self._rng = random.Random(seed)
+
+    def Table(self, name):
+        return StubTable(self, name)
+
+    def batch_write_item(self, RequestItems):
+        time.sleep(self.latency)
+        unprocessed = {}
+        with self.lock:
+            self.write_calls += 1
+            for name, requests in RequestItems.items():
+                if len(requests) > 25:
+                    raise ValueError('batch_write_item accepts at most 25 requests')
+                for request in requests:
+                    if self._rng.random() < self.unprocessed:
+                        unprocessed.setdefault(name, []).append(request)
+                    else:
+                        self.items.setdefault(name, []).append(request['PutRequest']['Item'])
+        return {'UnprocessedItems': unprocessed}
+
+    def transact_write_items(self, TransactItems):
+        """Only ADD updates and puts conditional on attribute_not_exists, as RollupTable.apply sends"""
+        time.sleep(self.latency)
+        with self.lock:
+            self.write_calls += 1
+            reasons = []
+            for action in TransactItems:
+                put = action.get('Put')
+                exists = put is not None and 'ConditionExpression' in put and any(
+                    item.get('state') == put['Item']['state'] and item.get('day') == put['Item']['day']
+                    for item in self.items.get(put['TableName'], [])
+                )
+                reasons.append({'Code': 'ConditionalCheckFailed' if exists else 'None'})
+            if any(reason['Code'] != 'None' for reason in reasons):
+                raise ClientError({
+                    'Error': {'Code': 'TransactionCanceledException', 'Message': 'Transaction cancelled'},
+                    'CancellationReasons': reasons
+                }, 'TransactWriteItems')
+            for action in TransactItems:
+                if 'Put' in action:
+                    self.items.setdefault(action['Put']['TableName'], []).append(dict(action['Put']['Item']))
+                else:
+                    self._add(**action['Update'])
+        return {}
+
+    def _add(self, TableName, Key, UpdateExpression, ExpressionAttributeNames, ExpressionAttributeValues):
+        """'ADD #name :value, ...' to the item with Key, creating it if needed"""
+        items = self.items.setdefault(TableName, [])
+        item = next((i for i in items if all(i.get(k) == v for k, v in Key.items())), None)
+        if item is None:
+            item = dict(Key)
+            items.append(item)
+        for clause in UpdateExpression[len('ADD '):].split(', '):
+            name, value = clause.split(' ')
+            field = ExpressionAttributeNames[name]
+            item[field] = item.get(field, 0) + ExpressionAttributeValues[value]
+
+def load_recommendation_app(s3, bedrock, dynamodb, bucket='bench-bucket'):
+    """Import get_recommendation/app.py and rewire its module-level components to stand-ins"""
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-south-1')
+    os.environ.setdefault('PRICE_DATA_BUCKET', bucket)
+    os.environ.setdefault('DYNAMODB_TABLE', 'bench-table')
+    use_recommendation_modules()
+
+    import app
+    from explanation_generator import ExplanationGenerator
+    from mandi_finder import MandiFinder
+    from object_cache import ObjectCache
+    from price_analyzer import PriceAnalyzer
+    from query_log import DynamoDBSink, QueryLogWriter
+    from recommendation_snapshot import MaterializedRecommendations
+
+    # Timed like the real clients, so traces cover the stand-ins; metrics lines are dropped
+    app.tracer.emit = lambda line: None
+    s3 = app.tracer.wrap(s3, 's3')
+    bedrock = app.tracer.wrap(bedrock, 'bedrock')
+    dynamodb = app.tracer.wrap(dynamodb, 'dynamodb')
+    app.s3 = s3
+    app.dynamodb = dynamodb
+    app.object_cache = ObjectCache(s3, ttl_seconds=0, tracer=app.tracer)
+    app.price_analyzer = PriceAnalyzer(s3, bucket, cache=app.object_cache)
+    app.mandi_finder = MandiFinder(s3, bucket, cache=app.object_cache)
+    app.materialized = MaterializedRecommendations(s3, bucket, app.price_analyzer, cache=app.object_cache)
+    app.explanation_generator = ExplanationGenerator(bedrock, latency_budget=app.EXPLANATION_BUDGET_SECONDS)
+    app.query_log_writer = QueryLogWriter(DynamoDBSink(dynamodb, app.TABLE_NAME))
+    app.batch_recommender = app.BatchRecommender(
+        app.price_analyzer, app.recommendation_engine, app.mandi_finder, app.explanation_generator,
+        app.batch_recommender.executor, materialized=app.materialized
+    )
+    app.register_trace_sources()
+    return app
+
+def install_recommendation_clients(s3, bedrock, dynamodb):
+    """Have clients.client()/resource() return the stand-ins.
+
+    app.py then builds its components on them at import, exactly as on a
+    cold start, instead of being rewired afterwards.
+    """
+    use_recommendation_modules()
+    import clients
+    clients._clients.update({
+        ('client', 's3', ()): s3,
+        ('client', 'bedrock-runtime', (('region_name', 'us-east-1'),)): bedrock,
+        ('resource', 'dynamodb', ()): dynamodb
+    })
+
+def load_analytics_app(s3, dynamodb, bucket='bench-bucket'):
+    """Import get_analytics/app.py as `analytics_app`, creating its boto3 clients from the stand-ins"""
+    import importlib.util
+    from unittest import mock
+
+    import boto3
+
+    os.environ.setdefault('AWS_DEFAULT_REGION', 'ap-south-1')
+    os.environ.setdefault('PRICE_DATA_BUCKET', bucket)
+    os.environ.setdefault('DYNAMODB_TABLE', 'bench-table')
+    os.environ.setdefault('ROLLUP_TABLE', 'bench-rollups')
+    use_analytics_modules()
+
+    # A module name of its own, so it can live alongside get_recommendation's app
+    spec = importlib.util.spec_from_file_location('analytics_app', os.path.join(ANALYTICS_DIR, 'app.py'))
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.object(boto3, 'client', lambda service, **kwargs: s3), \
+            mock.patch.object(boto3, 'resource', lambda service, **kwargs: dynamodb):
+        spec.loader.exec_module(module)
+    sys.modules['analytics_app'] = module
+    return module
+
+def seed_bucket(s3, bucket='bench-bucket', state='maharashtra', crop='cotton', mandis=20):
+    """Price CSV, columnar price store and mandi metadata for one state and crop"""
+    use_recommendation_modules()
+    from latest_price_index import build_index
+    from price_store import PriceStore, convert_csv
+
+    csv_text = make_price_csv(days=365, mandis=mandis)
+    s3.put_object(bucket, f"historical-prices/{state}/{crop}_{datetime.now().year}.csv", csv_text)
+    s3.put_object(bucket, f"price-store/{state}/{crop}.bin", convert_csv(csv_text, state, crop))
+    stores = {
+        key.rsplit('/', 1)[1][:-len('.bin')]: PriceStore.from_bytes(body)
+        for (b, key), (body, _) in s3.objects.items()
+        if b == bucket and key.startswith(f"price-store/{state}/") and key.endswith('.bin')
+    }
+    s3.put_object(bucket, f"price-store/{state}/latest-prices.idx", build_index(state, stores))
+    s3.put_object(bucket, f"mandi-metadata/{state}_mandis.json", json.dumps(make_mandi_metadata(mandis)))
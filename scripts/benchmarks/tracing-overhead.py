@@ -0,0 +1,123 @@
+#!/usr/bin/env python3
+"""
+Measure the cost of spans, counters and histogram records, and the handler latency
+with tracing on and off; check the EMF flush and the slow-request profile
+"""
+
+import argparse
+import json
+import time
+
+import standins
+from standins import LocalS3, StubBedrock, StubDynamoDB, load_recommendation_app, percentile, seed_bucket, timed
+
+standins.use_recommendation_modules()
+
+from tracing import EMF_MAX_METRICS, EMF_MAX_VALUES, Tracer
+
+def per_call_ns(fn, count):
+    start = time.perf_counter_ns()
+    for _ in range(count):
+        fn()
+    return (time.perf_counter_ns() - start) / count
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--calls', type=int, default=200_000)
+    parser.add_argument('--repeat', type=int, default=200)
+    parser.add_argument('--s3-ms', type=float, default=0)
+    args = parser.parse_args()
+
+    lines = []
+    tracer = Tracer('bench', emit=lines.append)
+    idle = Tracer('bench', enabled=False)
+    values = iter(range(10 ** 9))
+
+    def span():
+        with tracer.span('op'):
+            pass
+
+    def idle_span():
+        with idle.span('op'):
+            pass
+
+    operations = {
+        'span': span,
+        'span, tracing off': idle_span,
+        'record': lambda: tracer.record('latency', next(values) % 5_000_000),
+        'incr': lambda: tracer.incr('count')
+    }
+    print(f"{'operation':<22}{'ns per call':>12}")
+    for name, fn in operations.items():
+        print(f"{name:<22}{per_call_ns(fn, args.calls):>12.0f}")
+
+    start = time.perf_counter()
+    tracer.flush()
+    flush_ms = (time.perf_counter() - start) * 1000
+    emf = json.loads(lines[-1])
+    metrics = {m['Name'] for m in emf['_aws']['CloudWatchMetrics'][0]['Metrics']}
+    assert metrics == {'op', 'latency', 'count'}, metrics
+    assert len(emf['latency']['Values']) <= EMF_MAX_VALUES
+    assert emf['latency']['Count'] == args.calls and sum(emf['latency']['Counts']) == args.calls
+    print(f"flush: {len(lines[-1])} byte EMF line in {flush_ms:.2f} ms, "
+          f"{len(emf['latency']['Values'])} latency buckets")
+
+    # Past EMF_MAX_METRICS the definitions are split across directives
+    for i in range(250):
+        tracer.incr(f"count.{i}")
+    tracer.flush()
+    directives = json.loads(lines[-1])['_aws']['CloudWatchMetrics']
+    assert [len(d['Metrics']) for d in directives] == [EMF_MAX_METRICS, EMF_MAX_METRICS, 50]
+    assert {m['Name'] for d in directives for m in d['Metrics']} == {f"count.{i}" for i in range(250)}
+
+    # Errors without a response (or with response=None) are still counted, not re-raised as AttributeError
+    class Failing:
+        def get_object(self):
+            error = RuntimeError('connection reset')
+            error.response = None
+            raise error
+
+    client = tracer.wrap(Failing(), 's3')
+    try:
+        client.get_object()
+    except RuntimeError:
+        pass
+    assert tracer.snapshot()['s3.get_object.errors'] == 1
+
+    s3 = LocalS3(latency_ms=args.s3_ms)
+    seed_bucket(s3)
+    app = load_recommendation_app(s3, StubBedrock(0), StubDynamoDB(0))
+    emitted = []
+    app.tracer.emit = emitted.append
+    event = {'body': json.dumps({'state': 'maharashtra', 'crop': 'cotton', 'location': 'Akola', 'quantity': 50})}
+
+    def handle():
+        response = app.lambda_handler(event, None)
+        assert response['statusCode'] == 200, response['body']
+
+    handle()
+    # Each invocation writes its metrics before returning, as a frozen container flushes nothing
+    emf = json.loads(emitted[-1])
+    assert emf['request']['Count'] == 1 and 'stage.prices' in emf, sorted(emf)
+    results = {}
+    for enabled in (False, True, False, True):
+        app.tracer.enabled = enabled
+        results.setdefault(enabled, []).extend(timed(handle, args.repeat))
+    print(f"\n{'handler':<14}{'p50 ms':>9}{'p99 ms':>9}")
+    for enabled, samples in results.items():
+        print(f"{'tracing ' + ('on' if enabled else 'off'):<14}"
+              f"{percentile(samples, 50):>9.3f}{percentile(samples, 99):>9.3f}")
+
+    # A slow S3 gives the profiler something to sample
+    s3.latency = 0.05
+    app.tracer.slow_ms = 0
+    app.tracer.profile_slow = True
+    handle()
+    slow = json.loads(emitted[-2])
+    assert slow['message'] == 'slow request' and slow['spans'], slow
+    print(f"\nslow request log: {len(slow['spans'])} spans, {len(slow.get('profile', []))} sampled stacks")
+    for span in slow['spans']:
+        print(f"  {span['name']:<28}at {span['offset_ms']:>7.2f} ms, {span['ms']:.3f} ms")
+
+if __name__ == '__main__':
+    main()
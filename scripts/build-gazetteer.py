@@ -0,0 +1,93 @@
+#!/usr/bin/env python3
+"""
+Build the offline gazetteer used to place a request's location from a places CSV
+(name,kind,state,district,latitude,longitude,population) and optional PIN code CSVs
+"""
+
+import argparse
+import csv
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from gazetteer import Gazetteer, build_gazetteer
+
+# Column names used by common exports, such as the India Post PIN code directory
+ALIASES = {
+    'name': ('name', 'placename', 'village', 'officename'),
+    'kind': ('kind', 'type', 'level'),
+    'state': ('state', 'statename'),
+    'district': ('district', 'districtname'),
+    'latitude': ('latitude', 'lat'),
+    'longitude': ('longitude', 'lng', 'long', 'lon'),
+    'population': ('population', 'tot_p'),
+    'pincode': ('pincode', 'pin', 'pin_code')
+}
+
+def columns(header):
+    """Map each known field to its column index in a CSV header"""
+    positions = {name.strip().lower(): i for i, name in enumerate(header)}
+    return {
+        field: next((positions[alias] for alias in aliases if alias in positions), None)
+        for field, aliases in ALIASES.items()
+    }
+
+def coordinate(value):
+    try:
+        value = float(value)
+    except (TypeError, ValueError):
+        return None
+    return value if value else None
+
+def read_rows(path):
+    """Each CSV row as {field: value} for the known fields"""
+    with open(path, newline='', encoding='utf-8') as f:
+        reader = csv.reader(f)
+        fields = columns(next(reader))
+        for row in reader:
+            yield {field: row[i].strip() if i is not None and i < len(row) else '' for field, i in fields.items()}
+
+def read_places(path, default_kind):
+    for row in read_rows(path):
+        lat, lng = coordinate(row['latitude']), coordinate(row['longitude'])
+        if not row['name'] or lat is None or lng is None:
+            continue
+        population = int(float(row['population'])) if row['population'] else 0
+        yield (row['name'], row['kind'].lower() or default_kind, row['state'], row['district'] or None,
+               lat, lng, population)
+
+def read_pins(path):
+    """One (pincode, lat, lng, state, district) per PIN; post offices sharing a PIN are averaged"""
+    pins = {}
+    for row in read_rows(path):
+        lat, lng = coordinate(row['latitude']), coordinate(row['longitude'])
+        if not row['pincode'].isdigit() or lat is None or lng is None:
+            continue
+        entry = pins.setdefault(int(row['pincode']), [0.0, 0.0, 0, row['state'], row['district'] or None])
+        entry[0] += lat
+        entry[1] += lng
+        entry[2] += 1
+    return [(pin, lat / count, lng / count, state, district) for pin, (lat, lng, count, state, district) in pins.items()]
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('places', nargs='+', help='places CSV files')
+    parser.add_argument('--pins', action='append', default=[], help='PIN code CSV (pincode,latitude,longitude,state,district)')
+    parser.add_argument('--default-kind', default='village', help='kind for rows without one')
+    parser.add_argument('--output', default='gazetteer.bin')
+    args = parser.parse_args()
+
+    places = [place for path in args.places for place in read_places(path, args.default_kind)]
+    pins = [pin for path in args.pins for pin in read_pins(path)]
+    data = build_gazetteer(places, pins)
+    with open(args.output + '.tmp', 'wb') as f:
+        f.write(data)
+    os.replace(args.output + '.tmp', args.output)
+
+    gazetteer = Gazetteer.open(args.output)
+    print(f"Wrote {args.output}: {len(gazetteer)} places, {len(gazetteer.pins)} PIN codes, "
+          f"{len(gazetteer.states)} states ({len(data)} bytes)")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,36 @@
+#!/usr/bin/env python3
+"""
+Build the latest-price index for each state from its columnar price stores
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from latest_price_index import LatestPriceIndex, build_index_from_dir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('store_dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--state', action='append', help='only these states (default: every state directory)')
+    args = parser.parse_args()
+
+    states = args.state or sorted(
+        name for name in os.listdir(args.store_dir) if os.path.isdir(os.path.join(args.store_dir, name))
+    )
+    for state in states:
+        state_dir = os.path.join(args.store_dir, state)
+        data = build_index_from_dir(state_dir, state)
+        path = os.path.join(state_dir, 'latest-prices.idx')
+        # Write then rename so a mapped index is never seen half written
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        index = LatestPriceIndex.open(path)
+        print(f"Wrote {path}: {len(index.crops)} crops x {len(index.mandis)} mandis ({len(data)} bytes)")
+
+if __name__ == '__main__':
+    main()
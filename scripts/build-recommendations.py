@@ -0,0 +1,38 @@
+#!/usr/bin/env python3
+"""
+Materialize the recommendation snapshot for each state from its columnar price stores
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from recommendation_snapshot import SNAPSHOT_NAME, RecommendationSnapshot, build_snapshots
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('store_dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--state', action='append', help='only these states (default: every state directory)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    snapshots = build_snapshots(args.store_dir, states=args.state, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    for state, data in snapshots.items():
+        path = os.path.join(args.store_dir, state, SNAPSHOT_NAME)
+        # Write then rename so a reader never sees a half-written snapshot
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        snapshot = RecommendationSnapshot.open(path)
+        print(f"Wrote {path}: {len(snapshot.markets)} crops ({len(data)} bytes)")
+    print(f"Built {len(snapshots)} snapshots in {elapsed:.2f} s")
+
+if __name__ == '__main__':
+    main()
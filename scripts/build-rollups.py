@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+"""
+Rebuild the analytics rollups: daily query counters replayed from the query log,
+and the per-mandi latest-price table from the price store, with the best inter-mandi
+price spreads net of transport when the mandi metadata is at hand
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import sys
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions')
+sys.path.insert(0, os.path.join(BACKEND, 'get_analytics'))
+sys.path.insert(0, os.path.join(BACKEND, 'get_recommendation'))
+
+from price_partitions import crop_paths, open_local
+from price_spreads import TRANSPORT_COST, price_spread_table
+from rollups import DailyRollups, RollupTable, latest_price_key, latest_price_table, price_spread_key
+
+def scan_table(table, segments=8):
+    """Every item of a DynamoDB table, scanned in parallel segments"""
+    def scan(segment):
+        items = []
+        kwargs = {'Segment': segment, 'TotalSegments': segments}
+        while True:
+            response = table.scan(**kwargs)
+            items.extend(response['Items'])
+            if 'LastEvaluatedKey' not in response:
+                return items
+            kwargs['ExclusiveStartKey'] = response['LastEvaluatedKey']
+
+    with ThreadPoolExecutor(segments) as pool:
+        for items in pool.map(scan, range(segments)):
+            yield from items
+
+def read_sqlite_logs(path):
+    conn = sqlite3.connect(path)
+    for (item,) in conn.execute('SELECT item FROM query_logs'):
+        yield json.loads(item)
+
+def read_file_logs(path):
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            if line.strip():
+                yield json.loads(line)
+
+def latest_prices(store_dir):
+    """{state: latest-price table} for every {state}/{crop}.bin or partitioned crop under store_dir"""
+    tables = {}
+    for state in sorted(os.listdir(store_dir)):
+        state_dir = os.path.join(store_dir, state)
+        if not os.path.isdir(state_dir):
+            continue
+        windows = {crop: open_local(path).window() for crop, path in crop_paths(state_dir).items()}
+        tables[state] = latest_price_table(state, windows)
+    return tables
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    source = parser.add_mutually_exclusive_group()
+    source.add_argument('--query-log-table', help='DynamoDB query-log table to scan')
+    source.add_argument('--query-log-sqlite', help='SQLite file written by QUERY_LOG_SINK=sqlite:<path>')
+    source.add_argument('--query-log-file', help='JSON-lines file written by QUERY_LOG_SINK=file:<path>')
+    parser.add_argument('--rollup-table', help='DynamoDB rollup table to overwrite')
+    parser.add_argument('--rollup-output', help='write rollup buckets to this JSON file instead')
+    parser.add_argument('--price-store-dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--mandi-metadata-dir',
+                        help='directory of {state}_mandis.json for the spreads (default: mandi-metadata beside the price store)')
+    parser.add_argument('--transport-cost', type=float, default=TRANSPORT_COST,
+                        help='rupees per quintal per km deducted from the spreads')
+    parser.add_argument('--bucket', help='upload latest-price and spread tables to this bucket')
+    parser.add_argument('--latest-price-dir', help='write latest-price tables, and spreads under price-spreads/, here instead')
+    args = parser.parse_args()
+
+    if args.query_log_table or args.rollup_table or args.bucket:
+        import boto3
+        dynamodb = boto3.resource('dynamodb')
+
+    logs = None
+    if args.query_log_table:
+        logs = scan_table(dynamodb.Table(args.query_log_table))
+    elif args.query_log_sqlite:
+        logs = read_sqlite_logs(args.query_log_sqlite)
+    elif args.query_log_file:
+        logs = read_file_logs(args.query_log_file)
+
+    if logs is not None:
+        rollups = DailyRollups().add_all(logs)
+        if args.rollup_table:
+            RollupTable(dynamodb.Table(args.rollup_table)).replace(rollups)
+        if args.rollup_output:
+            with open(args.rollup_output, 'w', encoding='utf-8') as f:
+                json.dump([{'state': state, 'day': day, **bucket} for (state, day), bucket in sorted(rollups.buckets.items())], f)
+        print(f"Replayed {sum(b['queries'] for b in rollups.buckets.values())} queries into {len(rollups)} daily buckets")
+
+    if args.price_store_dir:
+        s3 = boto3.client('s3') if args.bucket else None
+        metadata_dir = args.mandi_metadata_dir or os.path.join(
+            os.path.dirname(os.path.abspath(args.price_store_dir)), 'mandi-metadata'
+        )
+
+        def write(key, name, table):
+            body = json.dumps(table).encode('utf-8')
+            if s3 is not None:
+                s3.put_object(Bucket=args.bucket, Key=key, Body=body, ContentType='application/json')
+            if args.latest_price_dir:
+                path = os.path.join(args.latest_price_dir, name)
+                os.makedirs(os.path.dirname(path), exist_ok=True)
+                with open(path, 'wb') as f:
+                    f.write(body)
+
+        for state, table in latest_prices(args.price_store_dir).items():
+            write(latest_price_key(state), f"{state}.json", table)
+            print(f"Latest prices for {state}: {sum(len(m) for m in table['crops'].values())} mandi/crop pairs")
+            metadata_path = os.path.join(metadata_dir, f"{state}_mandis.json")
+            if not os.path.exists(metadata_path):
+                print(f"  no {metadata_path}, so no price spreads")
+                continue
+            with open(metadata_path, encoding='utf-8') as f:
+                spreads = price_spread_table(state, table, json.load(f), transport_cost=args.transport_cost)
+            write(price_spread_key(state), os.path.join('price-spreads', f"{state}.json"), spreads)
+            best = [(crop, rows[0]['netSpread']) for crop, rows in spreads['crops'].items() if rows]
+            print('  best spreads: ' + ', '.join(f"{crop} ₹{spread}" for crop, spread in best))
+
+if __name__ == '__main__':
+    main()
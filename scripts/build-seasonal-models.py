@@ -0,0 +1,44 @@
+#!/usr/bin/env python3
+"""
+Fit the seasonal price models for each state from its columnar price stores, one worker
+process per state and crop
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from seasonal_model import MODELS_NAME, SeasonalModels, build_models_from_dir
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('store_dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--state', action='append', help='only these states (default: every state directory)')
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    models = build_models_from_dir(args.store_dir, states=args.state, workers=args.workers)
+    elapsed = time.perf_counter() - start
+
+    series = 0
+    for state, data in models.items():
+        path = os.path.join(args.store_dir, state, MODELS_NAME)
+        # Write then rename so a mapped file is never seen half written
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+
+        fitted = SeasonalModels.open(path)
+        usable = int(np.isfinite(fitted.coef[:, 0]).sum())
+        series += len(fitted)
+        print(f"Wrote {path}: {len(fitted.rows)} crops, {usable} of {len(fitted)} series fitted ({len(data)} bytes)")
+    print(f"Fitted {series} series in {elapsed:.2f} s")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,84 @@
+#!/usr/bin/env python3
+"""
+Clean the {crop}.bin price stores of a local price-store directory in place: repair min/max
+ranges, replace outlying modal prices with each mandi's rolling median and flag gaps, storing
+the quality flags alongside the prices. Stores are read a month at a time, so the working set
+stays bounded however many rows they hold. Partitioned crops are cleaned as they are ingested.
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from price_quality import FLAGS, clean_windows
+from price_store import PriceStore, PriceWindow, encode_store
+
+def months(store):
+    """The store's rows a calendar month at a time, as zero-copy windows"""
+    if not store.rows:
+        return
+    month = np.datetime64(store.first_day, 'D').astype('datetime64[M]')
+    while True:
+        first_day = int(month.astype('datetime64[D]').astype(np.int64))
+        if first_day > store.last_day:
+            return
+        yield store.window(first_day, int((month + 1).astype('datetime64[D]').astype(np.int64)) - 1)
+        month += 1
+
+def clean_store(path, state, crop):
+    """Rewrite one store with cleaned prices; returns (rows, per-mandi report)"""
+    store = PriceStore.open(path)
+    parts = []
+    report = {}
+    for cleaned, flagged in clean_windows(months(store)):
+        parts.append(cleaned)
+        for code, flags in flagged.items():
+            totals = report.setdefault(code, {})
+            for name, count in flags.items():
+                totals[name] = totals.get(name, 0) + count
+    rows = store.rows
+    if parts:
+        # Cleaning keeps each month's mandi list, so the parts share the store's
+        columns = [np.concatenate(column) for column in zip(*(part.columns() + (part.quality,) for part in parts))]
+        data = encode_store(PriceWindow(*columns[:6], store.mandis, columns[6]), state, crop)
+        del store, parts
+        with open(path + '.tmp', 'wb') as f:
+            f.write(data)
+        os.replace(path + '.tmp', path)
+    return rows, report
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('store_dir', help='directory of {state}/{crop}.bin price stores')
+    parser.add_argument('--state', action='append', help='only these states (default: every state directory)')
+    parser.add_argument('--report', help='write the rows flagged per state, crop and mandi to this JSON file')
+    args = parser.parse_args()
+
+    states = args.state or sorted(
+        name for name in os.listdir(args.store_dir) if os.path.isdir(os.path.join(args.store_dir, name))
+    )
+    reports = {}
+    for state in states:
+        state_dir = os.path.join(args.store_dir, state)
+        for name in sorted(os.listdir(state_dir)):
+            if not name.endswith('.bin') or name == 'seasonal-models.bin':
+                continue
+            crop = name[:-len('.bin')]
+            start = time.perf_counter()
+            rows, report = clean_store(os.path.join(state_dir, name), state, crop)
+            totals = {flag: sum(flags.get(flag, 0) for flags in report.values()) for flag in [*FLAGS, 'dropped']}
+            print(f"{state}/{crop}: {rows} rows in {time.perf_counter() - start:.1f} s, "
+                  + ', '.join(f"{count} {flag}" for flag, count in totals.items()))
+            reports[f"{state}/{crop}"] = report
+    if args.report:
+        with open(args.report, 'w', encoding='utf-8') as f:
+            json.dump(reports, f, indent=2, sort_keys=True)
+
+if __name__ == '__main__':
+    main()
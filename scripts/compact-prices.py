@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Compact a crop's time partitions: fold delta segments into months and finished years into
+year segments, and delete the segments retired by the previous run. Run it on the same
+schedule as ingestion, never concurrently with it.
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from price_partitions import DirectoryStorage, S3Storage, compact, read_manifest
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--state', required=True)
+    parser.add_argument('--crop', required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--store-dir', help='local directory served through PRICE_STORE_DIR')
+    target.add_argument('--bucket', help='price data bucket; partitions are under price-store/')
+    args = parser.parse_args()
+
+    if args.store_dir:
+        storage = DirectoryStorage(args.store_dir)
+    else:
+        import boto3
+        storage = S3Storage(boto3.client('s3'), args.bucket)
+
+    start = time.perf_counter()
+    result = compact(storage, args.state, args.crop)
+    segments = read_manifest(storage, args.state, args.crop)['segments']
+    print(f"Compacted {len(result['months'])} months and {len(result['years'])} years in "
+          f"{time.perf_counter() - start:.2f} s: {len(segments)} segments, {result['retired']} retired, "
+          f"{result['deleted']} deleted")
+
+if __name__ == '__main__':
+    main()
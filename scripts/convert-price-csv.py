@@ -0,0 +1,42 @@
+#!/usr/bin/env python3
+"""
+Convert a price CSV (data/sample-price-data.csv layout) into a columnar price store,
+cleaning the prices and storing their quality flags on the way
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from price_quality import clean_window
+from price_store import PriceStore, convert_csv, encode_store, parse_price_csv
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', help='input CSV path')
+    parser.add_argument('output', help='output .bin path, uploaded as price-store/{state}/{crop}.bin')
+    parser.add_argument('--state', required=True)
+    parser.add_argument('--crop', required=True)
+    parser.add_argument('--no-clean', action='store_true', help='store the prices as given, without quality flags')
+    args = parser.parse_args()
+
+    with open(args.csv, encoding='utf-8') as f:
+        text = f.read()
+    if args.no_clean:
+        data = convert_csv(text, args.state, args.crop)
+    else:
+        window, report = clean_window(parse_price_csv(text))
+        data = encode_store(window, args.state, args.crop)
+        for code, flags in sorted(report.items()):
+            print(f"{code}: " + ', '.join(f"{count} {name}" for name, count in flags.items()))
+
+    with open(args.output, 'wb') as f:
+        f.write(data)
+
+    store = PriceStore.open(args.output)
+    print(f"Wrote {store.rows} rows for {len(store.mandis)} mandis ({len(data)} bytes) to {args.output}")
+
+if __name__ == '__main__':
+    main()
@@ -1,117 +1,328 @@
 #!/usr/bin/env python3
 """
-Generate sample historical price data for testing
+Generate synthetic market data in the S3 bucket layout: multi-year daily prices for
+many states, crops and mandis, mandi metadata and query logs
+
+Each crop's price follows a yearly growth trend, a seasonal cycle and persistent
+market shocks; each mandi adds its own price offset, noise, trading days and
+arrival volumes. Output is the same for a seed whatever the number of workers.
+Prices are generated a calendar month at a time, so memory is bounded by one
+month of a state/crop (CSV only) or one state/crop series (price stores).
 """
 
-import pandas as pd
-from datetime import datetime, timedelta
-import random
+import argparse
 import json
+import os
+import resource
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date
+
+import numpy as np
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from latest_price_index import build_index
+from price_store import PriceStore, PriceWindow, encode_store, from_day, to_day
+from query_log import TTL_SECONDS
+
+# Approximate bounding boxes, so a state's mandis fall within it
+STATES = {
+    'maharashtra': {'code': 'MH', 'lat': (15.7, 21.9), 'lng': (72.7, 80.8)},
+    'karnataka': {'code': 'KA', 'lat': (11.6, 18.4), 'lng': (74.1, 78.5)},
+    'madhya_pradesh': {'code': 'MP', 'lat': (21.1, 26.8), 'lng': (74.1, 82.7)},
+    'gujarat': {'code': 'GJ', 'lat': (20.2, 24.6), 'lng': (68.3, 74.4)},
+    'rajasthan': {'code': 'RJ', 'lat': (23.1, 30.1), 'lng': (69.6, 78.2)},
+    'uttar_pradesh': {'code': 'UP', 'lat': (24.0, 30.3), 'lng': (77.1, 84.6)},
+    'punjab': {'code': 'PB', 'lat': (29.6, 32.4), 'lng': (73.9, 76.9)},
+    'telangana': {'code': 'TS', 'lat': (15.9, 19.9), 'lng': (77.3, 81.3)},
+    'andhra_pradesh': {'code': 'AP', 'lat': (12.7, 19.1), 'lng': (76.8, 84.7)},
+    'tamil_nadu': {'code': 'TN', 'lat': (8.1, 13.5), 'lng': (76.3, 80.3)}
+}
+
+# base: price in Rs/quintal at the end of the range; growth: per year;
+# season: amplitude of the yearly cycle, highest on day-of-year `peak`;
+# harvest: day of year arrivals peak; volatility: daily shock to the
+# market price; traded: share of mandis trading the crop
+CROPS = {
+    'cotton': {'base': 6000, 'growth': 0.05, 'season': 0.08, 'peak': 200, 'harvest': 320,
+               'volatility': 0.010, 'traded': 0.5, 'variety': 'Medium Staple'},
+    'soybean': {'base': 4500, 'growth': 0.04, 'season': 0.10, 'peak': 240, 'harvest': 290,
+                'volatility': 0.012, 'traded': 0.45, 'variety': 'Yellow'},
+    'wheat': {'base': 2200, 'growth': 0.06, 'season': 0.06, 'peak': 20, 'harvest': 100,
+              'volatility': 0.006, 'traded': 0.6, 'variety': 'Lokwan'},
+    'rice': {'base': 2800, 'growth': 0.05, 'season': 0.05, 'peak': 250, 'harvest': 320,
+             'volatility': 0.006, 'traded': 0.5, 'variety': 'Common'},
+    'onion': {'base': 1500, 'growth': 0.07, 'season': 0.30, 'peak': 300, 'harvest': 90,
+              'volatility': 0.035, 'traded': 0.4, 'variety': 'Red'},
+    'tur': {'base': 7000, 'growth': 0.06, 'season': 0.09, 'peak': 270, 'harvest': 30,
+            'volatility': 0.012, 'traded': 0.35, 'variety': 'Red'},
+    'maize': {'base': 2000, 'growth': 0.04, 'season': 0.08, 'peak': 220, 'harvest': 300,
+              'volatility': 0.010, 'traded': 0.45, 'variety': 'Yellow'},
+    'chana': {'base': 5200, 'growth': 0.05, 'season': 0.07, 'peak': 330, 'harvest': 70,
+              'volatility': 0.009, 'traded': 0.4, 'variety': 'Desi'}
+}
+
+SHOCK_PERSISTENCE = 0.98  # AR(1) coefficient of the daily market shock
+MANDI_OFFSET = 0.04       # sd of a mandi's log price offset from the state market
+MANDI_NOISE = 0.015       # sd of a mandi's daily log price noise
+REPORT_RATE = 0.97        # share of trading days a mandi reports a price
+WEEKDAYS = ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday', 'Sunday']
+FACILITIES = ['weighbridge', 'storage', 'cold_storage', 'grading', 'e_nam']
+CSV_HEADER = 'date,mandi_name,mandi_code,crop,variety,min_price,max_price,modal_price,volume_quintals\n'
+QUERY_STREAM = 1 << 20    # seed stream for query logs, apart from every state's
 
-def generate_price_data(state, crop, days=365):
-    """Generate sample price data"""
-    end_date = datetime.now()
-    start_date = end_date - timedelta(days=days)
+QUERY_LINE = (
+    '{"userId": "anonymous", "timestamp": %d, "state": "%s", "crop": "%s", "location": "%s", '
+    '"quantity": %d, "recommendation": "%s", "confidence": "%s", "ttl": %d}\n'
+)
+RECOMMENDATIONS = [('Sell Now', 'High', 0.3), ('Wait 2-4 weeks', 'Medium', 0.25),
+                   ('Sell within 1-2 weeks', 'Medium', 0.25), ('Sell within 1-2 weeks', 'Low', 0.2)]
+
+def state_rng(seed, state, *stream):
+    """Generator for one state (and crop), independent of which states are generated"""
+    return np.random.default_rng([seed, list(STATES).index(state), *stream])
+
+def generate_mandis(state, count, seed):
+    """Mandi metadata in the data/sample-mandi-metadata.json layout, plus per-mandi arrays"""
+    spec = STATES[state]
+    rng = state_rng(seed, state)
+    crops = list(CROPS)
+    
+    # Mandis cluster around district towns
+    districts = max(1, count // 12)
+    centre_lat = rng.uniform(*spec['lat'], districts)
+    centre_lng = rng.uniform(*spec['lng'], districts)
+    district = rng.integers(0, districts, count)
+    lat = np.clip(centre_lat[district] + rng.normal(0, 0.15, count), *spec['lat'])
+    lng = np.clip(centre_lng[district] + rng.normal(0, 0.15, count), *spec['lng'])
     
-    dates = pd.date_range(start=start_date, end=end_date, freq='D')
+    trades = rng.random((count, len(crops))) < np.array([CROPS[c]['traded'] for c in crops])
+    trades[np.arange(count), rng.integers(0, len(crops), count)] |= ~trades.any(axis=1)
+    open_days = rng.integers(4, 8, count)
+    operating = rng.random((count, 7)).argsort(axis=1).argsort(axis=1) < open_days[:, None]
+    facilities = rng.random((count, len(FACILITIES))) < 0.4
+    facilities[:, 0] = True
     
-    # Base price varies by crop
-    base_prices = {
-        'cotton': 6000,
-        'soybean': 4500,
-        'wheat': 2200,
-        'rice': 2800,
-        'onion': 1500
+    mandis = [
+        {
+            'code': f"{spec['code']}{m + 1:03d}",
+            'name': f"{state.replace('_', ' ').title()} Mandi {m + 1}",
+            'district': f"District {district[m] + 1}",
+            'latitude': round(float(lat[m]), 4),
+            'longitude': round(float(lng[m]), 4),
+            'crops_traded': [c.title() for c, t in zip(crops, trades[m]) if t],
+            'facilities': [f for f, has in zip(FACILITIES, facilities[m]) if has],
+            'contact': f"+91-{700 + district[m]}-xxx-xxxx",
+            'operating_days': [d for d, is_open in zip(WEEKDAYS, operating[m]) if is_open]
+        }
+        for m in range(count)
+    ]
+    market = {
+        'trades': trades,
+        'operating': operating,
+        'scale': rng.lognormal(6.5, 0.8, count),
+        'offset': rng.normal(0, MANDI_OFFSET, (count, len(crops)))
     }
+    return {'state': state.replace('_', ' ').title(), 'mandis': mandis}, market
+
+def ar1(shocks, phi, block=256):
+    """x[t] = phi * x[t-1] + shocks[t], from cumulative sums over blocks short enough for phi**-block"""
+    out = np.empty_like(shocks)
+    carry = 0.0
+    for start in range(0, len(shocks), block):
+        eps = shocks[start:start + block]
+        powers = phi ** np.arange(1, len(eps) + 1)
+        out[start:start + len(eps)] = powers * (carry + np.cumsum(eps / powers))
+        carry = out[start + len(eps) - 1]
+    return out
+
+def month_starts(first_day, last_day):
+    """Day numbers splitting [first_day, last_day] at calendar months, with last_day + 1 at the end"""
+    bounds = np.arange(np.datetime64(from_day(first_day), 'M'), np.datetime64(from_day(last_day), 'M') + 1)
+    starts = bounds.astype('datetime64[D]').astype(np.int64)
+    starts[0] = first_day
+    return np.append(starts, last_day + 1)
+
+def generate_prices(state, crop, metadata, market, first_day, last_day, seed):
+    """Yield a PriceWindow of the crop's prices per calendar month, rows sorted by day then mandi"""
+    spec = CROPS[crop]
+    crop_index = list(CROPS).index(crop)
+    rng = state_rng(seed, state, crop_index)
+    members = np.flatnonzero(market['trades'][:, crop_index])
+    mandis = [
+        {'code': metadata['mandis'][m]['code'], 'name': metadata['mandis'][m]['name'], 'variety': spec['variety']}
+        for m in members
+    ]
     
-    base_price = base_prices.get(crop.lower(), 5000)
+    days = np.arange(first_day, last_day + 1)
+    dates = days.astype('datetime64[D]')
+    day_of_year = (dates - dates.astype('datetime64[Y]')).astype(np.int64)
+    years_to_end = (days - last_day) / 365.25
+    market_price = (
+        np.log(spec['base']) + rng.normal(0, 0.05)
+        + np.log1p(spec['growth']) * years_to_end
+        + np.log1p(spec['season'] * np.cos(2 * np.pi * (day_of_year - spec['peak']) / 365.25))
+        + ar1(rng.normal(0, spec['volatility'], len(days)), SHOCK_PERSISTENCE)
+    )
+    arrivals = 1 + 0.6 * np.cos(2 * np.pi * (day_of_year - spec['harvest']) / 365.25)
+    weekday = (days + 3) % 7  # 1970-01-01 was a Thursday
+    offset = market['offset'][members, crop_index]
+    scale = market['scale'][members]
+    operating = market['operating'][members]
     
-    data = []
-    for i, date in enumerate(dates):
-        # Add trend and seasonality
-        trend = i * 2  # Slight upward trend
-        seasonal = 200 * (1 + 0.5 * (i % 90) / 90)  # Seasonal variation
-        noise = random.randint(-150, 150)
-        
-        modal_price = int(base_price + trend + seasonal + noise)
-        min_price = int(modal_price * 0.95)
-        max_price = int(modal_price * 1.05)
-        volume = random.randint(800, 1500)
+    bounds = month_starts(first_day, last_day)
+    for start, stop in zip(bounds[:-1], bounds[1:]):
+        t = slice(start - first_day, stop - first_day)
+        reports = operating[:, weekday[t]].T & (rng.random((stop - start, len(members))) < REPORT_RATE)
+        row_day, row_mandi = np.nonzero(reports)
+        n = len(row_day)
+        modal = np.exp(market_price[t][row_day] + offset[row_mandi] + rng.normal(0, MANDI_NOISE, n))
+        spread = modal * np.abs(rng.normal(0.04, 0.015, n))
+        volume = scale[row_mandi] * arrivals[t][row_day] * rng.lognormal(0, 0.35, n)
+        yield PriceWindow(
+            (row_day + start).astype(np.int32), row_mandi.astype(np.uint16),
+            np.round(modal - spread * rng.uniform(0.5, 1.5, n)).astype(np.float32),
+            np.round(modal + spread * rng.uniform(0.5, 1.5, n)).astype(np.float32),
+            np.round(modal).astype(np.float32), np.round(volume).astype(np.float32), mandis
+        )
+
+def csv_rows(window, crop):
+    """CSV text for a window, formatted with one %-operation rather than per row"""
+    if not len(window):
+        return ''
+    first = int(window.day.min())
+    dates = np.arange(first, int(window.day.max()) + 1).astype('datetime64[D]').astype(str).astype(object)
+    prefixes = np.array([
+        f",{m['name']},{m['code']},{crop.title()},{m['variety']}," for m in window.mandis
+    ], dtype=object)
+    values = np.empty((len(window), 6), dtype=object)
+    values[:, 0] = dates[window.day - first]
+    values[:, 1] = prefixes[window.mandi]
+    for i, column in enumerate((window.min_price, window.max_price, window.modal_price, window.volume)):
+        values[:, 2 + i] = column.astype(np.int64)
+    return ('%s%s%d,%d,%d,%d\n' * len(window)) % tuple(values.ravel())
+
+def generate_state(state, crops, mandi_count, first_day, last_day, seed, output, formats):
+    """Write one state's metadata, price CSVs and price stores; returns the row count"""
+    metadata, market = generate_mandis(state, mandi_count, seed)
+    os.makedirs(os.path.join(output, 'mandi-metadata'), exist_ok=True)
+    with open(os.path.join(output, 'mandi-metadata', f"{state}_mandis.json"), 'w', encoding='utf-8') as f:
+        json.dump(metadata, f, indent=2)
+    
+    csv_dir = os.path.join(output, 'historical-prices', state)
+    store_dir = os.path.join(output, 'price-store', state)
+    for directory, fmt in ((csv_dir, 'csv'), (store_dir, 'store')):
+        if fmt in formats:
+            os.makedirs(directory, exist_ok=True)
+    
+    rows = 0
+    stores = {}
+    for crop in crops:
+        chunks = []
+        csv_file = None
+        csv_year = None
+        try:
+            for window in generate_prices(state, crop, metadata, market, first_day, last_day, seed):
+                rows += len(window)
+                if 'csv' in formats and len(window):
+                    year = from_day(window.day[0]).year
+                    if year != csv_year:
+                        if csv_file is not None:
+                            csv_file.close()
+                        csv_year = year
+                        csv_file = open(os.path.join(csv_dir, f"{crop}_{year}.csv"), 'w', encoding='utf-8')
+                        csv_file.write(CSV_HEADER)
+                    csv_file.write(csv_rows(window, crop))
+                if 'store' in formats:
+                    chunks.append(window)
+        finally:
+            if csv_file is not None:
+                csv_file.close()
         
-        data.append({
-            'date': date.strftime('%Y-%m-%d'),
-            'mandi_name': 'Sample Mandi',
-            'mandi_code': 'MH001',
-            'crop': crop.title(),
-            'variety': 'Standard',
-            'min_price': min_price,
-            'max_price': max_price,
-            'modal_price': modal_price,
-            'volume_quintals': volume
-        })
+        if chunks:
+            series = PriceWindow(*(np.concatenate(c) for c in zip(*(w.columns() for w in chunks))), chunks[0].mandis)
+            path = os.path.join(store_dir, f"{crop}.bin")
+            with open(path, 'wb') as f:
+                f.write(encode_store(series, state, crop))
+            stores[crop] = PriceStore.open(path)
     
-    return pd.DataFrame(data)
-
-def generate_mandi_metadata(state):
-    """Generate sample mandi metadata"""
-    mandis = {
-        'maharashtra': [
-            {
-                'code': 'MH001',
-                'name': 'Akola APMC',
-                'district': 'Akola',
-                'latitude': 20.7002,
-                'longitude': 77.0082,
-                'crops_traded': ['Cotton', 'Soybean', 'Wheat'],
-                'facilities': ['weighbridge', 'storage'],
-                'contact': '+91-724-xxx-xxxx',
-                'operating_days': ['Monday', 'Tuesday', 'Wednesday', 'Friday']
-            },
-            {
-                'code': 'MH002',
-                'name': 'Nagpur Market',
-                'district': 'Nagpur',
-                'latitude': 21.1458,
-                'longitude': 79.0882,
-                'crops_traded': ['Cotton', 'Wheat', 'Onion'],
-                'facilities': ['weighbridge', 'cold_storage'],
-                'contact': '+91-712-xxx-xxxx',
-                'operating_days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday']
-            }
-        ],
-        'karnataka': [
-            {
-                'code': 'KA001',
-                'name': 'Bangalore APMC',
-                'district': 'Bangalore',
-                'latitude': 12.9716,
-                'longitude': 77.5946,
-                'crops_traded': ['Rice', 'Ragi', 'Vegetables'],
-                'facilities': ['weighbridge', 'cold_storage', 'grading'],
-                'contact': '+91-80-xxx-xxxx',
-                'operating_days': ['Monday', 'Tuesday', 'Wednesday', 'Thursday', 'Friday', 'Saturday']
-            }
-        ]
-    }
+    if 'store' in formats:
+        # Stamped with the last day rather than the clock, so reruns are byte-identical
+        built_at = f"{from_day(last_day).isoformat()}T23:59:59+00:00"
+        with open(os.path.join(store_dir, 'latest-prices.idx'), 'wb') as f:
+            f.write(build_index(state, stores, built_at=built_at))
+    return rows
+
+def write_query_logs(path, count, states, crops, mandi_count, end_day, seed, days=90, chunk=100_000):
+    """Query logs in the QUERY_LOG_SINK=file:<path> layout, busiest mornings and evenings"""
+    rng = np.random.default_rng([seed, QUERY_STREAM])
+    states = np.array(sorted(states, key=list(STATES).index), dtype=object)
+    crops = np.array(sorted(crops, key=list(CROPS).index), dtype=object)
+    crop_weights = np.array([CROPS[c]['traded'] for c in crops])
+    hour_weights = np.array([1, 1, 1, 1, 2, 4, 8, 12, 14, 12, 9, 7, 6, 6, 6, 7, 9, 11, 12, 9, 6, 4, 2, 1], dtype=float)
+    actions = np.array([r[0] for r in RECOMMENDATIONS], dtype=object)
+    confidences = np.array([r[1] for r in RECOMMENDATIONS], dtype=object)
+    end_ms = (end_day + 1) * 86_400_000
     
-    return {
-        'state': state.title(),
-        'mandis': mandis.get(state.lower(), [])
-    }
+    with open(path, 'w', encoding='utf-8') as f:
+        for start in range(0, count, chunk):
+            n = min(chunk, count - start)
+            day = end_day - rng.integers(0, days, n)
+            hour = rng.choice(24, n, p=hour_weights / hour_weights.sum())
+            timestamp = np.minimum(day * 86_400_000 + hour * 3_600_000 + rng.integers(0, 3_600_000, n), end_ms - 1)
+            outcome = rng.choice(len(RECOMMENDATIONS), n, p=[r[2] for r in RECOMMENDATIONS])
+            values = np.empty((n, 8), dtype=object)
+            values[:, 0] = timestamp
+            values[:, 1] = states[rng.integers(0, len(states), n)]
+            values[:, 2] = crops[rng.choice(len(crops), n, p=crop_weights / crop_weights.sum())]
+            values[:, 3] = 'District ' + (rng.integers(0, max(1, mandi_count // 12), n) + 1).astype(str).astype(object)
+            values[:, 4] = np.clip(rng.lognormal(3.5, 0.9, n), 1, 1000).astype(np.int64)
+            values[:, 5] = actions[outcome]
+            values[:, 6] = confidences[outcome]
+            values[:, 7] = timestamp // 1000 + TTL_SECONDS
+            f.write((QUERY_LINE * n) % tuple(values.ravel()))
 
-if __name__ == '__main__':
-    # Generate price data for Maharashtra cotton
-    print("Generating sample price data...")
-    df = generate_price_data('maharashtra', 'cotton', days=365)
-    df.to_csv('data/generated-price-data.csv', index=False)
-    print(f"Generated {len(df)} records")
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--output', default='data/generated', help='directory laid out like the bucket')
+    parser.add_argument('--states', nargs='+', choices=list(STATES), default=list(STATES))
+    parser.add_argument('--crops', nargs='+', choices=list(CROPS), default=list(CROPS))
+    parser.add_argument('--mandis', type=int, default=300, help='mandis per state')
+    parser.add_argument('--years', type=float, default=3)
+    parser.add_argument('--end', default=date.today().isoformat(), help='last day, YYYY-MM-DD')
+    parser.add_argument('--formats', nargs='+', choices=['csv', 'store'], default=['csv', 'store'])
+    parser.add_argument('--queries', type=int, default=100_000, help='query-log records to generate')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--workers', type=int, help='worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    
+    last_day = to_day(args.end)
+    first_day = last_day - int(args.years * 365.25) + 1
+    start = time.perf_counter()
     
-    # Generate mandi metadata
-    print("Generating mandi metadata...")
-    for state in ['maharashtra', 'karnataka']:
-        metadata = generate_mandi_metadata(state)
-        with open(f'data/{state}_mandis.json', 'w') as f:
-            json.dump(metadata, f, indent=2)
-        print(f"Generated metadata for {state}")
+    with ProcessPoolExecutor(max_workers=args.workers) as pool:
+        futures = {
+            state: pool.submit(generate_state, state, args.crops, args.mandis, first_day, last_day,
+                               args.seed, args.output, args.formats)
+            for state in args.states
+        }
+        rows = 0
+        for state, future in futures.items():
+            state_rows = future.result()
+            rows += state_rows
+            print(f"{state}: {state_rows} price rows for {len(args.crops)} crops")
     
-    print("Done!")
+    if args.queries:
+        write_query_logs(os.path.join(args.output, 'query-logs.jsonl'), args.queries, args.states,
+                         args.crops, args.mandis, last_day, args.seed)
+    
+    elapsed = time.perf_counter() - start
+    peak_mb = max(resource.getrusage(who).ru_maxrss for who in (resource.RUSAGE_SELF, resource.RUSAGE_CHILDREN)) / 1024
+    print(f"Generated {rows} price rows from {from_day(first_day)} to {from_day(last_day)} and "
+          f"{args.queries} query logs in {elapsed:.1f} s ({rows / elapsed:,.0f} rows/s, peak RSS {peak_mb:.0f} MB)")
+    print(f"Upload with: aws s3 sync {args.output} s3://YOUR-BUCKET --exclude query-logs.jsonl")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,48 @@
+#!/usr/bin/env python3
+"""
+Append a batch of new price rows (data/sample-price-data.csv layout) to a crop's time
+partitions, as one delta segment, in a local price-store directory or the bucket. Rows are
+cleaned against the stored history first and the flagged rows are reported per mandi
+"""
+
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'backend', 'functions', 'get_recommendation'))
+
+from price_partitions import DirectoryStorage, S3Storage, ingest
+from price_quality import quality_report
+from price_store import PriceStore, from_day, parse_price_csv
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('csv', help='CSV holding only the new rows')
+    parser.add_argument('--state', required=True)
+    parser.add_argument('--crop', required=True)
+    target = parser.add_mutually_exclusive_group(required=True)
+    target.add_argument('--store-dir', help='local directory served through PRICE_STORE_DIR')
+    target.add_argument('--bucket', help='price data bucket; partitions go under price-store/')
+    parser.add_argument('--no-clean', action='store_true', help='store the rows as given, without quality flags')
+    args = parser.parse_args()
+
+    with open(args.csv, encoding='utf-8') as f:
+        window = parse_price_csv(f.read())
+    if args.store_dir:
+        storage = DirectoryStorage(args.store_dir)
+    else:
+        import boto3
+        storage = S3Storage(boto3.client('s3'), args.bucket)
+    segment = ingest(storage, args.state, args.crop, window, clean=not args.no_clean)
+    if segment is None:
+        print('No rows to ingest')
+        return
+    print(f"Wrote {segment['name']}: {segment['rows']} of {len(window)} rows, "
+          f"{from_day(segment['first_day'])} to {from_day(segment['last_day'])}")
+    if not args.no_clean:
+        written = PriceStore.from_bytes(storage.read(f"{args.state}/{args.crop}/{segment['name']}"))
+        for code, flags in sorted(quality_report(written.window()).items()):
+            print(f"  {code}: " + ', '.join(f"{count} {name}" for name, count in flags.items()))
+
+if __name__ == '__main__':
+    main()